@@ -20,6 +20,15 @@ from app.routes.coupons import bp as coupons_bp
 from app.routes.user import bp as user_bp
 from app.routes.products import bp as products_bp
 from app.routes.cart import bp as cart_bp
+from app.routes.uploads import bp as uploads_bp
+from app.utils.cart_store import cart_storage
+from app.utils.coupon_cache import coupon_cache
+from app.utils.coupon_reservations import reservation_sweeper
+from app.utils.inventory_holds import hold_sweeper
+from app.utils.coupon_lifecycle import coupon_lifecycle
+from app.utils.product_cache import product_cache
+from app.utils.import_jobs import import_worker
+from app.utils.image_pipeline import image_pipeline
 
 def create_app(test_config=None):
     app = Flask(__name__)
@@ -35,6 +44,14 @@ def create_app(test_config=None):
     db.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
+    cart_storage.init_app(app)
+    coupon_cache.init_app(app)
+    reservation_sweeper.init_app(app)
+    hold_sweeper.init_app(app)
+    coupon_lifecycle.init_app(app)
+    product_cache.init_app(app)
+    import_worker.init_app(app)
+    image_pipeline.init_app(app)
 
     app.register_blueprint(test_db_bp)
     app.register_blueprint(auth_bp)
@@ -43,15 +60,7 @@ def create_app(test_config=None):
     app.register_blueprint(user_bp)
     app.register_blueprint(products_bp)
     app.register_blueprint(cart_bp)
-
-    # Serve static files from uploads directory
-    from flask import send_from_directory
-    import os
-
-    @app.route('/uploads/<path:filename>')
-    def uploaded_file(filename):
-        upload_dir = os.path.join(os.path.dirname(__file__), 'frontend', 'public', 'uploads')
-        return send_from_directory(upload_dir, filename)
+    app.register_blueprint(uploads_bp)
 
     @app.route('/')
     def hello():
@@ -6,6 +6,88 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret')
 
+    # Cart storage: 'memory' (single worker), 'sql' or 'redis'
+    CART_STORE = os.getenv('CART_STORE', 'memory')
+    CART_TTL_SECONDS = int(os.getenv('CART_TTL_SECONDS', 7 * 24 * 60 * 60))
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+    # Bounds for the in-memory cart store; evicted carts are spilled to
+    # CART_SPILL_DIR (if set) and restored on the user's next request
+    CART_MEMORY_MAX_ENTRIES = int(os.getenv('CART_MEMORY_MAX_ENTRIES', 10000))
+    CART_MEMORY_IDLE_SECONDS = int(os.getenv('CART_MEMORY_IDLE_SECONDS', 2 * 60 * 60))
+    CART_SPILL_DIR = os.getenv('CART_SPILL_DIR')
+
+    # Process-local coupon-by-code cache; 0 disables it
+    COUPON_CACHE_TTL_SECONDS = int(os.getenv('COUPON_CACHE_TTL_SECONDS', 60))
+    COUPON_CACHE_MAX_ENTRIES = int(os.getenv('COUPON_CACHE_MAX_ENTRIES', 10000))
+
+    # How long apply-coupon holds a coupon use for checkout, and how often
+    # expired holds are swept back (0 disables the background sweeper)
+    COUPON_RESERVATION_TTL_SECONDS = int(os.getenv('COUPON_RESERVATION_TTL_SECONDS', 15 * 60))
+    COUPON_RESERVATION_SWEEP_SECONDS = int(os.getenv('COUPON_RESERVATION_SWEEP_SECONDS', 60))
+
+    # How long adding to the cart holds the product's units for checkout, and
+    # how often expired holds are swept back (0 disables the background sweeper)
+    INVENTORY_HOLD_TTL_SECONDS = int(os.getenv('INVENTORY_HOLD_TTL_SECONDS', 15 * 60))
+    INVENTORY_HOLD_SWEEP_SECONDS = int(os.getenv('INVENTORY_HOLD_SWEEP_SECONDS', 60))
+
+    # Flip coupon lifecycle states (scheduled/active/expired) on time from a
+    # background thread; boundaries are loaded this far ahead
+    COUPON_LIFECYCLE_SCHEDULER = os.getenv('COUPON_LIFECYCLE_SCHEDULER', 'true').lower() == 'true'
+    COUPON_LIFECYCLE_HORIZON_SECONDS = int(os.getenv('COUPON_LIFECYCLE_HORIZON_SECONDS', 300))
+
+    # Process-local cache of catalog reads, invalidated by a shared catalog
+    # version; other workers' writes are seen within the version check
+    # interval. A TTL of 0 disables it
+    PRODUCT_CACHE_TTL_SECONDS = int(os.getenv('PRODUCT_CACHE_TTL_SECONDS', 300))
+    PRODUCT_CACHE_MAX_ENTRIES = int(os.getenv('PRODUCT_CACHE_MAX_ENTRIES', 5000))
+    PRODUCT_CACHE_VERSION_CHECK_SECONDS = float(os.getenv('PRODUCT_CACHE_VERSION_CHECK_SECONDS', 1.0))
+
+    # Product search keeps this many best ranked index matches, so latency
+    # does not grow with the number of products matching a short prefix; the
+    # reported total is capped at it. 0 ranks every match
+    PRODUCT_SEARCH_MAX_CANDIDATES = int(os.getenv('PRODUCT_SEARCH_MAX_CANDIDATES', 1000))
+
+    # CSV product imports insert and commit this many rows at a time and
+    # report at most this many row errors
+    PRODUCT_IMPORT_CHUNK_SIZE = int(os.getenv('PRODUCT_IMPORT_CHUNK_SIZE', 1000))
+    PRODUCT_IMPORT_MAX_ERRORS = int(os.getenv('PRODUCT_IMPORT_MAX_ERRORS', 100))
+
+    # Catalog exports fetch and render this many products at a time
+    PRODUCT_EXPORT_BATCH_SIZE = int(os.getenv('PRODUCT_EXPORT_BATCH_SIZE', 1000))
+
+    # Background imports (bulk upload with async=true): uploads are kept in
+    # PRODUCT_IMPORT_DIR (default instance/imports) and run by a worker thread
+    # per process; a running job whose heartbeat is older than the stale
+    # interval is taken over and resumed by another worker, up to
+    # PRODUCT_IMPORT_MAX_ATTEMPTS claims before the job is marked failed
+    PRODUCT_IMPORT_WORKER = os.getenv('PRODUCT_IMPORT_WORKER', 'true').lower() == 'true'
+    PRODUCT_IMPORT_DIR = os.getenv('PRODUCT_IMPORT_DIR')
+    PRODUCT_IMPORT_POLL_SECONDS = float(os.getenv('PRODUCT_IMPORT_POLL_SECONDS', 2))
+    PRODUCT_IMPORT_STALE_SECONDS = int(os.getenv('PRODUCT_IMPORT_STALE_SECONDS', 120))
+    PRODUCT_IMPORT_MAX_ATTEMPTS = int(os.getenv('PRODUCT_IMPORT_MAX_ATTEMPTS', 3))
+
+    # Product images are stored by content hash under UPLOAD_DIR (default
+    # frontend/public/uploads); thumbnail and medium variants are generated by
+    # a pool of IMAGE_PIPELINE_WORKERS threads. Uploads are staged privately
+    # in IMAGE_STAGING_DIR (default instance/image-staging) until published
+    UPLOAD_DIR = os.getenv('UPLOAD_DIR')
+    IMAGE_STAGING_DIR = os.getenv('IMAGE_STAGING_DIR')
+    IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 2))
+    IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+
+    # /uploads: content-hashed images are cached for a year as immutable,
+    # other files for UPLOADS_MAX_AGE seconds. UPLOADS_OFFLOAD hands the file
+    # body to a fronting proxy: 'x-sendfile' (Apache, lighttpd) sends the file
+    # path, 'x-accel-redirect' (nginx) the URI under UPLOADS_ACCEL_PREFIX,
+    # which the proxy maps to UPLOAD_DIR in an internal location
+    UPLOADS_MAX_AGE = int(os.getenv('UPLOADS_MAX_AGE', 300))
+    UPLOADS_OFFLOAD = os.getenv('UPLOADS_OFFLOAD', '')
+    UPLOADS_ACCEL_PREFIX = os.getenv('UPLOADS_ACCEL_PREFIX', '/_uploads/')
+
+    # Upper bound for one bulk coupon code generation request
+    COUPON_BULK_MAX_CODES = int(os.getenv('COUPON_BULK_MAX_CODES', 1000000))
+
     # Gmail SMTP settings for testing
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 587
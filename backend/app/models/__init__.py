@@ -3,3 +3,11 @@ from .coupon import Coupon
 from .redemption import Redemption
 from .product import Product
 from .order import Order, OrderItem
+from .cart import Cart
+from .redeemed_coupon import RedeemedCoupon
+from .coupon_reservation import CouponReservation
+from .coupon_category import CouponCategory
+from .product_facet_count import ProductFacetCount
+from .cache_version import CacheVersion
+from .import_job import ImportJob
+from .inventory_hold import InventoryHold
@@ -0,0 +1,15 @@
+from app import db
+
+class CacheVersion(db.Model):
+    """A named version counter shared by every worker.
+
+    Cached reads are tagged with the version they were computed at; bumping
+    the counter invalidates all of them at once.
+    """
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}={self.version}>'
@@ -0,0 +1,14 @@
+from app import db
+import datetime
+
+class Cart(db.Model):
+    __tablename__ = 'carts'
+
+    user_id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)  # JSON string of the cart
+    version = db.Column(db.Integer, nullable=False, default=1)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Cart user={self.user_id}>'
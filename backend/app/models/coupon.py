@@ -1,11 +1,62 @@
 import datetime
+import functools
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Numeric, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Numeric, Text, event
 from app import db
+from .coupon_category import CouponCategory
 import json
 
+
+@functools.lru_cache(maxsize=4096)
+def parse_categories(applicable_categories):
+    """Parse the JSON category list once per distinct value, as a tuple of unique names"""
+    if not applicable_categories:
+        return ()
+    try:
+        categories = json.loads(applicable_categories)
+    except (json.JSONDecodeError, TypeError):
+        return ()
+    if not isinstance(categories, list):
+        return ()
+    return tuple(dict.fromkeys(category for category in categories if isinstance(category, str) and category))
+
+
+# Coupon lifecycle states, kept up to date by app.utils.coupon_lifecycle
+COUPON_SCHEDULED = 'scheduled'
+COUPON_ACTIVE = 'active'
+COUPON_EXHAUSTED = 'exhausted'
+COUPON_EXPIRED = 'expired'
+LIFECYCLE_STATES = (COUPON_SCHEDULED, COUPON_ACTIVE, COUPON_EXHAUSTED, COUPON_EXPIRED)
+
+
+def compute_lifecycle_state(start_date, end_date, current_uses, max_uses, now=None):
+    """Lifecycle state of a coupon at `now`; the validity window includes both ends"""
+    now = now or datetime.datetime.utcnow()
+    if end_date and end_date < now:
+        return COUPON_EXPIRED
+    if start_date and start_date > now:
+        return COUPON_SCHEDULED
+    if (current_uses or 0) >= (max_uses if max_uses is not None else 1):
+        return COUPON_EXHAUSTED
+    return COUPON_ACTIVE
+
+
+def default_lifecycle_state(context):
+    """Column default, so Core bulk inserts get the right state too"""
+    params = context.get_current_parameters()
+    return compute_lifecycle_state(params.get('start_date'), params.get('end_date'),
+                                   params.get('current_uses'), params.get('max_uses'))
+
+
 class Coupon(db.Model):
     __tablename__ = 'coupons'
+    __table_args__ = (
+        # Live public coupons: listings and the best-coupon finder filter on
+        # one lifecycle state and order by end date
+        db.Index('ix_coupons_live', 'lifecycle_state', 'is_public', 'is_active', 'end_date'),
+        # Keyset pagination of the admin coupon list, newest first
+        db.Index('ix_coupons_created', 'created_at', 'id'),
+    )
     id = Column(Integer, primary_key=True)
     code = Column(String(32), unique=True, nullable=False)
     title = Column(String(120), nullable=False)
@@ -15,14 +66,16 @@ class Coupon(db.Model):
     is_public = Column(Boolean, default=True)
     max_uses = Column(Integer, default=1)
     current_uses = Column(Integer, default=0)
+    reserved_uses = Column(Integer, nullable=False, default=0)  # Uses held by unexpired cart reservations
     start_date = Column(DateTime)
     end_date = Column(DateTime)
     created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
     is_active = Column(Boolean, default=True)
+    lifecycle_state = Column(String(16), nullable=False, default=default_lifecycle_state)  # One of LIFECYCLE_STATES
 
     # Enhanced fields for product integration
     minimum_order_value = Column(Numeric(10, 2), default=0)
-    applicable_categories = Column(Text)  # JSON string of categories
+    applicable_categories = Column(Text)  # JSON string of categories, mirrored by category_links
     maximum_discount_amount = Column(Numeric(10, 2))  # Cap for percentage discounts
     first_time_user_only = Column(Boolean, default=False)
 
@@ -31,18 +84,14 @@ class Coupon(db.Model):
 
     creator = relationship('User', back_populates='coupons')
     redemptions = relationship('Redemption', back_populates='coupon', cascade='all, delete-orphan')
+    category_links = relationship('CouponCategory', cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Coupon {self.code}>'
 
     def get_applicable_categories(self):
         """Get applicable categories as a list"""
-        if self.applicable_categories:
-            try:
-                return json.loads(self.applicable_categories)
-            except json.JSONDecodeError:
-                return []
-        return []
+        return list(parse_categories(self.applicable_categories))
 
     def set_applicable_categories(self, categories):
         """Set applicable categories from a list"""
@@ -72,9 +121,11 @@ class Coupon(db.Model):
             'is_public': self.is_public,
             'max_uses': self.max_uses,
             'current_uses': self.current_uses,
+            'reserved_uses': self.reserved_uses or 0,
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
             'is_active': self.is_active,
+            'lifecycle_state': self.lifecycle_state,
             'minimum_order_value': float(self.minimum_order_value) if self.minimum_order_value is not None else 0.0,
             'applicable_categories': self.get_applicable_categories(),
             'maximum_discount_amount': float(self.maximum_discount_amount) if self.maximum_discount_amount is not None else None,
@@ -82,3 +133,21 @@ class Coupon(db.Model):
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+
+
+@event.listens_for(Coupon.applicable_categories, 'set')
+def sync_category_links(coupon, value, oldvalue, initiator):
+    """Keep the coupon_categories rows in step with the JSON column"""
+    links = {link.category: link for link in coupon.category_links}
+    coupon.category_links = [links.get(category) or CouponCategory(category=category)
+                             for category in parse_categories(value)]
+
+
+@event.listens_for(Coupon, 'before_update')
+def refresh_lifecycle_state(mapper, connection, coupon):
+    """Recompute the state when an ORM write changes the window or the usage"""
+    state = db.inspect(coupon)
+    if any(state.attrs[name].history.has_changes()
+           for name in ('start_date', 'end_date', 'current_uses', 'max_uses')):
+        coupon.lifecycle_state = compute_lifecycle_state(coupon.start_date, coupon.end_date,
+                                                         coupon.current_uses, coupon.max_uses)
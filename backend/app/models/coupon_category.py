@@ -0,0 +1,19 @@
+from app import db
+
+class CouponCategory(db.Model):
+    """One product category a category-restricted coupon applies to.
+
+    Kept in sync with `Coupon.applicable_categories`, which remains the JSON
+    view of the same list.
+    """
+    __tablename__ = 'coupon_categories'
+    __table_args__ = (
+        # Coupons applicable to a category
+        db.Index('ix_coupon_categories_category', 'category', 'coupon_id'),
+    )
+
+    coupon_id = db.Column(db.Integer, db.ForeignKey('coupons.id', ondelete='CASCADE'), primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+
+    def __repr__(self):
+        return f'<CouponCategory coupon={self.coupon_id} category={self.category}>'
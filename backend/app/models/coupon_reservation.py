@@ -0,0 +1,18 @@
+from app import db
+import datetime
+
+class CouponReservation(db.Model):
+    """A coupon use held for a user's cart until checkout or expiry"""
+    __tablename__ = 'coupon_reservations'
+    __table_args__ = (
+        db.UniqueConstraint('coupon_id', 'user_id', name='uq_coupon_reservations_coupon_user'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    coupon_id = db.Column(db.Integer, db.ForeignKey('coupons.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CouponReservation coupon={self.coupon_id} user={self.user_id}>'
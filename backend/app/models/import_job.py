@@ -0,0 +1,76 @@
+from app import db
+import datetime
+import json
+
+# Import job states; queued and running jobs are picked up by app.utils.import_jobs
+IMPORT_QUEUED = 'queued'
+IMPORT_RUNNING = 'running'
+IMPORT_COMPLETED = 'completed'
+IMPORT_FAILED = 'failed'
+IMPORT_CANCELLED = 'cancelled'
+IMPORT_STATES = (IMPORT_QUEUED, IMPORT_RUNNING, IMPORT_COMPLETED, IMPORT_FAILED, IMPORT_CANCELLED)
+FINISHED_STATES = (IMPORT_COMPLETED, IMPORT_FAILED, IMPORT_CANCELLED)
+
+
+class ImportJob(db.Model):
+    """A bulk product import run in the background.
+
+    Progress is written in the same transaction as each imported chunk, so
+    after a restart the job resumes after `resume_row` with its counts intact.
+    """
+    __tablename__ = 'import_jobs'
+    __table_args__ = (
+        db.Index('ix_import_jobs_status', 'status', 'id'),
+        db.Index('ix_import_jobs_created', 'created_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default=IMPORT_QUEUED)
+    filename = db.Column(db.String(255))
+    file_path = db.Column(db.String(500), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    imported_count = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    # JSON list of the first row errors
+    errors = db.Column(db.Text)
+    # Last CSV row whose chunk has been committed
+    resume_row = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    worker_id = db.Column(db.String(64))
+    # Times a worker has claimed the job; it fails after too many
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.status}>'
+
+    def error_list(self):
+        try:
+            return json.loads(self.errors) if self.errors else []
+        except (json.JSONDecodeError, TypeError):
+            return []
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'processed_rows': self.processed_rows,
+            'imported_count': self.imported_count,
+            'error_count': self.error_count,
+            'errors': self.error_list(),
+            'message': self.message,
+            'cancel_requested': self.cancel_requested,
+            'attempts': self.attempts,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
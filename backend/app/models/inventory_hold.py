@@ -0,0 +1,19 @@
+from app import db
+import datetime
+
+class InventoryHold(db.Model):
+    """Units of a product held for a user's cart until checkout or expiry"""
+    __tablename__ = 'inventory_holds'
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'user_id', name='uq_inventory_holds_product_user'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<InventoryHold product={self.product_id} user={self.user_id} quantity={self.quantity}>'
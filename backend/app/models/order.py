@@ -26,8 +26,8 @@ class Order(db.Model):
     def __repr__(self):
         return f'<Order {self.id}>'
 
-    def to_dict(self):
-        return {
+    def to_dict(self, include_items=True):
+        data = {
             'id': self.id,
             'user_id': self.user_id,
             'subtotal': float(self.subtotal) if self.subtotal is not None else 0.0,
@@ -39,9 +39,11 @@ class Order(db.Model):
             'shipping_address': self.shipping_address,
             'payment_method': self.payment_method,
             'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'items': [item.to_dict() for item in self.items]
+            'updated_at': self.updated_at.isoformat()
         }
+        if include_items:
+            data['items'] = [item.to_dict() for item in self.items]
+        return data
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
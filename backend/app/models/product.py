@@ -1,8 +1,37 @@
 from app import db
 import datetime
+import re
+
+# Images stored by app.utils.image_pipeline live in one directory per content
+# hash: /uploads/images/<xx>/<sha256>/{original.<ext>,thumbnail.webp,medium.webp}
+IMAGE_VARIANT_NAMES = ('thumbnail', 'medium')
+_IMAGE_URL = re.compile(r'^(?P<base>/uploads/images/[0-9a-f]{2}/[0-9a-f]{64})/(?P<name>[a-z]+)\.[a-z]+$')
+
+
+def image_url_for(digest, ext, variants=True):
+    """URL recorded on Product.image_url for a stored image: its medium
+    variant, or the original when variants are not generated"""
+    base = f'/uploads/images/{digest[:2]}/{digest}'
+    return f'{base}/medium.webp' if variants else f'{base}/original.{ext}'
+
+
+def image_variant_urls(image_url):
+    """Variant name -> URL for a pipeline image URL, None for other URLs"""
+    match = _IMAGE_URL.match(image_url or '')
+    if match is None:
+        return None
+    if match.group('name') == 'original':
+        return {name: image_url for name in IMAGE_VARIANT_NAMES}
+    return {name: f"{match.group('base')}/{name}.webp" for name in IMAGE_VARIANT_NAMES}
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        # Keyset pagination of the catalog by each sort key
+        db.Index('ix_products_name', 'name', 'id'),
+        db.Index('ix_products_price', 'price', 'id'),
+        db.Index('ix_products_created', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -12,6 +41,7 @@ class Product(db.Model):
     brand = db.Column(db.String(100))
     sku = db.Column(db.String(50), unique=True)
     stock_quantity = db.Column(db.Integer, default=0)
+    reserved_quantity = db.Column(db.Integer, nullable=False, default=0)  # Units held by unswept cart holds
     is_active = db.Column(db.Boolean, default=True)
     image_url = db.Column(db.String(500))
     minimum_order_value = db.Column(db.Numeric(10, 2), default=0)
@@ -38,6 +68,7 @@ class Product(db.Model):
             'stock_quantity': self.stock_quantity,
             'is_active': self.is_active,
             'image_url': self.image_url,
+            'image_variants': image_variant_urls(self.image_url),
             'minimum_order_value': float(self.minimum_order_value) if self.minimum_order_value is not None else 0.0,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
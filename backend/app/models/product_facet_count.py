@@ -0,0 +1,16 @@
+from app import db
+
+class ProductFacetCount(db.Model):
+    """Number of active products with one value of one facet (category,
+    brand, price band, availability).
+
+    Maintained by database triggers on `products`, see app.utils.product_facets.
+    """
+    __tablename__ = 'product_facet_counts'
+
+    facet = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.String(100), primary_key=True)
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ProductFacetCount {self.facet}={self.value}: {self.product_count}>'
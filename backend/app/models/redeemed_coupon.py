@@ -0,0 +1,15 @@
+from app import db
+import datetime
+
+class RedeemedCoupon(db.Model):
+    """One coupon redeemed by one user, written with every redemption"""
+    __tablename__ = 'user_redeemed_coupons'
+
+    # The primary key keeps a coupon to one row per user and serves the
+    # (user_id, coupon_id) probes of the listings' anti-join
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    coupon_id = db.Column(db.Integer, db.ForeignKey('coupons.id', ondelete='CASCADE'), primary_key=True)
+    redeemed_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<RedeemedCoupon user={self.user_id} coupon={self.coupon_id}>'
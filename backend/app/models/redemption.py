@@ -6,6 +6,11 @@ import json
 
 class Redemption(db.Model):
     __tablename__ = 'redemptions'
+    __table_args__ = (
+        # Keyset pagination of a user's / a coupon's redemptions, newest first
+        db.Index('ix_redemptions_user_redeemed', 'user_id', 'redeemed_at', 'id'),
+        db.Index('ix_redemptions_coupon_redeemed', 'coupon_id', 'redeemed_at', 'id'),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     coupon_id = Column(Integer, ForeignKey('coupons.id'), nullable=False)
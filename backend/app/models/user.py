@@ -5,6 +5,10 @@ from app import db
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Keyset pagination of the admin user list, newest first
+        db.Index('ix_users_created', 'created_at', 'id'),
+    )
     id = Column(Integer, primary_key=True)
     username = Column(String(80), unique=True, nullable=False)
     email = Column(String(120), unique=True, nullable=False)
@@ -1,12 +1,34 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from app import db
-from app.models import User, Coupon, Redemption, Product, Order, OrderItem
+from app.models import User, Coupon, Redemption, Product, Order, OrderItem, ImportJob
+from app.models.import_job import IMPORT_STATES, FINISHED_STATES
+from app.models.coupon import COUPON_SCHEDULED, COUPON_ACTIVE, COUPON_EXHAUSTED, COUPON_EXPIRED
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils.cart_store import cart_storage
+from app.utils.coupon_cache import coupon_cache
+from app.utils.product_cache import product_cache
+from app.utils.pagination import paginate_query, InvalidCursorError
+from app.utils.coupon_reservations import sweep_expired_reservations
+from app.utils.inventory_holds import sweep_expired_holds
+from app.utils.coupon_lifecycle import coupon_lifecycle, lifecycle_state_filter, LIVE_STATES
+from app.utils.coupon_codes import (
+    BulkCodeJob, CodeGenerator, CodeGenerationError,
+    DEFAULT_CODE_ALPHABET, DEFAULT_CODE_LENGTH, DEFAULT_CHUNK_SIZE
+)
+from app.utils.product_import import (
+    ProductImport, RowError, read_csv_rows, open_upload, IMPORT_COLUMNS,
+    DEFAULT_IMPORT_CHUNK_SIZE, DEFAULT_MAX_REPORTED_ERRORS
+)
+from app.utils.import_jobs import enqueue_import, cancel_import
+from app.utils.product_upsert import ProductUpsert, read_ndjson_rows
+from app.utils.product_export import export_chunks, EXPORT_FORMATS, DEFAULT_EXPORT_BATCH_SIZE
+from app.utils.image_pipeline import image_pipeline, InvalidImageError
+from app.models.product import image_variant_urls
 from functools import wraps
 import datetime
 import re
 import csv
-from io import StringIO
+import json
 
 bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -280,120 +302,193 @@ def bulk_upload_products():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
 
-    if not file.filename.endswith('.csv'):
+    if not file.filename.lower().endswith(('.csv', '.csv.gz')):
         return jsonify({'error': 'File must be a CSV'}), 400
 
+    # Large files can be imported by the background worker instead
+    if request.values.get('async', '').lower() in ('true', '1'):
+        try:
+            job = enqueue_import(file, created_by=int(get_jwt_identity()))
+        except Exception as e:
+            return jsonify({'error': f'Failed to queue CSV file: {str(e)}'}), 500
+        return jsonify({'message': 'Bulk upload queued', 'job': job.to_dict()}), 202
+
+    rows = read_csv_rows(open_upload(file.stream, file.filename))
+    job = ProductImport(
+        created_by=int(get_jwt_identity()),
+        chunk_size=current_app.config.get('PRODUCT_IMPORT_CHUNK_SIZE', DEFAULT_IMPORT_CHUNK_SIZE),
+        max_errors=current_app.config.get('PRODUCT_IMPORT_MAX_ERRORS', DEFAULT_MAX_REPORTED_ERRORS)
+    )
+
     try:
-        # Read CSV file
-        csv_data = file.read().decode('utf-8')
-        csv_reader = csv.DictReader(StringIO(csv_data))
+        job.run(rows)
+    except RowError as e:
+        return jsonify({'error': str(e)}), 400
+    except (UnicodeDecodeError, csv.Error, OSError, EOFError) as e:
+        # Chunks before the unreadable part stay imported
+        db.session.rollback()
+        return jsonify({
+            'error': f'Failed to read CSV file: {str(e)}',
+            'imported_count': job.stats['imported'],
+            'error_count': job.stats['error_count'],
+            'errors': job.errors
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to process CSV file: {str(e)}'}), 500
 
-        # Get admin user
-        user_id = get_jwt_identity()
-        admin_user = User.query.get(int(user_id))
-
-        success_count = 0
-        error_count = 0
-        errors = []
-
-        for row_num, row in enumerate(csv_reader, start=2):  # Start from 2 (header is row 1)
-            try:
-                # Validate required fields
-                if not row.get('name') or not row.get('price'):
-                    errors.append(f'Row {row_num}: Missing required fields (name and price are required)')
-                    error_count += 1
-                    continue
-
-                # Check SKU uniqueness
-                sku = row.get('sku', '').strip()
-                if not sku:
-                    # Generate SKU if not provided
-                    import random
-                    import string
-                    sku = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-                    # Ensure uniqueness
-                    while Product.query.filter_by(sku=sku).first():
-                        sku = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-                elif Product.query.filter_by(sku=sku).first():
-                    errors.append(f'Row {row_num}: SKU already exists')
-                    error_count += 1
-                    continue
-
-                # Parse price safely
-                try:
-                    price = float(row['price'])
-                except (ValueError, TypeError):
-                    errors.append(f'Row {row_num}: Invalid price format - {row["price"]}')
-                    error_count += 1
-                    continue
+    current_app.logger.info(f"Bulk upload imported {job.stats['imported']} of {job.stats['processed']} rows "
+                            f"in {job.stats['chunks']} chunks ({job.stats['error_count']} errors)")
 
-                # Parse minimum_order_value safely
-                minimum_order_value = None
-                if row.get('minimum_order_value') and row.get('minimum_order_value').strip():
-                    try:
-                        minimum_order_value = float(row.get('minimum_order_value'))
-                    except (ValueError, TypeError):
-                        errors.append(f'Row {row_num}: Invalid minimum_order_value format - {row.get("minimum_order_value")}')
-                        error_count += 1
-                        continue
+    return jsonify({
+        'message': 'Bulk upload completed',
+        'processed_count': job.stats['processed'],
+        'imported_count': job.stats['imported'],
+        'error_count': job.stats['error_count'],
+        'errors': job.errors
+    }), 200
 
-                # Parse stock_quantity safely
-                try:
-                    stock_quantity = int(row.get('stock_quantity', 0))
-                except (ValueError, TypeError):
-                    errors.append(f'Row {row_num}: Invalid stock_quantity format - {row.get("stock_quantity")}')
-                    error_count += 1
-                    continue
-
-                # Create product
-                product = Product(
-                    name=row['name'].strip(),
-                    description=row.get('description', '').strip(),
-                    price=price,
-                    category=row.get('category', '').strip() or 'All',
-                    brand=row.get('brand', '').strip(),
-                    sku=sku,
-                    stock_quantity=stock_quantity,
-                    is_active=row.get('is_active', 'true').lower() == 'true',
-                    image_url=row.get('image_url', '').strip(),
-                    minimum_order_value=minimum_order_value,
-                    created_by=admin_user.id,
-                    created_at=datetime.datetime.utcnow(),
-                    updated_at=datetime.datetime.utcnow()
-                )
-
-                db.session.add(product)
-                success_count += 1
-                print(f"Added product: {product.name} with SKU: {product.sku}")
-
-            except (ValueError, TypeError) as e:
-                errors.append(f'Row {row_num}: Invalid data format - {str(e)}')
-                error_count += 1
-                continue
-            except Exception as e:
-                errors.append(f'Row {row_num}: Unexpected error - {str(e)}')
-                error_count += 1
-                continue
+# GET /api/admin/products/export - Stream the catalog as CSV or NDJSON
+@bp.route('/products/export', methods=['GET'])
+@jwt_required()
+@admin_required
+def export_products():
+    data_format = request.args.get('format', 'csv').lower()
+    if data_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+    compress = request.args.get('gzip', '').lower() in ('true', '1')
+    category = request.args.get('category', '').strip()
+    status = request.args.get('status', 'all')  # all, active, inactive
 
-        try:
-            db.session.commit()
-            print(f"Successfully committed {success_count} products to database")
-        except Exception as e:
-            db.session.rollback()
-            errors.append(f'Database commit failed: {str(e)}')
-            error_count += success_count
-            success_count = 0
+    query = db.select(*[getattr(Product, column) for column in IMPORT_COLUMNS])
+    if category:
+        query = query.where(Product.category == category)
+    if status == 'active':
+        query = query.where(Product.is_active == True)
+    elif status == 'inactive':
+        query = query.where(Product.is_active == False)
 
-        return jsonify({
-            'message': 'Bulk upload completed',
-            'imported_count': success_count,
-            'error_count': error_count,
-            'errors': errors
-        }), 200
+    chunks = export_chunks(
+        data_format, compress=compress, query=query,
+        batch_size=current_app.config.get('PRODUCT_EXPORT_BATCH_SIZE', DEFAULT_EXPORT_BATCH_SIZE)
+    )
 
+    filename = f"products-{datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{data_format}"
+    mimetype = 'text/csv' if data_format == 'csv' else 'application/x-ndjson'
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    })
+
+# POST /api/admin/products/bulk-upsert - Insert or update products by SKU from CSV or NDJSON
+@bp.route('/products/bulk-upsert', methods=['POST'])
+@jwt_required()
+@admin_required
+def bulk_upsert_products():
+    # A multipart file, or the raw request body (e.g. a supplier feed posted by a script)
+    if 'file' in request.files:
+        file = request.files['file']
+        stream, filename, mimetype = file.stream, file.filename or '', file.mimetype
+    else:
+        stream, filename, mimetype = request.stream, '', request.mimetype
+
+    stream = open_upload(stream, filename)
+    filename = filename.lower().removesuffix('.gz')
+
+    data_format = request.args.get('format', '').lower()
+    if not data_format:
+        if filename.endswith(('.ndjson', '.jsonl')) or mimetype in ('application/x-ndjson', 'application/jsonl'):
+            data_format = 'ndjson'
+        elif filename.endswith('.csv') or mimetype == 'text/csv':
+            data_format = 'csv'
+    if data_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+
+    rows = read_csv_rows(stream, required=('sku',)) if data_format == 'csv' else read_ndjson_rows(stream)
+    job = ProductUpsert(
+        created_by=int(get_jwt_identity()),
+        chunk_size=current_app.config.get('PRODUCT_IMPORT_CHUNK_SIZE', DEFAULT_IMPORT_CHUNK_SIZE),
+        max_errors=current_app.config.get('PRODUCT_IMPORT_MAX_ERRORS', DEFAULT_MAX_REPORTED_ERRORS)
+    )
+
+    try:
+        job.run(rows)
+    except RowError as e:
+        return jsonify({'error': str(e)}), 400
+    except (UnicodeDecodeError, csv.Error, OSError, EOFError) as e:
+        # Chunks before the unreadable part stay applied
+        db.session.rollback()
+        return jsonify({
+            'error': f'Failed to read {data_format.upper()} data: {str(e)}',
+            'inserted_count': job.stats['inserted'],
+            'updated_count': job.stats['updated'],
+            'unchanged_count': job.stats['unchanged'],
+            'error_count': job.stats['error_count'],
+            'errors': job.errors
+        }), 400
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': f'Failed to process CSV file: {str(e)}'}), 500
+        return jsonify({'error': f'Failed to apply product upsert: {str(e)}'}), 500
+
+    current_app.logger.info(f"Bulk upsert of {job.stats['processed']} rows: {job.stats['inserted']} inserted, "
+                            f"{job.stats['updated']} updated, {job.stats['unchanged']} unchanged "
+                            f"({job.stats['error_count']} errors)")
+
+    return jsonify({
+        'message': 'Bulk upsert completed',
+        'processed_count': job.stats['processed'],
+        'inserted_count': job.stats['inserted'],
+        'updated_count': job.stats['updated'],
+        'unchanged_count': job.stats['unchanged'],
+        'error_count': job.stats['error_count'],
+        'errors': job.errors
+    }), 200
+
+# GET /api/admin/import-jobs - List background product imports, newest first
+@bp.route('/import-jobs', methods=['GET'])
+@jwt_required()
+@admin_required
+def list_import_jobs():
+    status = request.args.get('status', '').strip()
+    query = ImportJob.query
+    if status:
+        if status not in IMPORT_STATES:
+            return jsonify({'error': f'Unknown status: {status}'}), 400
+        query = query.filter(ImportJob.status == status)
+
+    try:
+        pagination = paginate_query(query, [(ImportJob.created_at, True), (ImportJob.id, True)])
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'jobs': [job.to_dict() for job in pagination.items],
+        'pagination': pagination.to_dict()
+    }), 200
+
+# GET /api/admin/import-jobs/<id> - Progress of a background product import
+@bp.route('/import-jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_import_job(job_id):
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        return jsonify({'error': 'Import job not found'}), 404
+    return jsonify({'job': job.to_dict()}), 200
+
+# POST /api/admin/import-jobs/<id>/cancel - Cancel a queued or running import
+@bp.route('/import-jobs/<int:job_id>/cancel', methods=['POST'])
+@jwt_required()
+@admin_required
+def cancel_import_job(job_id):
+    job = cancel_import(job_id)
+    if not job:
+        return jsonify({'error': 'Import job not found'}), 404
+    if job.status in FINISHED_STATES and not job.cancel_requested:
+        return jsonify({'error': f'Import job already {job.status}', 'job': job.to_dict()}), 409
+    return jsonify({'message': 'Import job cancellation requested', 'job': job.to_dict()}), 200
 
 # POST /api/admin/coupons - Create new coupon
 @bp.route('/coupons', methods=['POST'])
@@ -475,19 +570,89 @@ def create_coupon():
 
     db.session.add(coupon)
     db.session.commit()
+    coupon_cache.invalidate(coupon.code)
 
     return jsonify({
         'message': 'Coupon created successfully',
         'coupon': coupon.to_dict()
     }), 201
 
+# POST /api/admin/coupons/<id>/generate-codes - Mint unique single-use codes from a template coupon
+@bp.route('/coupons/<int:coupon_id>/generate-codes', methods=['POST'])
+@jwt_required()
+@admin_required
+def generate_coupon_codes(coupon_id):
+    template = Coupon.query.get_or_404(coupon_id)
+    data = request.get_json() or {}
+
+    try:
+        count = int(data.get('count', 0))
+        length = int(data.get('length', DEFAULT_CODE_LENGTH))
+        max_uses = int(data.get('max_uses', 1))
+        chunk_size = int(data.get('chunk_size', DEFAULT_CHUNK_SIZE))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'count, length, max_uses and chunk_size must be integers'}), 400
+
+    data_format = request.args.get('format', 'csv').lower()
+    if data_format not in ('csv', 'json'):
+        return jsonify({'error': 'Format must be csv or json'}), 400
+
+    max_codes = current_app.config.get('COUPON_BULK_MAX_CODES', 1000000)
+    if count > max_codes:
+        return jsonify({'error': f'At most {max_codes} codes can be generated at once'}), 400
+    if max_uses <= 0:
+        return jsonify({'error': 'Max uses must be greater than 0'}), 400
+
+    try:
+        generator = CodeGenerator(
+            alphabet=data.get('alphabet', DEFAULT_CODE_ALPHABET),
+            length=length,
+            prefix=data.get('prefix', ''),
+            validator=is_valid_coupon_code
+        )
+        job = BulkCodeJob(template, count, generator, created_by=int(get_jwt_identity()),
+                          max_uses=max_uses, chunk_size=chunk_size)
+    except CodeGenerationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def log_summary():
+        current_app.logger.info(f"Generated {job.stats['generated']} codes from coupon {coupon_id} "
+                                f"in {job.stats['elapsed_seconds']}s ({job.stats['codes_per_second']} codes/sec)")
+
+    def stream_csv():
+        yield 'code\r\n'
+        for codes in job.run():
+            yield ''.join(f'{code}\r\n' for code in codes)
+        log_summary()
+
+    def stream_json():
+        # The codes are streamed first; the throughput is only known once they are all inserted
+        yield '{"codes": ['
+        separator = ''
+        for codes in job.run():
+            if codes:
+                yield separator + ', '.join(json.dumps(code) for code in codes)
+                separator = ', '
+        log_summary()
+        yield '], ' + json.dumps({
+            'generated': job.stats['generated'],
+            'elapsed_seconds': job.stats['elapsed_seconds'],
+            'codes_per_second': job.stats['codes_per_second']
+        })[1:]
+
+    if data_format == 'json':
+        return Response(stream_with_context(stream_json()), mimetype='application/json')
+
+    filename = f"{generator.prefix or template.code}-codes.csv"
+    return Response(stream_with_context(stream_csv()), mimetype='text/csv', headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    })
+
 # GET /api/admin/coupons - List all coupons with pagination
 @bp.route('/coupons', methods=['GET'])
 @jwt_required()
 @admin_required
 def list_coupons():
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
     status = request.args.get('status', 'all')  # all, active, inactive
     search = request.args.get('search', '').strip()
 
@@ -499,18 +664,17 @@ def list_coupons():
         # Active: is_active=True AND current date is between start and end dates
         query = query.filter(
             Coupon.is_active == True,
-            Coupon.start_date <= now,
-            Coupon.end_date >= now
+            lifecycle_state_filter((COUPON_ACTIVE, COUPON_EXHAUSTED), now)
         )
     elif status == 'inactive':
         # Inactive: is_active=False
         query = query.filter(Coupon.is_active == False)
     elif status == 'expired':
         # Expired: end_date has passed
-        query = query.filter(Coupon.end_date < now)
+        query = query.filter(lifecycle_state_filter((COUPON_EXPIRED,), now))
     elif status == 'pending':
         # Pending: start_date is in the future
-        query = query.filter(Coupon.start_date > now)
+        query = query.filter(lifecycle_state_filter((COUPON_SCHEDULED,), now))
 
     # Search functionality
     if search:
@@ -523,13 +687,11 @@ def list_coupons():
             )
         )
 
-    # Order by creation date
-    query = query.order_by(Coupon.created_at.desc())
-
-    # Pagination
-    pagination = query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Newest first, by page number or after a cursor
+    try:
+        pagination = paginate_query(query, [(Coupon.created_at, True), (Coupon.id, True)])
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
 
     coupons = []
     for coupon in pagination.items:
@@ -546,6 +708,7 @@ def list_coupons():
             'start_date': coupon.start_date.strftime('%Y-%m-%d'),
             'end_date': coupon.end_date.strftime('%Y-%m-%d'),
             'is_active': coupon.is_active,
+            'lifecycle_state': coupon.lifecycle_state,
             'created_at': coupon.created_at.isoformat(),
             # Enhanced fields for product integration
             'minimum_order_value': float(coupon.minimum_order_value) if coupon.minimum_order_value else 0,
@@ -556,14 +719,7 @@ def list_coupons():
 
     return jsonify({
         'coupons': coupons,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
-        }
+        'pagination': pagination.to_dict()
     }), 200
 
 # GET /api/admin/coupons/<id> - Get specific coupon details
@@ -662,6 +818,7 @@ def update_coupon(coupon_id):
 
     coupon.updated_at = datetime.datetime.utcnow()
     db.session.commit()
+    coupon_cache.invalidate(coupon.code)
 
     return jsonify({
         'message': 'Coupon updated successfully',
@@ -698,8 +855,10 @@ def delete_coupon(coupon_id):
     if coupon.current_uses > 0:
         return jsonify({'error': 'Cannot delete coupon that has been used'}), 400
 
+    code = coupon.code
     db.session.delete(coupon)
     db.session.commit()
+    coupon_cache.invalidate(code)
 
     return jsonify({'message': 'Coupon deleted successfully'}), 200
 
@@ -709,8 +868,6 @@ def delete_coupon(coupon_id):
 @admin_required
 def get_coupon_redemptions(coupon_id):
     coupon = Coupon.query.get_or_404(coupon_id)
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
 
     query = db.session.query(Redemption, User, Order).join(
         User, Redemption.user_id == User.id
@@ -718,12 +875,14 @@ def get_coupon_redemptions(coupon_id):
         Order, Redemption.order_id == Order.id
     ).filter(
         Redemption.coupon_id == coupon_id
-    ).order_by(Redemption.redeemed_at.desc())
-
-    pagination = query.paginate(
-        page=page, per_page=per_page, error_out=False
     )
 
+    # Newest first, by page number or after a cursor
+    try:
+        pagination = paginate_query(query, [(Redemption.redeemed_at, True), (Redemption.id, True)])
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+
     redemptions = []
     for redemption, user, order in pagination.items:
         redemption_data = {
@@ -765,14 +924,7 @@ def get_coupon_redemptions(coupon_id):
             'max_uses': coupon.max_uses
         },
         'redemptions': redemptions,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
-        }
+        'pagination': pagination.to_dict()
     }), 200
 
 # GET /api/admin/dashboard - Dashboard stats
@@ -787,15 +939,15 @@ def admin_dashboard():
     total_coupons = Coupon.query.count()
 
     # Active vs inactive coupons (excluding expired ones)
-    current_time = datetime.datetime.utcnow()
+    now = datetime.datetime.utcnow()
     active_coupons = Coupon.query.filter(
         Coupon.is_active == True,
-        Coupon.end_date > current_time
+        lifecycle_state_filter(LIVE_STATES, now)
     ).count()
     inactive_coupons = Coupon.query.filter(
         db.or_(
             Coupon.is_active == False,
-            Coupon.end_date <= current_time
+            lifecycle_state_filter((COUPON_EXPIRED,), now)
         )
     ).count()
 
@@ -872,7 +1024,7 @@ def admin_dashboard():
 
     # Expired coupons
     expired_coupons = Coupon.query.filter(
-        Coupon.end_date < datetime.datetime.utcnow()
+        lifecycle_state_filter((COUPON_EXPIRED,), now)
     ).count()
 
     # Top selling products
@@ -923,8 +1075,6 @@ def admin_dashboard():
 @jwt_required()
 @admin_required
 def list_users():
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
     search = request.args.get('search', '').strip()
 
     query = User.query
@@ -940,13 +1090,11 @@ def list_users():
             )
         )
 
-    # Order by creation date
-    query = query.order_by(User.created_at.desc())
-
-    # Pagination
-    pagination = query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Newest first, by page number or after a cursor
+    try:
+        pagination = paginate_query(query, [(User.created_at, True), (User.id, True)])
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
 
     users = []
     for user in pagination.items:
@@ -965,14 +1113,7 @@ def list_users():
 
     return jsonify({
         'users': users,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
-        }
+        'pagination': pagination.to_dict()
     }), 200
 
 # GET /api/admin/users/<id> - Get specific user details
@@ -1284,42 +1425,34 @@ def upload_image():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
 
-    # Check if file is an image
-    allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    if not ('.' in file.filename and
-            file.filename.rsplit('.', 1)[1].lower() in allowed_extensions):
-        return jsonify({'error': 'Invalid file type. Only images are allowed.'}), 400
+    # Optionally record the image on a product right away
+    product = None
+    if request.form.get('product_id'):
+        try:
+            product = Product.query.get(int(request.form['product_id']))
+        except ValueError:
+            return jsonify({'error': 'Invalid product_id'}), 400
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
 
     try:
-        # Get filename from request or generate one
-        filename = request.form.get('filename', file.filename)
-
-        # Ensure filename is safe
-        import os
-        from werkzeug.utils import secure_filename
-        filename = secure_filename(filename)
-
-        # Create uploads directory if it doesn't exist
-        project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-        upload_dir = os.path.join(project_root, 'frontend', 'public', 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-
-        # Save file
-        file_path = os.path.join(upload_dir, filename)
-        file.save(file_path)
-
-        # Return the URL path to the uploaded image
-        image_url = f'/uploads/{filename}'
-
-        return jsonify({
-            'message': 'Image uploaded successfully',
-            'imageUrl': image_url,
-            'filename': filename
-        }), 200
-
+        # Stored by content hash; the variants are generated in the background
+        # and the product gets the image once they are written
+        stored = image_pipeline.store(file.stream, product_id=product.id if product else None)
+    except InvalidImageError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Failed to upload image: {str(e)}'}), 500
 
+    return jsonify({
+        'message': 'Image uploaded successfully',
+        'imageUrl': stored.image_url,
+        'filename': f'{stored.digest}.{stored.ext}',
+        'variants': image_variant_urls(stored.image_url),
+        'image': stored.to_dict()
+    }), 200
+
 # PUT /api/admin/profile - Update admin profile
 @bp.route('/profile', methods=['PUT'])
 @jwt_required()
@@ -1387,3 +1520,67 @@ def update_admin_password():
 
     except Exception as e:
         return jsonify({'error': f'Failed to update password: {str(e)}'}), 500
+
+# GET /api/admin/cart-store/stats - Cart store occupancy and eviction counters
+@bp.route('/cart-store/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_cart_store_stats():
+    return jsonify({
+        'backend': current_app.config.get('CART_STORE', 'memory'),
+        'stats': cart_storage.stats()
+    }), 200
+
+# GET /api/admin/coupon-cache/stats - Coupon lookup cache hit/miss counters
+@bp.route('/coupon-cache/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_coupon_cache_stats():
+    return jsonify({'stats': coupon_cache.stats()}), 200
+
+# GET /api/admin/product-cache/stats - Catalog read cache hit rate and version
+@bp.route('/product-cache/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_product_cache_stats():
+    return jsonify({'stats': product_cache.stats()}), 200
+
+# GET /api/admin/image-pipeline/stats - Image upload dedupe and processing counters
+@bp.route('/image-pipeline/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_image_pipeline_stats():
+    return jsonify({'stats': image_pipeline.stats()}), 200
+
+# GET /api/admin/coupon-lifecycle/stats - Lifecycle scheduler queue and transition counters
+@bp.route('/coupon-lifecycle/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_coupon_lifecycle_stats():
+    return jsonify({'stats': coupon_lifecycle.stats()}), 200
+
+# POST /api/admin/coupon-reservations/sweep - Release expired coupon reservations now
+@bp.route('/coupon-reservations/sweep', methods=['POST'])
+@jwt_required()
+@admin_required
+def sweep_coupon_reservations():
+    try:
+        swept = sweep_expired_reservations()
+        return jsonify({'message': f'Released {swept} expired reservations', 'released': swept}), 200
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error sweeping coupon reservations: {str(e)}')
+        return jsonify({'error': 'Failed to sweep coupon reservations'}), 500
+
+# POST /api/admin/inventory-holds/sweep - Release expired cart inventory holds now
+@bp.route('/inventory-holds/sweep', methods=['POST'])
+@jwt_required()
+@admin_required
+def sweep_inventory_holds():
+    try:
+        swept = sweep_expired_holds()
+        return jsonify({'message': f'Released {swept} expired inventory holds', 'released': swept}), 200
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error sweeping inventory holds: {str(e)}')
+        return jsonify({'error': 'Failed to sweep inventory holds'}), 500
@@ -2,50 +2,68 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models import Product, User, Order, OrderItem, Coupon, Redemption
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils.cart_store import cart_storage, empty_cart, CartConflictError
+from app.utils.inventory import InsufficientStockError
+from app.utils.inventory_holds import hold_stock, release_hold, convert_holds, available_quantities
+from app.utils.coupon_reservations import reserve_coupon_use, release_reservation, redeem_reservation
+from app.utils.coupon_cache import coupon_cache
+from app.utils.coupon_finder import find_best_coupons
+from app.utils.redeemed_coupons import get_redeemed_coupon_ids, record_redemption
+from app.utils.coupon_rules import get_user_facts, get_cart_categories, UserFacts, CART_RULES
+from contextlib import contextmanager
 import datetime
 import json
 
 bp = Blueprint('cart', __name__, url_prefix='/api/cart')
 
-# In-memory cart storage (in production, use Redis or database)
-# This is a simple implementation for demo purposes
-user_carts = {}
+# Carts live in the configured cart store (see app/utils/cart_store.py) so that
+# every worker sees the same cart. Routes that modify a cart do so inside
+# cart_storage.transaction(), which writes the cart back when the block exits.
 
 def get_user_cart(user_id):
-    """Get or create user cart"""
-    if user_id not in user_carts:
-        user_carts[user_id] = {
-            'items': [],
-            'applied_coupon': None,
-            'subtotal': 0,
-            'discount_amount': 0,
-            'final_total': 0
-        }
-    return user_carts[user_id]
-
-def calculate_cart_totals(cart):
-    """Calculate cart totals"""
+    """Get user cart (an empty cart if the user has none yet)"""
+    return cart_storage.load(user_id)
+
+@bp.errorhandler(CartConflictError)
+def handle_cart_conflict(e):
+    return jsonify({'error': 'Your cart was updated by another request. Please try again.'}), 409
+
+@contextmanager
+def holds_restored_on_conflict(user_id, product_ids):
+    """Put the holds on `product_ids` back to the stored cart's quantities
+    if the cart write fails; hold_stock() commits before the cart is written.
+    `product_ids` may be filled in while the block runs."""
+    try:
+        yield
+    except CartConflictError:
+        db.session.rollback()
+        quantities = {item['product_id']: item['quantity'] for item in get_user_cart(user_id)['items']}
+        for product_id in product_ids:
+            if quantities.get(product_id):
+                hold_stock(product_id, user_id, quantities[product_id])
+            else:
+                release_hold(product_id, user_id)
+        raise
+
+def calculate_cart_totals(cart, user_id):
+    """Calculate cart totals, dropping a coupon that no longer applies"""
     subtotal = sum(item['line_total'] for item in cart['items'])
     cart['subtotal'] = subtotal
 
     # Preserve existing discount if coupon is applied
     if cart.get('applied_coupon'):
         # Recalculate discount based on new subtotal
-        coupon = Coupon.query.filter_by(code=cart['applied_coupon']['code']).first()
-        if coupon and coupon.is_active:
-            discount_amount = 0
-            if coupon.discount_type == 'percentage':
-                discount_amount = (subtotal * coupon.discount_value) / 100
-                # Apply maximum discount cap if set
-                if coupon.maximum_discount_amount:
-                    discount_amount = min(discount_amount, float(coupon.maximum_discount_amount))
-            elif coupon.discount_type == 'fixed':
-                discount_amount = min(coupon.discount_value, subtotal)
-
-            cart['discount_amount'] = round(discount_amount, 2)
-            cart['applied_coupon']['discount_amount'] = round(discount_amount, 2)
+        rules = coupon_cache.get(cart['applied_coupon']['code'])
+        if rules and rules.evaluate(subtotal, rules=('active',)).ok:
+            discount_amount = rules.discount_for(subtotal)
+            cart['discount_amount'] = discount_amount
+            cart['applied_coupon']['discount_amount'] = discount_amount
         else:
-            # Coupon is no longer valid, remove it
+            # Coupon is no longer valid: give the held use back and remove it
+            coupon_id = rules.id if rules else db.session.query(Coupon.id).filter(
+                Coupon.code == cart['applied_coupon']['code']).scalar()
+            if coupon_id is not None:
+                release_reservation(coupon_id, user_id)
             cart['applied_coupon'] = None
             cart['discount_amount'] = 0
     else:
@@ -75,44 +93,45 @@ def add_to_cart():
     if not product or not product.is_active:
         return jsonify({'error': 'Product not found or inactive'}), 404
 
-    if product.stock_quantity < quantity:
-        return jsonify({'error': f'Insufficient stock. Available: {product.stock_quantity}'}), 400
-
     # Get user cart
-    cart = get_user_cart(user_id)
-
-    # Check if product already in cart
-    existing_item = None
-    for item in cart['items']:
-        if item['product_id'] == product_id:
-            existing_item = item
-            break
-
-    if existing_item:
-        # Update quantity
-        new_quantity = existing_item['quantity'] + quantity
-        if product.stock_quantity < new_quantity:
-            return jsonify({'error': f'Insufficient stock. Available: {product.stock_quantity}'}), 400
-
-        existing_item['quantity'] = new_quantity
-        existing_item['line_total'] = float(product.price) * new_quantity
-    else:
-        # Add new item
-        cart['items'].append({
-            'product_id': product_id,
-            'product_name': product.name,
-            'product_price': float(product.price),
-            'quantity': quantity,
-            'line_total': float(product.price) * quantity
-        })
-
-    # Recalculate totals
-    cart = calculate_cart_totals(cart)
+    with holds_restored_on_conflict(user_id, [product.id]), cart_storage.transaction(user_id) as cart:
+        # Check if product already in cart
+        existing_item = None
+        for item in cart['items']:
+            if item['product_id'] == product_id:
+                existing_item = item
+                break
+        new_quantity = (existing_item['quantity'] if existing_item else 0) + quantity
+
+        # Hold the units until checkout so other carts cannot take them
+        reserved_until = hold_stock(product.id, user_id, new_quantity)
+        if not reserved_until:
+            available = available_quantities([product.id], user_id=user_id).get(product.id, 0)
+            return jsonify({'error': f'Insufficient stock. Available: {available}'}), 400
+
+        if existing_item:
+            # Update quantity
+            existing_item['quantity'] = new_quantity
+            existing_item['line_total'] = float(product.price) * new_quantity
+            existing_item['reserved_until'] = reserved_until.isoformat()
+        else:
+            # Add new item
+            cart['items'].append({
+                'product_id': product_id,
+                'product_name': product.name,
+                'product_price': float(product.price),
+                'quantity': quantity,
+                'line_total': float(product.price) * quantity,
+                'reserved_until': reserved_until.isoformat()
+            })
+
+        # Recalculate totals
+        cart = calculate_cart_totals(cart, user_id)
 
-    return jsonify({
-        'message': 'Product added to cart',
-        'cart': cart
-    }), 200
+        return jsonify({
+            'message': 'Product added to cart',
+            'cart': cart
+        }), 200
 
 # GET /api/cart - Get current cart
 @bp.route('', methods=['GET'])
@@ -139,66 +158,71 @@ def update_cart():
     if not updates:
         return jsonify({'error': 'No updates provided'}), 400
 
-    cart = get_user_cart(user_id)
-
-    for update in updates:
-        try:
-            product_id = int(update.get('product_id'))
-            quantity = int(update.get('quantity', 0))
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid product_id or quantity format'}), 400
-
-        print(f"Processing update: product_id={product_id}, quantity={quantity}")  # Debug log
-
-        if quantity <= 0:
-            # Remove item
-            cart['items'] = [item for item in cart['items'] if item['product_id'] != product_id]
-        else:
-            # Update quantity
-            item_found = False
-            for item in cart['items']:
-                if item['product_id'] == product_id:
-                    item_found = True
-                    # Check stock
-                    product = Product.query.get(product_id)
-                    if not product or not product.is_active:
-                        return jsonify({'error': f'Product {product_id} not found'}), 404
-
-                    if product.stock_quantity < quantity:
-                        return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
-
-                    item['quantity'] = quantity
-                    item['line_total'] = float(product.price) * quantity
-                    break
-
-            if not item_found:
-                return jsonify({'error': f'Product {product_id} not found in cart'}), 404
+    touched = []
+    with holds_restored_on_conflict(user_id, touched), cart_storage.transaction(user_id) as cart:
+        for update in updates:
+            try:
+                product_id = int(update.get('product_id'))
+                quantity = int(update.get('quantity', 0))
+            except (ValueError, TypeError):
+                return jsonify({'error': 'Invalid product_id or quantity format'}), 400
+            touched.append(product_id)
+
+            print(f"Processing update: product_id={product_id}, quantity={quantity}")  # Debug log
+
+            if quantity <= 0:
+                # Remove item and give its held units back
+                cart['items'] = [item for item in cart['items'] if item['product_id'] != product_id]
+                release_hold(product_id, user_id)
+            else:
+                # Update quantity
+                item_found = False
+                for item in cart['items']:
+                    if item['product_id'] == product_id:
+                        item_found = True
+                        # Check stock
+                        product = Product.query.get(product_id)
+                        if not product or not product.is_active:
+                            return jsonify({'error': f'Product {product_id} not found'}), 404
+
+                        # Move the hold to the new quantity
+                        reserved_until = hold_stock(product_id, user_id, quantity)
+                        if not reserved_until:
+                            return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
+
+                        item['quantity'] = quantity
+                        item['line_total'] = float(product.price) * quantity
+                        item['reserved_until'] = reserved_until.isoformat()
+                        break
+
+                if not item_found:
+                    return jsonify({'error': f'Product {product_id} not found in cart'}), 404
+
+        # Recalculate totals
+        cart = calculate_cart_totals(cart, user_id)
 
-    # Recalculate totals
-    cart = calculate_cart_totals(cart)
-
-    return jsonify({
-        'message': 'Cart updated',
-        'cart': cart
-    }), 200
+        return jsonify({
+            'message': 'Cart updated',
+            'cart': cart
+        }), 200
 
 # DELETE /api/cart/remove/<product_id> - Remove from cart
 @bp.route('/remove/<int:product_id>', methods=['DELETE'])
 @jwt_required()
 def remove_from_cart(product_id):
     user_id = get_jwt_identity()
-    cart = get_user_cart(user_id)
-
-    # Remove item
-    cart['items'] = [item for item in cart['items'] if item['product_id'] != product_id]
+    with holds_restored_on_conflict(user_id, [product_id]), cart_storage.transaction(user_id) as cart:
+        # Remove item and give its held units back
+        cart['items'] = [item for item in cart['items'] if item['product_id'] != product_id]
+        release_hold(product_id, user_id)
 
-    # Recalculate totals
-    cart = calculate_cart_totals(cart)
+        # Recalculate totals
+        cart = calculate_cart_totals(cart, user_id)
 
-    return jsonify({
-        'message': 'Product removed from cart',
-        'cart': cart
-    }), 200
+        return jsonify({
+            'message': 'Product removed from cart',
+            'cart': cart
+        }), 200
 
 # POST /api/cart/apply-coupon - Apply coupon to cart
 @bp.route('/apply-coupon', methods=['POST'])
@@ -212,97 +236,124 @@ def apply_coupon():
     if not coupon_code:
         return jsonify({'error': 'Coupon code is required'}), 400
 
-    cart = get_user_cart(user_id)
+    with cart_storage.transaction(user_id) as cart:
+        if not cart['items']:
+            return jsonify({'error': 'Cart is empty'}), 400
 
-    if not cart['items']:
-        return jsonify({'error': 'Cart is empty'}), 400
-
-    # Check if coupon is already applied
-    if cart.get('applied_coupon') and cart['applied_coupon']['code'] == coupon_code.upper():
-        return jsonify({'error': 'This coupon is already applied to your cart'}), 400
-
-    # Find coupon
-    coupon = Coupon.query.filter_by(code=coupon_code.upper()).first()
-    if not coupon:
-        return jsonify({'error': 'Invalid coupon code'}), 404
-
-    if not coupon.is_active:
-        return jsonify({'error': 'Coupon is inactive'}), 400
-
-    # Check date validity
-    now = datetime.datetime.utcnow()
-    if coupon.start_date and coupon.start_date > now:
-        return jsonify({'error': 'Coupon has not started yet'}), 400
-    if coupon.end_date and coupon.end_date < now:
-        return jsonify({'error': 'Coupon has expired'}), 400
-
-    # Check usage limits
-    if coupon.current_uses >= coupon.max_uses:
-        return jsonify({'error': 'Coupon usage limit reached'}), 400
-
-    # Check if user has already redeemed this coupon
-    existing_redemption = Redemption.query.filter_by(
-        user_id=int(user_id),
-        coupon_id=coupon.id
-    ).first()
-
-    if existing_redemption:
-        return jsonify({'error': 'You have already redeemed this coupon'}), 400
-
-    # Check if coupon is for first-time users only
-    if coupon.first_time_user_only:
-        # Check if user has any previous redemptions
-        user_redemptions = Redemption.query.filter_by(user_id=int(user_id)).count()
-        if user_redemptions > 0:
-            return jsonify({'error': 'This coupon is only for first-time users'}), 400
-
-    # Check minimum order value
-    if coupon.minimum_order_value and cart['subtotal'] < float(coupon.minimum_order_value):
-        return jsonify({
-            'error': f'Minimum order value of ${coupon.minimum_order_value} required',
-            'current_total': cart['subtotal'],
-            'minimum_required': float(coupon.minimum_order_value)
-        }), 400
-
-    # Check applicable categories
-    if coupon.get_applicable_categories():
-        cart_categories = set()
-        for item in cart['items']:
-            product = Product.query.get(item['product_id'])
-            if product:
-                cart_categories.add(product.category)
+        # Check if coupon is already applied
+        if cart.get('applied_coupon') and cart['applied_coupon']['code'] == coupon_code.upper():
+            return jsonify({'error': 'This coupon is already applied to your cart'}), 400
 
-        applicable_categories = set(coupon.get_applicable_categories())
+        # Find coupon
+        rules = coupon_cache.get(coupon_code)
+        if not rules:
+            return jsonify({'error': 'Invalid coupon code'}), 404
 
-        if not cart_categories.intersection(applicable_categories):
+        # Evaluate every rule against the cart in memory; the only lookups
+        # are the user's redemption facts and, for category-restricted
+        # coupons, the categories of the cart's products. Usage is checked
+        # by the reservation below
+        cart_categories = ()
+        if rules.category_set:
+            cart_categories = get_cart_categories([item['product_id'] for item in cart['items']])
+
+        evaluation = rules.evaluate(
+            subtotal=cart['subtotal'],
+            categories=cart_categories,
+            facts=get_user_facts(user_id),
+            rules=tuple(rule for rule in CART_RULES if rule != 'usage')
+        )
+        failure = evaluation.first_failure
+        if failure and failure.rule == 'minimum_order':
             return jsonify({
-                'error': f'Coupon only applies to categories: {", ".join(applicable_categories)}'
+                'error': failure.message,
+                'current_total': cart['subtotal'],
+                'minimum_required': rules.minimum_order_value
             }), 400
+        if failure:
+            return jsonify({'error': failure.message}), 400
+
+        discount_amount = evaluation.discount_amount
+
+        # Hold a use until checkout so the coupon cannot run out in between
+        reserved_until = reserve_coupon_use(rules.id, user_id)
+        if not reserved_until:
+            return jsonify({'error': 'Coupon usage limit reached'}), 400
+
+        # Give back the hold of the coupon this one replaces
+        if cart.get('applied_coupon'):
+            previous = coupon_cache.get(cart['applied_coupon']['code'])
+            if previous and previous.id != rules.id:
+                release_reservation(previous.id, user_id)
+
+        # Apply discount
+        cart['applied_coupon'] = {
+            'code': rules.code,
+            'title': rules.title,
+            'discount_type': rules.discount_type,
+            'discount_value': rules.discount_value,
+            'discount_amount': discount_amount,
+            'reserved_until': reserved_until.isoformat()
+        }
+        cart['discount_amount'] = discount_amount
+        cart['final_total'] = cart['subtotal'] - cart['discount_amount']
+
+        return jsonify({
+            'message': 'Coupon applied successfully',
+            'cart': cart
+        }), 200
+
+# GET/POST /api/cart/best-coupons - Rank the coupons the user can apply to a cart
+@bp.route('/best-coupons', methods=['GET', 'POST'])
+@jwt_required()
+def best_coupons():
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    limit = min(max(request.args.get('limit', data.get('limit', 10), type=int) or 10, 1), 50)
+    cart_items = data.get('cart_items')
+
+    if cart_items:
+        # Cart sent by the client: price it with one query
+        try:
+            quantities = {}
+            for item in cart_items:
+                product_id = int(item.get('product_id'))
+                quantities[product_id] = quantities.get(product_id, 0) + int(item.get('quantity', 1))
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid product_id or quantity format'}), 400
 
-    # Calculate discount
-    discount_amount = 0
-    if coupon.discount_type == 'percentage':
-        discount_amount = (cart['subtotal'] * coupon.discount_value) / 100
-        # Apply maximum discount cap if set
-        if coupon.maximum_discount_amount:
-            discount_amount = min(discount_amount, float(coupon.maximum_discount_amount))
-    elif coupon.discount_type == 'fixed':
-        discount_amount = min(coupon.discount_value, cart['subtotal'])
-
-    # Apply discount
-    cart['applied_coupon'] = {
-        'code': coupon.code,
-        'title': coupon.title,
-        'discount_type': coupon.discount_type,
-        'discount_value': coupon.discount_value,
-        'discount_amount': round(discount_amount, 2)
-    }
-    cart['discount_amount'] = round(discount_amount, 2)
-    cart['final_total'] = cart['subtotal'] - cart['discount_amount']
+        products = Product.query.filter(Product.id.in_(quantities.keys()), Product.is_active == True).all()
+        if len(products) != len(quantities):
+            return jsonify({'error': 'Some products were not found or are inactive'}), 404
+        subtotal = sum(float(product.price) * quantities[product.id] for product in products)
+        categories = frozenset(product.category for product in products)
+    else:
+        # Otherwise use the server-side cart
+        cart = get_user_cart(user_id)
+        if not cart['items']:
+            return jsonify({'error': 'Cart is empty'}), 400
+        subtotal = cart['subtotal']
+        categories = get_cart_categories([item['product_id'] for item in cart['items']])
+
+    ranked = find_best_coupons(subtotal, categories=categories, facts=get_user_facts(user_id), limit=limit)
+
+    coupons = [{
+        'code': rules.code,
+        'title': rules.title,
+        'description': rules.description,
+        'discount_type': rules.discount_type,
+        'discount_value': rules.discount_value,
+        'maximum_discount_amount': rules.maximum_discount_amount,
+        'minimum_order_value': rules.minimum_order_value,
+        'end_date': rules.end_date.isoformat() if rules.end_date else None,
+        'discount_amount': discount_amount,
+        'final_total': round(subtotal - discount_amount, 2)
+    } for rules, discount_amount in ranked]
 
     return jsonify({
-        'message': 'Coupon applied successfully',
-        'cart': cart
+        'subtotal': subtotal,
+        'best_coupon': coupons[0] if coupons else None,
+        'coupons': coupons
     }), 200
 
 # POST /api/cart/remove-coupon - Remove applied coupon
@@ -310,20 +361,24 @@ def apply_coupon():
 @jwt_required()
 def remove_coupon():
     user_id = get_jwt_identity()
-    cart = get_user_cart(user_id)
+    with cart_storage.transaction(user_id) as cart:
+        if not cart.get('applied_coupon'):
+            return jsonify({'error': 'No coupon applied to remove'}), 400
 
-    if not cart.get('applied_coupon'):
-        return jsonify({'error': 'No coupon applied to remove'}), 400
+        # Give the held use back
+        rules = coupon_cache.get(cart['applied_coupon']['code'])
+        if rules:
+            release_reservation(rules.id, user_id)
 
-    # Remove coupon
-    cart['applied_coupon'] = None
-    cart['discount_amount'] = 0
-    cart['final_total'] = cart['subtotal']
+        # Remove coupon
+        cart['applied_coupon'] = None
+        cart['discount_amount'] = 0
+        cart['final_total'] = cart['subtotal']
 
-    return jsonify({
-        'message': 'Coupon removed successfully',
-        'cart': cart
-    }), 200
+        return jsonify({
+            'message': 'Coupon removed successfully',
+            'cart': cart
+        }), 200
 
 # POST /api/cart/checkout - Complete order with coupon
 @bp.route('/checkout', methods=['POST'])
@@ -341,112 +396,152 @@ def checkout():
     elif not shipping_address:
         shipping_address = "Default Address"
 
-    cart = get_user_cart(user_id)
-
-    if not cart['items']:
-        return jsonify({'error': 'Cart is empty'}), 400
-
-    # Validate stock again
-    for item in cart['items']:
-        product = Product.query.get(item['product_id'])
-        if not product or not product.is_active:
-            return jsonify({'error': f'Product {item["product_id"]} not found'}), 404
+    with cart_storage.transaction(user_id) as cart:
+        if not cart['items']:
+            return jsonify({'error': 'Cart is empty'}), 400
 
-        if product.stock_quantity < item['quantity']:
-            return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
+        now = datetime.datetime.utcnow()
+        product_ids = sorted({item['product_id'] for item in cart['items']})
+        coupon_code = cart['applied_coupon']['code'] if cart['applied_coupon'] else None
 
-    # Validate coupon if applied
-    coupon = None
-    if cart['applied_coupon']:
-        coupon = Coupon.query.filter_by(code=cart['applied_coupon']['code']).first()
-        if not coupon or not coupon.is_active:
-            return jsonify({'error': 'Applied coupon is no longer valid'}), 400
-
-        # Check if user already redeemed this coupon
-        existing_redemption = Redemption.query.filter_by(
-            user_id=int(user_id),
-            coupon_id=coupon.id
-        ).first()
-
-        if existing_redemption:
-            return jsonify({'error': 'You have already redeemed this coupon'}), 400
-
-    try:
-        # Create order
-        order = Order(
-            user_id=int(user_id),
-            subtotal=cart['subtotal'],
-            discount_amount=cart['discount_amount'],
-            final_total=cart['final_total'],
-            coupon_code_used=cart['applied_coupon']['code'] if cart['applied_coupon'] else None,
-            coupon_id=coupon.id if coupon else None,
-            order_status='completed',
-            shipping_address=shipping_address,
-            payment_method=payment_method,
-            created_at=datetime.datetime.utcnow(),
-            updated_at=datetime.datetime.utcnow()
-        )
-
-        db.session.add(order)
-        db.session.flush()  # Get order ID
-
-        # Create order items
-        for item in cart['items']:
-            product = Product.query.get(item['product_id'])
-
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item['product_id'],
-                quantity=item['quantity'],
-                unit_price=item['product_price'],
-                line_total=item['line_total']
-            )
-
-            db.session.add(order_item)
-
-            # Update product stock
-            product.stock_quantity -= item['quantity']
-            product.updated_at = datetime.datetime.utcnow()
-
-        # Create redemption record if coupon was used
-        if coupon:
-            # Convert product IDs to JSON string for storage
-            products_applied_to = json.dumps([item['product_id'] for item in cart['items']])
+        try:
+            # Load every product of the cart in a single query
+            products = {
+                product.id: product
+                for product in Product.query.filter(Product.id.in_(product_ids)).all()
+            }
 
-            redemption = Redemption(
+            for item in cart['items']:
+                product = products.get(item['product_id'])
+                if not product or not product.is_active:
+                    db.session.rollback()
+                    return jsonify({'error': f'Product {item["product_id"]} not found'}), 404
+
+            product_names = {product_id: product.name for product_id, product in products.items()}
+
+            # Validate coupon if applied; usage is checked by the redemption below
+            coupon = None
+            if coupon_code:
+                rules = coupon_cache.get(coupon_code)
+                if not rules:
+                    db.session.rollback()
+                    return jsonify({'error': 'Applied coupon is no longer valid'}), 400
+
+                facts = UserFacts(redeemed_coupon_ids=get_redeemed_coupon_ids(user_id))
+                failure = rules.evaluate(cart['subtotal'], facts=facts, now=now,
+                                         rules=('active', 'not_redeemed')).first_failure
+                if failure:
+                    db.session.rollback()
+                    if failure.rule == 'active':
+                        return jsonify({'error': 'Applied coupon is no longer valid'}), 400
+                    return jsonify({'error': failure.message}), 400
+
+                coupon = rules
+
+            # Turn the cart's inventory holds into stock decrements; stock is
+            # checked by guarded UPDATEs in the database, so concurrent
+            # checkouts cannot oversell or take units held by other carts
+            convert_holds(user_id, [(item['product_id'], item['quantity']) for item in cart['items']], now=now)
+
+            # Turn the use held since apply-coupon into a redemption; without
+            # a live hold (e.g. it expired) claim a free use with a
+            # conditional increment so concurrent checkouts cannot exceed max_uses
+            if coupon and not redeem_reservation(coupon.id, user_id, now=now):
+                db.session.rollback()
+                return jsonify({'error': 'Coupon usage limit reached'}), 400
+
+            # Create order
+            order = Order(
                 user_id=int(user_id),
-                coupon_id=coupon.id,
-                order_id=order.id,
-                redeemed_at=datetime.datetime.utcnow(),
-                discount_applied=cart['discount_amount'],
-                original_amount=cart['subtotal'],
+                subtotal=cart['subtotal'],
                 discount_amount=cart['discount_amount'],
-                final_amount=cart['final_total'],
-                products_applied_to=products_applied_to
+                final_total=cart['final_total'],
+                coupon_code_used=coupon_code,
+                coupon_id=coupon.id if coupon else None,
+                order_status='completed',
+                shipping_address=shipping_address,
+                payment_method=payment_method,
+                created_at=now,
+                updated_at=now
             )
 
-            db.session.add(redemption)
+            db.session.add(order)
+            db.session.flush()  # Get order ID
+
+            # Create all order items with one multi-row INSERT
+            order_item_rows = [{
+                'order_id': order.id,
+                'product_id': item['product_id'],
+                'quantity': item['quantity'],
+                'unit_price': item['product_price'],
+                'line_total': item['line_total']
+            } for item in cart['items']]
+            order_item_ids = dict(db.session.execute(
+                db.insert(OrderItem).returning(OrderItem.product_id, OrderItem.id),
+                order_item_rows
+            ).all())
+
+            # Create redemption record if coupon was used
+            if coupon:
+                if not record_redemption(user_id, coupon.id):
+                    db.session.rollback()
+                    return jsonify({'error': 'You have already redeemed this coupon'}), 400
+
+                # Convert product IDs to JSON string for storage
+                products_applied_to = json.dumps([item['product_id'] for item in cart['items']])
+
+                redemption = Redemption(
+                    user_id=int(user_id),
+                    coupon_id=coupon.id,
+                    order_id=order.id,
+                    redeemed_at=now,
+                    discount_applied=cart['discount_amount'],
+                    original_amount=cart['subtotal'],
+                    discount_amount=cart['discount_amount'],
+                    final_amount=cart['final_total'],
+                    products_applied_to=products_applied_to
+                )
+
+                db.session.add(redemption)
+
+            # Clear the cart in the order's transaction: if it was changed
+            # concurrently, CartConflictError rolls back the order as well
+            items = cart['items']
+            cart.clear()
+            cart.update(empty_cart())
+            cart_storage.persist(user_id, cart)
+
+            db.session.commit()
+
+            # Build the response from what was just written instead of
+            # lazy-loading every order item and product again
+            order_data = order.to_dict(include_items=False)
+            order_data['items'] = [{
+                'id': order_item_ids.get(item['product_id']),
+                'order_id': order_data['id'],
+                'product_id': item['product_id'],
+                'product_name': product_names[item['product_id']],
+                'quantity': item['quantity'],
+                'unit_price': float(item['product_price']),
+                'line_total': float(item['line_total'])
+            } for item in items]
 
-            # Update coupon usage
-            coupon.current_uses += 1
-            coupon.updated_at = datetime.datetime.utcnow()
+            return jsonify({
+                'message': 'Order completed successfully',
+                'order': order_data
+            }), 201
 
-        db.session.commit()
+        except CartConflictError:
+            db.session.rollback()
+            raise
 
-        # Clear cart
-        user_carts[user_id] = {
-            'items': [],
-            'applied_coupon': None,
-            'subtotal': 0,
-            'discount_amount': 0,
-            'final_total': 0
-        }
-
-        return jsonify({
-            'message': 'Order completed successfully',
-            'order': order.to_dict()
-        }), 201
+        except InsufficientStockError as e:
+            db.session.rollback()
+            return jsonify({
+                'error': str(e),
+                'shortages': e.shortages
+            }), 400
 
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': 'Failed to complete order. Please try again.'}), 500
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': 'Failed to complete order. Please try again.'}), 500
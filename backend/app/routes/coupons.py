@@ -1,7 +1,16 @@
 from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models import User, Coupon, Redemption, Order
+from app.models.coupon import COUPON_ACTIVE
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils.coupon_reservations import redeem_reservation
+from app.utils.coupon_cache import coupon_cache
+from app.utils.redeemed_coupons import exclude_redeemed, record_redemption
+from app.utils.coupon_rules import get_user_facts, AVAILABILITY_RULES
+from app.utils.coupon_categories import category_filter
+from app.utils.coupon_lifecycle import lifecycle_state_filter
+from app.utils.search_index import coupon_search
+from app.utils.pagination import paginate_query, InvalidCursorError
 import datetime
 import re
 
@@ -9,65 +18,29 @@ bp = Blueprint('coupons', __name__, url_prefix='/api/coupons')
 
 # Helper: validate coupon for redemption
 def validate_coupon_for_redemption(coupon, user_id, order_amount=0):
-    """Validate if a coupon can be redeemed by a user"""
-    errors = []
-
-    # Check if coupon exists and is active
+    """Validate if a coupon (compiled CouponRules) can be redeemed by a user"""
+    # Check if coupon exists
     if not coupon:
         return False, ["Coupon not found"]
 
-    if not coupon.is_active:
-        errors.append("Coupon is inactive")
-
-    # Check date validity
-    now = datetime.datetime.utcnow()
-    if coupon.start_date > now:
-        errors.append("Coupon has not started yet")
-    if coupon.end_date < now:
-        errors.append("Coupon has expired")
-
-    # Check usage limits
-    if coupon.current_uses >= coupon.max_uses:
-        errors.append("Coupon usage limit reached")
-
-    # Check if user already redeemed this coupon
-    existing_redemption = Redemption.query.filter_by(
-        user_id=user_id,
-        coupon_id=coupon.id
-    ).first()
-
-    if existing_redemption:
-        errors.append("You have already redeemed this coupon")
-
+    # Usage is left to redeem_reservation(): it converts the user's own hold,
+    # which reserved_uses counts, or claims a free use with a guarded UPDATE
+    rules = tuple(rule for rule in AVAILABILITY_RULES if rule != 'usage') + ('not_redeemed',)
     # Enhanced validation for product integration
     if order_amount > 0:
-        # Check minimum order value
-        if coupon.minimum_order_value and order_amount < float(coupon.minimum_order_value):
-            errors.append(f"Minimum order value of ${coupon.minimum_order_value} required")
-
-        # Check first-time user restriction
-        if coupon.first_time_user_only:
-            user = User.query.get(user_id)
-            if user:
-                existing_redemptions = Redemption.query.filter_by(user_id=user_id).count()
-                if existing_redemptions > 0:
-                    errors.append("This coupon is only for first-time users")
+        rules += ('minimum_order', 'first_time_user')
 
-    return len(errors) == 0, errors
+    evaluation = coupon.evaluate(
+        subtotal=order_amount,
+        facts=get_user_facts(user_id),
+        rules=rules
+    )
+    return evaluation.ok, evaluation.errors
 
 # Helper: calculate discount amount
 def calculate_discount(coupon, order_amount):
     """Calculate the discount amount based on coupon type and order amount"""
-    if coupon.discount_type == 'percentage':
-        discount_amount = (order_amount * coupon.discount_value) / 100
-        # Apply maximum discount cap if set
-        if coupon.maximum_discount_amount:
-            discount_amount = min(discount_amount, float(coupon.maximum_discount_amount))
-        return round(discount_amount, 2)
-    elif coupon.discount_type == 'fixed':
-        # For fixed discount, don't exceed order amount
-        return min(coupon.discount_value, order_amount)
-    return 0
+    return coupon.discount_for(order_amount)
 
 # GET /api/coupons/public - List all public active coupons
 @bp.route('/public', methods=['GET'])
@@ -77,26 +50,24 @@ def list_public_coupons():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
 
-    # Query public, active coupons that are within date range
+    # Query public, active coupons that are within date range and not used up
     now = datetime.datetime.utcnow()
     query = Coupon.query.filter(
         Coupon.is_public == True,
         Coupon.is_active == True,
-        Coupon.start_date <= now,
-        Coupon.end_date >= now,
-        Coupon.current_uses < Coupon.max_uses
+        lifecycle_state_filter((COUPON_ACTIVE,), now),
+        # Uses held by reservations are not available to other users
+        Coupon.current_uses + Coupon.reserved_uses < Coupon.max_uses
     )
 
     # Exclude coupons that user has already redeemed
-    # First, get all coupon IDs that the user has redeemed
-    redeemed_coupon_ids = db.session.query(Redemption.coupon_id).filter(
-        Redemption.user_id == int(user_id)
-    ).subquery()
+    query = exclude_redeemed(query, user_id)
 
-    # Then filter out those coupons
-    query = query.filter(
-        ~Coupon.id.in_(redeemed_coupon_ids)
-    )
+    # Optionally only coupons usable with these product categories (e.g. a cart's)
+    categories = [category.strip() for category in request.args.get('categories', '').split(',')
+                  if category.strip()]
+    if categories:
+        query = query.filter(category_filter(categories))
 
     query = query.order_by(Coupon.end_date.asc())  # Show expiring soon first
 
@@ -116,7 +87,7 @@ def list_public_coupons():
             'discount_value': coupon.discount_value,
             'max_uses': coupon.max_uses,
             'current_uses': coupon.current_uses,
-            'remaining_uses': coupon.max_uses - coupon.current_uses,
+            'remaining_uses': max(coupon.max_uses - coupon.current_uses - (coupon.reserved_uses or 0), 0),
             'start_date': coupon.start_date.strftime('%Y-%m-%d'),
             'end_date': coupon.end_date.strftime('%Y-%m-%d'),
             'days_remaining': (coupon.end_date - now).days,
@@ -142,7 +113,7 @@ def list_public_coupons():
 # GET /api/coupons/validate/<code> - Validate coupon without redeeming
 @bp.route('/validate/<code>', methods=['GET'])
 def validate_coupon(code):
-    coupon = Coupon.query.filter_by(code=code.upper()).first()
+    coupon = coupon_cache.get(code, with_usage=True)
 
     if not coupon:
         return jsonify({
@@ -152,31 +123,11 @@ def validate_coupon(code):
 
     # Basic validation
     now = datetime.datetime.utcnow()
-    is_valid = True
-    errors = []
-
-    if not coupon.is_active:
-        is_valid = False
-        errors.append("Coupon is inactive")
-
-    if not coupon.is_public:
-        is_valid = False
-        errors.append("Coupon is not public")
-
-    if coupon.start_date > now:
-        is_valid = False
-        errors.append("Coupon has not started yet")
-
-    if coupon.end_date < now:
-        is_valid = False
-        errors.append("Coupon has expired")
-
-    if coupon.current_uses >= coupon.max_uses:
-        is_valid = False
-        errors.append("Coupon usage limit reached")
+    evaluation = coupon.evaluate(now=now, rules=AVAILABILITY_RULES + ('public',))
+    errors = evaluation.errors
 
     return jsonify({
-        'valid': is_valid,
+        'valid': evaluation.ok,
         'coupon': {
             'id': coupon.id,
             'code': coupon.code,
@@ -188,14 +139,14 @@ def validate_coupon(code):
             'is_active': coupon.is_active,
             'max_uses': coupon.max_uses,
             'current_uses': coupon.current_uses,
-            'remaining_uses': coupon.max_uses - coupon.current_uses,
+            'remaining_uses': max(coupon.max_uses - coupon.current_uses - (coupon.reserved_uses or 0), 0),
             'start_date': coupon.start_date.strftime('%Y-%m-%d'),
             'end_date': coupon.end_date.strftime('%Y-%m-%d'),
             'days_remaining': (coupon.end_date - now).days,
             # Enhanced fields for product integration
-            'minimum_order_value': float(coupon.minimum_order_value) if coupon.minimum_order_value else 0,
-            'applicable_categories': coupon.get_applicable_categories(),
-            'maximum_discount_amount': float(coupon.maximum_discount_amount) if coupon.maximum_discount_amount else None,
+            'minimum_order_value': coupon.minimum_order_value,
+            'applicable_categories': list(coupon.categories),
+            'maximum_discount_amount': coupon.maximum_discount_amount,
             'first_time_user_only': coupon.first_time_user_only
         },
         'errors': errors
@@ -222,7 +173,7 @@ def redeem_coupon():
         return jsonify({'error': 'User not found'}), 404
 
     # Find coupon
-    coupon = Coupon.query.filter_by(code=code).first()
+    coupon = coupon_cache.get(code, with_usage=True)
     if not coupon:
         return jsonify({'error': 'Coupon not found'}), 404
 
@@ -239,6 +190,24 @@ def redeem_coupon():
 
     # Use database transaction to prevent race conditions
     try:
+        # Convert the user's reservation, if any, or claim a use with a
+        # conditional increment so concurrent redemptions can never exceed max_uses
+        if not redeem_reservation(coupon.id, user_id):
+            db.session.rollback()
+            return jsonify({
+                'error': 'Coupon cannot be redeemed',
+                'details': ['Coupon usage limit reached']
+            }), 400
+
+        # Add the coupon to the user's redeemed set; this also stops two
+        # concurrent redemptions of the same coupon by one user
+        if not record_redemption(user_id, coupon.id):
+            db.session.rollback()
+            return jsonify({
+                'error': 'Coupon cannot be redeemed',
+                'details': ['You have already redeemed this coupon']
+            }), 400
+
         # Create redemption record
         redemption = Redemption(
             user_id=int(user_id),
@@ -247,10 +216,6 @@ def redeem_coupon():
             discount_applied=discount_amount
         )
 
-        # Update coupon usage count
-        coupon.current_uses += 1
-        coupon.updated_at = datetime.datetime.utcnow()
-
         # Commit transaction
         db.session.add(redemption)
         db.session.commit()
@@ -281,41 +246,30 @@ def search_coupons():
     user_id = get_jwt_identity()
     query = request.args.get('q', '').strip()
     discount_type = request.args.get('discount_type', '').strip()
-    sort_by = request.args.get('sort_by', 'expiry')  # expiry, discount, name
+    sort_by = request.args.get('sort_by', 'relevance' if query else 'expiry')  # relevance, expiry, discount, name
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
 
     # Build query - exclude coupons that user has already redeemed
-    # First, get all coupon IDs that the user has redeemed
-    redeemed_coupon_ids = db.session.query(Redemption.coupon_id).filter(
-        Redemption.user_id == int(user_id)
-    ).subquery()
-
-    # Then filter out those coupons
-    db_query = Coupon.query.filter(
+    db_query = exclude_redeemed(Coupon.query.filter(
         Coupon.is_public == True,
         Coupon.is_active == True
-    ).filter(
-        ~Coupon.id.in_(redeemed_coupon_ids)
-    )
+    ), user_id)
 
-    # If query is provided, add search filter
+    # If query is provided, match it against the full-text index of code,
+    # title and description (prefix matching, ranked by relevance)
+    relevance = None
     if query:
-        search_term = f"%{query}%"
-        db_query = db_query.filter(
-            db.or_(
-                Coupon.code.ilike(search_term),
-                Coupon.title.ilike(search_term),
-                Coupon.description.ilike(search_term)
-            )
-        )
+        db_query, relevance = coupon_search.search(db_query, query)
 
     # Filter by discount type
     if discount_type:
         db_query = db_query.filter(Coupon.discount_type == discount_type)
 
     # Sort results
-    if sort_by == 'expiry':
+    if sort_by == 'relevance' and relevance is not None:
+        db_query = db_query.order_by(relevance.asc(), Coupon.end_date.asc())
+    elif sort_by == 'expiry':
         db_query = db_query.order_by(Coupon.end_date.asc())
     elif sort_by == 'discount':
         db_query = db_query.order_by(Coupon.discount_value.desc())
@@ -341,7 +295,7 @@ def search_coupons():
             'discount_value': coupon.discount_value,
             'max_uses': coupon.max_uses,
             'current_uses': coupon.current_uses,
-            'remaining_uses': coupon.max_uses - coupon.current_uses,
+            'remaining_uses': max(coupon.max_uses - coupon.current_uses - (coupon.reserved_uses or 0), 0),
             'start_date': coupon.start_date.strftime('%Y-%m-%d'),
             'end_date': coupon.end_date.strftime('%Y-%m-%d'),
             'days_remaining': (coupon.end_date - now).days,
@@ -371,8 +325,6 @@ def search_coupons():
 @jwt_required()
 def get_user_redemptions():
     user_id = get_jwt_identity()
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
     start_date = request.args.get('start_date', '').strip()
     end_date = request.args.get('end_date', '').strip()
 
@@ -404,12 +356,11 @@ def get_user_redemptions():
         except ValueError:
             pass  # Invalid date format, ignore filter
 
-    query = query.order_by(Redemption.redeemed_at.desc())
-
-    # Pagination
-    pagination = query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Newest first, by page number or after a cursor
+    try:
+        pagination = paginate_query(query, [(Redemption.redeemed_at, True), (Redemption.id, True)])
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
 
     redemptions = []
     total_saved = 0
@@ -456,12 +407,5 @@ def get_user_redemptions():
         'redemptions': redemptions,
         'total_redemptions': pagination.total,
         'total_saved': round(total_saved, 2),
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
-        }
+        'pagination': pagination.to_dict()
     }), 200
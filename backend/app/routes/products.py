@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models import Product, User
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils.coupon_cache import coupon_cache
+from app.utils.coupon_rules import AVAILABILITY_RULES
+from app.utils.search_index import product_search
+from app.utils.product_facets import FACETS, facet_counts
+from app.utils.product_cache import product_cache
+from app.utils.pagination import paginate_query, InvalidCursorError
 import datetime
 
 bp = Blueprint('products', __name__, url_prefix='/api/products')
@@ -9,79 +15,82 @@ bp = Blueprint('products', __name__, url_prefix='/api/products')
 # GET /api/products - List active products with filters
 @bp.route('', methods=['GET'])
 def list_products():
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
     category = request.args.get('category', '').strip()
     brand = request.args.get('brand', '').strip()
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
     sort_by = request.args.get('sort_by', 'name')  # name, price, created_at
     sort_order = request.args.get('sort_order', 'asc')  # asc, desc
+    facets = request.args.get('facets', '').strip()  # 'all' or e.g. 'category,brand,price'
+
+    if facets in ('all', 'true', '1'):
+        facets = FACETS
+    elif facets:
+        facets = [facet.strip() for facet in facets.split(',') if facet.strip()]
+        unknown = [facet for facet in facets if facet not in FACETS]
+        if unknown:
+            return jsonify({'error': f'Unknown facets: {", ".join(unknown)}. Available: {", ".join(FACETS)}'}), 400
+
+    # Served from the catalog cache, keyed by the query string
+    def load():
+        # Build filters, grouped by the facet they narrow
+        filters = {'category': [], 'brand': [], 'price': []}
+        if category:
+            filters['category'].append(Product.category.ilike(f'%{category}%'))
+        if brand:
+            filters['brand'].append(Product.brand.ilike(f'%{brand}%'))
+        if min_price is not None:
+            filters['price'].append(Product.price >= min_price)
+        if max_price is not None:
+            filters['price'].append(Product.price <= max_price)
+
+        # Build query
+        query = Product.query.filter_by(is_active=True)
+        for clauses in filters.values():
+            query = query.filter(*clauses)
+
+        # Apply sorting, by page number or after a cursor; id breaks ties
+        sort_column = {
+            'name': Product.name,
+            'price': Product.price,
+            'created_at': Product.created_at
+        }.get(sort_by, Product.name)
+        descending = sort_by in ('name', 'price', 'created_at') and sort_order == 'desc'
+        pagination = paginate_query(query, [(sort_column, descending), (Product.id, descending)])
+
+        products = []
+        for product in pagination.items:
+            products.append(product.to_dict())
+
+        response = {
+            'products': products,
+            'pagination': pagination.to_dict()
+        }
 
-    # Build query
-    query = Product.query.filter_by(is_active=True)
-
-    # Apply filters
-    if category:
-        query = query.filter(Product.category.ilike(f'%{category}%'))
-    if brand:
-        query = query.filter(Product.brand.ilike(f'%{brand}%'))
-    if min_price is not None:
-        query = query.filter(Product.price >= min_price)
-    if max_price is not None:
-        query = query.filter(Product.price <= max_price)
-
-    # Apply sorting
-    if sort_by == 'name':
-        if sort_order == 'desc':
-            query = query.order_by(Product.name.desc())
-        else:
-            query = query.order_by(Product.name.asc())
-    elif sort_by == 'price':
-        if sort_order == 'desc':
-            query = query.order_by(Product.price.desc())
-        else:
-            query = query.order_by(Product.price.asc())
-    elif sort_by == 'created_at':
-        if sort_order == 'desc':
-            query = query.order_by(Product.created_at.desc())
-        else:
-            query = query.order_by(Product.created_at.asc())
-    else:
-        query = query.order_by(Product.name.asc())
-
-    # Pagination
-    pagination = query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+        # Each facet counted under the other facets' filters; without
+        # filters, from the maintained aggregates
+        if facets:
+            response['facets'] = facet_counts(facets, filters)
 
-    products = []
-    for product in pagination.items:
-        products.append(product.to_dict())
+        return response
 
-    return jsonify({
-        'products': products,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
-        }
-    }), 200
+    try:
+        response = product_cache.get_or_load(('products', tuple(sorted(request.args.items(multi=True)))), load)
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(response), 200
 
 # GET /api/products/<id> - Get product details
 @bp.route('/<int:product_id>', methods=['GET'])
 def get_product(product_id):
-    product = Product.query.get_or_404(product_id)
+    def load():
+        product = db.session.get(Product, product_id)
+        if product is None or not product.is_active:
+            return {'error': 'Product not found'}, 404
+        return {'product': product.to_dict()}, 200
 
-    if not product.is_active:
-        return jsonify({'error': 'Product not found'}), 404
-
-    return jsonify({
-        'product': product.to_dict()
-    }), 200
+    response, status = product_cache.get_or_load(('product', product_id), load)
+    return jsonify(response), status
 
 # GET /api/products/search?q=<query> - Search products
 @bp.route('/search', methods=['GET'])
@@ -94,38 +103,30 @@ def search_products():
     if not query:
         return jsonify({'error': 'Search query is required'}), 400
 
-    # Build search query
-    db_query = Product.query.filter_by(is_active=True)
-
-    # Search by name, description, brand, or SKU
-    search_term = f"%{query}%"
-    db_query = db_query.filter(
-        db.or_(
-            Product.name.ilike(search_term),
-            Product.description.ilike(search_term),
-            Product.brand.ilike(search_term),
-            Product.sku.ilike(search_term)
+    # Rank the best matches from the full-text index; the category filter
+    # runs inside the index query. Only the best max_candidates matches are
+    # kept, so `total` never exceeds it
+    max_candidates = current_app.config.get('PRODUCT_SEARCH_MAX_CANDIDATES', 1000) or None
+
+    def run_search(search_text):
+        db_query, relevance = product_search.search(
+            Product.query.filter_by(is_active=True), search_text,
+            filters={'category': category}, limit=max_candidates
         )
-    )
+        if relevance is not None:
+            db_query = db_query.order_by(relevance.asc(), Product.name.asc())
+        else:
+            db_query = db_query.order_by(Product.name.asc())
+        return db_query.paginate(page=page, per_page=per_page, error_out=False)
 
-    # Filter by category if provided
-    if category:
-        db_query = db_query.filter(Product.category.ilike(f'%{category}%'))
-
-    # Order by relevance (name first, then description)
-    db_query = db_query.order_by(
-        db.case(
-            (Product.name.ilike(f'%{query}%'), 1),
-            (Product.description.ilike(f'%{query}%'), 2),
-            else_=3
-        ),
-        Product.name.asc()
-    )
+    pagination = run_search(query)
 
-    # Pagination
-    pagination = db_query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Nothing found: retry once with misspelt words corrected
+    corrected_query = None
+    if pagination.total == 0:
+        corrected_query = product_search.correct(query)
+        if corrected_query:
+            pagination = run_search(corrected_query)
 
     products = []
     for product in pagination.items:
@@ -134,10 +135,12 @@ def search_products():
     return jsonify({
         'products': products,
         'search_query': query,
+        'corrected_query': corrected_query,
         'pagination': {
             'page': page,
             'per_page': per_page,
             'total': pagination.total,
+            'total_limit': max_candidates,
             'pages': pagination.pages,
             'has_next': pagination.has_next,
             'has_prev': pagination.has_prev
@@ -147,13 +150,11 @@ def search_products():
 # GET /api/products/categories - List product categories
 @bp.route('/categories', methods=['GET'])
 def get_categories():
-    # Get unique categories from active products
-    categories = db.session.query(Product.category).filter(
-        Product.is_active == True
-    ).distinct().all()
+    # Categories of active products, from the facet counts
+    def load():
+        return sorted(entry['value'] for entry in facet_counts(('category',))['category'] if entry['value'])
 
-    category_list = [cat[0] for cat in categories if cat[0]]
-    category_list.sort()
+    category_list = product_cache.get_or_load(('categories',), load)
 
     return jsonify({
         'categories': category_list
@@ -173,6 +174,10 @@ def calculate_discount():
     if not coupon_code:
         return jsonify({'error': 'Coupon code is required'}), 400
 
+    # Load every product in the cart with one query
+    product_ids = [item.get('product_id') for item in cart_items]
+    products = {product.id: product for product in Product.query.filter(Product.id.in_(product_ids)).all()}
+
     # Calculate cart total
     cart_total = 0
     cart_products = []
@@ -181,7 +186,7 @@ def calculate_discount():
         product_id = item.get('product_id')
         quantity = item.get('quantity', 1)
 
-        product = Product.query.get(product_id)
+        product = products.get(product_id)
         if not product or not product.is_active:
             return jsonify({'error': f'Product {product_id} not found or inactive'}), 404
 
@@ -201,54 +206,27 @@ def calculate_discount():
         })
 
     # Find and validate coupon
-    from app.models import Coupon
-    coupon = Coupon.query.filter_by(code=coupon_code.upper()).first()
+    rules = coupon_cache.get(coupon_code, with_usage=True)
 
-    if not coupon:
+    if not rules:
         return jsonify({'error': 'Invalid coupon code'}), 404
 
-    if not coupon.is_active:
-        return jsonify({'error': 'Coupon is inactive'}), 400
-
-    # Check date validity
-    now = datetime.datetime.utcnow()
-    if coupon.start_date and coupon.start_date > now:
-        return jsonify({'error': 'Coupon has not started yet'}), 400
-    if coupon.end_date and coupon.end_date < now:
-        return jsonify({'error': 'Coupon has expired'}), 400
-
-    # Check usage limits
-    if coupon.current_uses >= coupon.max_uses:
-        return jsonify({'error': 'Coupon usage limit reached'}), 400
-
-    # Check minimum order value
-    if coupon.minimum_order_value and cart_total < float(coupon.minimum_order_value):
+    evaluation = rules.evaluate(
+        subtotal=cart_total,
+        categories=set(item['category'] for item in cart_products),
+        rules=AVAILABILITY_RULES + ('minimum_order', 'categories')
+    )
+    failure = evaluation.first_failure
+    if failure and failure.rule == 'minimum_order':
         return jsonify({
-            'error': f'Minimum order value of ${coupon.minimum_order_value} required',
+            'error': failure.message,
             'current_total': cart_total,
-            'minimum_required': float(coupon.minimum_order_value)
+            'minimum_required': rules.minimum_order_value
         }), 400
+    if failure:
+        return jsonify({'error': failure.message}), 400
 
-    # Check applicable categories
-    if coupon.get_applicable_categories():
-        cart_categories = set(item['category'] for item in cart_products)
-        applicable_categories = set(coupon.get_applicable_categories())
-
-        if not cart_categories.intersection(applicable_categories):
-            return jsonify({
-                'error': f'Coupon only applies to categories: {", ".join(applicable_categories)}'
-            }), 400
-
-    # Calculate discount
-    discount_amount = 0
-    if coupon.discount_type == 'percentage':
-        discount_amount = (cart_total * coupon.discount_value) / 100
-        # Apply maximum discount cap if set
-        if coupon.maximum_discount_amount:
-            discount_amount = min(discount_amount, float(coupon.maximum_discount_amount))
-    elif coupon.discount_type == 'fixed':
-        discount_amount = min(coupon.discount_value, cart_total)
-
+    discount_amount = evaluation.discount_amount
     final_total = cart_total - discount_amount
 
     return jsonify({
@@ -256,13 +234,13 @@ def calculate_discount():
         'discount_amount': round(discount_amount, 2),
         'final_total': round(final_total, 2),
         'coupon': {
-            'code': coupon.code,
-            'title': coupon.title,
-            'discount_type': coupon.discount_type,
-            'discount_value': coupon.discount_value,
-            'minimum_order_value': float(coupon.minimum_order_value) if coupon.minimum_order_value else 0,
-            'applicable_categories': coupon.get_applicable_categories(),
-            'maximum_discount_amount': float(coupon.maximum_discount_amount) if coupon.maximum_discount_amount else None
+            'code': rules.code,
+            'title': rules.title,
+            'discount_type': rules.discount_type,
+            'discount_value': rules.discount_value,
+            'minimum_order_value': rules.minimum_order_value,
+            'applicable_categories': list(rules.categories),
+            'maximum_discount_amount': rules.maximum_discount_amount
         },
         'cart_items': cart_products
     }), 200
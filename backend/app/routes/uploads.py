@@ -0,0 +1,53 @@
+from flask import Blueprint, request, current_app, abort
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+from app.utils.image_pipeline import upload_dir
+from urllib.parse import quote
+import os
+import re
+
+bp = Blueprint('uploads', __name__)
+
+DEFAULT_UPLOADS_MAX_AGE = 300
+DEFAULT_UPLOADS_ACCEL_PREFIX = '/_uploads/'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+UPLOADS_OFFLOAD_MODES = ('x-sendfile', 'x-accel-redirect')
+
+# Files of the image pipeline: their content never changes under one path
+_CONTENT_HASHED = re.compile(r'^images/[0-9a-f]{2}/[0-9a-f]{64}/[^/]+$')
+
+# GET /uploads/<path> - Uploaded file with caching headers, 304s and Range support
+@bp.route('/uploads/<path:filename>', methods=['GET'])
+def uploaded_file(filename):
+    path = safe_join(upload_dir(), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    immutable = _CONTENT_HASHED.match(filename) is not None
+    offload = current_app.config.get('UPLOADS_OFFLOAD') or ''
+    offload = offload.lower() if offload.lower() in UPLOADS_OFFLOAD_MODES else None
+
+    # ETag/Last-Modified come from the file's stat; conditional requests get a
+    # 304 and Range requests a 206. With offload the body, Range and
+    # conditional requests are all left to the proxy, which reads the file
+    response = send_file(
+        path, request.environ,
+        max_age=IMMUTABLE_MAX_AGE if immutable else int(
+            current_app.config.get('UPLOADS_MAX_AGE', DEFAULT_UPLOADS_MAX_AGE)),
+        conditional=offload is None,
+        etag=True,
+        use_x_sendfile=offload is not None,
+        response_class=current_app.response_class
+    )
+    if immutable:
+        response.cache_control.immutable = True
+
+    if offload is not None:
+        # A plain 200 without a length: the proxy sets it for what it sends
+        response.automatically_set_content_length = False
+        del response.headers['Content-Length']
+        if offload == 'x-accel-redirect':
+            del response.headers['X-Sendfile']
+            prefix = current_app.config.get('UPLOADS_ACCEL_PREFIX') or DEFAULT_UPLOADS_ACCEL_PREFIX
+            response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(filename)
+    return response
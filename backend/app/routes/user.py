@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models import User, Coupon, Redemption, Order, Product
+from app.models.coupon import COUPON_ACTIVE
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils.redeemed_coupons import exclude_redeemed
+from app.utils.coupon_lifecycle import lifecycle_state_filter
 import datetime
 import re
 
@@ -230,21 +233,11 @@ def get_user_stats():
     # Get available public coupons count (excluding already redeemed ones)
     now = datetime.datetime.utcnow()
 
-    # First, get all coupon IDs that the user has redeemed
-    redeemed_coupon_ids = db.session.query(Redemption.coupon_id).filter(
-        Redemption.user_id == user.id
-    ).subquery()
-
-    # Then count available coupons excluding redeemed ones
-    available_coupons = Coupon.query.filter(
+    available_coupons = exclude_redeemed(Coupon.query.filter(
         Coupon.is_public == True,
         Coupon.is_active == True,
-        Coupon.start_date <= now,
-        Coupon.end_date >= now,
-        Coupon.current_uses < Coupon.max_uses
-    ).filter(
-        ~Coupon.id.in_(redeemed_coupon_ids)
-    ).count()
+        lifecycle_state_filter((COUPON_ACTIVE,), now)
+    ), user.id).count()
 
     # Get monthly redemption trends (last 6 months)
     monthly_trends = []
@@ -346,21 +339,11 @@ def get_user_dashboard():
     # Get available public coupons (excluding already redeemed ones)
     now = datetime.datetime.utcnow()
 
-    # First, get all coupon IDs that the user has redeemed
-    redeemed_coupon_ids = db.session.query(Redemption.coupon_id).filter(
-        Redemption.user_id == user.id
-    ).subquery()
-
-    # Then get available coupons excluding redeemed ones
-    available_coupons = Coupon.query.filter(
+    available_coupons = exclude_redeemed(Coupon.query.filter(
         Coupon.is_public == True,
         Coupon.is_active == True,
-        Coupon.start_date <= now,
-        Coupon.end_date >= now,
-        Coupon.current_uses < Coupon.max_uses
-    ).filter(
-        ~Coupon.id.in_(redeemed_coupon_ids)
-    ).limit(5).all()
+        lifecycle_state_filter((COUPON_ACTIVE,), now)
+    ), user.id).limit(5).all()
 
     # Format available coupons
     available_coupons_list = []
@@ -0,0 +1,558 @@
+"""
+Cart storage backends.
+
+Carts are kept outside the request worker so that every worker sees the same
+cart. The backend is chosen with the CART_STORE setting:
+
+- memory: process-local dict (single worker / development)
+- sql:    the `carts` table in the application database
+- redis:  any client speaking the Redis protocol (REDIS_URL or CART_REDIS_CLIENT)
+
+Every backend expires carts after CART_TTL_SECONDS of inactivity and offers
+`transaction(user_id)`, an atomic read-modify-write of a single cart. Inside a
+transaction, `persist(user_id, cart)` writes the cart right away; the SQL
+backend does so in the caller's database transaction, so e.g. checkout clears
+the cart and commits it together with the order.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Cart
+import copy
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_CART_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_MAX_CARTS_IN_MEMORY = 10000
+
+
+class CartConflictError(Exception):
+    """Raised when a cart was changed by another request during a transaction"""
+
+
+def empty_cart():
+    """Return a new, empty cart"""
+    return {
+        'items': [],
+        'applied_coupon': None,
+        'subtotal': 0,
+        'discount_amount': 0,
+        'final_total': 0
+    }
+
+
+class _OpenTransaction:
+    """What a running transaction last read or wrote for one cart"""
+
+    def __init__(self, cart, token):
+        self.original = copy.deepcopy(cart)
+        self.token = token
+
+
+class CartStore:
+    """Base class for cart backends.
+
+    Subclasses implement `_read`, `_write`, `_remove` and `_locked`; `_read`
+    returns a `(cart, token)` pair where the token is whatever the backend needs
+    to detect a concurrent write in `_write`, which returns the new token.
+    Backends writing through the application's database session do not commit
+    in `_write`/`_remove` but in `_commit`.
+    """
+
+    def __init__(self, ttl=DEFAULT_CART_TTL_SECONDS):
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def load(self, user_id):
+        """Get the user's cart, or an empty cart if none is stored"""
+        cart, _ = self._read(str(user_id))
+        return cart if cart is not None else empty_cart()
+
+    def save(self, user_id, cart):
+        """Store the cart and restart its TTL"""
+        user_id = str(user_id)
+        with self._locked(user_id):
+            _, token = self._read(user_id, for_update=True)
+            self._write(user_id, cart, token)
+            self._commit()
+
+    def delete(self, user_id):
+        """Remove the user's cart"""
+        user_id = str(user_id)
+        with self._locked(user_id):
+            _, token = self._read(user_id, for_update=True)
+            self._remove(user_id, token)
+            self._commit()
+
+    def purge_expired(self):
+        """Remove expired carts, returns the number removed"""
+        return 0
+
+    def stats(self):
+        """Backend specific counters, empty if the backend keeps none"""
+        return {}
+
+    @contextmanager
+    def transaction(self, user_id):
+        """Atomically load, modify and store a cart.
+
+        The yielded cart may be mutated in place; it is written back when the
+        block exits without an exception, and only if it actually changed. A
+        cart that ends up empty is removed instead of stored.
+        """
+        user_id = str(user_id)
+        with self._locked(user_id):
+            cart, token = self._read(user_id, for_update=True)
+            if cart is None:
+                cart = empty_cart()
+            open_transactions = self._open_transactions()
+            open_transactions[user_id] = _OpenTransaction(cart, token)
+            try:
+                yield cart
+                self.persist(user_id, cart)
+                self._commit()
+            finally:
+                open_transactions.pop(user_id, None)
+
+    def persist(self, user_id, cart):
+        """Write the cart of a running transaction now, if it changed.
+
+        The SQL backend writes in the current database transaction without
+        committing it; a concurrent change raises CartConflictError.
+        """
+        user_id = str(user_id)
+        state = self._open_transactions().get(user_id)
+        if state is None:
+            raise RuntimeError(f'No cart transaction open for user {user_id}')
+        if cart == state.original:
+            return
+        if cart == empty_cart():
+            state.token = self._remove(user_id, state.token)
+        else:
+            state.token = self._write(user_id, cart, state.token)
+        state.original = copy.deepcopy(cart)
+
+    def _open_transactions(self):
+        if not hasattr(self._local, 'open'):
+            self._local.open = {}
+        return self._local.open
+
+    def _read(self, user_id, for_update=False):
+        raise NotImplementedError
+
+    def _write(self, user_id, cart, token):
+        raise NotImplementedError
+
+    def _remove(self, user_id, token):
+        raise NotImplementedError
+
+    def _commit(self):
+        """Make the writes of `_write`/`_remove` durable"""
+
+    def _locked(self, user_id):
+        raise NotImplementedError
+
+
+class MemoryCartStore(CartStore):
+    """Process-local cart store, only suitable for a single worker.
+
+    The store is bounded: at most `max_entries` carts are kept, least recently
+    used first out, and carts untouched for `idle_timeout` seconds are evicted
+    as well. With `spill_dir` set, evicted carts are written to disk and
+    restored on the user's next request, so memory stays flat without losing
+    the carts of inactive users.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, ttl=DEFAULT_CART_TTL_SECONDS, max_entries=DEFAULT_MAX_CARTS_IN_MEMORY,
+                 idle_timeout=None, spill_dir=None):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.idle_timeout = idle_timeout if idle_timeout is not None else ttl
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        # user_id -> (expires_at, last_access, cart), least recently used first
+        self._carts = OrderedDict()
+        self._mutex = threading.Lock()
+        self._locks = [threading.RLock() for _ in range(self.LOCK_STRIPES)]
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'idle_evictions': 0,
+            'expirations': 0,
+            'spilled': 0,
+            'restored': 0
+        }
+
+    def _locked(self, user_id):
+        return self._locks[hash(user_id) % self.LOCK_STRIPES]
+
+    def _read(self, user_id, for_update=False):
+        now = time.time()
+        evicted = []
+        with self._mutex:
+            evicted.extend(self._evict_idle(now))
+            entry = self._carts.get(user_id)
+            if entry is not None:
+                expires_at, _, cart = entry
+                if expires_at <= now:
+                    del self._carts[user_id]
+                    self._stats['expirations'] += 1
+                    entry = None
+                else:
+                    self._carts[user_id] = (expires_at, now, cart)
+                    self._carts.move_to_end(user_id)
+                    self._stats['hits'] += 1
+            if entry is None:
+                self._stats['misses'] += 1
+        self._spill(evicted)
+
+        if entry is not None:
+            return copy.deepcopy(cart), None
+
+        restored = self._restore(user_id, now)
+        if restored is None:
+            return None, None
+        expires_at, cart = restored
+        self._insert(user_id, expires_at, cart, now)
+        return copy.deepcopy(cart), None
+
+    def _write(self, user_id, cart, token):
+        now = time.time()
+        self._insert(user_id, now + self.ttl, copy.deepcopy(cart), now)
+        return None
+
+    def _remove(self, user_id, token):
+        with self._mutex:
+            self._carts.pop(user_id, None)
+        self._discard_spilled(user_id)
+        return None
+
+    def _insert(self, user_id, expires_at, cart, now):
+        evicted = []
+        with self._mutex:
+            self._carts[user_id] = (expires_at, now, cart)
+            self._carts.move_to_end(user_id)
+            while len(self._carts) > self.max_entries:
+                evicted.append(self._carts.popitem(last=False))
+                self._stats['evictions'] += 1
+        self._spill(evicted)
+
+    def _evict_idle(self, now):
+        """Pop carts idle for longer than idle_timeout, caller holds the mutex.
+
+        Entries are ordered by last access, so only the front needs checking.
+        """
+        evicted = []
+        while self._carts:
+            user_id, entry = next(iter(self._carts.items()))
+            if now - entry[1] < self.idle_timeout:
+                break
+            self._carts.popitem(last=False)
+            if entry[0] <= now:
+                self._stats['expirations'] += 1
+            else:
+                evicted.append((user_id, entry))
+                self._stats['idle_evictions'] += 1
+        return evicted
+
+    def _spill_path(self, user_id):
+        digest = hashlib.sha1(user_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, f'{digest}.json')
+
+    def _spill(self, evicted):
+        if not self.spill_dir:
+            return
+        now = time.time()
+        for user_id, (expires_at, _, cart) in evicted:
+            if expires_at <= now:
+                continue
+            path = self._spill_path(user_id)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'expires_at': expires_at, 'cart': cart}, f)
+            os.replace(tmp_path, path)
+            with self._mutex:
+                self._stats['spilled'] += 1
+
+    def _restore(self, user_id, now):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(user_id)
+        try:
+            with open(path) as f:
+                spilled = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._discard_spilled(user_id)
+        if spilled.get('expires_at', 0) <= now:
+            return None
+        with self._mutex:
+            self._stats['restored'] += 1
+        return spilled['expires_at'], spilled['cart']
+
+    def _discard_spilled(self, user_id):
+        if self.spill_dir:
+            try:
+                os.remove(self._spill_path(user_id))
+            except OSError:
+                pass
+
+    def purge_expired(self):
+        now = time.time()
+        with self._mutex:
+            evicted = self._evict_idle(now)
+            expired = [user_id for user_id, entry in self._carts.items() if entry[0] <= now]
+            for user_id in expired:
+                del self._carts[user_id]
+            self._stats['expirations'] += len(expired)
+        self._spill(evicted)
+
+        removed = len(expired)
+        if self.spill_dir:
+            for name in os.listdir(self.spill_dir):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.spill_dir, name)
+                try:
+                    with open(path) as f:
+                        expires_at = json.load(f).get('expires_at', 0)
+                except (OSError, ValueError):
+                    continue
+                if expires_at <= now:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
+    def stats(self):
+        with self._mutex:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._carts)
+        stats['max_entries'] = self.max_entries
+        return stats
+
+
+class SQLCartStore(CartStore):
+    """Cart store backed by the `carts` table.
+
+    Writes go through the application's session and are committed with the
+    caller's transaction (or at the end of `transaction()`), never on their
+    own. The version column catches concurrent writers; reads for a write also
+    take a row lock (SELECT ... FOR UPDATE) where the database supports it,
+    plain `load()`s do not.
+    """
+
+    def _locked(self, user_id):
+        return _NULL_LOCK
+
+    def _read(self, user_id, for_update=False):
+        query = select(Cart.data, Cart.version, Cart.expires_at).where(Cart.user_id == user_id)
+        if for_update:
+            query = query.with_for_update()
+        row = db.session.execute(query).first()
+        if row is None:
+            return None, None
+        if row.expires_at <= datetime.datetime.utcnow():
+            return None, row.version
+        try:
+            return json.loads(row.data), row.version
+        except json.JSONDecodeError:
+            return None, row.version
+
+    def _write(self, user_id, cart, token):
+        now = datetime.datetime.utcnow()
+        values = {
+            'data': json.dumps(cart),
+            'expires_at': now + datetime.timedelta(seconds=self.ttl),
+            'updated_at': now
+        }
+        try:
+            if token is None:
+                # A savepoint, so a concurrent insert does not undo the caller's work
+                with db.session.begin_nested():
+                    db.session.execute(insert(Cart).values(user_id=user_id, version=1, **values))
+                return 1
+        except IntegrityError:
+            raise CartConflictError(f'Cart for user {user_id} was created concurrently')
+
+        result = db.session.execute(
+            update(Cart)
+            .where(Cart.user_id == user_id, Cart.version == token)
+            .values(version=token + 1, **values)
+        )
+        if result.rowcount != 1:
+            raise CartConflictError(f'Cart for user {user_id} was modified concurrently')
+        return token + 1
+
+    def _remove(self, user_id, token):
+        if token is None:
+            return None
+        result = db.session.execute(
+            delete(Cart).where(Cart.user_id == user_id, Cart.version == token)
+        )
+        if result.rowcount != 1:
+            raise CartConflictError(f'Cart for user {user_id} was modified concurrently')
+        return None
+
+    def _commit(self):
+        db.session.commit()
+
+    def purge_expired(self):
+        result = db.session.execute(
+            delete(Cart).where(Cart.expires_at <= datetime.datetime.utcnow())
+        )
+        db.session.commit()
+        return result.rowcount
+
+
+class RedisCartStore(CartStore):
+    """Cart store for a Redis-protocol server.
+
+    Only GET, SET (with EX/NX/PX), DELETE and EVAL of `RELEASE_LOCK_SCRIPT` are
+    used, so redis-py, fakeredis or any small stand-in client exposing those
+    methods will work. Writers hold a short per-cart lease lock while they read,
+    modify and write.
+    """
+
+    # Compare-and-delete in one step, so a lease that expired and was taken
+    # over by another writer between the check and the delete is left alone
+    RELEASE_LOCK_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) "
+        "else return 0 end"
+    )
+
+    def __init__(self, client, ttl=DEFAULT_CART_TTL_SECONDS, prefix='cart:',
+                 lock_timeout=5.0, lock_wait=2.0):
+        super().__init__(ttl)
+        self.client = client
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+
+    def _key(self, user_id):
+        return f'{self.prefix}{user_id}'
+
+    @contextmanager
+    def _locked(self, user_id):
+        lock_key = f'{self._key(user_id)}:lock'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_wait
+        while not self.client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000)):
+            if time.monotonic() >= deadline:
+                raise CartConflictError(f'Timed out waiting for cart lock of user {user_id}')
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            # Only release the lock if our lease has not expired and been taken over
+            self.client.eval(self.RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+    def _read(self, user_id, for_update=False):
+        raw = self.client.get(self._key(user_id))
+        if raw is None:
+            return None, None
+        try:
+            return json.loads(raw), None
+        except (json.JSONDecodeError, TypeError):
+            return None, None
+
+    def _write(self, user_id, cart, token):
+        self.client.set(self._key(user_id), json.dumps(cart), ex=self.ttl)
+        return None
+
+    def _remove(self, user_id, token):
+        self.client.delete(self._key(user_id))
+        return None
+
+
+class _NullLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_LOCK = _NullLock()
+
+
+def create_cart_store(config):
+    """Build the cart backend described by an app config mapping"""
+    backend = config.get('CART_STORE', 'memory')
+    ttl = int(config.get('CART_TTL_SECONDS', DEFAULT_CART_TTL_SECONDS))
+
+    if backend == 'memory':
+        idle_timeout = config.get('CART_MEMORY_IDLE_SECONDS')
+        return MemoryCartStore(
+            ttl=ttl,
+            max_entries=int(config.get('CART_MEMORY_MAX_ENTRIES', DEFAULT_MAX_CARTS_IN_MEMORY)),
+            idle_timeout=int(idle_timeout) if idle_timeout else None,
+            spill_dir=config.get('CART_SPILL_DIR') or None
+        )
+    if backend == 'sql':
+        return SQLCartStore(ttl=ttl)
+    if backend == 'redis':
+        client = config.get('CART_REDIS_CLIENT')
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError('CART_STORE=redis requires the redis package')
+            client = redis.Redis.from_url(config.get('REDIS_URL', 'redis://localhost:6379/0'))
+        return RedisCartStore(client, ttl=ttl)
+    raise ValueError(f'Unknown CART_STORE backend: {backend}')
+
+
+class CartStorage:
+    """Flask extension exposing the configured cart store of the current app"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['cart_store'] = create_cart_store(app.config)
+
+    @property
+    def store(self):
+        return current_app.extensions['cart_store']
+
+    def load(self, user_id):
+        return self.store.load(user_id)
+
+    def save(self, user_id, cart):
+        return self.store.save(user_id, cart)
+
+    def delete(self, user_id):
+        return self.store.delete(user_id)
+
+    def transaction(self, user_id):
+        return self.store.transaction(user_id)
+
+    def persist(self, user_id, cart):
+        return self.store.persist(user_id, cart)
+
+    def purge_expired(self):
+        return self.store.purge_expired()
+
+    def stats(self):
+        return self.store.stats()
+
+
+cart_storage = CartStorage()
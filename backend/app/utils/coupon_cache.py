@@ -0,0 +1,166 @@
+"""
+Process-local cache of compiled coupons.
+
+Every coupon interaction starts by looking a coupon up by its code. The cache
+keeps the compiled `CouponRules` of recently used codes for a short TTL, so the
+cart path (totals on every cart mutation, apply-coupon, checkout) does not
+select the coupon row again and again.
+
+Usage counters are never served from the cache: cached entries carry
+`current_uses=None`, and callers that check the usage rule ask for
+`with_usage=True`, which reads `current_uses`/`reserved_uses`/`max_uses` by
+primary key. Admin writes invalidate the code in this process; other workers
+pick the change up when their entry expires, so the TTL bounds how stale a
+coupon can be there.
+"""
+
+from collections import OrderedDict
+from dataclasses import replace
+from flask import current_app
+from app import db
+from app.models import Coupon
+from app.utils.coupon_rules import compile_coupon
+import threading
+import time
+
+DEFAULT_COUPON_CACHE_TTL_SECONDS = 60
+DEFAULT_MAX_COUPONS_CACHED = 10000
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+class CouponCache:
+    """Coupon-by-code cache with TTL expiry and an LRU bound.
+
+    A `ttl` of 0 disables caching; every lookup then goes to the database.
+    """
+
+    def __init__(self, ttl=DEFAULT_COUPON_CACHE_TTL_SECONDS, max_entries=DEFAULT_MAX_COUPONS_CACHED):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # code -> (expires_at, rules), least recently used first
+        self._entries = OrderedDict()
+        self._mutex = threading.Lock()
+        # Bumped by every invalidation so a lookup that raced with an admin
+        # write does not store what it read before the write
+        self._generation = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+
+    def get(self, code, with_usage=False):
+        """Compiled rules of the coupon with this code, or None.
+
+        With `with_usage` the usage counters are read from the database;
+        otherwise `current_uses` is None and the usage rule must not be
+        evaluated on the result.
+        """
+        code = normalize_code(code)
+        if not code:
+            return None
+
+        rules, generation = self._read(code)
+        if rules is None:
+            coupon = Coupon.query.filter_by(code=code).first()
+            if coupon is None:
+                return None
+            rules = compile_coupon(coupon)
+            self._store(code, replace(rules, current_uses=None), generation)
+            return rules if with_usage else replace(rules, current_uses=None)
+
+        if with_usage:
+            row = db.session.query(Coupon.current_uses, Coupon.reserved_uses, Coupon.max_uses).filter(
+                Coupon.id == rules.id
+            ).first()
+            if row is None:
+                # Deleted by another worker
+                self.invalidate(code)
+                return None
+            rules = replace(rules, current_uses=row.current_uses or 0, reserved_uses=row.reserved_uses or 0,
+                            max_uses=row.max_uses or 0)
+        return rules
+
+    def invalidate(self, *codes):
+        """Drop the given codes (all codes if none are given)"""
+        with self._mutex:
+            self._generation += 1
+            if not codes:
+                self._stats['invalidations'] += len(self._entries)
+                self._entries.clear()
+                return
+            for code in codes:
+                if self._entries.pop(normalize_code(code), None) is not None:
+                    self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._mutex:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _read(self, code):
+        now = time.time()
+        with self._mutex:
+            entry = self._entries.get(code)
+            if entry is not None and entry[0] <= now:
+                del self._entries[code]
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None, self._generation
+            self._entries.move_to_end(code)
+            self._stats['hits'] += 1
+            return entry[1], self._generation
+
+    def _store(self, code, rules, generation):
+        if self.ttl <= 0:
+            return
+        with self._mutex:
+            if generation != self._generation:
+                return
+            self._entries[code] = (time.time() + self.ttl, rules)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+
+class CouponCacheExtension:
+    """Flask extension holding the coupon cache of the current app"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['coupon_cache'] = CouponCache(
+            ttl=int(app.config.get('COUPON_CACHE_TTL_SECONDS', DEFAULT_COUPON_CACHE_TTL_SECONDS)),
+            max_entries=int(app.config.get('COUPON_CACHE_MAX_ENTRIES', DEFAULT_MAX_COUPONS_CACHED))
+        )
+
+    @property
+    def cache(self):
+        return current_app.extensions['coupon_cache']
+
+    def get(self, code, with_usage=False):
+        return self.cache.get(code, with_usage=with_usage)
+
+    def invalidate(self, *codes):
+        return self.cache.invalidate(*codes)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+coupon_cache = CouponCacheExtension()
@@ -0,0 +1,79 @@
+"""
+Coupon to product category mapping.
+
+Category restrictions live in the `coupon_categories` table, one row per
+(coupon, category), indexed by category. `Coupon.applicable_categories` is
+kept as the JSON view of the same list: ORM writes to it update the rows
+through `sync_category_links`, and `sync_coupon_categories()` rebuilds the
+rows from the JSON for Core bulk inserts and the backfill migration.
+
+A coupon without rows is unrestricted; a restricted coupon applies to a cart
+when one of its categories is among the cart's categories.
+"""
+
+from sqlalchemy import select, exists, delete, insert
+from app import db
+from app.models import Coupon, CouponCategory
+from app.models.coupon import parse_categories
+
+SYNC_BATCH_SIZE = 1000
+
+
+def category_filter(categories):
+    """SQL condition: the coupon is unrestricted or applies to one of `categories`"""
+    restricted = exists().where(CouponCategory.coupon_id == Coupon.id)
+    categories = sorted(set(categories))
+    if not categories:
+        return ~restricted
+    applicable = exists().where(
+        CouponCategory.coupon_id == Coupon.id,
+        CouponCategory.category.in_(categories)
+    )
+    return db.or_(~restricted, applicable)
+
+
+def coupons_for_categories(categories, include_unrestricted=True):
+    """Query of the coupons applicable to a cart with these categories"""
+    if include_unrestricted:
+        return Coupon.query.filter(category_filter(categories))
+    categories = sorted(set(categories))
+    return Coupon.query.filter(Coupon.id.in_(
+        select(CouponCategory.coupon_id).where(CouponCategory.category.in_(categories))
+    ))
+
+
+def insert_category_links(coupon_categories):
+    """Insert rows for {coupon_id: categories}, part of the caller's transaction"""
+    rows = [{'coupon_id': coupon_id, 'category': category}
+            for coupon_id, categories in coupon_categories.items()
+            for category in categories]
+    if rows:
+        db.session.execute(insert(CouponCategory), rows)
+    return len(rows)
+
+
+def sync_coupon_categories(coupon_ids=None):
+    """Rebuild the category rows from the JSON column, returns the rows written.
+
+    Covers all coupons unless `coupon_ids` is given; commits per batch.
+    """
+    query = select(Coupon.id, Coupon.applicable_categories).order_by(Coupon.id)
+    if coupon_ids is not None:
+        query = query.where(Coupon.id.in_(list(coupon_ids)))
+
+    written = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(query.where(Coupon.id > last_id).limit(SYNC_BATCH_SIZE)).all()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        db.session.execute(
+            delete(CouponCategory)
+            .where(CouponCategory.coupon_id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        written += insert_category_links({row.id: parse_categories(row.applicable_categories) for row in rows})
+        db.session.commit()
+        last_id = ids[-1]
+    return written
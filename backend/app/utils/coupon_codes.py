@@ -0,0 +1,210 @@
+"""
+Bulk generation of unique coupon codes.
+
+A `BulkCodeJob` mints `count` single-use coupons from a template coupon.
+Candidate codes are drawn from a configurable alphabet, length and prefix and
+checked for uniqueness without a query per code: an in-memory set catches
+duplicates within the job and a Bloom filter, built once from the existing
+codes that share the prefix, catches clashes with the database (a false
+positive only costs one extra candidate). Coupons are inserted in chunks with
+one multi-row INSERT and one commit per chunk; a chunk that still hits the
+unique constraint (a code created concurrently) is re-checked with a single
+IN query and refilled.
+"""
+
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Coupon
+from app.models.coupon import parse_categories
+from app.utils.coupon_categories import insert_category_links
+from app.utils.coupon_lifecycle import coupon_lifecycle
+import datetime
+import hashlib
+import math
+import secrets
+import time
+
+# Upper-case letters and digits without the easily confused 0/O and 1/I
+DEFAULT_CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+DEFAULT_CODE_LENGTH = 10
+DEFAULT_CHUNK_SIZE = 5000
+
+# The code space must be this many times larger than the requested count,
+# so random candidates rarely collide
+MIN_SPACE_FACTOR = 20
+
+
+class CodeGenerationError(ValueError):
+    """Raised for generation parameters that cannot produce the requested codes"""
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(int(capacity), 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class CodeGenerator:
+    """Random codes of `prefix` + `length` characters from `alphabet`"""
+
+    def __init__(self, alphabet=DEFAULT_CODE_ALPHABET, length=DEFAULT_CODE_LENGTH, prefix='', validator=None):
+        # Codes are looked up upper-cased, so only upper-case codes can be redeemed
+        self.alphabet = ''.join(sorted(set((alphabet or '').upper())))
+        self.length = int(length)
+        self.prefix = (prefix or '').strip().upper()
+
+        if len(self.alphabet) < 2:
+            raise CodeGenerationError('Alphabet must contain at least 2 distinct characters')
+        if self.length < 1:
+            raise CodeGenerationError('Length must be at least 1')
+        if validator and not all(validator(self.prefix + char * self.length) for char in self.alphabet):
+            raise CodeGenerationError('Alphabet, length and prefix do not produce valid coupon codes')
+
+    @property
+    def space(self):
+        return len(self.alphabet) ** self.length
+
+    def generate(self):
+        return self.prefix + ''.join(secrets.choice(self.alphabet) for _ in range(self.length))
+
+
+class BulkCodeJob:
+    """Mint `count` unique single-use coupons copied from `template`.
+
+    Iterating `run()` yields the codes of each committed chunk; `stats` holds
+    the counters and the generation rate once the job has finished.
+    """
+
+    def __init__(self, template, count, generator, created_by, max_uses=1, chunk_size=DEFAULT_CHUNK_SIZE):
+        if count < 1:
+            raise CodeGenerationError('Count must be at least 1')
+        if generator.space < count * MIN_SPACE_FACTOR:
+            raise CodeGenerationError(
+                f'{count} codes need a larger code space; increase the length or the alphabet'
+            )
+        # Copied up front: the template instance expires at every chunk commit
+        self.template_values = {
+            'title': template.title,
+            'description': template.description,
+            'discount_type': template.discount_type,
+            'discount_value': template.discount_value,
+            'start_date': template.start_date,
+            'end_date': template.end_date,
+            'minimum_order_value': template.minimum_order_value,
+            'applicable_categories': template.applicable_categories,
+            'maximum_discount_amount': template.maximum_discount_amount,
+            'first_time_user_only': template.first_time_user_only
+        }
+        self.categories = parse_categories(template.applicable_categories)
+        self.count = count
+        self.generator = generator
+        self.created_by = created_by
+        self.max_uses = max_uses
+        self.chunk_size = max(int(chunk_size), 1)
+        self.seen = set()
+        self.existing = None
+        self.stats = {
+            'requested': count,
+            'generated': 0,
+            'duplicates': 0,
+            'bloom_rejections': 0,
+            'conflicts': 0,
+            'chunks': 0,
+            'elapsed_seconds': 0.0,
+            'codes_per_second': 0.0
+        }
+
+    def load_existing(self):
+        """Build the Bloom filter from the existing codes that share the prefix"""
+        query = db.session.query(Coupon.code)
+        if self.generator.prefix:
+            query = query.filter(Coupon.code.startswith(self.generator.prefix, autoescape=True))
+        existing_count = query.count()
+        self.existing = BloomFilter(existing_count + self.count)
+        for (code,) in query.yield_per(10000):
+            self.existing.add(code.upper())
+
+    def next_code(self):
+        while True:
+            code = self.generator.generate()
+            if code in self.seen:
+                self.stats['duplicates'] += 1
+                continue
+            self.seen.add(code)
+            if code in self.existing:
+                self.stats['bloom_rejections'] += 1
+                continue
+            return code
+
+    def coupon_row(self, code, now):
+        return dict(
+            self.template_values,
+            code=code,
+            is_public=False,
+            max_uses=self.max_uses,
+            current_uses=0,
+            created_by=self.created_by,
+            is_active=True,
+            created_at=now,
+            updated_at=now
+        )
+
+    def insert_chunk(self, codes):
+        """Insert one chunk, replacing codes that turn out to exist already"""
+        while True:
+            now = datetime.datetime.utcnow()
+            try:
+                rows = [self.coupon_row(code, now) for code in codes]
+                if self.categories:
+                    # Category restrictions go to the category index too
+                    coupon_ids = db.session.execute(db.insert(Coupon).returning(Coupon.id), rows).scalars().all()
+                    insert_category_links({coupon_id: self.categories for coupon_id in coupon_ids})
+                else:
+                    db.session.execute(db.insert(Coupon), rows)
+                db.session.commit()
+                return codes
+            except IntegrityError:
+                db.session.rollback()
+                taken = {row[0] for row in db.session.query(Coupon.code).filter(Coupon.code.in_(codes)).all()}
+                if not taken:
+                    raise
+                self.stats['conflicts'] += len(taken)
+                codes = [code for code in codes if code not in taken] + [self.next_code() for _ in taken]
+
+    def run(self):
+        start = time.perf_counter()
+        if self.existing is None:
+            self.load_existing()
+
+        remaining = self.count
+        while remaining > 0:
+            codes = [self.next_code() for _ in range(min(self.chunk_size, remaining))]
+            codes = self.insert_chunk(codes)
+            remaining -= len(codes)
+            self.stats['generated'] += len(codes)
+            self.stats['chunks'] += 1
+            yield codes
+
+        # Every minted coupon shares the template's window
+        coupon_lifecycle.schedule(self.template_values['start_date'], self.template_values['end_date'])
+
+        elapsed = time.perf_counter() - start
+        self.stats['elapsed_seconds'] = round(elapsed, 3)
+        self.stats['codes_per_second'] = round(self.stats['generated'] / elapsed, 1) if elapsed else 0.0
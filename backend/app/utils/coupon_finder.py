@@ -0,0 +1,100 @@
+"""
+Best-coupon finder.
+
+Ranks every public, live coupon a user may still redeem by the discount it
+would give a cart. The work is pushed into the database: the WHERE clause
+prunes on the `ix_coupons_live` index (lifecycle_state, is_public,
+is_active, end_date), held uses, the minimum-order and first-time rules, the
+user's redeemed set and the `coupon_categories` index, and the discount
+itself, including the `maximum_discount_amount` cap, is computed by a CASE
+expression the rows are ordered by. Only the best rows come back, as plain column tuples; they are
+then confirmed with the rule engine.
+"""
+
+from app import db
+from app.models import Coupon
+from app.models.coupon import COUPON_ACTIVE
+from app.utils.coupon_rules import compile_coupon, CART_RULES, NO_USER_FACTS
+from app.utils.coupon_categories import category_filter
+from app.utils.coupon_lifecycle import lifecycle_state_filter
+from app.utils.redeemed_coupons import not_redeemed_by
+import datetime
+
+# Columns loaded per candidate: everything compile_coupon() reads
+CANDIDATE_COLUMNS = (
+    Coupon.id, Coupon.code, Coupon.title, Coupon.description, Coupon.discount_type,
+    Coupon.discount_value, Coupon.is_active, Coupon.is_public, Coupon.start_date,
+    Coupon.end_date, Coupon.max_uses, Coupon.current_uses, Coupon.reserved_uses,
+    Coupon.minimum_order_value, Coupon.applicable_categories, Coupon.maximum_discount_amount,
+    Coupon.first_time_user_only
+)
+
+
+def discount_expression(subtotal):
+    """SQL expression of the discount a coupon gives an order of `subtotal`"""
+    percentage = Coupon.discount_value * subtotal / 100
+    capped = db.case(
+        (db.and_(Coupon.maximum_discount_amount > 0, Coupon.maximum_discount_amount < percentage),
+         Coupon.maximum_discount_amount),
+        else_=percentage
+    )
+    fixed = db.case((Coupon.discount_value < subtotal, Coupon.discount_value), else_=subtotal)
+    return db.case(
+        (Coupon.discount_type == 'percentage', capped),
+        (Coupon.discount_type == 'fixed', fixed),
+        else_=0
+    )
+
+
+def candidate_query(subtotal, categories=(), facts=NO_USER_FACTS, now=None):
+    """Query of (columns..., discount) for the coupons that can apply, best first"""
+    now = now or datetime.datetime.utcnow()
+    discount = discount_expression(subtotal).label('discount')
+
+    query = db.session.query(*CANDIDATE_COLUMNS, discount).filter(
+        Coupon.is_public == True,
+        Coupon.is_active == True,
+        lifecycle_state_filter((COUPON_ACTIVE,), now),
+        Coupon.current_uses + Coupon.reserved_uses < Coupon.max_uses,
+        db.or_(Coupon.minimum_order_value == None, Coupon.minimum_order_value <= subtotal)
+    )
+
+    if facts.user_id is not None:
+        # Facts built without a user are still checked by the not_redeemed rule
+        query = query.filter(not_redeemed_by(facts.user_id))
+    if facts.redemption_count > 0:
+        query = query.filter(db.or_(Coupon.first_time_user_only == False,
+                                    Coupon.first_time_user_only == None))
+
+    # Unrestricted coupons and those restricted to one of the cart's
+    # categories, from the category index
+    query = query.filter(category_filter(categories))
+
+    return query.order_by(discount.desc(), Coupon.end_date.asc(), Coupon.id.asc())
+
+
+def find_best_coupons(subtotal, categories=(), facts=NO_USER_FACTS, limit=10, now=None):
+    """The `limit` best coupons for a cart as (CouponRules, discount_amount) pairs, best first"""
+    now = now or datetime.datetime.utcnow()
+    categories = frozenset(categories)
+    if subtotal <= 0 or limit <= 0:
+        return []
+
+    query = candidate_query(subtotal, categories, facts, now)
+    batch_size = max(limit * 2, 20)
+    results = []
+    offset = 0
+    while len(results) < limit:
+        rows = query.offset(offset).limit(batch_size).all()
+        for row in rows:
+            rules = compile_coupon(row)
+            evaluation = rules.evaluate(subtotal, categories=categories, facts=facts, now=now, rules=CART_RULES)
+            if evaluation.ok and evaluation.discount_amount > 0:
+                results.append((rules, evaluation.discount_amount))
+        if len(rows) < batch_size:
+            break
+        offset += batch_size
+
+    # The SQL order is by unrounded discount; keep ties stable after rounding
+    results.sort(key=lambda result: -result[1])
+    return results[:limit]
@@ -0,0 +1,285 @@
+"""
+Coupon lifecycle states and their scheduler.
+
+Every coupon carries an indexed `lifecycle_state`: scheduled (before its
+start date), active, exhausted (every use taken) or expired (past its end
+date). Listings then select live coupons with `lifecycle_state = 'active'`
+instead of comparing dates and counters on every row.
+
+Usage flips (active -> exhausted) are written by the conditional UPDATE that
+claims the last use; coupons edited through the ORM get their state
+recomputed. Time flips happen at the window boundaries: the
+scheduler keeps the start and end instants of the coming horizon in a
+min-heap, and once the earliest is due it advances every due coupon with two
+set-based UPDATEs on the state index. The heap only says *when* to look, so a
+stale or duplicate entry costs one cheap no-op UPDATE. Transitions are passed
+to hooks; the coupon cache drops the affected codes.
+
+Only the background thread (COUPON_LIFECYCLE_SCHEDULER) advances the heap and
+writes transitions, waking at each boundary instant. Reads never write: they
+select with `lifecycle_state_filter()`, an equality on the stored state (on
+`ix_coupons_live`) with a single re-check, that a coupon still marked live has
+not ended, so an ended coupon is never offered before the scheduler gets to
+it. A coupon whose start just passed shows up as active once the scheduler
+has written it. Boundaries created by other processes are picked up at the
+next horizon reload.
+"""
+
+from sqlalchemy import select, update, event
+from flask import current_app, has_app_context
+from app import db
+from app.models import Coupon
+from app.models.coupon import COUPON_SCHEDULED, COUPON_ACTIVE, COUPON_EXHAUSTED, COUPON_EXPIRED
+from app.utils.coupon_cache import coupon_cache
+import datetime
+import heapq
+import threading
+
+DEFAULT_LIFECYCLE_HORIZON_SECONDS = 300
+
+# States a coupon can still leave because of time
+LIVE_STATES = (COUPON_SCHEDULED, COUPON_ACTIVE, COUPON_EXHAUSTED)
+
+# A coupon is valid through its end_date and expired right after it
+END_OF_WINDOW = datetime.timedelta(microseconds=1)
+
+
+def lifecycle_state_expression(now):
+    """SQL CASE computing a coupon's state, mirroring compute_lifecycle_state()"""
+    return db.case(
+        (Coupon.end_date < now, COUPON_EXPIRED),
+        (Coupon.start_date > now, COUPON_SCHEDULED),
+        (db.func.coalesce(Coupon.current_uses, 0) >= db.func.coalesce(Coupon.max_uses, 1), COUPON_EXHAUSTED),
+        else_=COUPON_ACTIVE
+    )
+
+
+def lifecycle_state_filter(states, now):
+    """Coupons whose stored state is one of `states`.
+
+    Filtering on live states also drops coupons whose end date has passed but
+    that the scheduler has not expired yet.
+    """
+    clause = Coupon.lifecycle_state == states[0] if len(states) == 1 else Coupon.lifecycle_state.in_(states)
+    if set(states) <= set(LIVE_STATES):
+        clause = db.and_(clause, db.or_(Coupon.end_date == None, Coupon.end_date >= now))
+    return clause
+
+
+def claimed_use_state():
+    """New state for an UPDATE that takes one use: the last use exhausts the coupon"""
+    return db.case(
+        (db.and_(Coupon.lifecycle_state == COUPON_ACTIVE, Coupon.current_uses + 1 >= Coupon.max_uses),
+         COUPON_EXHAUSTED),
+        else_=Coupon.lifecycle_state
+    )
+
+
+def refresh_lifecycle_states(now=None):
+    """Recompute the state of every coupon, returns how many changed. Commits."""
+    now = now or datetime.datetime.utcnow()
+    expression = lifecycle_state_expression(now)
+    result = db.session.execute(
+        update(Coupon)
+        .where(db.or_(Coupon.lifecycle_state == None, Coupon.lifecycle_state != expression))
+        .values(lifecycle_state=expression)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+class CouponLifecycle:
+    """Min-heap of upcoming window boundaries and the transitions they trigger"""
+
+    def __init__(self, horizon=DEFAULT_LIFECYCLE_HORIZON_SECONDS):
+        self.horizon = datetime.timedelta(seconds=horizon)
+        self.hooks = []
+        self._heap = []
+        self._queued = set()
+        self._loaded_until = None
+        self._condition = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self._stats = {'reloads': 0, 'advances': 0, 'transitions': 0}
+
+    def schedule(self, start_date=None, end_date=None):
+        """Queue the boundaries of a coupon's window that fall in the loaded horizon"""
+        with self._condition:
+            if self._loaded_until is None:
+                return
+            for instant in (start_date, end_date + END_OF_WINDOW if end_date else None):
+                if instant and instant <= self._loaded_until and instant not in self._queued:
+                    heapq.heappush(self._heap, instant)
+                    self._queued.add(instant)
+            self._condition.notify()
+
+    def next_wakeup(self):
+        with self._condition:
+            return self._next_wakeup()
+
+    def _next_wakeup(self):
+        if self._loaded_until is None:
+            return None
+        return min(self._heap[0], self._loaded_until) if self._heap else self._loaded_until
+
+    def advance_due(self, now=None):
+        """Apply the transitions that are due, returns them (usually none)"""
+        now = now or datetime.datetime.utcnow()
+        with self._condition:
+            reload = self._loaded_until is None or now >= self._loaded_until
+            due = reload
+            while self._heap and self._heap[0] <= now:
+                self._queued.discard(heapq.heappop(self._heap))
+                due = True
+        if not due:
+            return []
+
+        transitions = self.advance(now)
+        if reload:
+            self.reload(now)
+        return transitions
+
+    def advance(self, now):
+        """Expire and activate every coupon whose boundary has passed. Commits."""
+        expired = db.session.execute(
+            update(Coupon)
+            .where(Coupon.lifecycle_state.in_(LIVE_STATES), Coupon.end_date < now)
+            .values(lifecycle_state=COUPON_EXPIRED)
+            .returning(Coupon.id, Coupon.code, Coupon.lifecycle_state)
+            .execution_options(synchronize_session=False)
+        ).all()
+        activated = db.session.execute(
+            update(Coupon)
+            .where(Coupon.lifecycle_state == COUPON_SCHEDULED, Coupon.start_date <= now)
+            .values(lifecycle_state=lifecycle_state_expression(now))
+            .returning(Coupon.id, Coupon.code, Coupon.lifecycle_state)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.commit()
+
+        transitions = [(row.id, row.code, row.lifecycle_state) for row in expired + activated]
+        with self._condition:
+            self._stats['advances'] += 1
+            self._stats['transitions'] += len(transitions)
+        if transitions:
+            for hook in self.hooks:
+                hook(transitions)
+        return transitions
+
+    def reload(self, now):
+        """Load the boundaries of the next horizon from the state index"""
+        horizon_end = now + self.horizon
+        starts = db.session.execute(
+            select(Coupon.start_date).where(
+                Coupon.lifecycle_state == COUPON_SCHEDULED,
+                Coupon.start_date <= horizon_end
+            ).distinct()
+        ).scalars().all()
+        ends = db.session.execute(
+            select(Coupon.end_date).where(
+                Coupon.lifecycle_state.in_(LIVE_STATES),
+                Coupon.end_date <= horizon_end
+            ).distinct()
+        ).scalars().all()
+
+        instants = set(starts) | {end_date + END_OF_WINDOW for end_date in ends}
+        with self._condition:
+            # Keep what was scheduled while the queries ran
+            instants.update(instant for instant in self._heap if instant <= horizon_end)
+            self._queued = instants
+            self._heap = list(instants)
+            heapq.heapify(self._heap)
+            self._loaded_until = horizon_end
+            self._stats['reloads'] += 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._heap)
+            stats['loaded_until'] = self._loaded_until.isoformat() if self._loaded_until else None
+        stats['horizon_seconds'] = int(self.horizon.total_seconds())
+        return stats
+
+    def start(self, app):
+        """Advance transitions from a background thread, on time"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(app,),
+                                            name='coupon-lifecycle-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stop = True
+            self._condition.notify()
+
+    def _run(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    transitions = self.advance_due()
+                    if transitions:
+                        app.logger.info(f'Coupon lifecycle: {len(transitions)} transitions')
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f'Coupon lifecycle scheduler failed: {str(e)}')
+                finally:
+                    db.session.remove()
+
+            with self._condition:
+                if self._stop:
+                    return
+                wakeup = self._next_wakeup()
+                timeout = (wakeup - datetime.datetime.utcnow()).total_seconds() if wakeup else 1.0
+                self._condition.wait(min(max(timeout, 0.001), self.horizon.total_seconds()))
+                if self._stop:
+                    return
+
+
+def invalidate_transitioned(transitions):
+    coupon_cache.invalidate(*[code for _, code, _ in transitions])
+
+
+class CouponLifecycleExtension:
+    """Flask extension holding the lifecycle scheduler of the current app"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        lifecycle = CouponLifecycle(
+            horizon=int(app.config.get('COUPON_LIFECYCLE_HORIZON_SECONDS', DEFAULT_LIFECYCLE_HORIZON_SECONDS))
+        )
+        lifecycle.hooks.append(invalidate_transitioned)
+        app.extensions['coupon_lifecycle'] = lifecycle
+        if app.config.get('COUPON_LIFECYCLE_SCHEDULER'):
+            lifecycle.start(app)
+
+    @property
+    def lifecycle(self):
+        return current_app.extensions['coupon_lifecycle']
+
+    def advance_due(self, now=None):
+        return self.lifecycle.advance_due(now)
+
+    def schedule(self, start_date=None, end_date=None):
+        return self.lifecycle.schedule(start_date, end_date)
+
+    def add_hook(self, hook):
+        self.lifecycle.hooks.append(hook)
+
+    def stats(self):
+        return self.lifecycle.stats()
+
+
+coupon_lifecycle = CouponLifecycleExtension()
+
+
+@event.listens_for(Coupon, 'after_insert')
+@event.listens_for(Coupon, 'after_update')
+def schedule_coupon_window(mapper, connection, coupon):
+    """Queue the window of coupons written through the ORM"""
+    if has_app_context() and 'coupon_lifecycle' in current_app.extensions:
+        coupon_lifecycle.schedule(coupon.start_date, coupon.end_date)
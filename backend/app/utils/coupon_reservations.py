@@ -0,0 +1,216 @@
+"""
+Time-limited coupon reservations.
+
+Applying a coupon to a cart holds one of its uses for the user until checkout
+or until the hold expires. Holds are counted in `Coupon.reserved_uses`, so a
+hold is taken with a single conditional increment
+
+    UPDATE coupons SET reserved_uses = reserved_uses + 1
+    WHERE id = :id AND is_active AND current_uses + reserved_uses < max_uses
+
+and `claim_coupon_use()` leaves held uses alone. At checkout the hold is
+converted into a use (`redeem_reservation`); expired holds are given back by
+`sweep_expired_reservations()`, run by the background `ReservationSweeper`,
+the admin sweep endpoint, and on demand when a coupon looks exhausted.
+"""
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from flask import current_app
+from app import db
+from app.models import Coupon, CouponReservation
+from app.utils.coupon_usage import claim_coupon_use
+from app.utils.coupon_lifecycle import claimed_use_state
+import datetime
+import threading
+
+DEFAULT_RESERVATION_TTL_SECONDS = 15 * 60
+
+
+def reservation_ttl():
+    return int(current_app.config.get('COUPON_RESERVATION_TTL_SECONDS', DEFAULT_RESERVATION_TTL_SECONDS))
+
+
+def _release_counts(counts, now):
+    """Give back held uses, `counts` maps coupon_id to the number of holds"""
+    if not counts:
+        return
+    released = db.case(counts, value=Coupon.id)
+    db.session.execute(
+        update(Coupon)
+        .where(Coupon.id.in_(counts.keys()))
+        .values(
+            reserved_uses=db.case((Coupon.reserved_uses > released, Coupon.reserved_uses - released), else_=0),
+            updated_at=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _hold_use(coupon_id, now):
+    result = db.session.execute(
+        update(Coupon)
+        .where(
+            Coupon.id == coupon_id,
+            Coupon.is_active == True,
+            Coupon.current_uses + Coupon.reserved_uses < Coupon.max_uses
+        )
+        .values(reserved_uses=Coupon.reserved_uses + 1, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def reserve_coupon_use(coupon_id, user_id, ttl=None, now=None):
+    """Hold one use of a coupon for a user, returns the hold's expiry or None.
+
+    A user holding the coupon already gets the hold extended. Commits.
+    """
+    now = now or datetime.datetime.utcnow()
+    expires_at = now + datetime.timedelta(seconds=ttl if ttl is not None else reservation_ttl())
+    user_id = int(user_id)
+
+    extended = db.session.execute(
+        update(CouponReservation)
+        .where(CouponReservation.coupon_id == coupon_id, CouponReservation.user_id == user_id)
+        .values(expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    if extended.rowcount == 1:
+        db.session.commit()
+        return expires_at
+
+    held = _hold_use(coupon_id, now)
+    if not held and sweep_expired_reservations(coupon_id=coupon_id, now=now, commit=False):
+        # Expired holds were blocking the coupon; try again
+        held = _hold_use(coupon_id, now)
+    if not held:
+        db.session.commit()
+        return None
+
+    try:
+        db.session.add(CouponReservation(coupon_id=coupon_id, user_id=user_id,
+                                         expires_at=expires_at, created_at=now))
+        db.session.commit()
+    except IntegrityError:
+        # The same user reserved it concurrently; that hold stands
+        db.session.rollback()
+        return db.session.execute(
+            select(CouponReservation.expires_at)
+            .where(CouponReservation.coupon_id == coupon_id, CouponReservation.user_id == user_id)
+        ).scalar()
+    return expires_at
+
+
+def release_reservation(coupon_id, user_id, now=None):
+    """Drop a user's hold on a coupon, returns False if there was none. Commits."""
+    now = now or datetime.datetime.utcnow()
+    result = db.session.execute(
+        delete(CouponReservation)
+        .where(CouponReservation.coupon_id == coupon_id, CouponReservation.user_id == int(user_id))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        _release_counts({coupon_id: result.rowcount}, now)
+    db.session.commit()
+    return bool(result.rowcount)
+
+
+def redeem_reservation(coupon_id, user_id, now=None):
+    """Turn a user's hold into a coupon use, or claim a free use without one.
+
+    Part of the caller's transaction (the checkout): rolling back restores the
+    hold. Returns False if the user held nothing and no use is left.
+    """
+    now = now or datetime.datetime.utcnow()
+    result = db.session.execute(
+        delete(CouponReservation)
+        .where(CouponReservation.coupon_id == coupon_id, CouponReservation.user_id == int(user_id))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return claim_coupon_use(coupon_id, now=now)
+
+    db.session.execute(
+        update(Coupon)
+        .where(Coupon.id == coupon_id)
+        .values(
+            current_uses=Coupon.current_uses + 1,
+            lifecycle_state=claimed_use_state(),
+            reserved_uses=db.case((Coupon.reserved_uses > 0, Coupon.reserved_uses - 1), else_=0),
+            updated_at=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+def sweep_expired_reservations(coupon_id=None, now=None, batch_size=1000, commit=True):
+    """Delete expired holds and give their uses back, returns how many were swept"""
+    now = now or datetime.datetime.utcnow()
+    swept = 0
+    while True:
+        query = select(CouponReservation.id, CouponReservation.coupon_id).where(
+            CouponReservation.expires_at <= now
+        )
+        if coupon_id is not None:
+            query = query.where(CouponReservation.coupon_id == coupon_id)
+        rows = db.session.execute(query.limit(batch_size)).all()
+        if not rows:
+            break
+
+        # Only count the holds this sweep actually deleted
+        deleted = db.session.execute(
+            delete(CouponReservation)
+            .where(CouponReservation.id.in_([row.id for row in rows]), CouponReservation.expires_at <= now)
+            .returning(CouponReservation.coupon_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        counts = {}
+        for (row_coupon_id,) in deleted:
+            counts[row_coupon_id] = counts.get(row_coupon_id, 0) + 1
+        _release_counts(counts, now)
+        swept += len(deleted)
+        if commit:
+            db.session.commit()
+        if len(rows) < batch_size:
+            break
+    return swept
+
+
+class ReservationSweeper:
+    """Background thread sweeping expired reservations every
+    COUPON_RESERVATION_SWEEP_SECONDS (0 or unset disables it)"""
+
+    def __init__(self, app=None):
+        self._thread = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        interval = int(app.config.get('COUPON_RESERVATION_SWEEP_SECONDS', 0) or 0)
+        app.extensions['reservation_sweeper'] = self
+        if interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(app, interval),
+                                            name='coupon-reservation-sweeper', daemon=True)
+            self._thread.start()
+
+    def _run(self, app, interval):
+        while not self._stop.wait(interval):
+            with app.app_context():
+                try:
+                    swept = sweep_expired_reservations()
+                    if swept:
+                        app.logger.info(f'Swept {swept} expired coupon reservations')
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f'Coupon reservation sweep failed: {str(e)}')
+                finally:
+                    db.session.remove()
+
+    def stop(self):
+        self._stop.set()
+
+
+reservation_sweeper = ReservationSweeper()
@@ -0,0 +1,221 @@
+"""
+Coupon rule engine.
+
+A `Coupon` row is compiled once into an immutable `CouponRules` object (dates,
+usage, minimum order, category set, discount cap, first-time flag). Evaluating
+a cart against it is pure Python: the only per-user input is a `UserFacts`
+object that the caller loads (or builds from data it already has).
+
+Every coupon validation path goes through `CouponRules.evaluate()`, choosing
+which rules apply; failures are reported in one fixed order with one wording.
+"""
+
+from dataclasses import dataclass, field
+from app import db
+from app.models import Product
+from app.models.coupon import parse_categories
+from app.utils.redeemed_coupons import get_redeemed_coupon_ids
+import datetime
+
+# Rules in the order they are checked and reported
+ALL_RULES = (
+    'active',
+    'public',
+    'started',
+    'not_expired',
+    'usage',
+    'not_redeemed',
+    'first_time_user',
+    'minimum_order',
+    'categories'
+)
+
+# Rules that only depend on the coupon itself and the current time
+AVAILABILITY_RULES = ('active', 'started', 'not_expired', 'usage')
+
+# Rules a coupon must pass to be applied to a cart
+CART_RULES = AVAILABILITY_RULES + ('not_redeemed', 'first_time_user', 'minimum_order', 'categories')
+
+
+@dataclass(frozen=True)
+class UserFacts:
+    """What the rules need to know about the user redeeming a coupon"""
+    redeemed_coupon_ids: frozenset = field(default_factory=frozenset)
+    redemption_count: int = 0
+    # Set when loaded for a user, so queries can anti-join their redemptions
+    user_id: int = None
+
+
+NO_USER_FACTS = UserFacts()
+
+
+@dataclass(frozen=True)
+class RuleFailure:
+    rule: str
+    message: str
+
+
+@dataclass(frozen=True)
+class CouponEvaluation:
+    failures: tuple
+    discount_amount: float
+
+    @property
+    def ok(self):
+        return not self.failures
+
+    @property
+    def errors(self):
+        return [failure.message for failure in self.failures]
+
+    @property
+    def first_failure(self):
+        return self.failures[0] if self.failures else None
+
+
+@dataclass(frozen=True)
+class CouponRules:
+    id: int
+    code: str
+    title: str
+    description: str
+    discount_type: str
+    discount_value: float
+    is_active: bool
+    is_public: bool
+    start_date: datetime.datetime
+    end_date: datetime.datetime
+    max_uses: int
+    current_uses: int
+    minimum_order_value: float
+    categories: tuple
+    category_set: frozenset
+    maximum_discount_amount: float
+    first_time_user_only: bool
+    # Uses held by coupon reservations, counted against max_uses
+    reserved_uses: int = 0
+
+    def discount_for(self, subtotal):
+        """Discount for an order of `subtotal`, capped and rounded to cents"""
+        if self.discount_type == 'percentage':
+            discount_amount = (subtotal * self.discount_value) / 100
+            # Apply maximum discount cap if set
+            if self.maximum_discount_amount:
+                discount_amount = min(discount_amount, self.maximum_discount_amount)
+        elif self.discount_type == 'fixed':
+            # For fixed discount, don't exceed order amount
+            discount_amount = min(self.discount_value, subtotal)
+        else:
+            discount_amount = 0
+        return round(discount_amount, 2)
+
+    def evaluate(self, subtotal=0, categories=(), facts=NO_USER_FACTS, now=None, rules=ALL_RULES):
+        """Check the given rules against an order, returns a CouponEvaluation"""
+        now = now or datetime.datetime.utcnow()
+        failures = []
+        for rule in ALL_RULES:
+            if rule in rules:
+                message = RULE_CHECKS[rule](self, subtotal, categories, facts, now)
+                if message:
+                    failures.append(RuleFailure(rule, message))
+        return CouponEvaluation(tuple(failures), self.discount_for(subtotal))
+
+
+def _check_active(rules, subtotal, categories, facts, now):
+    if not rules.is_active:
+        return 'Coupon is inactive'
+
+
+def _check_public(rules, subtotal, categories, facts, now):
+    if not rules.is_public:
+        return 'Coupon is not public'
+
+
+def _check_started(rules, subtotal, categories, facts, now):
+    if rules.start_date and rules.start_date > now:
+        return 'Coupon has not started yet'
+
+
+def _check_not_expired(rules, subtotal, categories, facts, now):
+    if rules.end_date and rules.end_date < now:
+        return 'Coupon has expired'
+
+
+def _check_usage(rules, subtotal, categories, facts, now):
+    if rules.current_uses + rules.reserved_uses >= rules.max_uses:
+        return 'Coupon usage limit reached'
+
+
+def _check_not_redeemed(rules, subtotal, categories, facts, now):
+    if rules.id in facts.redeemed_coupon_ids:
+        return 'You have already redeemed this coupon'
+
+
+def _check_first_time_user(rules, subtotal, categories, facts, now):
+    if rules.first_time_user_only and facts.redemption_count > 0:
+        return 'This coupon is only for first-time users'
+
+
+def _check_minimum_order(rules, subtotal, categories, facts, now):
+    if rules.minimum_order_value and subtotal < rules.minimum_order_value:
+        return f'Minimum order value of ${rules.minimum_order_value:.2f} required'
+
+
+def _check_categories(rules, subtotal, categories, facts, now):
+    if rules.category_set and rules.category_set.isdisjoint(categories):
+        return f'Coupon only applies to categories: {", ".join(rules.categories)}'
+
+
+RULE_CHECKS = {
+    'active': _check_active,
+    'public': _check_public,
+    'started': _check_started,
+    'not_expired': _check_not_expired,
+    'usage': _check_usage,
+    'not_redeemed': _check_not_redeemed,
+    'first_time_user': _check_first_time_user,
+    'minimum_order': _check_minimum_order,
+    'categories': _check_categories
+}
+
+
+def compile_coupon(coupon):
+    """Compile a Coupon row into an immutable CouponRules object"""
+    categories = parse_categories(coupon.applicable_categories)
+
+    return CouponRules(
+        id=coupon.id,
+        code=coupon.code,
+        title=coupon.title,
+        description=coupon.description,
+        discount_type=coupon.discount_type,
+        discount_value=float(coupon.discount_value or 0),
+        is_active=bool(coupon.is_active),
+        is_public=bool(coupon.is_public),
+        start_date=coupon.start_date,
+        end_date=coupon.end_date,
+        max_uses=coupon.max_uses or 0,
+        current_uses=coupon.current_uses or 0,
+        minimum_order_value=float(coupon.minimum_order_value or 0),
+        categories=categories,
+        category_set=frozenset(categories),
+        maximum_discount_amount=float(coupon.maximum_discount_amount) if coupon.maximum_discount_amount else None,
+        first_time_user_only=bool(coupon.first_time_user_only),
+        reserved_uses=coupon.reserved_uses or 0
+    )
+
+
+def get_user_facts(user_id):
+    """Load the redemption facts of a user from the redeemed-coupon index"""
+    coupon_ids = get_redeemed_coupon_ids(user_id)
+    return UserFacts(redeemed_coupon_ids=coupon_ids, redemption_count=len(coupon_ids), user_id=int(user_id))
+
+
+def get_cart_categories(product_ids):
+    """Categories of the given products, in one query"""
+    if not product_ids:
+        return frozenset()
+    rows = db.session.query(Product.category).filter(
+        Product.id.in_(set(product_ids))
+    ).distinct().all()
+    return frozenset(row[0] for row in rows)
@@ -0,0 +1,42 @@
+"""
+Race-free coupon usage counting.
+
+A coupon use is claimed with a single conditional increment
+
+    UPDATE coupons SET current_uses = current_uses + 1
+    WHERE id = :id AND is_active AND current_uses < max_uses
+
+so `max_uses` can never be exceeded, no matter how many requests redeem the
+same coupon at once, and the coupon row is only locked for the duration of
+that one statement. Every redemption path must claim through this module
+instead of incrementing `Coupon.current_uses` on a loaded object.
+"""
+
+from app import db
+from app.models import Coupon
+from app.utils.coupon_lifecycle import claimed_use_state
+import datetime
+
+
+def claim_coupon_use(coupon_id, now=None):
+    """Claim one use of a coupon, returns False if none is left.
+
+    The claim is part of the caller's transaction: rolling back releases it.
+    """
+    result = db.session.execute(
+        db.update(Coupon)
+        .where(
+            Coupon.id == coupon_id,
+            Coupon.is_active == True,
+            # Uses held by other users' reservations are not available
+            Coupon.current_uses + Coupon.reserved_uses < Coupon.max_uses
+        )
+        .values(
+            current_uses=Coupon.current_uses + 1,
+            lifecycle_state=claimed_use_state(),
+            updated_at=now or datetime.datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
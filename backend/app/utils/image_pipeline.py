@@ -0,0 +1,405 @@
+"""
+Product image uploads: content-addressed storage and pre-sized variants.
+
+An upload is streamed to a private staging file while its SHA-256 is
+computed, and stored under its digest:
+
+    <UPLOAD_DIR>/images/<first 2 hex>/<sha256>/original.<ext>
+                                               thumbnail.webp   (160px)
+                                               medium.webp      (600px)
+
+so identical images share one directory and a duplicate upload costs a hash
+and nothing else. The type is taken from the file's magic bytes, not from
+the client's file name, and nothing is ever overwritten with other content.
+With Pillow installed the staged file must also decode before the upload is
+accepted, so corrupt or truncated files are rejected with the request.
+
+Decoding and resizing happen in a thread pool (IMAGE_PIPELINE_WORKERS) off
+the request thread; concurrent uploads of the same image share one job. The
+worker re-encodes the original and the variants without EXIF/XMP metadata
+(orientation is applied first) and only then moves them into the public
+directory, so the raw upload is never served. `medium` is written last and
+marks a finished image. A product only gets the variant URL once its image is
+finished; if processing fails, products already pointing at it fall back to
+the original, or to no image when not even the original was published.
+
+Pillow is optional: without it the pipeline publishes the original as
+uploaded and no variants, and product URLs point at the original.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from sqlalchemy import update
+from app import db
+from app.models.product import Product, image_url_for
+from app.utils.product_cache import bump_catalog_version
+import datetime
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Resizing and metadata stripping need Pillow
+    Image = None
+
+DEFAULT_IMAGE_PIPELINE_WORKERS = 2
+DEFAULT_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+# Variant name -> longest side in pixels; the last one marks a finished image
+VARIANTS = (('thumbnail', 160), ('medium', 600))
+VARIANT_FORMAT = 'webp'
+VARIANT_QUALITY = 82
+
+# Magic bytes -> stored extension
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+_SAVE_FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'gif': 'GIF', 'webp': 'WEBP'}
+
+_READ_SIZE = 64 * 1024
+
+
+class InvalidImageError(ValueError):
+    """Raised for an upload that is not a supported image or is too large"""
+
+
+def sniff_image_type(head):
+    """Extension of the image whose first bytes are `head`, or None"""
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def verify_image(path):
+    """Raise InvalidImageError unless Pillow can decode the file at `path`"""
+    if Image is None:
+        return
+    try:
+        with Image.open(path) as image:
+            image.verify()
+        with Image.open(path) as image:
+            if image.format != 'PNG':
+                # verify() checks PNG chunks only; decoding at a reduced size
+                # catches truncated JPEG/GIF/WebP data cheaply
+                image.draft('RGB', (VARIANTS[0][1], VARIANTS[0][1]))
+                image.load()
+    except Exception:
+        raise InvalidImageError('Image file is corrupt or truncated')
+
+
+def upload_dir():
+    """Directory served under /uploads"""
+    configured = current_app.config.get('UPLOAD_DIR')
+    if configured:
+        return configured
+    project_root = os.path.abspath(os.path.join(current_app.root_path, '..', '..'))
+    return os.path.join(project_root, 'frontend', 'public', 'uploads')
+
+
+def image_dir(root, digest):
+    return os.path.join(root, 'images', digest[:2], digest)
+
+
+def _write_atomic(directory, name, save):
+    """Write a file with `save(path)` under a temporary name, then rename it"""
+    temp_path = os.path.join(directory, f'.{name}.{uuid.uuid4().hex}.tmp')
+    try:
+        save(temp_path)
+        os.replace(temp_path, os.path.join(directory, name))
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def process_image(staged_path, target_dir, ext):
+    """Publish a staged upload: the original without metadata, then the variants"""
+    os.makedirs(target_dir, exist_ok=True)
+    original_name = f'original.{ext}'
+
+    if Image is None:
+        _write_atomic(target_dir, original_name, lambda path: shutil.copyfile(staged_path, path))
+        return
+
+    with Image.open(staged_path) as image:
+        if getattr(image, 'is_animated', False):
+            # Re-encoding would drop the animation; GIF/WebP frames carry no EXIF
+            _write_atomic(target_dir, original_name, lambda path: shutil.copyfile(staged_path, path))
+            image.seek(0)
+            frame = image.convert('RGBA')
+        else:
+            frame = ImageOps.exif_transpose(image)
+            # Saving without exif=/xmp= drops the metadata; keep the color profile
+            options = {'icc_profile': image.info.get('icc_profile')} if image.info.get('icc_profile') else {}
+            if ext == 'jpg':
+                options['quality'] = 95
+                if frame.mode not in ('RGB', 'L', 'CMYK'):
+                    frame = frame.convert('RGB')
+            _write_atomic(target_dir, original_name,
+                          lambda path: frame.save(path, format=_SAVE_FORMATS[ext], **options))
+
+        for name, size in VARIANTS:
+            variant = frame.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            if variant.mode not in ('RGB', 'RGBA'):
+                transparent = 'A' in variant.getbands() or 'transparency' in variant.info
+                variant = variant.convert('RGBA' if transparent else 'RGB')
+            _write_atomic(target_dir, f'{name}.{VARIANT_FORMAT}',
+                          lambda path: variant.save(path, format=VARIANT_FORMAT.upper(), quality=VARIANT_QUALITY))
+
+
+class StoredImage:
+    """Result of an upload: the digest, its URLs and whether processing is pending"""
+
+    def __init__(self, digest, ext, duplicate, future=None):
+        self.digest = digest
+        self.ext = ext
+        self.duplicate = duplicate
+        self.future = future
+
+    @property
+    def ready(self):
+        return self.future is None or self.future.done()
+
+    @property
+    def image_url(self):
+        """URL to record on Product.image_url"""
+        return image_url_for(self.digest, self.ext, variants=Image is not None)
+
+    @property
+    def original_url(self):
+        return f'/uploads/images/{self.digest[:2]}/{self.digest}/original.{self.ext}'
+
+    def original_path(self, root):
+        return os.path.join(image_dir(root, self.digest), f'original.{self.ext}')
+
+    def to_dict(self):
+        return {
+            'digest': self.digest,
+            'image_url': self.image_url,
+            'original_url': self.original_url,
+            'duplicate': self.duplicate,
+            'status': 'ready' if self.ready else 'processing'
+        }
+
+
+class ImagePipeline:
+    """Content-addressed image store with a worker pool producing the variants"""
+
+    def __init__(self, root, staging_dir, workers=DEFAULT_IMAGE_PIPELINE_WORKERS, max_bytes=DEFAULT_IMAGE_MAX_BYTES):
+        self.root = root
+        self.staging_dir = staging_dir
+        self.max_bytes = max_bytes
+        self.workers = max(int(workers), 1)
+        self._executor = None
+        self._jobs = {}
+        self._listeners = {}
+        self._mutex = threading.Lock()
+        self._stats = {'uploads': 0, 'duplicates': 0, 'processed': 0, 'failed': 0, 'bytes_stored': 0}
+
+    @property
+    def executor(self):
+        # Started on first use, threads are only created for apps that upload
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-pipeline')
+        return self._executor
+
+    def finished(self, digest):
+        """Whether the image with this digest has been published"""
+        directory = image_dir(self.root, digest)
+        if Image is not None:
+            return os.path.exists(os.path.join(directory, f'{VARIANTS[-1][0]}.{VARIANT_FORMAT}'))
+        return os.path.isdir(directory) and any(name.startswith('original.') for name in os.listdir(directory))
+
+    def _stage(self, stream):
+        """Copy the upload to a staging file, returns (path, digest, ext, size)"""
+        os.makedirs(self.staging_dir, exist_ok=True)
+        path = os.path.join(self.staging_dir, f'{uuid.uuid4().hex}.upload')
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        try:
+            with open(path, 'wb') as f:
+                while True:
+                    block = stream.read(_READ_SIZE)
+                    if not block:
+                        break
+                    size += len(block)
+                    if size > self.max_bytes:
+                        raise InvalidImageError(f'Image is larger than {self.max_bytes // (1024 * 1024)} MB')
+                    if len(head) < 16:
+                        head += block[:16 - len(head)]
+                    digest.update(block)
+                    f.write(block)
+            ext = sniff_image_type(head)
+            if ext is None:
+                raise InvalidImageError('Invalid file type. Only images are allowed.')
+            verify_image(path)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        return path, digest.hexdigest(), ext, size
+
+    def store(self, stream, listener=None):
+        """Store an uploaded image. Raises InvalidImageError.
+
+        If the image still has to be processed, `listener(stored, error)` is
+        called on the worker thread once it is done, before `wait()` returns;
+        `error` is None on success.
+        """
+        staged_path, digest, ext, size = self._stage(stream)
+
+        with self._mutex:
+            self._stats['uploads'] += 1
+            future = self._jobs.get(digest)
+            if future is not None or self.finished(digest):
+                # Same content already stored or being processed
+                self._stats['duplicates'] += 1
+                os.remove(staged_path)
+                if future is not None and listener is not None:
+                    self._listeners[digest].append(listener)
+                return StoredImage(digest, ext, duplicate=True, future=future)
+            self._listeners[digest] = [listener] if listener is not None else []
+            future = self._jobs[digest] = self.executor.submit(self._process, staged_path, digest, ext, size)
+        return StoredImage(digest, ext, duplicate=False, future=future)
+
+    def _process(self, staged_path, digest, ext, size):
+        error = None
+        try:
+            process_image(staged_path, image_dir(self.root, digest), ext)
+            with self._mutex:
+                self._stats['processed'] += 1
+                self._stats['bytes_stored'] += size
+        except Exception as e:
+            error = e
+            with self._mutex:
+                self._stats['failed'] += 1
+            raise
+        finally:
+            os.remove(staged_path)
+            self._notify(StoredImage(digest, ext, duplicate=False), error)
+
+    def _notify(self, stored, error):
+        """Call the job's listeners, then retire the job"""
+        while True:
+            with self._mutex:
+                listeners = self._listeners.pop(stored.digest, [])
+                if not listeners:
+                    # Nobody can join the job once it is gone
+                    self._jobs.pop(stored.digest, None)
+                    return
+                # Uploads joining while the listeners run add a new list
+                self._listeners[stored.digest] = []
+            for listener in listeners:
+                listener(stored, error)
+
+    def wait(self, digest, timeout=None):
+        """Wait for the processing of `digest`, if any. Returns False on timeout."""
+        with self._mutex:
+            future = self._jobs.get(digest)
+        if future is None:
+            return True
+        try:
+            future.result(timeout)
+        except FutureTimeout:
+            return False
+        except Exception:
+            pass
+        return True
+
+    def stats(self):
+        with self._mutex:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._jobs)
+        stats['variants_enabled'] = Image is not None
+        return stats
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+class ImagePipelineExtension:
+    """Flask extension holding the image pipeline of the current app"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        with app.app_context():
+            root = upload_dir()
+        app.extensions['image_pipeline'] = ImagePipeline(
+            root=root,
+            staging_dir=app.config.get('IMAGE_STAGING_DIR') or os.path.join(app.instance_path, 'image-staging'),
+            workers=int(app.config.get('IMAGE_PIPELINE_WORKERS', DEFAULT_IMAGE_PIPELINE_WORKERS)),
+            max_bytes=int(app.config.get('IMAGE_MAX_BYTES', DEFAULT_IMAGE_MAX_BYTES))
+        )
+
+    @property
+    def pipeline(self):
+        return current_app.extensions['image_pipeline']
+
+    def store(self, stream, product_id=None):
+        """Store an uploaded image and, once it is processed, record it on the
+        product with `product_id`. Raises InvalidImageError."""
+        app = current_app._get_current_object()
+
+        def finished(stored, error):
+            with app.app_context():
+                try:
+                    record_image(stored, product_id, error)
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f'Could not record image {stored.digest}: {str(e)}')
+                finally:
+                    db.session.remove()
+
+        stored = self.pipeline.store(stream, listener=finished)
+        if stored.future is None and product_id is not None:
+            # Already published by an earlier upload
+            record_image(stored, product_id)
+        return stored
+
+    def wait(self, digest, timeout=None):
+        return self.pipeline.wait(digest, timeout)
+
+    def stats(self):
+        return self.pipeline.stats()
+
+
+def record_image(stored, product_id=None, error=None):
+    """Point products at a processed image, or away from one that failed"""
+    now = datetime.datetime.utcnow()
+    if error is None:
+        if product_id is None:
+            return
+        query = update(Product).where(Product.id == product_id).values(image_url=stored.image_url, updated_at=now)
+    else:
+        current_app.logger.error(f'Image processing failed for {stored.digest}: {str(error)}')
+        fallback = None
+        if stored.image_url != stored.original_url and os.path.exists(stored.original_path(upload_dir())):
+            fallback = stored.original_url
+        # Products saved with the URL before processing finished
+        affected = Product.image_url == stored.image_url
+        if product_id is not None and fallback is not None:
+            affected = db.or_(affected, Product.id == product_id)
+        query = update(Product).where(affected).values(image_url=fallback, updated_at=now)
+
+    result = db.session.execute(query.execution_options(synchronize_session=False))
+    if result.rowcount:
+        bump_catalog_version()
+    db.session.commit()
+
+
+image_pipeline = ImagePipelineExtension()
@@ -0,0 +1,299 @@
+"""
+Background product imports.
+
+`enqueue_import()` saves an uploaded CSV under PRODUCT_IMPORT_DIR and records
+an `ImportJob` in the queued state; the request returns right away. Jobs are
+run by `run_next_import_job()`, called by the `ImportJobWorker` thread of each
+process (PRODUCT_IMPORT_WORKER) and usable from a separate worker process.
+
+A worker claims a job with a conditional UPDATE, so each job runs once even
+with several workers. While it runs, every committed chunk also writes the
+job's counts, its first errors, a heartbeat and `resume_row` (the last row
+covered) in the same transaction. If the worker dies, the heartbeat goes
+stale, another worker reclaims the job after PRODUCT_IMPORT_STALE_SECONDS and
+continues after `resume_row` with the counts exactly as committed, so no row
+is imported twice. Every claim counts as an attempt: a job that keeps
+crashing or hanging its worker is marked failed instead of being claimed
+again once it used PRODUCT_IMPORT_MAX_ATTEMPTS.
+
+Cancelling a queued job finishes it immediately; a running job is flagged
+and stops before its next chunk. The uploaded file is deleted once the job
+is finished.
+"""
+
+from flask import current_app
+from app import db
+from app.models import ImportJob
+from app.models.import_job import (
+    IMPORT_QUEUED, IMPORT_RUNNING, IMPORT_COMPLETED, IMPORT_FAILED, IMPORT_CANCELLED
+)
+from app.utils.product_import import (
+    ProductImport, ImportCancelled, RowError, read_csv_rows, open_upload,
+    DEFAULT_IMPORT_CHUNK_SIZE, DEFAULT_MAX_REPORTED_ERRORS
+)
+import datetime
+import json
+import os
+import threading
+import uuid
+
+DEFAULT_IMPORT_POLL_SECONDS = 2
+DEFAULT_IMPORT_STALE_SECONDS = 120
+DEFAULT_IMPORT_MAX_ATTEMPTS = 3
+
+
+class ImportJobLost(ImportCancelled):
+    """Raised when another worker has reclaimed the job being run"""
+
+
+def import_dir():
+    return current_app.config.get('PRODUCT_IMPORT_DIR') or os.path.join(current_app.instance_path, 'imports')
+
+
+def enqueue_import(file, created_by):
+    """Save an uploaded file and queue its import. Commits, returns the job."""
+    directory = import_dir()
+    os.makedirs(directory, exist_ok=True)
+    suffix = '.csv.gz' if file.filename.lower().endswith('.gz') else '.csv'
+    path = os.path.join(directory, f'{uuid.uuid4().hex}{suffix}')
+    file.save(path)
+
+    job = ImportJob(status=IMPORT_QUEUED, filename=file.filename, file_path=path, created_by=created_by)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(path)
+        raise
+    import_worker.notify()
+    return job
+
+
+def cancel_import(job_id):
+    """Cancel a job. Returns the job, or None if there is no such job.
+
+    A queued job is cancelled at once; a running job is flagged and stops
+    before its next chunk. Finished jobs are returned unchanged.
+    """
+    now = datetime.datetime.utcnow()
+    result = db.session.execute(
+        db.update(ImportJob)
+        .where(ImportJob.id == job_id, ImportJob.status == IMPORT_QUEUED)
+        .values(status=IMPORT_CANCELLED, cancel_requested=True, finished_at=now, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        db.session.commit()
+        job = db.session.get(ImportJob, job_id)
+        _remove_file(job.file_path)
+        return job
+
+    db.session.execute(
+        db.update(ImportJob)
+        .where(ImportJob.id == job_id, ImportJob.status == IMPORT_RUNNING)
+        .values(cancel_requested=True, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return db.session.get(ImportJob, job_id)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ImportJobRun(ProductImport):
+    """ProductImport that persists its progress on an ImportJob"""
+
+    def __init__(self, job, worker_id, **kwargs):
+        super().__init__(job.created_by, **kwargs)
+        self.job_id = job.id
+        self.worker_id = worker_id
+        self.resume_row = job.resume_row
+        self.errors = job.error_list()
+        self.stats.update(processed=job.processed_rows, imported=job.imported_count, error_count=job.error_count)
+
+    def rows(self, path):
+        """Rows of the job's file not covered by a committed chunk yet"""
+        with open(path, 'rb') as f:
+            for row_num, row in read_csv_rows(open_upload(f, path)):
+                if row_num > self.resume_row:
+                    yield row_num, row
+
+    def cancelled(self):
+        return bool(db.session.execute(
+            db.select(ImportJob.cancel_requested).where(ImportJob.id == self.job_id)
+        ).scalar())
+
+    def checkpoint(self, last_row):
+        now = datetime.datetime.utcnow()
+        result = db.session.execute(
+            db.update(ImportJob)
+            .where(ImportJob.id == self.job_id, ImportJob.worker_id == self.worker_id,
+                   ImportJob.status == IMPORT_RUNNING)
+            .values(
+                processed_rows=self.stats['processed'],
+                imported_count=self.stats['imported'],
+                error_count=self.stats['error_count'],
+                errors=json.dumps(self.errors),
+                resume_row=last_row,
+                heartbeat_at=now,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            # Reclaimed as stale by another worker: this chunk must not commit
+            raise ImportJobLost('Import job was taken over by another worker')
+
+
+def claim_next_job(worker_id, now=None):
+    """Claim the oldest queued job, or a running one whose worker went silent"""
+    now = now or datetime.datetime.utcnow()
+    stale_before = now - datetime.timedelta(
+        seconds=int(current_app.config.get('PRODUCT_IMPORT_STALE_SECONDS', DEFAULT_IMPORT_STALE_SECONDS))
+    )
+    max_attempts = max(int(current_app.config.get('PRODUCT_IMPORT_MAX_ATTEMPTS', DEFAULT_IMPORT_MAX_ATTEMPTS)), 1)
+    claimable = db.or_(
+        ImportJob.status == IMPORT_QUEUED,
+        db.and_(ImportJob.status == IMPORT_RUNNING,
+                db.or_(ImportJob.heartbeat_at.is_(None), ImportJob.heartbeat_at < stale_before))
+    )
+    candidates = db.session.execute(
+        db.select(ImportJob.id, ImportJob.file_path).where(claimable).order_by(ImportJob.id).limit(5)
+    ).all()
+    for job_id, path in candidates:
+        # A job whose workers keep dying is not handed to another one
+        given_up = db.session.execute(
+            db.update(ImportJob)
+            .where(ImportJob.id == job_id, claimable, ImportJob.attempts >= max_attempts)
+            .values(status=IMPORT_FAILED, message=f'Import stopped after {max_attempts} attempts',
+                    finished_at=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if given_up.rowcount:
+            db.session.commit()
+            _remove_file(path)
+            current_app.logger.warning(f'Import job {job_id} failed after {max_attempts} attempts')
+            continue
+
+        # Claiming refreshes the heartbeat, so only one worker's UPDATE matches
+        result = db.session.execute(
+            db.update(ImportJob)
+            .where(ImportJob.id == job_id, claimable)
+            .values(status=IMPORT_RUNNING, worker_id=worker_id, attempts=ImportJob.attempts + 1,
+                    heartbeat_at=now, updated_at=now, started_at=db.func.coalesce(ImportJob.started_at, now))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount:
+            return db.session.get(ImportJob, job_id)
+    return None
+
+
+def _finish(job_id, worker_id, status, message=None):
+    now = datetime.datetime.utcnow()
+    result = db.session.execute(
+        db.update(ImportJob)
+        .where(ImportJob.id == job_id, ImportJob.worker_id == worker_id, ImportJob.status == IMPORT_RUNNING)
+        .values(status=status, message=message, finished_at=now, heartbeat_at=now, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def run_import_job(job, worker_id):
+    """Run a claimed job to the end. Returns its final status, or None if the
+    job was taken over by another worker."""
+    run = ImportJobRun(
+        job, worker_id,
+        chunk_size=current_app.config.get('PRODUCT_IMPORT_CHUNK_SIZE', DEFAULT_IMPORT_CHUNK_SIZE),
+        max_errors=current_app.config.get('PRODUCT_IMPORT_MAX_ERRORS', DEFAULT_MAX_REPORTED_ERRORS)
+    )
+    job_id, path = job.id, job.file_path
+
+    try:
+        run.run(run.rows(path))
+        status, message = IMPORT_COMPLETED, None
+    except ImportJobLost:
+        db.session.rollback()
+        return None
+    except ImportCancelled:
+        db.session.rollback()
+        status, message = IMPORT_CANCELLED, 'Cancelled by an admin'
+    except (RowError, UnicodeDecodeError, OSError, EOFError) as e:
+        db.session.rollback()
+        status, message = IMPORT_FAILED, f'Failed to read CSV file: {str(e)}'
+    except Exception as e:
+        db.session.rollback()
+        status, message = IMPORT_FAILED, f'Failed to process CSV file: {str(e)}'
+
+    if not _finish(job_id, worker_id, status, message):
+        # Taken over by another worker meanwhile
+        return None
+    _remove_file(path)
+    current_app.logger.info(f"Import job {job_id} {status}: imported {run.stats['imported']} of "
+                            f"{run.stats['processed']} rows ({run.stats['error_count']} errors)")
+    return status
+
+
+def run_next_import_job(worker_id=None):
+    """Claim and run one job. Returns the job id, or None if there was nothing to run."""
+    worker_id = worker_id or f'{os.getpid()}-{threading.get_ident()}'
+    job = claim_next_job(worker_id)
+    if job is None:
+        return None
+    run_import_job(job, worker_id)
+    return job.id
+
+
+class ImportJobWorker:
+    """Background thread running queued import jobs, polling every
+    PRODUCT_IMPORT_POLL_SECONDS and woken up when this process enqueues one
+    (PRODUCT_IMPORT_WORKER disables it when unset)"""
+
+    def __init__(self, app=None):
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stop = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['import_worker'] = self
+        if app.config.get('PRODUCT_IMPORT_WORKER') and self._thread is None:
+            interval = float(app.config.get('PRODUCT_IMPORT_POLL_SECONDS', DEFAULT_IMPORT_POLL_SECONDS))
+            self._thread = threading.Thread(target=self._run, args=(app, interval),
+                                            name='product-import-worker', daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self, app, interval):
+        worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        while not self._stop:
+            with app.app_context():
+                try:
+                    ran = run_next_import_job(worker_id)
+                except Exception as e:
+                    db.session.rollback()
+                    ran = None
+                    app.logger.error(f'Product import worker failed: {str(e)}')
+                finally:
+                    db.session.remove()
+            if ran is None:
+                self._wakeup.wait(interval)
+                self._wakeup.clear()
+
+    def stop(self):
+        self._stop = True
+        self._wakeup.set()
+
+
+import_worker = ImportJobWorker()
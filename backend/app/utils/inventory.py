@@ -0,0 +1,109 @@
+"""
+Inventory updates that cannot oversell.
+
+Stock is never read, checked in Python and written back. Instead every line is
+decremented by a guarded statement
+
+    UPDATE products SET stock_quantity = stock_quantity - :qty
+    WHERE id = :id AND stock_quantity - reserved_quantity >= :qty
+
+so the database decides atomically whether enough stock is left, and two
+concurrent checkouts only wait on each other for the duration of the UPDATE.
+Units held by carts (`reserved_quantity`, see app/utils/inventory_holds.py)
+are not taken; a checkout releases its own holds first.
+"""
+
+from app import db
+from app.models import Product
+from app.utils.product_cache import bump_catalog_version
+import datetime
+
+
+class InsufficientStockError(Exception):
+    """Raised when one or more lines could not be decremented.
+
+    `shortages` lists the products that were short, each a dict with
+    product_id, sku, name, requested and available.
+    """
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        names = ', '.join(shortage['name'] or str(shortage['product_id']) for shortage in shortages)
+        super().__init__(f'Insufficient stock for {names}')
+
+
+def _merge_lines(lines):
+    """Sum quantities per product from a {product_id: qty} mapping or (product_id, qty) pairs"""
+    items = lines.items() if isinstance(lines, dict) else lines
+    merged = {}
+    for product_id, quantity in items:
+        merged[int(product_id)] = merged.get(int(product_id), 0) + int(quantity)
+    return merged
+
+
+def decrement_stock(lines, now=None):
+    """Atomically take stock for every line, or raise InsufficientStockError.
+
+    All lines are decremented by one UPDATE statement; a line only matches if
+    its product is active and has at least the requested quantity left
+    besides the units held by carts. If
+    fewer rows than lines were updated, the short products are looked up and
+    InsufficientStockError is raised. The lines that did match have been
+    decremented at that point, so the caller must roll back the transaction.
+    """
+    quantities = _merge_lines(lines)
+    if not quantities:
+        return
+    if any(quantity <= 0 for quantity in quantities.values()):
+        raise ValueError('Quantities must be greater than 0')
+
+    requested = db.case(quantities, value=Product.id)
+    remaining = db.session.execute(
+        db.update(Product)
+        .where(
+            Product.id.in_(quantities.keys()),
+            Product.is_active == True,
+            Product.stock_quantity - Product.reserved_quantity >= requested
+        )
+        .values(
+            stock_quantity=Product.stock_quantity - requested,
+            updated_at=now or datetime.datetime.utcnow()
+        )
+        .returning(Product.stock_quantity)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+    if len(remaining) != len(quantities):
+        raise InsufficientStockError(find_shortages(quantities))
+
+    # Cached reads only need refreshing when a product sells out
+    if any(stock <= 0 for stock in remaining):
+        bump_catalog_version()
+
+
+def find_shortages(lines):
+    """Return the lines that cannot currently be fulfilled, in one query"""
+    quantities = _merge_lines(lines)
+    rows = db.session.query(
+        Product.id, Product.sku, Product.name, Product.stock_quantity, Product.reserved_quantity,
+        Product.is_active
+    ).filter(
+        Product.id.in_(quantities.keys())
+    ).all()
+    found = {row.id: row for row in rows}
+
+    shortages = []
+    for product_id, quantity in quantities.items():
+        row = found.get(product_id)
+        available = 0
+        if row is not None and row.is_active:
+            available = max((row.stock_quantity or 0) - row.reserved_quantity, 0)
+        if available < quantity:
+            shortages.append({
+                'product_id': product_id,
+                'sku': row.sku if row is not None else None,
+                'name': row.name if row is not None else None,
+                'requested': quantity,
+                'available': available
+            })
+    return shortages
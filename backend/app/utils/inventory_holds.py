@@ -0,0 +1,254 @@
+"""
+Time-limited inventory holds for carts.
+
+Adding a product to a cart holds the line's quantity for the user until
+checkout or until the hold expires, so during a sale the last units go to
+the carts that got them first instead of failing at checkout. Holds are
+counted in `Product.reserved_quantity`, so available-to-sell is
+
+    stock_quantity - reserved_quantity
+
+without summing the holds, and a hold is taken with a single conditional
+increment
+
+    UPDATE products SET reserved_quantity = reserved_quantity + :delta
+    WHERE id = :id AND is_active AND stock_quantity - reserved_quantity >= :delta
+
+Changing a cart line moves the hold by the difference. At checkout the
+user's holds are dropped and the stock is decremented in the same
+transaction (`convert_holds`); `decrement_stock` leaves other carts' holds
+alone. Expired holds are given back by `sweep_expired_holds()`, run in
+batches by the background `HoldSweeper`, the admin sweep endpoint, and on
+demand when a product looks sold out.
+"""
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from flask import current_app
+from app import db
+from app.models import Product, InventoryHold
+from app.utils.inventory import decrement_stock
+import datetime
+import threading
+
+DEFAULT_HOLD_TTL_SECONDS = 15 * 60
+
+
+def hold_ttl():
+    return int(current_app.config.get('INVENTORY_HOLD_TTL_SECONDS', DEFAULT_HOLD_TTL_SECONDS))
+
+
+def _release_counts(counts, now):
+    """Give back held units, `counts` maps product_id to the units released"""
+    if not counts:
+        return
+    released = db.case(counts, value=Product.id)
+    db.session.execute(
+        update(Product)
+        .where(Product.id.in_(counts.keys()))
+        .values(
+            reserved_quantity=db.case((Product.reserved_quantity > released,
+                                       Product.reserved_quantity - released), else_=0),
+            updated_at=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _reserve(product_id, quantity, now):
+    result = db.session.execute(
+        update(Product)
+        .where(
+            Product.id == product_id,
+            Product.is_active == True,
+            Product.stock_quantity - Product.reserved_quantity >= quantity
+        )
+        .values(reserved_quantity=Product.reserved_quantity + quantity, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def hold_stock(product_id, user_id, quantity, ttl=None, now=None):
+    """Hold `quantity` units of a product for a user, returns the hold's expiry
+    or None if that much is not available.
+
+    `quantity` is the user's total for the product (the cart line), so an
+    existing hold is moved by the difference and its expiry extended. Commits.
+    """
+    now = now or datetime.datetime.utcnow()
+    expires_at = now + datetime.timedelta(seconds=ttl if ttl is not None else hold_ttl())
+    user_id = int(user_id)
+    swept = False
+
+    for _ in range(3):
+        existing = db.session.execute(
+            select(InventoryHold.id, InventoryHold.quantity)
+            .where(InventoryHold.product_id == product_id, InventoryHold.user_id == user_id)
+        ).first()
+        delta = quantity - (existing.quantity if existing else 0)
+
+        if delta > 0 and not _reserve(product_id, delta, now):
+            if not swept and sweep_expired_holds(product_ids=[product_id], now=now, commit=False):
+                # Expired holds were blocking the product; try again
+                swept = True
+                continue
+            db.session.commit()
+            return None
+        if delta < 0:
+            _release_counts({product_id: -delta}, now)
+
+        try:
+            if existing:
+                # Guarded by the old quantity: a concurrent change of the same
+                # hold makes this match nothing and the whole step is retried
+                moved = db.session.execute(
+                    update(InventoryHold)
+                    .where(InventoryHold.id == existing.id, InventoryHold.quantity == existing.quantity)
+                    .values(quantity=quantity, expires_at=expires_at)
+                    .execution_options(synchronize_session=False)
+                )
+                if moved.rowcount != 1:
+                    db.session.rollback()
+                    continue
+            else:
+                db.session.add(InventoryHold(product_id=product_id, user_id=user_id, quantity=quantity,
+                                             expires_at=expires_at, created_at=now))
+            db.session.commit()
+            return expires_at
+        except IntegrityError:
+            # The same user placed a hold concurrently; retry against it
+            db.session.rollback()
+    return None
+
+
+def release_hold(product_id, user_id, now=None):
+    """Drop a user's hold on a product, returns False if there was none. Commits."""
+    now = now or datetime.datetime.utcnow()
+    released = db.session.execute(
+        delete(InventoryHold)
+        .where(InventoryHold.product_id == product_id, InventoryHold.user_id == int(user_id))
+        .returning(InventoryHold.quantity)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if released:
+        _release_counts({product_id: released}, now)
+    db.session.commit()
+    return released is not None
+
+
+def convert_holds(user_id, lines, now=None):
+    """Take the stock of a checkout, turning the user's holds into decrements.
+
+    `lines` are (product_id, quantity) pairs. The user's holds on these
+    products are dropped and the stock is decremented with `decrement_stock`,
+    which only takes units that no other cart holds; raises
+    InsufficientStockError like it. Part of the caller's transaction: rolling
+    back restores the holds.
+    """
+    now = now or datetime.datetime.utcnow()
+    product_ids = sorted({int(product_id) for product_id, _ in lines})
+    if not product_ids:
+        return
+
+    # Expired holds of other carts should not block this checkout
+    sweep_expired_holds(product_ids=product_ids, now=now, commit=False)
+
+    held = db.session.execute(
+        delete(InventoryHold)
+        .where(InventoryHold.user_id == int(user_id), InventoryHold.product_id.in_(product_ids))
+        .returning(InventoryHold.product_id, InventoryHold.quantity)
+        .execution_options(synchronize_session=False)
+    ).all()
+    _release_counts(dict(held), now)
+    decrement_stock(lines, now=now)
+
+
+def sweep_expired_holds(product_ids=None, now=None, batch_size=1000, commit=True):
+    """Delete expired holds and give their units back, returns how many were swept"""
+    now = now or datetime.datetime.utcnow()
+    swept = 0
+    while True:
+        query = select(InventoryHold.id).where(InventoryHold.expires_at <= now)
+        if product_ids is not None:
+            query = query.where(InventoryHold.product_id.in_(product_ids))
+        ids = db.session.execute(query.limit(batch_size)).scalars().all()
+        if not ids:
+            break
+
+        # Only count the holds this sweep actually deleted
+        deleted = db.session.execute(
+            delete(InventoryHold)
+            .where(InventoryHold.id.in_(ids), InventoryHold.expires_at <= now)
+            .returning(InventoryHold.product_id, InventoryHold.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        counts = {}
+        for product_id, quantity in deleted:
+            counts[product_id] = counts.get(product_id, 0) + quantity
+        _release_counts(counts, now)
+        swept += len(deleted)
+        if commit:
+            db.session.commit()
+        if len(ids) < batch_size:
+            break
+    return swept
+
+
+def available_quantities(product_ids, user_id=None):
+    """Units available to sell per active product, read from the hold counter.
+
+    With `user_id`, the units that user holds are counted as available to them.
+    """
+    if not product_ids:
+        return {}
+    rows = db.session.execute(
+        select(Product.id, Product.stock_quantity, Product.reserved_quantity)
+        .where(Product.id.in_(product_ids), Product.is_active == True)
+    ).all()
+    available = {row.id: max((row.stock_quantity or 0) - row.reserved_quantity, 0) for row in rows}
+    if user_id is not None:
+        for product_id, quantity in db.session.execute(
+            select(InventoryHold.product_id, InventoryHold.quantity)
+            .where(InventoryHold.user_id == int(user_id), InventoryHold.product_id.in_(available.keys()))
+        ):
+            available[product_id] += quantity
+    return available
+
+
+class HoldSweeper:
+    """Background thread sweeping expired inventory holds every
+    INVENTORY_HOLD_SWEEP_SECONDS (0 or unset disables it)"""
+
+    def __init__(self, app=None):
+        self._thread = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        interval = int(app.config.get('INVENTORY_HOLD_SWEEP_SECONDS', 0) or 0)
+        app.extensions['hold_sweeper'] = self
+        if interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(app, interval),
+                                            name='inventory-hold-sweeper', daemon=True)
+            self._thread.start()
+
+    def _run(self, app, interval):
+        while not self._stop.wait(interval):
+            with app.app_context():
+                try:
+                    swept = sweep_expired_holds()
+                    if swept:
+                        app.logger.info(f'Swept {swept} expired inventory holds')
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f'Inventory hold sweep failed: {str(e)}')
+                finally:
+                    db.session.remove()
+
+    def stop(self):
+        self._stop.set()
+
+
+hold_sweeper = HoldSweeper()
@@ -0,0 +1,35 @@
+from app import db, create_app
+from sqlalchemy import text
+
+def migrate_add_cache_versions():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if cache_versions table exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='cache_versions'
+            """))
+
+            if not result.fetchone():
+                # Create the shared cache version counters
+                db.session.execute(text("""
+                    CREATE TABLE cache_versions (
+                        name VARCHAR(64) NOT NULL PRIMARY KEY,
+                        version BIGINT NOT NULL DEFAULT 0
+                    )
+                """))
+                db.session.execute(text("INSERT INTO cache_versions (name, version) VALUES ('catalog', 0)"))
+                db.session.commit()
+                print('Successfully created cache_versions table.')
+            else:
+                print('cache_versions table already exists.')
+
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_cache_versions()
@@ -0,0 +1,40 @@
+from app import db, create_app
+from sqlalchemy import text
+
+def migrate_add_carts_table():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if carts table exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='carts'
+            """))
+
+            if not result.fetchone():
+                # Create carts table used by CART_STORE=sql
+                db.session.execute(text("""
+                    CREATE TABLE carts (
+                        user_id VARCHAR(64) PRIMARY KEY,
+                        data TEXT NOT NULL,
+                        version INTEGER NOT NULL DEFAULT 1,
+                        expires_at DATETIME NOT NULL,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                """))
+                db.session.execute(text("""
+                    CREATE INDEX ix_carts_expires_at ON carts (expires_at)
+                """))
+                print('Successfully created carts table.')
+            else:
+                print('carts table already exists.')
+
+            db.session.commit()
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_carts_table()
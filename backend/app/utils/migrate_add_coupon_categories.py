@@ -0,0 +1,43 @@
+from app import db, create_app
+from app.utils.coupon_categories import sync_coupon_categories
+from sqlalchemy import text
+
+def migrate_add_coupon_categories():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if coupon_categories table exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='coupon_categories'
+            """))
+
+            if not result.fetchone():
+                # Create the coupon to category mapping
+                db.session.execute(text("""
+                    CREATE TABLE coupon_categories (
+                        coupon_id INTEGER NOT NULL REFERENCES coupons(id) ON DELETE CASCADE,
+                        category VARCHAR(100) NOT NULL,
+                        PRIMARY KEY (coupon_id, category)
+                    )
+                """))
+                db.session.execute(text("""
+                    CREATE INDEX ix_coupon_categories_category
+                    ON coupon_categories (category, coupon_id)
+                """))
+                db.session.commit()
+                print('Successfully created coupon_categories table.')
+            else:
+                print('coupon_categories table already exists.')
+
+            # Backfill (or refresh) the mapping from applicable_categories
+            rows = sync_coupon_categories()
+            print(f'Wrote {rows} coupon category rows.')
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_coupon_categories()
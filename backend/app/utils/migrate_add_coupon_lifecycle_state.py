@@ -0,0 +1,44 @@
+from app import db, create_app
+from app.utils.coupon_lifecycle import refresh_lifecycle_states
+from sqlalchemy import text
+
+def migrate_add_coupon_lifecycle_state():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if lifecycle_state column exists
+            result = db.session.execute(text("""
+                SELECT COUNT(*) FROM pragma_table_info('coupons')
+                WHERE name='lifecycle_state'
+            """))
+
+            if result.scalar() == 0:
+                # Add lifecycle_state column
+                db.session.execute(text("""
+                    ALTER TABLE coupons
+                    ADD COLUMN lifecycle_state VARCHAR(16) NOT NULL DEFAULT 'active'
+                """))
+                print('Successfully added lifecycle_state column to coupons table.')
+            else:
+                print('lifecycle_state column already exists.')
+
+            # The live-coupon index now leads with the lifecycle state
+            db.session.execute(text('DROP INDEX IF EXISTS ix_coupons_live'))
+            db.session.execute(text("""
+                CREATE INDEX ix_coupons_live
+                ON coupons (lifecycle_state, is_public, is_active, end_date)
+            """))
+            db.session.commit()
+            print('Successfully rebuilt ix_coupons_live index.')
+
+            # Backfill the state of every coupon
+            changed = refresh_lifecycle_states()
+            print(f'Updated the lifecycle state of {changed} coupons.')
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_coupon_lifecycle_state()
@@ -0,0 +1,31 @@
+from app import db, create_app
+from sqlalchemy import text
+
+def migrate_add_coupon_live_index():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if the index exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='index' AND name='ix_coupons_live'
+            """))
+
+            if not result.fetchone():
+                # Index used to prune live public coupons (best-coupon finder)
+                db.session.execute(text("""
+                    CREATE INDEX ix_coupons_live ON coupons (is_public, is_active, end_date)
+                """))
+                print('Successfully created ix_coupons_live index.')
+            else:
+                print('ix_coupons_live index already exists.')
+
+            db.session.commit()
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_coupon_live_index()
@@ -0,0 +1,58 @@
+from app import db, create_app
+from sqlalchemy import text
+
+def migrate_add_coupon_reservations():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if reserved_uses column exists
+            result = db.session.execute(text("""
+                SELECT COUNT(*) FROM pragma_table_info('coupons')
+                WHERE name='reserved_uses'
+            """))
+
+            if result.scalar() == 0:
+                # Add reserved_uses column
+                db.session.execute(text("""
+                    ALTER TABLE coupons
+                    ADD COLUMN reserved_uses INTEGER NOT NULL DEFAULT 0
+                """))
+                print('Successfully added reserved_uses column to coupons table.')
+            else:
+                print('reserved_uses column already exists.')
+
+            # Check if coupon_reservations table exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='coupon_reservations'
+            """))
+
+            if not result.fetchone():
+                # Create coupon_reservations table
+                db.session.execute(text("""
+                    CREATE TABLE coupon_reservations (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        coupon_id INTEGER NOT NULL REFERENCES coupons(id) ON DELETE CASCADE,
+                        user_id INTEGER NOT NULL REFERENCES users(id),
+                        expires_at DATETIME NOT NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        CONSTRAINT uq_coupon_reservations_coupon_user UNIQUE (coupon_id, user_id)
+                    )
+                """))
+                db.session.execute(text("""
+                    CREATE INDEX ix_coupon_reservations_expires_at
+                    ON coupon_reservations (expires_at)
+                """))
+                print('Successfully created coupon_reservations table.')
+            else:
+                print('coupon_reservations table already exists.')
+
+            db.session.commit()
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_coupon_reservations()
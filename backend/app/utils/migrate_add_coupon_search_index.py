@@ -0,0 +1,32 @@
+from app import db, create_app
+from app.utils.search_index import coupon_search
+from sqlalchemy import text
+
+def migrate_add_coupon_search_index():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if the coupon_search full-text table exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='coupon_search'
+            """))
+
+            if not result.fetchone():
+                # Create the FTS5 table and the triggers keeping it in sync
+                coupon_search.create(db.session.connection())
+                db.session.commit()
+                print('Successfully created coupon_search index.')
+            else:
+                print('coupon_search index already exists.')
+
+            # Index (or re-index) every existing coupon
+            coupon_search.rebuild()
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_coupon_search_index()
@@ -0,0 +1,67 @@
+from app import db, create_app
+from sqlalchemy import text
+
+def migrate_add_import_jobs():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if import_jobs table exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='import_jobs'
+            """))
+
+            if not result.fetchone():
+                # Create the background import job table
+                db.session.execute(text("""
+                    CREATE TABLE import_jobs (
+                        id INTEGER NOT NULL PRIMARY KEY,
+                        status VARCHAR(16) NOT NULL DEFAULT 'queued',
+                        filename VARCHAR(255),
+                        file_path VARCHAR(500) NOT NULL,
+                        created_by INTEGER NOT NULL REFERENCES users(id),
+                        processed_rows INTEGER NOT NULL DEFAULT 0,
+                        imported_count INTEGER NOT NULL DEFAULT 0,
+                        error_count INTEGER NOT NULL DEFAULT 0,
+                        errors TEXT,
+                        resume_row INTEGER NOT NULL DEFAULT 0,
+                        message TEXT,
+                        cancel_requested BOOLEAN NOT NULL DEFAULT 0,
+                        worker_id VARCHAR(64),
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        heartbeat_at DATETIME,
+                        created_at DATETIME,
+                        started_at DATETIME,
+                        finished_at DATETIME,
+                        updated_at DATETIME
+                    )
+                """))
+                db.session.execute(text("CREATE INDEX ix_import_jobs_status ON import_jobs (status, id)"))
+                db.session.execute(text("CREATE INDEX ix_import_jobs_created ON import_jobs (created_at, id)"))
+                db.session.commit()
+                print('Successfully created import_jobs table.')
+            else:
+                print('import_jobs table already exists.')
+
+                # Check if attempts column exists
+                result = db.session.execute(text("""
+                    SELECT COUNT(*) FROM pragma_table_info('import_jobs')
+                    WHERE name='attempts'
+                """))
+
+                if result.scalar() == 0:
+                    db.session.execute(text("""
+                        ALTER TABLE import_jobs
+                        ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0
+                    """))
+                    db.session.commit()
+                    print('Successfully added attempts column to import_jobs table.')
+
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_import_jobs()
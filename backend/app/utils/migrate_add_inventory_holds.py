@@ -0,0 +1,59 @@
+from app import db, create_app
+from sqlalchemy import text
+
+def migrate_add_inventory_holds():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if reserved_quantity column exists
+            result = db.session.execute(text("""
+                SELECT COUNT(*) FROM pragma_table_info('products')
+                WHERE name='reserved_quantity'
+            """))
+
+            if result.scalar() == 0:
+                # Add reserved_quantity column
+                db.session.execute(text("""
+                    ALTER TABLE products
+                    ADD COLUMN reserved_quantity INTEGER NOT NULL DEFAULT 0
+                """))
+                print('Successfully added reserved_quantity column to products table.')
+            else:
+                print('reserved_quantity column already exists.')
+
+            # Check if inventory_holds table exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='inventory_holds'
+            """))
+
+            if not result.fetchone():
+                # Create inventory_holds table
+                db.session.execute(text("""
+                    CREATE TABLE inventory_holds (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+                        user_id INTEGER NOT NULL REFERENCES users(id),
+                        quantity INTEGER NOT NULL,
+                        expires_at DATETIME NOT NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        CONSTRAINT uq_inventory_holds_product_user UNIQUE (product_id, user_id)
+                    )
+                """))
+                db.session.execute(text("""
+                    CREATE INDEX ix_inventory_holds_expires_at
+                    ON inventory_holds (expires_at)
+                """))
+                print('Successfully created inventory_holds table.')
+            else:
+                print('inventory_holds table already exists.')
+
+            db.session.commit()
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_inventory_holds()
@@ -0,0 +1,40 @@
+from app import db, create_app
+from sqlalchemy import text
+
+# Sort key plus id of every listing served with cursor pagination
+KEYSET_INDEXES = [
+    ('ix_products_name', 'products', 'name, id'),
+    ('ix_products_price', 'products', 'price, id'),
+    ('ix_products_created', 'products', 'created_at, id'),
+    ('ix_coupons_created', 'coupons', 'created_at, id'),
+    ('ix_users_created', 'users', 'created_at, id'),
+    ('ix_redemptions_user_redeemed', 'redemptions', 'user_id, redeemed_at, id'),
+    ('ix_redemptions_coupon_redeemed', 'redemptions', 'coupon_id, redeemed_at, id'),
+]
+
+def migrate_add_keyset_indexes():
+    app = create_app()
+    with app.app_context():
+        try:
+            for name, table, columns in KEYSET_INDEXES:
+                # Check if the index exists
+                result = db.session.execute(text("""
+                    SELECT name FROM sqlite_master
+                    WHERE type='index' AND name=:name
+                """), {'name': name})
+
+                if not result.fetchone():
+                    db.session.execute(text(f'CREATE INDEX {name} ON {table} ({columns})'))
+                    print(f'Created index {name}.')
+                else:
+                    print(f'Index {name} already exists.')
+
+            db.session.commit()
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_keyset_indexes()
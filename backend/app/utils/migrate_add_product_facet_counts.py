@@ -0,0 +1,36 @@
+from app import db, create_app
+from app.models import ProductFacetCount
+from app.utils.product_facets import create_facet_triggers, rebuild_facet_counts
+from sqlalchemy import text
+
+def migrate_add_product_facet_counts():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if product_facet_counts table exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='product_facet_counts'
+            """))
+
+            if not result.fetchone():
+                ProductFacetCount.__table__.create(db.session.connection())
+                db.session.commit()
+                print('Successfully created product_facet_counts table.')
+            else:
+                print('product_facet_counts table already exists.')
+
+            # Triggers keeping the counts in sync with products
+            create_facet_triggers(db.session.connection())
+            db.session.commit()
+
+            # Count (or recount) the existing catalog
+            rebuild_facet_counts()
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_product_facet_counts()
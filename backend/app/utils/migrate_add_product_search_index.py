@@ -0,0 +1,32 @@
+from app import db, create_app
+from app.utils.search_index import product_search
+from sqlalchemy import text
+
+def migrate_add_product_search_index():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if the product_search full-text table exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='product_search'
+            """))
+
+            if not result.fetchone():
+                # Create the FTS5 table and the triggers keeping it in sync
+                product_search.create(db.session.connection())
+                db.session.commit()
+                print('Successfully created product_search index.')
+            else:
+                print('product_search index already exists.')
+
+            # Index (or re-index) every existing product
+            product_search.rebuild()
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_product_search_index()
@@ -0,0 +1,53 @@
+from app import db, create_app
+from app.utils.redeemed_coupons import rebuild_redeemed_coupons
+from sqlalchemy import text
+
+def migrate_add_redeemed_coupons_index():
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check if user_redeemed_coupons table exists
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='user_redeemed_coupons'
+            """))
+
+            if result.fetchone():
+                columns = [row[1] for row in db.session.execute(text('PRAGMA table_info(user_redeemed_coupons)'))]
+                if 'coupon_ids' in columns:
+                    # Replace the earlier one-row-per-user layout; the backfill refills it
+                    db.session.execute(text('DROP TABLE user_redeemed_coupons'))
+                    db.session.commit()
+                    print('Dropped the per-user user_redeemed_coupons layout.')
+
+            result = db.session.execute(text("""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name='user_redeemed_coupons'
+            """))
+
+            if not result.fetchone():
+                # Create the per-user redeemed-coupon index
+                db.session.execute(text("""
+                    CREATE TABLE user_redeemed_coupons (
+                        user_id INTEGER NOT NULL REFERENCES users(id),
+                        coupon_id INTEGER NOT NULL REFERENCES coupons(id) ON DELETE CASCADE,
+                        redeemed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, coupon_id)
+                    )
+                """))
+                db.session.commit()
+                print('Successfully created user_redeemed_coupons table.')
+            else:
+                print('user_redeemed_coupons table already exists.')
+
+            # Backfill (or refresh) the index from existing redemptions
+            users = rebuild_redeemed_coupons()
+            print(f'Indexed redeemed coupons of {users} users.')
+            print('Migration completed successfully!')
+
+        except Exception as e:
+            print(f'Error during migration: {str(e)}')
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate_add_redeemed_coupons_index()
@@ -0,0 +1,164 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+`paginate_query()` serves a listing in one of two modes, chosen by the
+request:
+
+- Page numbers (`?page=N`, the default): `OFFSET` plus `COUNT(*)` as before,
+  with the same `pagination` fields.
+- Cursor (`?cursor=`, empty for the first page): rows after the last row of
+  the previous page by sort key, `WHERE (sort_key, id) > (:last, :last_id)
+  ORDER BY sort_key, id LIMIT per_page + 1`. The cost of a page no longer
+  depends on how deep it is. The response carries `next_cursor` and
+  `has_more`; the exact `total` is only counted with `include_total=true`.
+
+A cursor is an opaque token holding the sort key values of the last row and
+a fingerprint of the ordering, so a cursor cannot be replayed against a
+different sort. Sort keys must be non-null and end with a unique column
+(the primary key) so every row has one position.
+"""
+
+from flask import request
+from app import db
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+
+MAX_PER_PAGE = 100
+
+
+class InvalidCursorError(ValueError):
+    """Raised for a cursor that is malformed or was issued for another ordering"""
+
+
+def _fingerprint(order):
+    names = ','.join(f'{column}:{"desc" if descending else "asc"}' for column, descending in order)
+    return hashlib.sha1(names.encode()).hexdigest()[:8]
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.datetime.fromisoformat(value['dt'])
+        if 'dec' in value:
+            return decimal.Decimal(value['dec'])
+        raise ValueError('unknown value type')
+    return value
+
+
+def encode_cursor(order, values):
+    payload = {'o': _fingerprint(order), 'k': [_encode_value(value) for value in values]}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(order, token):
+    """Sort key values of the row a cursor points after"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values = [_decode_value(value) for value in payload['k']]
+        fingerprint = payload['o']
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursorError('Invalid cursor')
+    if fingerprint != _fingerprint(order) or len(values) != len(order):
+        raise InvalidCursorError('Cursor does not match this listing order')
+    return values
+
+
+def after_keys(order, values):
+    """Condition selecting the rows that come after `values` in `order`"""
+    columns = [column for column, _ in order]
+    directions = {descending for _, descending in order}
+    if len(directions) == 1:
+        # One direction: a row-value comparison the index can seek on
+        if directions.pop():
+            return db.tuple_(*columns) < db.tuple_(*values)
+        return db.tuple_(*columns) > db.tuple_(*values)
+
+    alternatives = []
+    for i, (column, descending) in enumerate(order):
+        equal = [columns[j] == values[j] for j in range(i)]
+        alternatives.append(db.and_(*equal, column < values[i] if descending else column > values[i]))
+    return db.or_(*alternatives)
+
+
+def _row_value(row, column):
+    """Value of `column` in a result row (a model instance or a tuple of them)"""
+    if isinstance(row, column.class_):
+        return getattr(row, column.key)
+    for entity in row:
+        if isinstance(entity, column.class_):
+            return getattr(entity, column.key)
+    raise ValueError(f'{column} is not in the result row')
+
+
+class Page:
+    """One page of a listing, in either mode. `total` is None in cursor mode
+    unless it was asked for."""
+
+    def __init__(self, items, per_page, page=None, pagination=None, next_cursor=None, has_more=False, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.page = page
+        self.pagination = pagination
+        self.next_cursor = next_cursor
+        self.has_more = has_more
+        self.total = total
+
+    def to_dict(self):
+        if self.pagination is not None:
+            return {
+                'page': self.page,
+                'per_page': self.per_page,
+                'total': self.total,
+                'pages': self.pagination.pages,
+                'has_next': self.pagination.has_next,
+                'has_prev': self.pagination.has_prev
+            }
+        data = {
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'has_more': self.has_more
+        }
+        if self.total is not None:
+            data['total'] = self.total
+        return data
+
+
+def paginate_query(query, order, args=None):
+    """Order `query` by `order` ((column, descending) pairs, unique column
+    last) and return the requested Page. Raises InvalidCursorError."""
+    args = request.args if args is None else args
+    per_page = args.get('per_page', 10, type=int)
+
+    if 'cursor' not in args:
+        page = args.get('page', 1, type=int)
+        ordered = query.order_by(*[column.desc() if descending else column.asc() for column, descending in order])
+        pagination = ordered.paginate(page=page, per_page=per_page, error_out=False)
+        return Page(pagination.items, per_page, page=page, pagination=pagination, total=pagination.total)
+
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    total = query.order_by(None).count() if args.get('include_total', '').lower() in ('true', '1') else None
+
+    token = args.get('cursor', '').strip()
+    if token:
+        query = query.filter(after_keys(order, decode_cursor(order, token)))
+    rows = query.order_by(
+        *[column.desc() if descending else column.asc() for column, descending in order]
+    ).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(order, [_row_value(rows[-1], column) for column, _ in order])
+    return Page(rows, per_page, next_cursor=next_cursor, has_more=has_more, total=total)
@@ -0,0 +1,307 @@
+"""
+Versioned read-through cache for catalog reads.
+
+Product listings, product details and the category list are cached per
+process, keyed by their request parameters and tagged with the catalog
+version they were computed at. The version is a counter in `cache_versions`
+shared by every worker; a write to the catalog bumps it, and every entry
+tagged with an older version is then a miss (O(1) invalidation, old entries
+age out of the LRU).
+
+Bumping:
+
+- ORM writes to products (admin create/update/delete, bulk upload) are
+  detected at flush time.
+- Core statements that bypass the ORM call `bump_catalog_version()`.
+
+Stock levels alone do not bump: every checkout would otherwise write the
+version row and empty every worker's cache. A stock change only bumps when
+the product sells out or comes back in stock, so cached reads may show a unit
+count up to PRODUCT_CACHE_TTL_SECONDS old, never the wrong availability.
+
+Either way the bump is only flagged on the session and written once, as the
+last statement before COMMIT, so a bulk write bumps once per transaction and
+the version row is locked only for the commit itself. A rolled back
+transaction bumps nothing.
+
+Workers read the shared version at most every PRODUCT_CACHE_VERSION_CHECK_SECONDS,
+which bounds how long another worker's write can go unseen; the writing
+worker sees its own writes immediately.
+
+Stampede protection: one request per key and process loads a missing entry
+while concurrent requests for the same key wait for its result, or are served
+the previous version's entry if there is one, instead of all going to the
+database after a bump.
+"""
+
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from app import db
+from app.models import Product, CacheVersion
+import threading
+import time
+
+DEFAULT_PRODUCT_CACHE_TTL_SECONDS = 300
+DEFAULT_MAX_PRODUCT_ENTRIES_CACHED = 5000
+DEFAULT_VERSION_CHECK_SECONDS = 1.0
+
+CATALOG_VERSION = 'catalog'
+
+# How long a request waits for another request loading the same key
+LOAD_WAIT_SECONDS = 5.0
+
+_BUMP_FLAG = 'bump_catalog_version'
+
+# Product columns whose changes alone leave cached reads valid; stock_quantity
+# only counts when it crosses zero
+STOCK_COLUMNS = ('stock_quantity', 'reserved_quantity', 'updated_at')
+
+
+def bump_catalog_version():
+    """Invalidate cached catalog reads when the current transaction commits"""
+    db.session.info[_BUMP_FLAG] = True
+
+
+def _write_version_bump(session):
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(CacheVersion).values(name=CATALOG_VERSION, version=1)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[CacheVersion.name],
+            set_={'version': CacheVersion.version + 1}
+        ))
+        return
+
+    result = session.execute(
+        db.update(CacheVersion)
+        .where(CacheVersion.name == CATALOG_VERSION)
+        .values(version=CacheVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        session.execute(db.insert(CacheVersion).values(name=CATALOG_VERSION, version=1))
+
+
+class _Load:
+    """A load in flight that concurrent requests for the same key can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class ProductCache:
+    """Catalog read cache with version tagging, TTL expiry and an LRU bound.
+
+    A `ttl` of 0 disables caching; every read then goes to the database.
+    """
+
+    def __init__(self, ttl=DEFAULT_PRODUCT_CACHE_TTL_SECONDS, max_entries=DEFAULT_MAX_PRODUCT_ENTRIES_CACHED,
+                 version_check=DEFAULT_VERSION_CHECK_SECONDS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_check = version_check
+        # key -> (version, expires_at, value), least recently used first
+        self._entries = OrderedDict()
+        self._loads = {}
+        self._mutex = threading.Lock()
+        self._version = None
+        self._version_read_at = 0.0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'stale_hits': 0,
+            'coalesced': 0,
+            'loads': 0,
+            'evictions': 0,
+            'version_reads': 0
+        }
+
+    def version(self):
+        """Current catalog version, re-read from the database every `version_check` seconds"""
+        now = time.monotonic()
+        with self._mutex:
+            if self._version is not None and now - self._version_read_at < self.version_check:
+                return self._version
+        version = db.session.execute(
+            db.select(CacheVersion.version).where(CacheVersion.name == CATALOG_VERSION)
+        ).scalar() or 0
+        with self._mutex:
+            self._version = version
+            self._version_read_at = now
+            self._stats['version_reads'] += 1
+        return version
+
+    def version_changed(self):
+        """Re-read the version on the next lookup (this process just bumped it)"""
+        with self._mutex:
+            self._version = None
+
+    def get_or_load(self, key, loader):
+        """Cached value for `key`, calling `loader()` to compute it on a miss"""
+        if self.ttl <= 0:
+            return loader()
+
+        version = self.version()
+        now = time.time()
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[2]
+
+            load = self._loads.get(key)
+            if load is not None and entry is not None and entry[1] > now:
+                # Someone is already refreshing it: serve the previous version
+                self._stats['stale_hits'] += 1
+                return entry[2]
+            if load is None:
+                load = self._loads[key] = _Load()
+                leader = True
+                self._stats['misses'] += 1
+            else:
+                leader = False
+
+        if not leader:
+            if load.done.wait(LOAD_WAIT_SECONDS) and not load.failed:
+                with self._mutex:
+                    self._stats['coalesced'] += 1
+                return load.value
+            return loader()
+
+        try:
+            value = loader()
+        except Exception:
+            load.failed = True
+            raise
+        else:
+            load.value = value
+            self._store(key, version, value)
+            return value
+        finally:
+            with self._mutex:
+                self._stats['loads'] += 1
+                self._loads.pop(key, None)
+            load.done.set()
+
+    def clear(self):
+        with self._mutex:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        with self._mutex:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['version'] = self._version
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl
+        stats['version_check_seconds'] = self.version_check
+        lookups = stats['hits'] + stats['stale_hits'] + stats['coalesced'] + stats['misses']
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _store(self, key, version, value):
+        with self._mutex:
+            # A bump seen while loading means the value may predate it
+            if self._version is not None and self._version != version:
+                return
+            self._entries[key] = (version, time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+
+class ProductCacheExtension:
+    """Flask extension holding the product cache of the current app"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['product_cache'] = ProductCache(
+            ttl=int(app.config.get('PRODUCT_CACHE_TTL_SECONDS', DEFAULT_PRODUCT_CACHE_TTL_SECONDS)),
+            max_entries=int(app.config.get('PRODUCT_CACHE_MAX_ENTRIES', DEFAULT_MAX_PRODUCT_ENTRIES_CACHED)),
+            version_check=float(app.config.get('PRODUCT_CACHE_VERSION_CHECK_SECONDS',
+                                               DEFAULT_VERSION_CHECK_SECONDS))
+        )
+
+    @property
+    def cache(self):
+        return current_app.extensions['product_cache']
+
+    def get_or_load(self, key, loader):
+        return self.cache.get_or_load(key, loader)
+
+    def version(self):
+        return self.cache.version()
+
+    def clear(self):
+        return self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
+
+
+product_cache = ProductCacheExtension()
+
+
+def stock_crossed_zero(before, after):
+    """Whether a stock change sells a product out or brings it back"""
+    return ((before or 0) > 0) != ((after or 0) > 0)
+
+
+def _changes_catalog(product):
+    """Whether an updated product changed anything cached reads show"""
+    state = inspect(product)
+    for attr in state.mapper.column_attrs:
+        history = state.attrs[attr.key].history
+        if not history.has_changes():
+            continue
+        if attr.key not in STOCK_COLUMNS:
+            return True
+        if attr.key == 'stock_quantity':
+            if not history.deleted:
+                # The previous level was never loaded
+                return True
+            if stock_crossed_zero(history.deleted[0], history.added[0] if history.added else None):
+                return True
+    return False
+
+
+@event.listens_for(db.session, 'before_flush')
+def flag_product_writes(session, flush_context, instances):
+    """Flag a version bump when the flush writes catalog-visible product data"""
+    if any(isinstance(obj, Product) for obj in (*session.new, *session.deleted)) \
+            or any(isinstance(obj, Product) and _changes_catalog(obj) for obj in session.dirty):
+        session.info[_BUMP_FLAG] = True
+
+
+@event.listens_for(db.session, 'before_commit')
+def write_version_bump(session):
+    session.flush()
+    if session.info.pop(_BUMP_FLAG, False):
+        _write_version_bump(session)
+        session.info['catalog_version_bumped'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def refresh_local_version(session):
+    if session.info.pop('catalog_version_bumped', False) and has_app_context() \
+            and 'product_cache' in current_app.extensions:
+        product_cache.cache.version_changed()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def drop_version_bump(session):
+    session.info.pop(_BUMP_FLAG, None)
+    session.info.pop('catalog_version_bumped', None)
@@ -0,0 +1,83 @@
+"""
+Streaming export of the product catalog.
+
+`export_chunks()` reads the products through a server-side cursor (rows are
+fetched `batch_size` at a time instead of materializing the result) and
+renders each batch as CSV or NDJSON, optionally gzip-compressed on the fly,
+so memory stays constant whatever the catalog size. The columns are the ones
+the importer accepts (IMPORT_COLUMNS), so an export can be imported again.
+"""
+
+from app import db
+from app.models import Product
+from app.utils.product_import import IMPORT_COLUMNS
+from io import StringIO
+import csv
+import json
+import zlib
+
+DEFAULT_EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+
+def _csv_value(column, value):
+    if value is None:
+        return ''
+    if column == 'is_active':
+        return 'true' if value else 'false'
+    return value
+
+
+def _json_value(column, value):
+    if value is not None and column in ('price', 'minimum_order_value'):
+        return float(value)
+    return value
+
+
+def export_rows(query=None, batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+    """Yield batches of product rows (tuples in IMPORT_COLUMNS order), by id"""
+    query = query if query is not None else db.select(*[getattr(Product, column) for column in IMPORT_COLUMNS])
+    result = db.session.execute(
+        query.order_by(Product.id).execution_options(stream_results=True, yield_per=batch_size)
+    )
+    for batch in result.partitions():
+        yield batch
+
+
+def render_csv(batches):
+    yield ','.join(IMPORT_COLUMNS) + '\r\n'
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for batch in batches:
+        writer.writerows([_csv_value(column, value) for column, value in zip(IMPORT_COLUMNS, row)] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def render_ndjson(batches):
+    for batch in batches:
+        yield ''.join(
+            json.dumps({column: _json_value(column, value) for column, value in zip(IMPORT_COLUMNS, row)}) + '\n'
+            for row in batch
+        )
+
+
+def gzip_chunks(chunks):
+    """Compress text chunks into one gzip stream as they are produced"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(data_format='csv', compress=False, query=None, batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+    """Generator of the export body, one piece per batch of products"""
+    batches = export_rows(query, batch_size)
+    chunks = render_csv(batches) if data_format == 'csv' else render_ndjson(batches)
+    if compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
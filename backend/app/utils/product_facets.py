@@ -0,0 +1,215 @@
+"""
+Facet counts for product browsing.
+
+`product_facet_counts` holds, for every facet value, how many active products
+have it: one row per category, brand, price band and availability (in or out
+of stock). Listings read the few rows of a facet instead of running a
+`GROUP BY` over the catalog on every request.
+
+The counts are maintained by triggers on `products`, so every write path
+(ORM, bulk Core statements, the guarded stock decrements of checkout) keeps
+them current in the same transaction:
+
+- INSERT adds the new row's facet values, DELETE removes the old row's.
+- UPDATE moves the row from its old values to its new ones, and only fires
+  when an active flag or facet value actually changes, so a stock decrement
+  only touches the counts when the product sells out or is restocked.
+
+`rebuild_facet_counts()` recomputes everything, after a migration or if the
+price bands change.
+
+The maintained rows count the whole active catalog. A listing with filters
+applied counts with one `GROUP BY` per facet instead, over the products
+matching the filters of the other facets, so each value's count is what
+selecting it would show (a category's count ignores the category filter but
+honours the brand and price ones).
+
+`ddl()` is the only definition of the triggers: init_db.sql carries its
+PostgreSQL output between generated markers, refreshed with
+`python -m app.utils.product_facets`.
+"""
+
+from sqlalchemy import event, text
+from app import db
+from app.models import Product, ProductFacetCount
+import os
+import re
+
+# Lower bounds of the price bands; a band runs up to the next bound
+PRICE_BANDS = (0, 25, 50, 100, 250, 500)
+
+FACETS = ('category', 'brand', 'price', 'availability')
+
+IN_STOCK = 'in_stock'
+OUT_OF_STOCK = 'out_of_stock'
+
+# Columns whose change can move a product between facet values
+_TRACKED_COLUMNS = ('category', 'brand', 'price', 'stock_quantity', 'is_active')
+
+INIT_SQL_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'init_db.sql')
+INIT_SQL_BEGIN = '-- BEGIN product facet triggers (generated by `python -m app.utils.product_facets`, do not edit)'
+INIT_SQL_END = '-- END product facet triggers'
+
+
+def price_band_label(index):
+    low = PRICE_BANDS[index]
+    if index + 1 < len(PRICE_BANDS):
+        return f'{low}-{PRICE_BANDS[index + 1]}'
+    return f'{low}+'
+
+
+def facet_value_sql(row):
+    """SQL expressions of each facet value of `row` (new/old/products)"""
+    bands = ' '.join(f"WHEN {row}.price < {PRICE_BANDS[i + 1]} THEN '{price_band_label(i)}'"
+                     for i in range(len(PRICE_BANDS) - 1))
+    return {
+        'category': f'{row}.category',
+        'brand': f'{row}.brand',
+        'price': f"CASE {bands} ELSE '{price_band_label(len(PRICE_BANDS) - 1)}' END",
+        'availability': (f"CASE WHEN coalesce({row}.stock_quantity, 0) > 0 "
+                         f"THEN '{IN_STOCK}' ELSE '{OUT_OF_STOCK}' END")
+    }
+
+
+def _changed(facet, dialect):
+    old, new = facet_value_sql('old')[facet], facet_value_sql('new')[facet]
+    if dialect == 'postgresql':
+        return f'({old}) IS DISTINCT FROM ({new})'
+    return f'({old}) IS NOT ({new})'
+
+
+def _add(row, facet, delta):
+    value = facet_value_sql(row)[facet]
+    return (f"INSERT INTO product_facet_counts (facet, value, product_count) "
+            f"SELECT '{facet}', {value}, {delta} WHERE {row}.is_active AND {value} IS NOT NULL "
+            f"ON CONFLICT (facet, value) DO UPDATE SET "
+            f"product_count = product_facet_counts.product_count + {delta};")
+
+
+def ddl(dialect):
+    """Statements creating the triggers on `dialect`"""
+    if dialect == 'sqlite':
+        statements = [
+            'CREATE TRIGGER IF NOT EXISTS product_facets_ai AFTER INSERT ON products BEGIN '
+            + ' '.join(_add('new', facet, 1) for facet in FACETS) + ' END',
+            'CREATE TRIGGER IF NOT EXISTS product_facets_ad AFTER DELETE ON products BEGIN '
+            + ' '.join(_add('old', facet, -1) for facet in FACETS) + ' END'
+        ]
+        # One UPDATE trigger per facet, so unrelated changes skip it
+        for facet in FACETS:
+            statements.append(
+                f'CREATE TRIGGER IF NOT EXISTS product_facets_au_{facet} '
+                f'AFTER UPDATE OF {", ".join(_TRACKED_COLUMNS)} ON products '
+                f'WHEN old.is_active IS NOT new.is_active OR {_changed(facet, dialect)} '
+                f'BEGIN {_add("old", facet, -1)} {_add("new", facet, 1)} END'
+            )
+        return statements
+
+    if dialect == 'postgresql':
+        remove = ' '.join(_add('old', facet, -1) for facet in FACETS)
+        add = ' '.join(_add('new', facet, 1) for facet in FACETS)
+        changed = ' OR '.join(_changed(facet, dialect) for facet in FACETS)
+        return [
+            'CREATE OR REPLACE FUNCTION product_facets_apply() RETURNS trigger AS $$ BEGIN '
+            f"IF TG_OP IN ('UPDATE', 'DELETE') THEN {remove} END IF; "
+            f"IF TG_OP IN ('INSERT', 'UPDATE') THEN {add} END IF; "
+            'RETURN NULL; END $$ LANGUAGE plpgsql',
+            'DROP TRIGGER IF EXISTS product_facets_aid ON products',
+            'CREATE TRIGGER product_facets_aid AFTER INSERT OR DELETE ON products '
+            'FOR EACH ROW EXECUTE FUNCTION product_facets_apply()',
+            'DROP TRIGGER IF EXISTS product_facets_au ON products',
+            f'CREATE TRIGGER product_facets_au AFTER UPDATE OF {", ".join(_TRACKED_COLUMNS)} ON products '
+            f'FOR EACH ROW WHEN (old.is_active IS DISTINCT FROM new.is_active OR {changed}) '
+            'EXECUTE FUNCTION product_facets_apply()'
+        ]
+    return []
+
+
+def create_facet_triggers(connection):
+    for statement in ddl(connection.dialect.name):
+        connection.execute(text(statement))
+
+
+def init_sql_block():
+    """The PostgreSQL trigger DDL as init_db.sql carries it, markers included"""
+    return '\n'.join([INIT_SQL_BEGIN] + [f'{statement};' for statement in ddl('postgresql')] + [INIT_SQL_END])
+
+
+def write_init_sql(path=INIT_SQL_PATH):
+    """Replace the generated trigger block of init_db.sql with the current DDL"""
+    with open(path) as f:
+        sql = f.read()
+    pattern = re.compile(re.escape(INIT_SQL_BEGIN) + '.*?' + re.escape(INIT_SQL_END), re.S)
+    with open(path, 'w') as f:
+        f.write(pattern.sub(lambda match: init_sql_block(), sql))
+
+
+@event.listens_for(Product.__table__, 'after_create')
+def _after_create(target, connection, **kw):
+    create_facet_triggers(connection)
+
+
+def rebuild_facet_counts():
+    """Recompute every count from the products table. Commits."""
+    db.session.execute(db.delete(ProductFacetCount))
+    for facet, value in facet_value_sql('products').items():
+        db.session.execute(text(
+            f"INSERT INTO product_facet_counts (facet, value, product_count) "
+            f"SELECT '{facet}', {value}, count(*) FROM products "
+            f"WHERE products.is_active AND {value} IS NOT NULL GROUP BY {value}"
+        ))
+    db.session.commit()
+
+
+def _format(result):
+    bands = [price_band_label(i) for i in range(len(PRICE_BANDS))]
+    for facet, values in result.items():
+        if facet != 'price':
+            values.sort(key=lambda entry: (-entry['count'], entry['value']))
+            continue
+        values.sort(key=lambda entry: bands.index(entry['value']))
+        for entry in values:
+            index = bands.index(entry['value'])
+            entry['min_price'] = PRICE_BANDS[index]
+            entry['max_price'] = PRICE_BANDS[index + 1] if index + 1 < len(PRICE_BANDS) else None
+    return result
+
+
+def _filtered_counts(facets, filters):
+    result = {}
+    for facet in facets:
+        value = db.literal_column(facet_value_sql('products')[facet])
+        others = [clause for other, clauses in filters.items() if other != facet for clause in clauses]
+        rows = db.session.query(value, db.func.count()).select_from(Product).filter(
+            Product.is_active == True, value.isnot(None), *others
+        ).group_by(value).all()
+        result[facet] = [{'value': row[0], 'count': row[1]} for row in rows]
+    return result
+
+
+def facet_counts(facets=FACETS, filters=None):
+    """{facet: [{'value', 'count'}, ...]} for the requested facets.
+
+    `filters` maps a facet to the clauses of the listing filter on it; each
+    facet is counted under the filters of the others. Without filters the
+    maintained counts are read. Categories and brands are ordered by count,
+    price bands by price (with their `min_price`/`max_price` bounds for the
+    listing filters).
+    """
+    filters = {facet: clauses for facet, clauses in (filters or {}).items() if clauses}
+    if filters:
+        return _format(_filtered_counts(facets, filters))
+
+    rows = ProductFacetCount.query.filter(
+        ProductFacetCount.facet.in_(facets),
+        ProductFacetCount.product_count > 0
+    ).all()
+
+    result = {facet: [] for facet in facets}
+    for row in rows:
+        result[row.facet].append({'value': row.value, 'count': row.product_count})
+    return _format(result)
+
+
+if __name__ == '__main__':
+    write_init_sql()
@@ -0,0 +1,277 @@
+"""
+Streaming bulk import of products from CSV.
+
+The upload is parsed row by row as it is read from the request stream, so the
+file is never held in memory. SKU uniqueness is checked against a set of the
+existing SKUs loaded once up front (plus the SKUs accepted so far), not with a
+query per row. Rows are imported in chunks with one multi-row INSERT (skipping
+SKUs created concurrently) and one commit per chunk, so a large import never
+holds a huge session or a long transaction, and the rows of committed chunks
+stay imported if a later one fails. Subclasses can record progress in each
+chunk's transaction and cancel between chunks (see app.utils.import_jobs).
+
+Rows that cannot be imported are reported as structured errors
+(`{'row', 'sku', 'field', 'error'}`); only the first `max_errors` are kept, the
+count covers all of them.
+"""
+
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Product
+from app.utils.product_cache import bump_catalog_version
+import codecs
+import csv
+import datetime
+import gzip
+import math
+import random
+import string
+
+# Column layout of an import file; `name` and `price` are required
+IMPORT_COLUMNS = ('name', 'description', 'price', 'category', 'brand', 'sku',
+                  'stock_quantity', 'is_active', 'image_url', 'minimum_order_value')
+REQUIRED_COLUMNS = ('name', 'price')
+
+DEFAULT_IMPORT_CHUNK_SIZE = 1000
+DEFAULT_MAX_REPORTED_ERRORS = 100
+
+GENERATED_SKU_LENGTH = 8
+
+
+class ImportCancelled(Exception):
+    """Raised by ProductImport.run() when the import was cancelled"""
+
+
+class RowError(ValueError):
+    """Raised for a row that cannot be imported"""
+
+    def __init__(self, message, field=None):
+        self.field = field
+        super().__init__(message)
+
+
+def open_upload(stream, filename):
+    """Binary stream of an upload, decompressed as it is read for .gz files"""
+    if (filename or '').lower().endswith('.gz'):
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+
+def read_csv_rows(stream, encoding='utf-8-sig', required=REQUIRED_COLUMNS):
+    """Yield (row number, row dict) from a binary stream, decoding as it goes.
+
+    Row numbers are file line numbers of the record (the header is row 1).
+    Raises RowError if a `required` column is missing from the header.
+    """
+    reader = csv.DictReader(codecs.iterdecode(stream, encoding))
+    columns = [column.strip() for column in reader.fieldnames or []]
+    missing = [column for column in required if column not in columns]
+    if missing:
+        raise RowError(f'Missing required columns: {", ".join(missing)}')
+    reader.fieldnames = columns
+
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _text(row, column):
+    value = row.get(column)
+    return '' if value is None else str(value).strip()
+
+
+def _whole_number(value):
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return int(number) if number.is_integer() else None
+
+
+def _number(row, column, parse, default=None):
+    value = _text(row, column)
+    if not value:
+        return default
+    try:
+        number = parse(value)
+    except (ValueError, TypeError):
+        # JSON feeds may write whole numbers as 3.0
+        number = _whole_number(value) if parse is int else None
+        if number is None:
+            raise RowError(f'Invalid {column} format - {value}', field=column)
+    if isinstance(number, float) and not math.isfinite(number):
+        raise RowError(f'Invalid {column} format - {value}', field=column)
+    return number
+
+
+def parse_product_row(row):
+    """Column values of a product from one import row. Raises RowError."""
+    name = _text(row, 'name')
+    if not name or not _text(row, 'price'):
+        raise RowError('Missing required fields (name and price are required)',
+                       field='name' if not name else 'price')
+
+    return {
+        'name': name,
+        'description': _text(row, 'description'),
+        'price': _number(row, 'price', float),
+        'category': _text(row, 'category') or 'All',
+        'brand': _text(row, 'brand'),
+        'sku': _text(row, 'sku'),
+        'stock_quantity': _number(row, 'stock_quantity', int, default=0),
+        'is_active': (_text(row, 'is_active') or 'true').lower() == 'true',
+        'image_url': _text(row, 'image_url'),
+        'minimum_order_value': _number(row, 'minimum_order_value', float)
+    }
+
+
+def parse_product_fields(row):
+    """Values of the columns given in `row`, for partial updates; blank or
+    missing columns are left out. Raises RowError."""
+    values = {}
+    for column in IMPORT_COLUMNS:
+        if not _text(row, column):
+            continue
+        if column in ('price', 'minimum_order_value'):
+            values[column] = _number(row, column, float)
+        elif column == 'stock_quantity':
+            values[column] = _number(row, column, int)
+        elif column == 'is_active':
+            values[column] = _text(row, column).lower() == 'true'
+        else:
+            values[column] = _text(row, column)
+    return values
+
+
+class ProductImport:
+    """Import products from (row number, row dict) pairs in committed chunks.
+
+    `run()` returns `stats` (processed, imported, error_count, chunks);
+    `errors` holds the first `max_errors` row errors.
+    """
+
+    def __init__(self, created_by, chunk_size=DEFAULT_IMPORT_CHUNK_SIZE, max_errors=DEFAULT_MAX_REPORTED_ERRORS):
+        self.created_by = created_by
+        self.chunk_size = max(int(chunk_size), 1)
+        self.max_errors = max(int(max_errors), 0)
+        self.skus = None
+        self.errors = []
+        self.stats = {
+            'processed': 0,
+            'imported': 0,
+            'error_count': 0,
+            'chunks': 0
+        }
+
+    def load_existing_skus(self):
+        self.skus = set()
+        for sku in db.session.execute(db.select(Product.sku).where(Product.sku.isnot(None))).scalars():
+            self.skus.add(sku)
+
+    def add_error(self, row_num, message, sku=None, field=None):
+        self.stats['error_count'] += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_num, 'sku': sku or None, 'field': field, 'error': message})
+
+    def generate_sku(self):
+        while True:
+            sku = ''.join(random.choices(string.ascii_uppercase + string.digits, k=GENERATED_SKU_LENGTH))
+            if sku not in self.skus:
+                return sku
+
+    def accept(self, row_num, row):
+        """Validated column values of `row`, or None after recording its error"""
+        try:
+            values = parse_product_row(row)
+        except RowError as e:
+            self.add_error(row_num, str(e), sku=_text(row, 'sku'), field=e.field)
+            return None
+
+        if not values['sku']:
+            values['sku'] = self.generate_sku()
+        elif values['sku'] in self.skus:
+            self.add_error(row_num, 'SKU already exists', sku=values['sku'], field='sku')
+            return None
+        self.skus.add(values['sku'])
+        return values
+
+    def cancelled(self):
+        """Checked before each chunk; a subclass returns True to stop the import"""
+        return False
+
+    def checkpoint(self, last_row):
+        """Called in each chunk's transaction before it commits, with the last row
+        it covers; a subclass records progress here"""
+
+    def insert_rows(self, rows):
+        """Insert `rows`, skipping SKUs that exist already; returns the inserted SKUs"""
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            statement = dialect_insert(Product).on_conflict_do_nothing(index_elements=[Product.sku])
+            return set(db.session.execute(statement.returning(Product.sku), rows).scalars())
+
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(Product), rows)
+            return {row['sku'] for row in rows}
+        except IntegrityError:
+            inserted = set()
+            for row in rows:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(db.insert(Product), [row])
+                    inserted.add(row['sku'])
+                except IntegrityError:
+                    pass
+            return inserted
+
+    def insert_chunk(self, chunk, last_row):
+        """Insert and commit one chunk of (row number, values) pairs, which may be
+        empty when every row since the last chunk was rejected"""
+        if self.cancelled():
+            raise ImportCancelled('Import cancelled')
+
+        if chunk:
+            now = datetime.datetime.utcnow()
+            inserted = self.insert_rows([
+                dict(values, created_by=self.created_by, created_at=now, updated_at=now) for _, values in chunk
+            ])
+            # A SKU created concurrently since the SKUs were loaded
+            for row_num, values in chunk:
+                if values['sku'] not in inserted:
+                    self.add_error(row_num, 'SKU already exists', sku=values['sku'], field='sku')
+            if inserted:
+                # Core inserts are not seen by the flush-time detection
+                bump_catalog_version()
+            self.stats['imported'] += len(inserted)
+
+        self.checkpoint(last_row)
+        db.session.commit()
+        self.stats['chunks'] += 1
+
+    def run(self, rows):
+        """Import `rows`, committing every `chunk_size` rows. Raises ImportCancelled
+        if `cancelled()` turns True; the chunks committed until then stay."""
+        if self.skus is None:
+            self.load_existing_skus()
+
+        chunk = []
+        pending = 0
+        last_row = 0
+        for row_num, row in rows:
+            self.stats['processed'] += 1
+            pending += 1
+            last_row = row_num
+            values = self.accept(row_num, row)
+            if values is not None:
+                chunk.append((row_num, values))
+            if pending >= self.chunk_size:
+                self.insert_chunk(chunk, last_row)
+                chunk = []
+                pending = 0
+        if pending:
+            self.insert_chunk(chunk, last_row)
+        return self.stats
@@ -0,0 +1,167 @@
+"""
+Bulk product upsert by SKU.
+
+Supplier feeds (CSV or NDJSON) are applied in chunks with set-based
+statements instead of one request, query and commit per product. For each
+chunk:
+
+- one SELECT loads the current values of the chunk's SKUs, locking their rows
+  (where the database supports it) so carts cannot hold more units meanwhile,
+- new SKUs are inserted with one multi-row `INSERT ... ON CONFLICT DO NOTHING`
+  (they need `name` and `price`),
+- existing SKUs whose given columns differ are updated with one executemany
+  UPDATE by primary key; rows that would not change anything are skipped and
+  counted as unchanged, and rows setting `stock_quantity` below the units held
+  in carts (`reserved_quantity`) are rejected,
+
+and the chunk commits with a single catalog version bump if it changed
+anything cached reads show: stock-only updates bump only when a product sells
+out or comes back in stock. Only the columns present in a record are applied, so a feed with
+`sku,price,stock_quantity` leaves names and descriptions alone.
+"""
+
+from app import db
+from app.models import Product
+from app.utils.product_import import (
+    ProductImport, ImportCancelled, RowError, IMPORT_COLUMNS, parse_product_fields
+)
+from app.utils.product_cache import bump_catalog_version, stock_crossed_zero
+import codecs
+import datetime
+import json
+
+# Column values of a new product not given by its record
+NEW_PRODUCT_DEFAULTS = {
+    'description': '',
+    'category': 'All',
+    'brand': '',
+    'stock_quantity': 0,
+    'is_active': True,
+    'image_url': '',
+    'minimum_order_value': None
+}
+
+_DECIMAL_COLUMNS = ('price', 'minimum_order_value')
+
+
+def read_ndjson_rows(stream, encoding='utf-8'):
+    """Yield (line number, record) from a binary NDJSON stream, decoding as it
+    goes. Blank lines are skipped; a line that is not valid JSON yields None."""
+    for line_num, line in enumerate(codecs.iterdecode(stream, encoding), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except ValueError:
+            yield line_num, None
+
+
+def _same(column, current, value):
+    if column in _DECIMAL_COLUMNS:
+        if current is None or value is None:
+            return current is None and value is None
+        return round(float(current), 2) == round(float(value), 2)
+    return current == value
+
+
+class ProductUpsert(ProductImport):
+    """Insert or update products by SKU in committed chunks.
+
+    `stats` adds inserted, updated and unchanged counts to those of
+    ProductImport (`imported` counts inserted plus updated).
+    """
+
+    def __init__(self, created_by, **kwargs):
+        super().__init__(created_by, **kwargs)
+        self.stats.update(inserted=0, updated=0, unchanged=0)
+
+    def load_existing_skus(self):
+        # Existing SKUs are looked up per chunk; this only tracks the SKUs seen
+        self.skus = set()
+
+    def accept(self, row_num, row):
+        if not isinstance(row, dict):
+            self.add_error(row_num, 'Invalid JSON object')
+            return None
+
+        sku = str(row.get('sku') or '').strip()
+        if not sku:
+            self.add_error(row_num, 'Missing sku', field='sku')
+            return None
+        if sku in self.skus:
+            self.add_error(row_num, 'SKU appears more than once in the file', sku=sku, field='sku')
+            return None
+
+        try:
+            values = parse_product_fields(row)
+        except RowError as e:
+            self.add_error(row_num, str(e), sku=sku, field=e.field)
+            return None
+        self.skus.add(sku)
+        return values
+
+    def insert_chunk(self, chunk, last_row):
+        if self.cancelled():
+            raise ImportCancelled('Import cancelled')
+
+        if chunk:
+            now = datetime.datetime.utcnow()
+            existing = {
+                row.sku: row for row in db.session.execute(
+                    db.select(Product.id, Product.sku, Product.reserved_quantity,
+                              *[getattr(Product, column) for column in IMPORT_COLUMNS if column != 'sku'])
+                    .where(Product.sku.in_([values['sku'] for _, values in chunk]))
+                    .with_for_update()
+                )
+            }
+
+            inserts = []
+            updates = []
+            catalog_changed = False
+            for row_num, values in chunk:
+                current = existing.get(values['sku'])
+                if current is None:
+                    if 'name' not in values or 'price' not in values:
+                        self.add_error(row_num, 'New SKU: name and price are required', sku=values['sku'],
+                                       field='price' if 'name' in values else 'name')
+                        continue
+                    inserts.append((row_num, dict(NEW_PRODUCT_DEFAULTS, **values, created_by=self.created_by,
+                                                  created_at=now, updated_at=now)))
+                    continue
+
+                changes = {column: value for column, value in values.items()
+                           if column != 'sku' and not _same(column, getattr(current, column), value)}
+                if changes.get('stock_quantity', current.reserved_quantity) < current.reserved_quantity:
+                    self.add_error(row_num, f'stock_quantity {changes["stock_quantity"]} is below the '
+                                            f'{current.reserved_quantity} units held in carts',
+                                   sku=values['sku'], field='stock_quantity')
+                    continue
+                if changes:
+                    updates.append(dict(changes, id=current.id, updated_at=now))
+                    catalog_changed = catalog_changed or set(changes) != {'stock_quantity'} \
+                        or stock_crossed_zero(current.stock_quantity, changes['stock_quantity'])
+                else:
+                    self.stats['unchanged'] += 1
+
+            inserted = self.insert_rows([row for _, row in inserts]) if inserts else set()
+            for row_num, row in inserts:
+                if row['sku'] not in inserted:
+                    # Created by someone else since the chunk's SELECT
+                    self.add_error(row_num, 'SKU already exists', sku=row['sku'], field='sku')
+            # Bulk UPDATE by primary key: one executemany per set of changed columns
+            groups = {}
+            for update in updates:
+                groups.setdefault(tuple(sorted(update)), []).append(update)
+            for rows in groups.values():
+                db.session.execute(db.update(Product), rows)
+
+            if inserted or catalog_changed:
+                bump_catalog_version()
+            self.stats['inserted'] += len(inserted)
+            self.stats['updated'] += len(updates)
+            self.stats['imported'] += len(inserted) + len(updates)
+
+        self.checkpoint(last_row)
+        db.session.commit()
+        self.stats['chunks'] += 1
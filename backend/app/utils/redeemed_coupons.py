@@ -0,0 +1,87 @@
+"""
+Per-user index of redeemed coupons.
+
+`user_redeemed_coupons` holds one row per (user, coupon) redeemed, written in
+the same transaction as the redemption (see `record_redemption`). Its primary
+key stops a user from recording a coupon twice and serves both readers: the
+"already redeemed" check reads a user's rows with one key range scan, and the
+coupon listings filter in SQL with a correlated NOT EXISTS against it
+(`not_redeemed_by`), so the statement does not grow with the number of coupons
+a user redeemed and a redemption writes a single row.
+
+`rebuild_redeemed_coupons()` backfills the index from `redemptions`.
+"""
+
+from sqlalchemy import select, insert, delete
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Coupon, Redemption, RedeemedCoupon
+import datetime
+
+
+def get_redeemed_coupon_ids(user_id):
+    """IDs of the coupons the user has redeemed, as a frozenset"""
+    return frozenset(db.session.execute(
+        select(RedeemedCoupon.coupon_id).where(RedeemedCoupon.user_id == int(user_id))
+    ).scalars())
+
+
+def not_redeemed_by(user_id):
+    """Clause matching the coupons a user has not redeemed (NOT EXISTS anti-join)"""
+    return ~select(RedeemedCoupon.coupon_id).where(
+        RedeemedCoupon.user_id == int(user_id), RedeemedCoupon.coupon_id == Coupon.id
+    ).exists()
+
+
+def exclude_redeemed(query, user_id):
+    """Filter coupons the user has already redeemed out of a Coupon query"""
+    return query.filter(not_redeemed_by(user_id))
+
+
+def record_redemption(user_id, coupon_id):
+    """Add a coupon to the user's index, returns False if it was already there.
+
+    Call this before adding the Redemption row, in the same transaction; the
+    change is committed or rolled back with it. Concurrent redemptions of the
+    same coupon by the same user meet on the primary key, so only one of them
+    records it.
+    """
+    values = {'user_id': int(user_id), 'coupon_id': coupon_id, 'redeemed_at': datetime.datetime.utcnow()}
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        result = db.session.execute(
+            dialect_insert(RedeemedCoupon).values(**values).on_conflict_do_nothing()
+        )
+        return result.rowcount == 1
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(RedeemedCoupon).values(**values))
+        return True
+    except IntegrityError:
+        return False
+
+
+def rebuild_redeemed_coupons(user_id=None):
+    """Rebuild the index from `redemptions` for one user or everybody, returns the user count"""
+    query = db.session.query(Redemption.user_id, Redemption.coupon_id,
+                             db.func.min(Redemption.redeemed_at)).group_by(Redemption.user_id, Redemption.coupon_id)
+    stale = delete(RedeemedCoupon)
+    if user_id is not None:
+        query = query.filter(Redemption.user_id == int(user_id))
+        stale = stale.where(RedeemedCoupon.user_id == int(user_id))
+    rows = query.all()
+    db.session.execute(stale)
+
+    if rows:
+        db.session.execute(insert(RedeemedCoupon), [{
+            'user_id': row_user_id,
+            'coupon_id': coupon_id,
+            'redeemed_at': redeemed_at
+        } for row_user_id, coupon_id, redeemed_at in rows])
+    db.session.commit()
+    return len({row_user_id for row_user_id, _, _ in rows})
@@ -0,0 +1,276 @@
+"""
+Full-text search indexes.
+
+A `SearchIndex` indexes a few text columns of a model so search boxes can use
+an index instead of `ILIKE '%q%'` over every row:
+
+- SQLite: an external-content FTS5 table (`<name>`) over the model's table,
+  kept in sync by AFTER INSERT/UPDATE/DELETE triggers, with prefix indexes
+  and bm25() ranking weighted per column.
+- PostgreSQL: a generated, weighted `search_vector` tsvector column with a GIN
+  index, queried with `to_tsquery` prefix terms and ranked with ts_rank().
+- Other databases fall back to ILIKE on the columns, unranked.
+
+Filter columns (a product's category) are indexed too, so filtering on them
+happens inside the index query rather than on the joined rows. Callers that
+only show the best pages can cap the candidate set with `limit`: the index
+query keeps the `limit` best ranked matches, so only those are joined back to
+the table however many rows match a short prefix (the total is then capped at
+`limit` too).
+
+When a query finds nothing, `correct()` suggests the nearest indexed words so
+a typo can be retried: on SQLite from an fts5vocab table, on PostgreSQL from
+the rows holding a similar word (pg_trgm `<%` on trigram indexes of the
+searched columns).
+
+The index is created with the table (DDL events on `create_all()`), so every
+write path, ORM or Core, is covered by the database itself. Search text is
+split into words and every word must match the start of an indexed word, so
+"spr sale" finds "Spring Sale".
+"""
+
+from sqlalchemy import event, text, literal, literal_column, table, column, select
+from app import db
+from app.models import Coupon, Product
+import difflib
+import re
+
+# Words beyond this are ignored, keeping match expressions small
+MAX_SEARCH_TERMS = 8
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+# Postgres tsvector weight classes, in column order; D is kept for filter columns
+_PG_WEIGHTS = 'ABC'
+
+# Typo correction: how close a word must be, and how far its length may differ
+CORRECTION_CUTOFF = 0.75
+CORRECTION_LENGTH_SLACK = 2
+
+# PostgreSQL typo correction: rows with a similar word to take candidates from
+CORRECTION_ROWS = 50
+
+
+def search_terms(query):
+    """Lower-cased words of a search box query"""
+    return [word.lower() for word in _WORD.findall(query or '')][:MAX_SEARCH_TERMS]
+
+
+class SearchIndex:
+    """Full-text index `name` over `columns` of `model`, given as (column, weight) pairs.
+
+    `filter_columns` are indexed for `search(filters=...)` but do not match
+    the search text and do not affect ranking.
+    """
+
+    def __init__(self, model, name, columns, filter_columns=()):
+        self.model = model
+        self.name = name
+        self.columns = tuple(column_name for column_name, _ in columns)
+        self.weights = tuple(weight for _, weight in columns)
+        self.filter_columns = tuple(filter_columns)
+        event.listen(model.__table__, 'after_create', self._after_create)
+        event.listen(model.__table__, 'before_drop', self._before_drop)
+
+    @property
+    def table_name(self):
+        return self.model.__table__.name
+
+    @property
+    def indexed_columns(self):
+        return self.columns + self.filter_columns
+
+    @property
+    def vocab_name(self):
+        return f'{self.name}_vocab'
+
+    def ddl(self, dialect):
+        """Statements creating the index on `dialect`"""
+        columns = ', '.join(self.indexed_columns)
+        if dialect == 'sqlite':
+            new_values = ', '.join(f'new.{name}' for name in self.indexed_columns)
+            old_values = ', '.join(f'old.{name}' for name in self.indexed_columns)
+            delete_old = (f"INSERT INTO {self.name}({self.name}, rowid, {columns}) "
+                          f"VALUES ('delete', old.id, {old_values});")
+            insert_new = f'INSERT INTO {self.name}(rowid, {columns}) VALUES (new.id, {new_values});'
+            return [
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.name} USING fts5("
+                f"{columns}, content='{self.table_name}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.vocab_name} USING fts5vocab({self.name}, 'row')",
+                f'CREATE TRIGGER IF NOT EXISTS {self.name}_ai AFTER INSERT ON {self.table_name} '
+                f'BEGIN {insert_new} END',
+                f'CREATE TRIGGER IF NOT EXISTS {self.name}_ad AFTER DELETE ON {self.table_name} '
+                f'BEGIN {delete_old} END',
+                f'CREATE TRIGGER IF NOT EXISTS {self.name}_au AFTER UPDATE OF {columns} ON {self.table_name} '
+                f'BEGIN {delete_old} {insert_new} END'
+            ]
+        if dialect == 'postgresql':
+            classes = [_PG_WEIGHTS[min(i, 2)] for i in range(len(self.columns))]
+            classes += ['D'] * len(self.filter_columns)
+            vector = ' || '.join(
+                f"setweight(to_tsvector('simple', coalesce({name}, '')), '{weight_class}')"
+                for name, weight_class in zip(self.indexed_columns, classes)
+            )
+            return [
+                f'ALTER TABLE {self.table_name} ADD COLUMN IF NOT EXISTS search_vector tsvector '
+                f'GENERATED ALWAYS AS ({vector}) STORED',
+                f'CREATE INDEX IF NOT EXISTS ix_{self.name} ON {self.table_name} USING GIN (search_vector)',
+                # Trigram indexes for the typo correction
+                'CREATE EXTENSION IF NOT EXISTS pg_trgm'
+            ] + [
+                f'CREATE INDEX IF NOT EXISTS ix_{self.name}_trgm_{name} ON {self.table_name} '
+                f'USING GIN ({name} gin_trgm_ops)'
+                for name in self.columns
+            ]
+        return []
+
+    def create(self, connection):
+        for statement in self.ddl(connection.dialect.name):
+            connection.execute(text(statement))
+
+    def rebuild(self):
+        """Re-index every row (after a bulk load with triggers disabled, or a repair)"""
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text(f"INSERT INTO {self.name}({self.name}) VALUES ('rebuild')"))
+            db.session.commit()
+
+    def _after_create(self, target, connection, **kw):
+        self.create(connection)
+
+    def _before_drop(self, target, connection, **kw):
+        if connection.dialect.name == 'sqlite':
+            connection.execute(text(f'DROP TABLE IF EXISTS {self.vocab_name}'))
+            connection.execute(text(f'DROP TABLE IF EXISTS {self.name}'))
+
+    def _match_expression(self, terms, filters):
+        """FTS5 MATCH expression: every term as a prefix, filters as column phrases"""
+        match = ' '.join(f'"{term}"*' for term in terms)
+        if self.filter_columns:
+            match = f"{{{' '.join(self.columns)}}} : ({match})"
+        for name, filter_terms in filters.items():
+            match += f' AND {name} : "{" ".join(filter_terms)}"*'
+        return match
+
+    def _tsquery_text(self, terms, filters):
+        """to_tsquery() input: every term as a prefix, filter terms restricted to class D"""
+        text_classes = 'ABC'[:len(self.columns)] if self.filter_columns else ''
+        parts = [f'{term}:*{text_classes}' for term in terms]
+        for filter_terms in filters.values():
+            parts.extend(f'{term}:*D' for term in filter_terms)
+        return ' & '.join(parts)
+
+    def search(self, query, search_text, filters=None, limit=None):
+        """Restrict `query` (over the model) to rows matching `search_text`.
+
+        `filters` maps filter columns to text their value must contain (as
+        words, the last one a prefix). With `limit`, only the `limit` best
+        ranked matches are returned: exact whenever fewer rows match, and a
+        broad prefix joins `limit` rows instead of the whole table.
+
+        Returns the query and a relevance expression to order by ascending
+        (best first), or None where the database cannot rank.
+        """
+        terms = search_terms(search_text)
+        if not terms:
+            return query.filter(db.false()), None
+        filters = {name: search_terms(value) for name, value in (filters or {}).items()}
+        filters = {name: filter_terms for name, filter_terms in filters.items() if filter_terms}
+
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            fts = table(self.name, column('rowid'))
+            condition = literal_column(self.name).op('MATCH')(self._match_expression(terms, filters))
+            rank = db.func.bm25(literal_column(self.name), *self.weights, *[0.0] * len(self.filter_columns))
+            if limit is None:
+                return query.join(fts, fts.c.rowid == self.model.id).filter(condition), rank
+            candidates = (select(fts.c.rowid.label('id'), rank.label('rank'))
+                          .where(condition).order_by(rank, fts.c.rowid.desc()).limit(limit).subquery())
+            return query.join(candidates, candidates.c.id == self.model.id), candidates.c.rank
+
+        if dialect == 'postgresql':
+            vector = literal_column(f'{self.table_name}.search_vector')
+            tsquery = db.func.to_tsquery('simple', self._tsquery_text(terms, filters))
+            rank = -db.func.ts_rank(vector, tsquery)
+            if limit is None:
+                return query.filter(vector.op('@@')(tsquery)), rank
+            candidates = (select(self.model.id.label('id'), rank.label('rank'))
+                          .where(vector.op('@@')(tsquery)).order_by(rank, self.model.id.desc())
+                          .limit(limit).subquery())
+            return query.join(candidates, candidates.c.id == self.model.id), candidates.c.rank
+
+        for term in terms:
+            query = query.filter(db.or_(*[getattr(self.model, name).icontains(term, autoescape=True)
+                                          for name in self.columns]))
+        for name, filter_terms in filters.items():
+            for term in filter_terms:
+                query = query.filter(getattr(self.model, name).icontains(term, autoescape=True))
+        return query, None
+
+    def correct(self, search_text):
+        """Search text with each word that starts no indexed word replaced by
+        the closest indexed word, or None if there is nothing to correct."""
+        if db.engine.dialect.name not in ('sqlite', 'postgresql'):
+            return None
+        terms = search_terms(search_text)
+        corrected = [self._correct_term(term) for term in terms]
+        if corrected == terms:
+            return None
+        return ' '.join(corrected)
+
+    def _correct_term(self, term):
+        if db.engine.dialect.name == 'sqlite':
+            if self._sqlite_starts_a_word(term):
+                return term
+            candidates = self._sqlite_similar_words(term)
+        else:
+            if self._pg_starts_a_word(term):
+                return term
+            candidates = self._pg_similar_words(term)
+        matches = difflib.get_close_matches(term, candidates, n=1, cutoff=CORRECTION_CUTOFF)
+        return matches[0] if matches else term
+
+    def _sqlite_starts_a_word(self, term):
+        prefixed = text(f'SELECT 1 FROM {self.vocab_name} WHERE term >= :low AND term < :high LIMIT 1')
+        return db.session.execute(prefixed, {'low': term, 'high': term + '\uffff'}).first() is not None
+
+    def _sqlite_similar_words(self, term):
+        # Words sharing the first letter and of a similar length
+        return db.session.execute(
+            text(f'SELECT term FROM {self.vocab_name} WHERE term >= :low AND term < :high '
+                 'AND length(term) BETWEEN :shortest AND :longest'),
+            {'low': term[0], 'high': term[0] + '\uffff',
+             'shortest': len(term) - CORRECTION_LENGTH_SLACK, 'longest': len(term) + CORRECTION_LENGTH_SLACK}
+        ).scalars().all()
+
+    def _pg_starts_a_word(self, term):
+        vector = literal_column(f'{self.table_name}.search_vector')
+        tsquery = db.func.to_tsquery('simple', self._tsquery_text([term], {}))
+        return db.session.execute(
+            select(self.model.id).where(vector.op('@@')(tsquery)).limit(1)
+        ).first() is not None
+
+    def _pg_similar_words(self, term):
+        # Words of the rows holding a word trigram-similar to the term, kept
+        # to those sharing its first letter and of a similar length
+        columns = [getattr(self.model, name) for name in self.columns]
+        rows = db.session.execute(
+            select(*columns)
+            .where(db.or_(*[literal(term).op('<%')(indexed) for indexed in columns]))
+            .limit(CORRECTION_ROWS)
+        ).all()
+        words = {word.lower() for row in rows for value in row if value for word in _WORD.findall(value)}
+        return [word for word in words
+                if word[0] == term[0] and abs(len(word) - len(term)) <= CORRECTION_LENGTH_SLACK]
+
+
+# Code matches rank above title matches, title above description
+coupon_search = SearchIndex(Coupon, 'coupon_search', (('code', 10.0), ('title', 5.0), ('description', 1.0)))
+
+# Name matches rank above SKU, brand and description matches; category is
+# only used to filter
+product_search = SearchIndex(
+    Product, 'product_search',
+    (('name', 10.0), ('sku', 8.0), ('brand', 5.0), ('description', 1.0)),
+    filter_columns=('category',)
+)
@@ -0,0 +1,94 @@
+"""
+Best-coupon finder latency versus the number of live coupons.
+
+    python -m benchmarks.bench_best_coupons [--coupons 1000,10000,50000] [--runs 20]
+
+Coupons are a mix of percentage (some capped) and fixed discounts, minimum
+order values and category restrictions. Each run times find_best_coupons()
+for a 150.00 cart in two categories; `loop` times the naive alternative of
+loading every live coupon as an ORM object and evaluating it in Python.
+"""
+
+from app import db
+from app.models import Coupon
+from app.utils.coupon_finder import find_best_coupons
+from app.utils.coupon_categories import sync_coupon_categories
+from app.utils.coupon_rules import compile_coupon, CART_RULES
+from benchmarks.common import make_app, create_user, timed, summarize
+import argparse
+import datetime
+import json
+import random
+
+CATEGORIES = ['Electronics', 'Books', 'Home', 'Toys', 'Garden', 'Sports', 'Beauty', 'Grocery']
+
+
+def seed_coupons(count, user_id):
+    rng = random.Random(42)
+    now = datetime.datetime.utcnow()
+    rows = []
+    for i in range(count):
+        percentage = rng.random() < 0.6
+        rows.append({
+            'code': f'BENCH{i:06d}',
+            'title': f'Bench coupon {i}',
+            'discount_type': 'percentage' if percentage else 'fixed',
+            'discount_value': rng.randint(5, 60) if percentage else rng.randint(1, 80),
+            'is_public': rng.random() < 0.9,
+            'is_active': rng.random() < 0.9,
+            'max_uses': 100,
+            'current_uses': rng.randint(0, 100),
+            'start_date': now - datetime.timedelta(days=rng.randint(1, 30)),
+            'end_date': now + datetime.timedelta(days=rng.randint(-10, 60)),
+            'minimum_order_value': rng.choice([0, 0, 50, 100, 200]),
+            'maximum_discount_amount': rng.choice([None, None, 20, 40]) if percentage else None,
+            'applicable_categories': json.dumps(rng.sample(CATEGORIES, 2)) if rng.random() < 0.3 else None,
+            'first_time_user_only': rng.random() < 0.1,
+            'created_by': user_id
+        })
+    db.session.execute(db.insert(Coupon), rows)
+    db.session.commit()
+    sync_coupon_categories()
+
+
+def python_loop(subtotal, categories):
+    now = datetime.datetime.utcnow()
+    results = []
+    for coupon in Coupon.query.filter(Coupon.is_public == True, Coupon.is_active == True).all():
+        evaluation = compile_coupon(coupon).evaluate(subtotal, categories=categories, now=now, rules=CART_RULES)
+        if evaluation.ok:
+            results.append((coupon.code, evaluation.discount_amount))
+    results.sort(key=lambda result: -result[1])
+    return results[:10]
+
+
+def run(count, runs):
+    app, cleanup = make_app()
+    try:
+        with app.app_context():
+            user = create_user()
+            seed_coupons(count, user.id)
+            categories = frozenset(['Electronics', 'Books'])
+
+            for name, fn in (('finder', lambda: find_best_coupons(150.0, categories=categories)),
+                             ('loop', lambda: python_loop(150.0, categories))):
+                samples = []
+                for _ in range(runs):
+                    _, elapsed = timed(fn)
+                    db.session.expunge_all()
+                    samples.append(elapsed)
+                median, p95 = summarize(samples)
+                print(f'{count:>8} {name:>8} {median:>10.2f} {p95:>10.2f}')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--coupons', default='1000,10000,50000')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"coupons":>8} {"mode":>8} {"median ms":>10} {"p95 ms":>10}')
+    for count in args.coupons.split(','):
+        run(int(count), args.runs)
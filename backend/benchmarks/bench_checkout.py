@@ -0,0 +1,90 @@
+"""
+Checkout round trips and latency versus cart size.
+
+    python -m benchmarks.bench_checkout [--sizes 1,5,10,30,60] [--runs 20]
+
+For every cart size the cart is filled directly through the cart store and
+POST /api/cart/checkout is timed. The statement count is the number of SQL
+round trips issued by the checkout request. It must not grow with the cart:
+without a coupon it is EXPECTED_STATEMENTS for any size,
+
+    SELECT the cart's products            INSERT the order
+    SELECT expired holds to sweep         INSERT the order items
+    DELETE the user's holds               reload the order after commit
+    UPDATE the stock
+
+The products are stocked so that none sells out; a checkout that does adds
+the catalog version bump. Applying a coupon adds its redemption statements on
+top.
+"""
+
+from app import db
+from app.models import Product
+from app.utils.cart_store import empty_cart
+from benchmarks.common import make_app, create_user, auth_headers, count_statements, timed, summarize
+import argparse
+import json
+
+EXPECTED_STATEMENTS = 7
+
+
+def fill_cart(app, user_id, products):
+    cart = empty_cart()
+    for product in products:
+        price = float(product.price)
+        cart['items'].append({
+            'product_id': product.id,
+            'product_name': product.name,
+            'product_price': price,
+            'quantity': 1,
+            'line_total': price
+        })
+    cart['subtotal'] = cart['final_total'] = sum(item['line_total'] for item in cart['items'])
+    app.extensions['cart_store'].save(user_id, cart)
+
+
+def run(sizes, runs):
+    app, cleanup = make_app()
+    try:
+        with app.app_context():
+            user = create_user()
+            products = []
+            for i in range(max(sizes)):
+                product = Product(name=f'Bench product {i}', price=10 + i, category='Bench',
+                                  sku=f'BENCH-{i}', stock_quantity=10 ** 6, created_by=user.id)
+                db.session.add(product)
+                products.append(product)
+            db.session.commit()
+            user_id = str(user.id)
+
+            client = app.test_client()
+            headers = auth_headers(client, user.email)
+
+            print(f'{"items":>6} {"statements":>11} {"median ms":>10} {"p95 ms":>8}')
+            for size in sizes:
+                samples = []
+                statements = 0
+                for _ in range(runs):
+                    fill_cart(app, user_id, products[:size])
+                    with count_statements(db.engine) as executed:
+                        response, elapsed = timed(
+                            client.post, '/api/cart/checkout', data=json.dumps({}),
+                            content_type='application/json', headers=headers
+                        )
+                    assert response.status_code == 201, response.data
+                    statements = len(executed)
+                    assert statements == EXPECTED_STATEMENTS, \
+                        f'checkout of {size} items issued {statements} statements, expected {EXPECTED_STATEMENTS}'
+                    samples.append(elapsed)
+                median, p95 = summarize(samples)
+                print(f'{size:>6} {statements:>11} {median:>10.2f} {p95:>8.2f}')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1,5,10,30,60')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(',')], args.runs)
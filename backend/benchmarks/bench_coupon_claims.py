@@ -0,0 +1,81 @@
+"""
+Redemptions/sec on a single hot coupon.
+
+    python -m benchmarks.bench_coupon_claims [--claimants 1000] [--concurrency 50] [--max-uses 500]
+
+Every claimant tries to claim one use of the same coupon from a worker thread
+with its own database session. `conditional` uses claim_coupon_use(); `legacy`
+replays the old ORM read-check-increment to show how it oversubscribes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from app import db
+from app.models import Coupon
+from app.utils.coupon_usage import claim_coupon_use
+from benchmarks.common import make_app, create_user
+import argparse
+import datetime
+import time
+
+
+def legacy_claim(coupon_id):
+    coupon = db.session.get(Coupon, coupon_id)
+    if coupon.current_uses >= coupon.max_uses:
+        return False
+    coupon.current_uses += 1
+    return True
+
+
+def run_mode(mode, claimants, concurrency, max_uses):
+    app, cleanup = make_app()
+    try:
+        with app.app_context():
+            user = create_user(is_admin=True)
+            now = datetime.datetime.utcnow()
+            coupon = Coupon(code='HOT', title='Hot coupon', discount_type='fixed', discount_value=5,
+                            max_uses=max_uses, current_uses=0, created_by=user.id,
+                            start_date=now - datetime.timedelta(days=1),
+                            end_date=now + datetime.timedelta(days=1))
+            db.session.add(coupon)
+            db.session.commit()
+            coupon_id = coupon.id
+
+        claim = claim_coupon_use if mode == 'conditional' else legacy_claim
+
+        def claimant(_):
+            with app.app_context():
+                try:
+                    claimed = claim(coupon_id)
+                    db.session.commit()
+                    return 'claimed' if claimed else 'rejected'
+                except Exception:
+                    db.session.rollback()
+                    return 'error'
+                finally:
+                    db.session.remove()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(claimant, range(claimants)))
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            current_uses = db.session.get(Coupon, coupon_id).current_uses
+
+        print(f'{mode:>12} {claimants / elapsed:>12.0f} {outcomes.count("claimed"):>8} '
+              f'{outcomes.count("rejected"):>9} {outcomes.count("error"):>7} {current_uses:>13}/{max_uses}')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--claimants', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--max-uses', type=int, default=500)
+    parser.add_argument('--modes', default='conditional,legacy')
+    args = parser.parse_args()
+
+    print(f'{"mode":>12} {"claims/sec":>12} {"claimed":>8} {"rejected":>9} {"errors":>7} {"current_uses":>17}')
+    for mode in args.modes.split(','):
+        run_mode(mode, args.claimants, args.concurrency, args.max_uses)
@@ -0,0 +1,89 @@
+"""
+Coupon search latency: full-text index versus ILIKE scans.
+
+    python -m benchmarks.bench_coupon_search [--coupons 100000] [--runs 20]
+
+Seeds `--coupons` public coupons with generated titles and descriptions, then
+times one page of /api/coupons/search-style queries for a few search box
+inputs, as the user types: `index` goes through the coupon_search index
+(bm25 ranked), `ilike` is the previous `ILIKE '%q%'` filter on code, title
+and description.
+"""
+
+from app import db
+from app.models import Coupon
+from app.utils.search_index import coupon_search
+from benchmarks.common import make_app, create_user, timed, summarize
+import argparse
+import datetime
+import random
+
+WORDS = ['spring', 'summer', 'autumn', 'winter', 'sale', 'flash', 'electronics', 'books', 'garden',
+         'toys', 'beauty', 'sports', 'weekend', 'member', 'welcome', 'bonus', 'clearance', 'holiday',
+         'student', 'bundle', 'shipping', 'free', 'exclusive', 'launch', 'anniversary', 'loyalty']
+
+QUERIES = ['sp', 'spring', 'spring sa', 'electronics weekend', 'zzz']
+
+
+def seed_coupons(count, user_id):
+    rng = random.Random(7)
+    now = datetime.datetime.utcnow()
+    for offset in range(0, count, 10000):
+        db.session.execute(db.insert(Coupon), [{
+            'code': f'{rng.choice(WORDS)[:4].upper()}{i:06d}',
+            'title': ' '.join(rng.sample(WORDS, 3)).title(),
+            'description': ' '.join(rng.choices(WORDS, k=8)),
+            'discount_type': 'fixed',
+            'discount_value': rng.randint(1, 50),
+            'start_date': now - datetime.timedelta(days=1),
+            'end_date': now + datetime.timedelta(days=rng.randint(1, 90)),
+            'max_uses': 100,
+            'created_by': user_id
+        } for i in range(offset, min(offset + 10000, count))])
+        db.session.commit()
+
+
+def ilike_search(text):
+    term = f'%{text}%'
+    return Coupon.query.filter(
+        Coupon.is_public == True, Coupon.is_active == True,
+        db.or_(Coupon.code.ilike(term), Coupon.title.ilike(term), Coupon.description.ilike(term))
+    ).order_by(Coupon.end_date.asc()).limit(10).all()
+
+
+def index_search(text):
+    query, relevance = coupon_search.search(
+        Coupon.query.filter(Coupon.is_public == True, Coupon.is_active == True), text
+    )
+    return query.order_by(relevance.asc(), Coupon.end_date.asc()).limit(10).all()
+
+
+def run(count, runs):
+    app, cleanup = make_app()
+    try:
+        with app.app_context():
+            user = create_user()
+            _, seed_ms = timed(seed_coupons, count, user.id)
+            print(f'seeded {count} coupons (indexed by triggers) in {seed_ms / 1000:.1f}s')
+
+            for text in QUERIES:
+                for name, fn in (('index', index_search), ('ilike', ilike_search)):
+                    samples = []
+                    for _ in range(runs):
+                        _, elapsed = timed(fn, text)
+                        db.session.expunge_all()
+                        samples.append(elapsed)
+                    median, p95 = summarize(samples)
+                    print(f'{text!r:>24} {name:>6} {median:>10.2f} {p95:>10.2f}')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--coupons', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"query":>24} {"mode":>6} {"median ms":>10} {"p95 ms":>10}')
+    run(args.coupons, args.runs)
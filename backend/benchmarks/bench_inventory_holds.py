@@ -0,0 +1,80 @@
+"""
+Available-to-sell with inventory holds: counter versus SUM scan.
+
+    python -m benchmarks.bench_inventory_holds [--holds 100,1000,10000] [--runs 50]
+
+For every number of active holds on one product, reading what is left to sell
+is timed twice: from `Product.reserved_quantity` (what hold_stock and
+checkout use) and by summing the product's unexpired holds. Then the time of
+a hold placed through `hold_stock` is shown, which should stay flat as the
+number of holds grows, and a sweep of all of them once they expired.
+"""
+
+from app import db
+from app.models import Product, User, InventoryHold
+from app.utils.inventory_holds import hold_stock, sweep_expired_holds, available_quantities
+from benchmarks.common import make_app, create_user, timed, summarize
+import argparse
+import datetime
+
+
+def add_holds(product_id, count, expires_at):
+    """Create `count` users each holding one unit, with plain inserts"""
+    start = db.session.query(db.func.count(User.id)).scalar()
+    users = [{'username': f'holder{start + i}', 'email': f'holder{start + i}@example.com',
+              'password_hash': 'x', 'email_verified': True} for i in range(count)]
+    db.session.execute(db.insert(User), users)
+    ids = db.session.execute(db.select(User.id).order_by(User.id.desc()).limit(count)).scalars().all()
+    db.session.execute(db.insert(InventoryHold), [
+        {'product_id': product_id, 'user_id': user_id, 'quantity': 1, 'expires_at': expires_at} for user_id in ids
+    ])
+    db.session.execute(db.update(Product).where(Product.id == product_id)
+                       .values(reserved_quantity=Product.reserved_quantity + count))
+    db.session.commit()
+
+
+def sum_scan(product_id, now):
+    held = db.session.query(db.func.coalesce(db.func.sum(InventoryHold.quantity), 0)).filter(
+        InventoryHold.product_id == product_id, InventoryHold.expires_at > now
+    ).scalar()
+    stock = db.session.query(Product.stock_quantity).filter(Product.id == product_id).scalar()
+    return stock - held
+
+
+def run(sizes, runs):
+    app, cleanup = make_app()
+    try:
+        with app.app_context():
+            user = create_user()
+            product = Product(name='Bench console', price=300, category='Bench', sku='BENCH-HOLD',
+                              stock_quantity=10 ** 7, created_by=user.id)
+            db.session.add(product)
+            db.session.commit()
+            product_id = product.id
+            expires_at = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+            print(f'{"holds":>7} {"counter ms":>11} {"SUM ms":>8} {"hold ms":>8}')
+            total = 0
+            for size in sizes:
+                add_holds(product_id, size - total, expires_at)
+                total = size
+                now = datetime.datetime.utcnow()
+                counter = [timed(available_quantities, [product_id])[1] for _ in range(runs)]
+                scan = [timed(sum_scan, product_id, now)[1] for _ in range(runs)]
+                holds = [timed(hold_stock, product_id, user.id, i % 3 + 1)[1] for i in range(runs)]
+                print(f'{size:>7} {summarize(counter)[0]:>11.3f} {summarize(scan)[0]:>8.3f} '
+                      f'{summarize(holds)[0]:>8.3f}')
+
+            later = expires_at + datetime.timedelta(seconds=1)
+            swept, elapsed = timed(sweep_expired_holds, now=later)
+            print(f'swept {swept} expired holds in {elapsed:.1f} ms')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--holds', default='100,1000,10000')
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+    run([int(size) for size in args.holds.split(',')], args.runs)
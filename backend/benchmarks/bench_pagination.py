@@ -0,0 +1,70 @@
+"""
+Deep-page latency: page numbers (OFFSET + COUNT) versus cursors.
+
+    python -m benchmarks.bench_pagination [--products 100000] [--runs 10]
+
+Seeds `--products` products and times GET /api/products (product cache
+disabled) at increasing depths, sorted by price: `page` requests ?page=N,
+`cursor` requests the same rows with the cursor pointing at the end of the
+previous page.
+"""
+
+from app import db
+from app.models import Product
+from app.utils.pagination import encode_cursor
+from benchmarks.common import make_app, create_user, timed, summarize
+import argparse
+import random
+
+PER_PAGE = 20
+
+
+def seed_products(count, user_id):
+    rng = random.Random(5)
+    for offset in range(0, count, 10000):
+        db.session.execute(db.insert(Product), [{
+            'name': f'Product {i}',
+            'category': 'Bench',
+            'price': rng.randint(100, 99999) / 100,
+            'created_by': user_id
+        } for i in range(offset, min(offset + 10000, count))])
+        db.session.commit()
+
+
+def run(count, runs):
+    app, cleanup = make_app(PRODUCT_CACHE_TTL_SECONDS=0)
+    try:
+        with app.app_context():
+            user_id = create_user().id
+            seed_products(count, user_id)
+            client = app.test_client()
+            order = [(Product.price, False), (Product.id, False)]
+
+            for page in (1, 10, 100, 1000, count // PER_PAGE):
+                # The row the previous page ended on
+                previous = db.session.execute(
+                    db.select(Product.price, Product.id).order_by(Product.price, Product.id)
+                    .offset(max((page - 1) * PER_PAGE - 1, 0)).limit(1)
+                ).first()
+                cursor = encode_cursor(order, [previous.price, previous.id]) if page > 1 else ''
+
+                for mode, path in (('page', f'/api/products?sort_by=price&per_page={PER_PAGE}&page={page}'),
+                                   ('cursor', f'/api/products?sort_by=price&per_page={PER_PAGE}&cursor={cursor}')):
+                    samples = []
+                    for _ in range(runs):
+                        _, elapsed = timed(client.get, path)
+                        samples.append(elapsed)
+                    median, p95 = summarize(samples)
+                    print(f'{page:>8} {mode:>7} {median:>10.2f} {p95:>10.2f}')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f'{"page":>8} {"mode":>7} {"median ms":>10} {"p95 ms":>10}')
+    run(args.products, args.runs)
@@ -0,0 +1,86 @@
+"""
+Catalog read latency with the product cache, and loads after a version bump.
+
+    python -m benchmarks.bench_product_cache [--products 20000] [--runs 50] [--threads 16]
+
+Times GET /api/products (with facets), /api/products/<id> and
+/api/products/categories with the cache disabled (`uncached`) and enabled
+(`cached`, steady state). Then bumps the catalog version and fires
+`--threads` concurrent listing requests: without stampede protection each
+would query the database, with it one does.
+"""
+
+from app import db
+from app.models import Product
+from app.utils.product_cache import bump_catalog_version
+from benchmarks.common import make_app, create_user, timed, summarize
+import argparse
+import random
+import threading
+
+PATHS = ['/api/products?facets=all', '/api/products?sort_by=price&page=5', '/api/products/{id}',
+         '/api/products/categories']
+
+
+def seed_products(count, user_id):
+    rng = random.Random(3)
+    for offset in range(0, count, 10000):
+        db.session.execute(db.insert(Product), [{
+            'name': f'Product {i}',
+            'sku': f'SKU-{i:07d}',
+            'category': rng.choice(['Electronics', 'Garden', 'Sports', 'Kitchen']),
+            'brand': f'Brand {rng.randint(1, 50)}',
+            'price': rng.randint(1, 900),
+            'stock_quantity': rng.randint(0, 100),
+            'created_by': user_id
+        } for i in range(offset, min(offset + 10000, count))])
+        db.session.commit()
+
+
+def time_paths(client, product_id, runs):
+    for path in PATHS:
+        path = path.format(id=product_id)
+        samples = []
+        for _ in range(runs):
+            _, elapsed = timed(client.get, path)
+            samples.append(elapsed)
+        yield path, summarize(samples)
+
+
+def run(count, runs, threads):
+    for mode, ttl in (('uncached', 0), ('cached', 300)):
+        app, cleanup = make_app(PRODUCT_CACHE_TTL_SECONDS=ttl)
+        try:
+            with app.app_context():
+                user_id = create_user().id
+                seed_products(count, user_id)
+                product_id = db.session.execute(db.select(Product.id)).scalars().first()
+                client = app.test_client()
+                for path, (median, p95) in time_paths(client, product_id, runs):
+                    print(f'{path:>40} {mode:>9} {median:>10.2f} {p95:>10.2f}')
+
+                if ttl:
+                    bump_catalog_version()
+                    db.session.commit()
+                    loads_before = app.extensions['product_cache'].stats()['loads']
+                    workers = [threading.Thread(target=client.get, args=(PATHS[0],)) for _ in range(threads)]
+                    for worker in workers:
+                        worker.start()
+                    for worker in workers:
+                        worker.join()
+                    stats = app.extensions['product_cache'].stats()
+                    print(f'after a bump, {threads} concurrent requests ran {stats["loads"] - loads_before} '
+                          f'load(s); hit rate {stats["hit_rate"]}')
+        finally:
+            cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    print(f'{"path":>40} {"mode":>9} {"median ms":>10} {"p95 ms":>10}')
+    run(args.products, args.runs, args.threads)
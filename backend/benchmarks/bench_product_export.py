@@ -0,0 +1,61 @@
+"""
+Catalog export throughput and memory.
+
+    python -m benchmarks.bench_product_export [--sizes 50000 200000]
+
+For each catalog size, seeds the products and consumes the CSV and gzipped
+NDJSON export generators, reporting rows per second, output size and peak
+Python memory, which should not grow with the catalog.
+"""
+
+from app import db
+from app.models import Product
+from app.utils.product_export import export_chunks
+from benchmarks.common import make_app, create_user
+import argparse
+import time
+import tracemalloc
+
+
+def seed_products(count, user_id):
+    for offset in range(0, count, 10000):
+        db.session.execute(db.insert(Product), [{
+            'name': f'Product {i}',
+            'description': f'Description of product {i}, with a comma',
+            'category': f'Category {i % 20}',
+            'brand': f'Brand {i % 50}',
+            'price': i % 500 + 0.99,
+            'stock_quantity': i % 30,
+            'sku': f'SKU-{i}',
+            'created_by': user_id
+        } for i in range(offset, min(offset + 10000, count))])
+        db.session.commit()
+
+
+def run(count):
+    app, cleanup = make_app()
+    try:
+        with app.app_context():
+            seed_products(count, create_user().id)
+            for data_format, compress in (('csv', False), ('ndjson', True)):
+                tracemalloc.start()
+                start = time.perf_counter()
+                size = sum(len(chunk) for chunk in export_chunks(data_format, compress=compress))
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                label = data_format + ('.gz' if compress else '')
+                print(f'{count:>8} {label:>10} {count / elapsed:>12,.0f} {size / 1024 / 1024:>9.1f} '
+                      f'{peak / 1024 / 1024:>9.1f}')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50000, 200000])
+    args = parser.parse_args()
+
+    print(f'{"products":>8} {"format":>10} {"rows/sec":>12} {"out MiB":>9} {"peak MiB":>9}')
+    for size in args.sizes:
+        run(size)
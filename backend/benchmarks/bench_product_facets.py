@@ -0,0 +1,83 @@
+"""
+Facet count latency: maintained aggregates versus GROUP BY scans.
+
+    python -m benchmarks.bench_product_facets [--products 100000] [--runs 20]
+
+Seeds `--products` products, then times reading category, brand, price band
+and availability counts from product_facet_counts (`aggregate`) against the
+four `GROUP BY` queries over the active catalog they replace (`group_by`).
+Also times a single-line stock decrement, which fires the facet triggers
+only when the product sells out.
+"""
+
+from app import db
+from app.models import Product
+from app.utils.inventory import decrement_stock
+from app.utils.product_facets import facet_counts, facet_value_sql
+from benchmarks.common import make_app, create_user, timed, summarize
+import argparse
+import random
+
+CATEGORIES = ['Electronics', 'Home & Garden', 'Sports', 'Clothing', 'Kitchen', 'Toys', 'Books', 'Beauty']
+BRANDS = [f'Brand {i}' for i in range(200)]
+
+
+def seed_products(count, user_id):
+    rng = random.Random(11)
+    for offset in range(0, count, 10000):
+        db.session.execute(db.insert(Product), [{
+            'name': f'Product {i}',
+            'sku': f'SKU-{i:07d}',
+            'category': rng.choice(CATEGORIES),
+            'brand': rng.choice(BRANDS),
+            'price': rng.randint(1, 900),
+            'stock_quantity': rng.choice([0, 5, 50, 500]),
+            'created_by': user_id
+        } for i in range(offset, min(offset + 10000, count))])
+        db.session.commit()
+
+
+def group_by_counts():
+    return {facet: db.session.execute(db.text(
+        f'SELECT {value}, count(*) FROM products WHERE products.is_active GROUP BY {value}'
+    )).all() for facet, value in facet_value_sql('products').items()}
+
+
+def run(count, runs):
+    app, cleanup = make_app()
+    try:
+        with app.app_context():
+            user_id = create_user().id
+            _, seed_ms = timed(seed_products, count, user_id)
+            print(f'seeded {count} products (counted by triggers) in {seed_ms / 1000:.1f}s')
+
+            for name, fn in (('aggregate', facet_counts), ('group_by', group_by_counts)):
+                samples = []
+                for _ in range(runs):
+                    _, elapsed = timed(fn)
+                    db.session.expunge_all()
+                    samples.append(elapsed)
+                median, p95 = summarize(samples)
+                print(f'{name:>12} {median:>10.2f} {p95:>10.2f}')
+
+            product_id = db.session.execute(
+                db.select(Product.id).where(Product.stock_quantity == 500)
+            ).scalars().first()
+            samples = []
+            for _ in range(runs):
+                _, elapsed = timed(lambda: (decrement_stock({product_id: 1}), db.session.commit()))
+                samples.append(elapsed)
+            median, p95 = summarize(samples)
+            print(f'{"decrement":>12} {median:>10.2f} {p95:>10.2f}')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"mode":>12} {"median ms":>10} {"p95 ms":>10}')
+    run(args.products, args.runs)
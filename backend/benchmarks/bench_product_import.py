@@ -0,0 +1,72 @@
+"""
+CSV bulk product import throughput and memory.
+
+    python -m benchmarks.bench_product_import [--rows 100000] [--chunk-size 1000]
+
+Uploads a generated CSV of `--rows` products (2% of them invalid or with a
+duplicate SKU) to POST /api/admin/products/bulk-upload and reports the
+elapsed time, rows per second, SQL statements and peak Python memory.
+"""
+
+from app import db
+from benchmarks.common import make_app, create_user, auth_headers, count_statements
+from io import BytesIO
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('name,description,price,category,brand,sku,stock_quantity,is_active\n')
+        for i in range(rows):
+            if i % 100 == 7:
+                f.write(f'Bad {i},,not-a-price,Bench,,BAD-{i},1,true\n')
+            elif i % 100 == 42:
+                f.write(f'Duplicate {i},,9.99,Bench,,SKU-{i - 1},1,true\n')
+            else:
+                f.write(f'Product {i},"Sample, product {i}",{i % 500 + 0.99},Bench {i % 20},Brand {i % 50},'
+                        f'SKU-{i},{i % 30},true\n')
+
+
+def run(rows, chunk_size):
+    app, cleanup = make_app(PRODUCT_IMPORT_CHUNK_SIZE=chunk_size)
+    try:
+        with app.app_context():
+            create_user('admin', is_admin=True)
+            client = app.test_client()
+            headers = auth_headers(client, 'admin@example.com')
+
+            with tempfile.NamedTemporaryFile(suffix='.csv') as upload:
+                write_csv(upload.name, rows)
+                with open(upload.name, 'rb') as f:
+                    content = f.read()
+
+            tracemalloc.start()
+            with count_statements(db.engine) as statements:
+                start = time.perf_counter()
+                response = client.post('/api/admin/products/bulk-upload', headers=headers,
+                                       data={'file': (BytesIO(content), 'products.csv')},
+                                       content_type='multipart/form-data')
+                elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            data = json.loads(response.data)
+            print(f'status:        {response.status_code}')
+            print(f'imported:      {data["imported_count"]} of {rows} ({data["error_count"]} errors)')
+            print(f'elapsed:       {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec)')
+            print(f'statements:    {len(statements)}')
+            print(f'peak memory:   {peak / 1024 / 1024:.1f} MiB (upload {len(content) / 1024 / 1024:.1f} MiB)')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+    run(args.rows, args.chunk_size)
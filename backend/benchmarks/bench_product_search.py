@@ -0,0 +1,105 @@
+"""
+Product search latency as the catalog grows: full-text index versus ILIKE.
+
+    python -m benchmarks.bench_product_search [--sizes 10000,100000] [--runs 20]
+
+Grows one catalog through each of `--sizes` products with generated names,
+brands and descriptions, and at every size times one page of
+/api/products/search-style queries: `index` goes through the product_search
+index with the candidate cap and category filter of the route, `ilike` is
+the previous `ILIKE '%q%'` filter on name, description, brand and SKU.
+"""
+
+from app import db
+from app.models import Product
+from app.utils.search_index import product_search
+from benchmarks.common import make_app, create_user, timed, summarize
+import argparse
+import random
+
+WORDS = ['wireless', 'bluetooth', 'steel', 'cotton', 'organic', 'portable', 'classic', 'mini', 'pro',
+         'smart', 'leather', 'ceramic', 'outdoor', 'kitchen', 'garden', 'travel', 'kids', 'sport',
+         'waterproof', 'vintage', 'compact', 'deluxe', 'eco', 'ultra', 'studio', 'home']
+NOUNS = ['headphones', 'speaker', 'bottle', 'shirt', 'lamp', 'backpack', 'kettle', 'chair', 'watch',
+         'blender', 'jacket', 'mug', 'charger', 'tent', 'camera', 'pillow']
+BRANDS = ['Acme', 'Northwind', 'Contoso', 'Globex', 'Initech', 'Umbrella', 'Stark', 'Wayne']
+CATEGORIES = ['Electronics', 'Home & Garden', 'Sports', 'Clothing', 'Kitchen', 'Toys']
+
+QUERIES = [('wi', None), ('wireless head', None), ('wireless head', 'Electronics'),
+           ('acme kettle', 'Kitchen'), ('hedphones', None), ('zzz', None)]
+
+MAX_CANDIDATES = 1000
+
+
+def seed_products(start, count, user_id):
+    rng = random.Random(start)
+    for offset in range(start, start + count, 10000):
+        db.session.execute(db.insert(Product), [{
+            'name': f'{" ".join(rng.sample(WORDS, 2)).title()} {rng.choice(NOUNS).title()}',
+            'description': ' '.join(rng.choices(WORDS + NOUNS, k=12)),
+            'brand': rng.choice(BRANDS),
+            'sku': f'SKU-{i:07d}',
+            'category': rng.choice(CATEGORIES),
+            'price': rng.randint(5, 500),
+            'created_by': user_id
+        } for i in range(offset, min(offset + 10000, start + count))])
+        db.session.commit()
+
+
+def ilike_search(text, category):
+    term = f'%{text}%'
+    query = Product.query.filter_by(is_active=True).filter(db.or_(
+        Product.name.ilike(term), Product.description.ilike(term),
+        Product.brand.ilike(term), Product.sku.ilike(term)
+    ))
+    if category:
+        query = query.filter(Product.category.ilike(f'%{category}%'))
+    return query.order_by(Product.name.asc()).paginate(page=1, per_page=10, error_out=False).items
+
+
+def index_search(text, category):
+    query, relevance = product_search.search(
+        Product.query.filter_by(is_active=True), text,
+        filters={'category': category or ''}, limit=MAX_CANDIDATES
+    )
+    pagination = query.order_by(relevance.asc(), Product.name.asc()).paginate(page=1, per_page=10, error_out=False)
+    if pagination.total == 0:
+        corrected = product_search.correct(text)
+        if corrected:
+            return index_search(corrected, category)
+    return pagination.items
+
+
+def run(sizes, runs):
+    app, cleanup = make_app()
+    try:
+        with app.app_context():
+            user_id = create_user().id
+            seeded = 0
+            for size in sizes:
+                _, seed_ms = timed(seed_products, seeded, size - seeded, user_id)
+                seeded = size
+                print(f'-- {size} products (indexed by triggers, +{seed_ms / 1000:.1f}s)')
+
+                for text, category in QUERIES:
+                    label = f'{text}' + (f' [{category}]' if category else '')
+                    for name, fn in (('index', index_search), ('ilike', ilike_search)):
+                        samples = []
+                        for _ in range(runs):
+                            _, elapsed = timed(fn, text, category)
+                            db.session.expunge_all()
+                            samples.append(elapsed)
+                        median, p95 = summarize(samples)
+                        print(f'{label!r:>32} {name:>6} {median:>10.2f} {p95:>10.2f}')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"query":>32} {"mode":>6} {"median ms":>10} {"p95 ms":>10}')
+    run(sorted(int(size) for size in args.sizes.split(',')), args.runs)
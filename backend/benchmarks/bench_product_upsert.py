@@ -0,0 +1,86 @@
+"""
+Supplier feed throughput: bulk upsert by SKU versus one PUT per product.
+
+    python -m benchmarks.bench_product_upsert [--products 20000] [--put-sample 500]
+
+Seeds `--products` products, then applies a feed changing the price and
+stock of every one of them (plus 5% new SKUs, a tenth of the rows unchanged)
+through POST /api/admin/products/bulk-upsert, and times PUT
+/api/admin/products/<id> on a sample of `--put-sample` products for
+comparison.
+"""
+
+from app import db
+from app.models import Product
+from benchmarks.common import make_app, create_user, auth_headers, count_statements
+import argparse
+import json
+import time
+
+
+def seed_products(count, user_id):
+    for offset in range(0, count, 10000):
+        db.session.execute(db.insert(Product), [{
+            'name': f'Product {i}',
+            'category': 'Bench',
+            'price': 10,
+            'stock_quantity': 5,
+            'sku': f'SKU-{i}',
+            'created_by': user_id
+        } for i in range(offset, min(offset + 10000, count))])
+        db.session.commit()
+
+
+def feed(count):
+    lines = []
+    for i in range(count):
+        if i % 10 == 0:
+            lines.append(json.dumps({'sku': f'SKU-{i}', 'price': 10, 'stock_quantity': 5}))
+        else:
+            lines.append(json.dumps({'sku': f'SKU-{i}', 'price': 10 + i % 50, 'stock_quantity': i % 30}))
+    for i in range(count, count + count // 20):
+        lines.append(json.dumps({'sku': f'SKU-{i}', 'name': f'New {i}', 'price': 12}))
+    return '\n'.join(lines) + '\n'
+
+
+def run(count, put_sample):
+    app, cleanup = make_app()
+    try:
+        with app.app_context():
+            user_id = create_user('admin', is_admin=True).id
+            seed_products(count, user_id)
+            client = app.test_client()
+            headers = auth_headers(client, 'admin@example.com')
+            body = feed(count)
+
+            with count_statements(db.engine) as statements:
+                start = time.perf_counter()
+                response = client.post('/api/admin/products/bulk-upsert', headers=headers,
+                                       data=body, content_type='application/x-ndjson')
+                elapsed = time.perf_counter() - start
+            data = json.loads(response.data)
+            rows = data['processed_count']
+            print(f'bulk upsert:   {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec), '
+                  f'{len(statements)} statements')
+            print(f'               {data["inserted_count"]} inserted, {data["updated_count"]} updated, '
+                  f'{data["unchanged_count"]} unchanged, {data["error_count"]} errors')
+
+            ids = db.session.execute(db.select(Product.id).order_by(Product.id).limit(put_sample)).scalars().all()
+            with count_statements(db.engine) as statements:
+                start = time.perf_counter()
+                for product_id in ids:
+                    client.put(f'/api/admin/products/{product_id}', headers=headers,
+                               data=json.dumps({'price': 20, 'stock_quantity': 3}), content_type='application/json')
+                elapsed = time.perf_counter() - start
+            print(f'PUT each:      {len(ids)} rows in {elapsed:.2f}s ({len(ids) / elapsed:,.0f} rows/sec), '
+                  f'{len(statements)} statements')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--put-sample', type=int, default=500)
+    args = parser.parse_args()
+    run(args.products, args.put_sample)
@@ -0,0 +1,86 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database (or BENCH_DATABASE_URL) and
+are started from the backend directory, e.g. `python -m benchmarks.bench_checkout`.
+"""
+
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User
+import json
+import os
+import statistics
+import tempfile
+import time
+
+
+def make_app(**config):
+    """Create an app bound to a fresh benchmark database, returns (app, cleanup)"""
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    test_config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': os.getenv('BENCH_DATABASE_URL', f'sqlite:///{db_path}'),
+        'SECRET_KEY': 'bench-secret-key',
+        'JWT_SECRET_KEY': 'bench-jwt-secret'
+    }
+    test_config.update(config)
+    app = create_app(test_config)
+    with app.app_context():
+        db.create_all()
+
+    def cleanup():
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+    return app, cleanup
+
+
+def create_user(username='bench', is_admin=False, password='Password123'):
+    """Create a verified user inside the current app context"""
+    user = User(username=username, email=f'{username}@example.com',
+                first_name='Bench', last_name='User', email_verified=True, is_admin=is_admin)
+    user.set_password(password)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def auth_headers(client, email, password='Password123'):
+    response = client.post('/api/auth/login',
+                           data=json.dumps({'email': email, 'password': password}),
+                           content_type='application/json')
+    return {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+
+@contextmanager
+def count_statements(engine):
+    """Count SQL statements (database round trips) sent through engine"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def timed(fn, *args, **kwargs):
+    """Run fn and return (result, elapsed milliseconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def summarize(samples):
+    """Median and p95 of a list of millisecond samples"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return statistics.median(ordered), p95
@@ -33,12 +33,14 @@ CREATE TABLE IF NOT EXISTS coupons (
     is_public BOOLEAN DEFAULT FALSE,
     max_uses INTEGER DEFAULT 1,
     current_uses INTEGER DEFAULT 0,
+    reserved_uses INTEGER NOT NULL DEFAULT 0,
     start_date TIMESTAMP NOT NULL,
     end_date TIMESTAMP NOT NULL,
     minimum_order_value DECIMAL(10,2) DEFAULT 0,
     applicable_categories TEXT[],
     maximum_discount_amount DECIMAL(10,2),
     first_time_user_only BOOLEAN DEFAULT FALSE,
+    lifecycle_state VARCHAR(16) NOT NULL DEFAULT 'active',
     created_by INTEGER REFERENCES users(id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -53,6 +55,7 @@ CREATE TABLE IF NOT EXISTS products (
     brand VARCHAR(50),
     sku VARCHAR(50) UNIQUE,
     stock_quantity INTEGER DEFAULT 0,
+    reserved_quantity INTEGER NOT NULL DEFAULT 0,
     is_active BOOLEAN DEFAULT TRUE,
     image_url VARCHAR(255),
     minimum_order_value DECIMAL(10,2) DEFAULT 0,
@@ -99,6 +102,86 @@ CREATE TABLE IF NOT EXISTS redemptions (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE IF NOT EXISTS coupon_reservations (
+    id SERIAL PRIMARY KEY,
+    coupon_id INTEGER NOT NULL REFERENCES coupons(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_coupon_reservations_coupon_user UNIQUE (coupon_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS inventory_holds (
+    id SERIAL PRIMARY KEY,
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    quantity INTEGER NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_inventory_holds_product_user UNIQUE (product_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS coupon_categories (
+    coupon_id INTEGER NOT NULL REFERENCES coupons(id) ON DELETE CASCADE,
+    category VARCHAR(100) NOT NULL,
+    PRIMARY KEY (coupon_id, category)
+);
+
+CREATE TABLE IF NOT EXISTS product_facet_counts (
+    facet VARCHAR(32) NOT NULL,
+    value VARCHAR(100) NOT NULL,
+    product_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (facet, value)
+);
+
+-- Version counters of cached reads; bumping 'catalog' invalidates every
+-- cached product listing
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name VARCHAR(64) NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO cache_versions (name, version) VALUES ('catalog', 0) ON CONFLICT (name) DO NOTHING;
+
+-- Background product imports; progress is written with every committed chunk
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id SERIAL PRIMARY KEY,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    filename VARCHAR(255),
+    file_path VARCHAR(500) NOT NULL,
+    created_by INTEGER NOT NULL REFERENCES users(id),
+    processed_rows INTEGER NOT NULL DEFAULT 0,
+    imported_count INTEGER NOT NULL DEFAULT 0,
+    error_count INTEGER NOT NULL DEFAULT 0,
+    errors TEXT,
+    resume_row INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    worker_id VARCHAR(64),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    heartbeat_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_import_jobs_status ON import_jobs (status, id);
+CREATE INDEX IF NOT EXISTS ix_import_jobs_created ON import_jobs (created_at, id);
+
+CREATE TABLE IF NOT EXISTS user_redeemed_coupons (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    coupon_id INTEGER NOT NULL REFERENCES coupons(id) ON DELETE CASCADE,
+    redeemed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, coupon_id)
+);
+
+CREATE TABLE IF NOT EXISTS carts (
+    user_id VARCHAR(64) PRIMARY KEY,
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    expires_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
@@ -106,12 +189,65 @@ CREATE INDEX IF NOT EXISTS idx_coupons_code ON coupons(code);
 CREATE INDEX IF NOT EXISTS idx_coupons_is_public ON coupons(is_public);
 CREATE INDEX IF NOT EXISTS idx_coupons_start_date ON coupons(start_date);
 CREATE INDEX IF NOT EXISTS idx_coupons_end_date ON coupons(end_date);
+CREATE INDEX IF NOT EXISTS ix_coupons_live ON coupons(lifecycle_state, is_public, is_active, end_date);
 CREATE INDEX IF NOT EXISTS idx_products_category ON products(category);
 CREATE INDEX IF NOT EXISTS idx_products_is_active ON products(is_active);
 CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
 CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(order_status);
 CREATE INDEX IF NOT EXISTS idx_redemptions_user_id ON redemptions(user_id);
 CREATE INDEX IF NOT EXISTS idx_redemptions_coupon_id ON redemptions(coupon_id);
+CREATE INDEX IF NOT EXISTS ix_carts_expires_at ON carts(expires_at);
+CREATE INDEX IF NOT EXISTS ix_coupon_reservations_expires_at ON coupon_reservations(expires_at);
+CREATE INDEX IF NOT EXISTS ix_inventory_holds_expires_at ON inventory_holds(expires_at);
+CREATE INDEX IF NOT EXISTS ix_coupon_categories_category ON coupon_categories(category, coupon_id);
+
+-- Keyset (cursor) pagination: sort key plus id
+CREATE INDEX IF NOT EXISTS ix_products_name ON products(name, id);
+CREATE INDEX IF NOT EXISTS ix_products_price ON products(price, id);
+CREATE INDEX IF NOT EXISTS ix_products_created ON products(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_coupons_created ON coupons(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_users_created ON users(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_redemptions_user_redeemed ON redemptions(user_id, redeemed_at, id);
+CREATE INDEX IF NOT EXISTS ix_redemptions_coupon_redeemed ON redemptions(coupon_id, redeemed_at, id);
+
+-- Full-text search over coupon code, title and description (weighted A/B/C)
+ALTER TABLE coupons ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(code, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(title, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+) STORED;
+CREATE INDEX IF NOT EXISTS ix_coupon_search ON coupons USING GIN (search_vector);
+
+-- Trigram indexes for search typo correction
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS ix_coupon_search_trgm_code ON coupons USING GIN (code gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_coupon_search_trgm_title ON coupons USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_coupon_search_trgm_description ON coupons USING GIN (description gin_trgm_ops);
+
+-- Full-text search over product name, SKU, brand and description (weighted
+-- A/B/C/C); category is weight D and only used to filter
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(sku, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(brand, '')), 'C') ||
+    setweight(to_tsvector('simple', coalesce(description, '')), 'C') ||
+    setweight(to_tsvector('simple', coalesce(category, '')), 'D')
+) STORED;
+CREATE INDEX IF NOT EXISTS ix_product_search ON products USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS ix_product_search_trgm_name ON products USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_product_search_trgm_sku ON products USING GIN (sku gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_product_search_trgm_brand ON products USING GIN (brand gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_product_search_trgm_description ON products USING GIN (description gin_trgm_ops);
+
+-- Facet counts of active products (category, brand, price band, availability),
+-- kept in sync by triggers defined in app/utils/product_facets.py
+-- BEGIN product facet triggers (generated by `python -m app.utils.product_facets`, do not edit)
+CREATE OR REPLACE FUNCTION product_facets_apply() RETURNS trigger AS $$ BEGIN IF TG_OP IN ('UPDATE', 'DELETE') THEN INSERT INTO product_facet_counts (facet, value, product_count) SELECT 'category', old.category, -1 WHERE old.is_active AND old.category IS NOT NULL ON CONFLICT (facet, value) DO UPDATE SET product_count = product_facet_counts.product_count + -1; INSERT INTO product_facet_counts (facet, value, product_count) SELECT 'brand', old.brand, -1 WHERE old.is_active AND old.brand IS NOT NULL ON CONFLICT (facet, value) DO UPDATE SET product_count = product_facet_counts.product_count + -1; INSERT INTO product_facet_counts (facet, value, product_count) SELECT 'price', CASE WHEN old.price < 25 THEN '0-25' WHEN old.price < 50 THEN '25-50' WHEN old.price < 100 THEN '50-100' WHEN old.price < 250 THEN '100-250' WHEN old.price < 500 THEN '250-500' ELSE '500+' END, -1 WHERE old.is_active AND CASE WHEN old.price < 25 THEN '0-25' WHEN old.price < 50 THEN '25-50' WHEN old.price < 100 THEN '50-100' WHEN old.price < 250 THEN '100-250' WHEN old.price < 500 THEN '250-500' ELSE '500+' END IS NOT NULL ON CONFLICT (facet, value) DO UPDATE SET product_count = product_facet_counts.product_count + -1; INSERT INTO product_facet_counts (facet, value, product_count) SELECT 'availability', CASE WHEN coalesce(old.stock_quantity, 0) > 0 THEN 'in_stock' ELSE 'out_of_stock' END, -1 WHERE old.is_active AND CASE WHEN coalesce(old.stock_quantity, 0) > 0 THEN 'in_stock' ELSE 'out_of_stock' END IS NOT NULL ON CONFLICT (facet, value) DO UPDATE SET product_count = product_facet_counts.product_count + -1; END IF; IF TG_OP IN ('INSERT', 'UPDATE') THEN INSERT INTO product_facet_counts (facet, value, product_count) SELECT 'category', new.category, 1 WHERE new.is_active AND new.category IS NOT NULL ON CONFLICT (facet, value) DO UPDATE SET product_count = product_facet_counts.product_count + 1; INSERT INTO product_facet_counts (facet, value, product_count) SELECT 'brand', new.brand, 1 WHERE new.is_active AND new.brand IS NOT NULL ON CONFLICT (facet, value) DO UPDATE SET product_count = product_facet_counts.product_count + 1; INSERT INTO product_facet_counts (facet, value, product_count) SELECT 'price', CASE WHEN new.price < 25 THEN '0-25' WHEN new.price < 50 THEN '25-50' WHEN new.price < 100 THEN '50-100' WHEN new.price < 250 THEN '100-250' WHEN new.price < 500 THEN '250-500' ELSE '500+' END, 1 WHERE new.is_active AND CASE WHEN new.price < 25 THEN '0-25' WHEN new.price < 50 THEN '25-50' WHEN new.price < 100 THEN '50-100' WHEN new.price < 250 THEN '100-250' WHEN new.price < 500 THEN '250-500' ELSE '500+' END IS NOT NULL ON CONFLICT (facet, value) DO UPDATE SET product_count = product_facet_counts.product_count + 1; INSERT INTO product_facet_counts (facet, value, product_count) SELECT 'availability', CASE WHEN coalesce(new.stock_quantity, 0) > 0 THEN 'in_stock' ELSE 'out_of_stock' END, 1 WHERE new.is_active AND CASE WHEN coalesce(new.stock_quantity, 0) > 0 THEN 'in_stock' ELSE 'out_of_stock' END IS NOT NULL ON CONFLICT (facet, value) DO UPDATE SET product_count = product_facet_counts.product_count + 1; END IF; RETURN NULL; END $$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS product_facets_aid ON products;
+CREATE TRIGGER product_facets_aid AFTER INSERT OR DELETE ON products FOR EACH ROW EXECUTE FUNCTION product_facets_apply();
+DROP TRIGGER IF EXISTS product_facets_au ON products;
+CREATE TRIGGER product_facets_au AFTER UPDATE OF category, brand, price, stock_quantity, is_active ON products FOR EACH ROW WHEN (old.is_active IS DISTINCT FROM new.is_active OR (old.category) IS DISTINCT FROM (new.category) OR (old.brand) IS DISTINCT FROM (new.brand) OR (CASE WHEN old.price < 25 THEN '0-25' WHEN old.price < 50 THEN '25-50' WHEN old.price < 100 THEN '50-100' WHEN old.price < 250 THEN '100-250' WHEN old.price < 500 THEN '250-500' ELSE '500+' END) IS DISTINCT FROM (CASE WHEN new.price < 25 THEN '0-25' WHEN new.price < 50 THEN '25-50' WHEN new.price < 100 THEN '50-100' WHEN new.price < 250 THEN '100-250' WHEN new.price < 500 THEN '250-500' ELSE '500+' END) OR (CASE WHEN coalesce(old.stock_quantity, 0) > 0 THEN 'in_stock' ELSE 'out_of_stock' END) IS DISTINCT FROM (CASE WHEN coalesce(new.stock_quantity, 0) > 0 THEN 'in_stock' ELSE 'out_of_stock' END)) EXECUTE FUNCTION product_facets_apply();
+-- END product facet triggers
 
 -- Create views for common queries
 CREATE OR REPLACE VIEW active_coupons AS
@@ -150,25 +286,11 @@ LEFT JOIN products p ON true
 LEFT JOIN orders o ON true
 LEFT JOIN redemptions r ON true;
 
--- Create functions for common operations
-CREATE OR REPLACE FUNCTION update_coupon_usage()
-RETURNS TRIGGER AS $$
-BEGIN
-    -- Update coupon usage count
-    UPDATE coupons
-    SET current_uses = current_uses + 1
-    WHERE id = NEW.coupon_id;
-
-    RETURN NEW;
-END;
-$$ LANGUAGE plpgsql;
-
--- Create trigger for coupon usage tracking
+-- Coupon usage is counted by the application with a conditional increment
+-- (app/utils/coupon_usage.py). A trigger incrementing current_uses on every
+-- redemption insert would count each use twice, so make sure none exists.
 DROP TRIGGER IF EXISTS trigger_update_coupon_usage ON redemptions;
-CREATE TRIGGER trigger_update_coupon_usage
-    AFTER INSERT ON redemptions
-    FOR EACH ROW
-    EXECUTE FUNCTION update_coupon_usage();
+DROP FUNCTION IF EXISTS update_coupon_usage();
 
 -- Create function to check coupon validity
 CREATE OR REPLACE FUNCTION is_coupon_valid(
@@ -0,0 +1,151 @@
+import unittest
+import json
+import tempfile
+import os
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.models.coupon import Coupon
+from app.models.redemption import Redemption
+from app.utils.coupon_finder import find_best_coupons
+from app.utils.redeemed_coupons import record_redemption
+from app.utils.coupon_rules import UserFacts
+
+class BestCouponsTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='shopper', email='shopper@example.com', email_verified=True)
+        self.user.set_password('Password123')
+        db.session.add(self.user)
+        db.session.commit()
+
+        self.laptop = Product(name='Laptop', price=200, category='Electronics', sku='LAPTOP001',
+                              stock_quantity=10, created_by=self.user.id)
+        self.book = Product(name='Novel', price=20, category='Books', sku='BOOK001',
+                            stock_quantity=10, created_by=self.user.id)
+        db.session.add_all([self.laptop, self.book])
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def create_coupon(self, code, discount_type='percentage', discount_value=10, **fields):
+        now = datetime.datetime.utcnow()
+        values = dict(
+            code=code, title=code, discount_type=discount_type, discount_value=discount_value,
+            max_uses=10, current_uses=0, created_by=self.user.id,
+            start_date=now - datetime.timedelta(days=1), end_date=now + datetime.timedelta(days=7)
+        )
+        values.update(fields)
+        coupon = Coupon(**values)
+        db.session.add(coupon)
+        db.session.commit()
+        return coupon
+
+    def get_auth_headers(self):
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'shopper@example.com', 'password': 'Password123'}),
+                                    content_type='application/json')
+        return {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def test_ranked_by_capped_discount(self):
+        """Test ranking by actual discount, with the percentage cap applied"""
+        self.create_coupon('PCT50CAP', discount_value=50, maximum_discount_amount=30)
+        self.create_coupon('PCT20', discount_value=20)
+        self.create_coupon('FIXED35', discount_type='fixed', discount_value=35)
+        self.create_coupon('FIXED500', discount_type='fixed', discount_value=500)
+
+        ranked = find_best_coupons(200)
+        self.assertEqual([(rules.code, amount) for rules, amount in ranked], [
+            ('FIXED500', 200.0),
+            ('PCT20', 40.0),
+            ('FIXED35', 35.0),
+            ('PCT50CAP', 30.0)
+        ])
+
+    def test_rules_prune_candidates(self):
+        """Test that coupons the cart or user cannot use are left out"""
+        now = datetime.datetime.utcnow()
+        self.create_coupon('PRIVATE', is_public=False)
+        self.create_coupon('INACTIVE', is_active=False)
+        self.create_coupon('EXPIRED', end_date=now - datetime.timedelta(hours=1))
+        self.create_coupon('FUTURE', start_date=now + datetime.timedelta(hours=1))
+        self.create_coupon('USEDUP', current_uses=10)
+        self.create_coupon('BIGORDER', minimum_order_value=500)
+        self.create_coupon('BOOKS', applicable_categories=json.dumps(['Books']))
+        self.create_coupon('ELECTRONICS', applicable_categories=json.dumps(['Electronics']))
+        self.create_coupon('FIRSTTIME', first_time_user_only=True)
+        redeemed = self.create_coupon('REDEEMED')
+        self.create_coupon('ANYONE')
+
+        ranked = find_best_coupons(200, categories={'Electronics'})
+        self.assertEqual(sorted(rules.code for rules, _ in ranked),
+                         ['ANYONE', 'ELECTRONICS', 'FIRSTTIME', 'REDEEMED'])
+
+        facts = UserFacts(redeemed_coupon_ids=frozenset([redeemed.id]), redemption_count=1)
+        ranked = find_best_coupons(200, categories={'Electronics'}, facts=facts)
+        self.assertEqual(sorted(rules.code for rules, _ in ranked), ['ANYONE', 'ELECTRONICS'])
+
+    def test_limit_batches_past_false_positives(self):
+        """Test that a category only matching the JSON text is not treated as a match"""
+        # '"Books"' appears in the JSON text, but only inside another category
+        for i in range(30):
+            self.create_coupon(f'NEAR{i}', discount_value=90, applicable_categories=json.dumps(['Rare","Books']))
+        self.create_coupon('REAL', discount_value=5)
+        ranked = find_best_coupons(100, categories={'Books'}, limit=1)
+        self.assertEqual([rules.code for rules, _ in ranked], ['REAL'])
+
+    def test_endpoint(self):
+        """Test the endpoint with the server-side cart and with a cart in the request"""
+        self.create_coupon('PCT10', discount_value=10)
+        self.create_coupon('BOOKS5', discount_type='fixed', discount_value=5,
+                           applicable_categories=json.dumps(['Books']))
+        redeemed = self.create_coupon('FIXED100', discount_type='fixed', discount_value=100)
+        record_redemption(self.user.id, redeemed.id)
+        db.session.add(Redemption(user_id=self.user.id, coupon_id=redeemed.id, discount_applied=100))
+        db.session.commit()
+        headers = self.get_auth_headers()
+
+        response = self.client.get('/api/cart/best-coupons', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+        self.client.post('/api/cart/add', data=json.dumps({'product_id': self.laptop.id, 'quantity': 1}),
+                         content_type='application/json', headers=headers)
+        response = self.client.get('/api/cart/best-coupons', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual([coupon['code'] for coupon in data['coupons']], ['PCT10'])
+        self.assertEqual(data['best_coupon']['discount_amount'], 20.0)
+        self.assertEqual(data['best_coupon']['final_total'], 180.0)
+
+        response = self.client.post('/api/cart/best-coupons', data=json.dumps({
+            'cart_items': [{'product_id': self.book.id, 'quantity': 2}]
+        }), content_type='application/json', headers=headers)
+        data = json.loads(response.data)
+        self.assertEqual(data['subtotal'], 40.0)
+        self.assertEqual([(coupon['code'], coupon['discount_amount']) for coupon in data['coupons']],
+                         [('BOOKS5', 5.0), ('PCT10', 4.0)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,387 @@
+import unittest
+import json
+import tempfile
+import os
+import threading
+import time
+from sqlalchemy import event
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.models.order import Order
+from app.utils.cart_store import (
+    MemoryCartStore, SQLCartStore, RedisCartStore, CartConflictError, empty_cart
+)
+
+class FakeRedis:
+    """Minimal stand-in for a Redis client (GET, SET with EX/PX/NX, DELETE, EVAL)"""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def _expired(self, key):
+        entry = self.data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+
+    def get(self, key):
+        with self.lock:
+            self._expired(key)
+            entry = self.data.get(key)
+            return entry[0].encode('utf-8') if entry else None
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        with self.lock:
+            self._expired(key)
+            if nx and key in self.data:
+                return None
+            expires_at = None
+            if ex is not None:
+                expires_at = time.monotonic() + ex
+            elif px is not None:
+                expires_at = time.monotonic() + px / 1000.0
+            self.data[key] = (value, expires_at)
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            return 1 if self.data.pop(key, None) else 0
+
+    def eval(self, script, numkeys, *keys_and_args):
+        """Run the store's lock release script: delete KEYS[1] if it holds ARGV[1]"""
+        assert script == RedisCartStore.RELEASE_LOCK_SCRIPT
+        key, token = keys_and_args[0], keys_and_args[numkeys]
+        with self.lock:
+            self._expired(key)
+            entry = self.data.get(key)
+            if entry and entry[0] == token:
+                del self.data[key]
+                return 1
+            return 0
+
+
+class CartTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = self.make_app()
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(
+            username='testuser',
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            email_verified=True
+        )
+        self.user.set_password('Password123')
+        db.session.add(self.user)
+        db.session.commit()
+
+        self.product = Product(
+            name='Test Laptop',
+            description='A test laptop',
+            price=999.99,
+            category='Electronics',
+            brand='TestBrand',
+            sku='LAPTOP001',
+            stock_quantity=10,
+            created_by=self.user.id
+        )
+        db.session.add(self.product)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def make_app(self, **config):
+        test_config = {
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        }
+        test_config.update(config)
+        return create_app(test_config)
+
+    def get_auth_headers(self, client=None):
+        """Log in the test user and return authorization headers"""
+        client = client or self.client
+        response = client.post('/api/auth/login',
+                               data=json.dumps({'email': 'test@example.com', 'password': 'Password123'}),
+                               content_type='application/json')
+        token = json.loads(response.data)['access_token']
+        return {'Authorization': f'Bearer {token}'}
+
+    def add_to_cart(self, client, headers, quantity=1):
+        return client.post('/api/cart/add',
+                           data=json.dumps({'product_id': self.product.id, 'quantity': quantity}),
+                           content_type='application/json',
+                           headers=headers)
+
+    def test_add_to_cart_and_checkout(self):
+        """Test the cart flow with the default in-memory store"""
+        headers = self.get_auth_headers()
+        response = self.add_to_cart(self.client, headers, quantity=2)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/cart', headers=headers)
+        cart = json.loads(response.data)['cart']
+        self.assertEqual(cart['items'][0]['quantity'], 2)
+        self.assertAlmostEqual(cart['subtotal'], 1999.98)
+
+        response = self.client.post('/api/cart/checkout',
+                                    data=json.dumps({'shipping_address': '1 Test Street'}),
+                                    content_type='application/json',
+                                    headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.query.count(), 1)
+        self.assertEqual(db.session.get(Product, self.product.id).stock_quantity, 8)
+
+        response = self.client.get('/api/cart', headers=headers)
+        self.assertEqual(json.loads(response.data)['cart']['items'], [])
+
+    def count_checkout_statements(self, cart_size):
+        """Fill the cart with cart_size products and count the SQL statements of checkout"""
+        headers = self.get_auth_headers()
+        for i in range(cart_size):
+            product = Product(name=f'Product {cart_size}-{i}', price=10, category='Books',
+                              sku=f'SKU-{cart_size}-{i}', stock_quantity=5, created_by=self.user.id)
+            db.session.add(product)
+            db.session.commit()
+            self.client.post('/api/cart/add',
+                             data=json.dumps({'product_id': product.id, 'quantity': 1}),
+                             content_type='application/json',
+                             headers=headers)
+
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.post('/api/cart/checkout',
+                                        data=json.dumps({}),
+                                        content_type='application/json',
+                                        headers=headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(json.loads(response.data)['order']['items']), cart_size)
+        return len(statements)
+
+    def test_checkout_round_trips_do_not_grow_with_cart_size(self):
+        """Test that checkout issues the same number of statements for any cart size"""
+        self.assertEqual(self.count_checkout_statements(2), self.count_checkout_statements(20))
+
+    def test_sql_store_is_shared_between_workers(self):
+        """Test that two app instances using the SQL store see the same cart"""
+        worker_a = self.make_app(CART_STORE='sql')
+        worker_b = self.make_app(CART_STORE='sql')
+        client_a = worker_a.test_client()
+        client_b = worker_b.test_client()
+
+        headers = self.get_auth_headers(client_a)
+        response = self.add_to_cart(client_a, headers, quantity=3)
+        self.assertEqual(response.status_code, 200)
+
+        response = client_b.get('/api/cart', headers=headers)
+        cart = json.loads(response.data)['cart']
+        self.assertEqual(len(cart['items']), 1)
+        self.assertEqual(cart['items'][0]['quantity'], 3)
+
+    def test_redis_store_is_shared_between_workers(self):
+        """Test that two app instances using one Redis server see the same cart"""
+        redis_client = FakeRedis()
+        client_a = self.make_app(CART_STORE='redis', CART_REDIS_CLIENT=redis_client).test_client()
+        client_b = self.make_app(CART_STORE='redis', CART_REDIS_CLIENT=redis_client).test_client()
+
+        headers = self.get_auth_headers(client_a)
+        self.add_to_cart(client_a, headers)
+        self.add_to_cart(client_b, headers)
+
+        response = client_a.get('/api/cart', headers=headers)
+        cart = json.loads(response.data)['cart']
+        self.assertEqual(cart['items'][0]['quantity'], 2)
+
+    def check_store(self, store):
+        """Exercise the common CartStore contract"""
+        self.assertEqual(store.load(1), empty_cart())
+
+        with store.transaction(1) as cart:
+            cart['items'].append({'product_id': 1, 'quantity': 1})
+        self.assertEqual(len(store.load(1)['items']), 1)
+
+        # An exception inside the transaction discards the changes
+        with self.assertRaises(RuntimeError):
+            with store.transaction(1) as cart:
+                cart['items'] = []
+                raise RuntimeError('boom')
+        self.assertEqual(len(store.load(1)['items']), 1)
+
+        store.delete(1)
+        self.assertEqual(store.load(1), empty_cart())
+
+    def check_concurrent_updates(self, store, threads=8, increments=25):
+        """Concurrent read-modify-write cycles must not lose updates"""
+        def worker():
+            for _ in range(increments):
+                with store.transaction('shared') as cart:
+                    cart['subtotal'] += 1
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(store.load('shared')['subtotal'], threads * increments)
+
+    def test_memory_store(self):
+        store = MemoryCartStore()
+        self.check_store(store)
+        self.check_concurrent_updates(store)
+
+    def test_sql_store(self):
+        self.check_store(SQLCartStore())
+
+    def test_redis_store(self):
+        store = RedisCartStore(FakeRedis())
+        self.check_store(store)
+        self.check_concurrent_updates(store)
+
+    def test_redis_lock_release_keeps_taken_over_lease(self):
+        """Test that a writer whose lease expired does not release the next holder's lock"""
+        redis_client = FakeRedis()
+        store = RedisCartStore(redis_client, lock_timeout=0.001)
+        with store._locked(1):
+            time.sleep(0.01)
+            # The lease expired and another writer took the lock
+            self.assertTrue(redis_client.set('cart:1:lock', 'other', nx=True, px=5000))
+        self.assertEqual(redis_client.get('cart:1:lock'), b'other')
+
+    def test_cart_ttl(self):
+        """Test that carts expire after the configured TTL"""
+        for store in (MemoryCartStore(ttl=0), SQLCartStore(ttl=0), RedisCartStore(FakeRedis(), ttl=0.001)):
+            store.save(1, {'items': [{'product_id': 1}], 'applied_coupon': None,
+                           'subtotal': 1, 'discount_amount': 0, 'final_total': 1})
+            time.sleep(0.01)
+            self.assertEqual(store.load(1), empty_cart())
+
+    def test_memory_store_is_bounded(self):
+        """Test LRU eviction once max_entries is reached"""
+        store = MemoryCartStore(max_entries=2)
+        for user_id in (1, 2):
+            with store.transaction(user_id) as cart:
+                cart['subtotal'] = user_id
+        store.load(1)  # 1 is now the most recently used cart
+        with store.transaction(3) as cart:
+            cart['subtotal'] = 3
+
+        stats = store.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(store.load(2), empty_cart())
+        self.assertEqual(store.load(1)['subtotal'], 1)
+
+    def test_memory_store_idle_eviction_and_spill(self):
+        """Test that idle carts are evicted to disk and restored on access"""
+        with tempfile.TemporaryDirectory() as spill_dir:
+            store = MemoryCartStore(idle_timeout=0.01, spill_dir=spill_dir)
+            with store.transaction(1) as cart:
+                cart['subtotal'] = 42
+            time.sleep(0.02)
+            store.purge_expired()
+
+            self.assertEqual(store.stats()['entries'], 0)
+            self.assertEqual(store.stats()['spilled'], 1)
+            self.assertEqual(store.load(1)['subtotal'], 42)
+            self.assertEqual(store.stats()['restored'], 1)
+            self.assertEqual(os.listdir(spill_dir), [])
+
+    def test_checkout_reports_short_products(self):
+        """Test that checkout fails cleanly when stock ran out after adding to cart"""
+        headers = self.get_auth_headers()
+        self.add_to_cart(self.client, headers, quantity=5)
+        db.session.get(Product, self.product.id).stock_quantity = 4
+        db.session.commit()
+
+        response = self.client.post('/api/cart/checkout',
+                                    data=json.dumps({}),
+                                    content_type='application/json',
+                                    headers=headers)
+        self.assertEqual(response.status_code, 400)
+        shortages = json.loads(response.data)['shortages']
+        self.assertEqual(shortages[0]['sku'], 'LAPTOP001')
+        self.assertEqual(shortages[0]['available'], 4)
+        self.assertEqual(Order.query.count(), 0)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Product, self.product.id).stock_quantity, 4)
+
+    def test_checkout_removes_cart_entry(self):
+        """Test that a completed checkout frees the cart instead of keeping an empty one"""
+        headers = self.get_auth_headers()
+        self.add_to_cart(self.client, headers)
+        store = self.app.extensions['cart_store']
+        self.assertEqual(store.stats()['entries'], 1)
+
+        response = self.client.post('/api/cart/checkout',
+                                    data=json.dumps({}),
+                                    content_type='application/json',
+                                    headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(store.stats()['entries'], 0)
+
+    def test_sql_store_detects_concurrent_write(self):
+        """Test that a stale version is rejected by the SQL store"""
+        store = SQLCartStore()
+        store.save(1, empty_cart())
+        _, version = store._read('1')
+        store.save(1, empty_cart())
+        with self.assertRaises(CartConflictError):
+            store._write('1', empty_cart(), version)
+
+    def test_checkout_cart_conflict_places_no_order(self):
+        """Test that a cart changed during checkout rolls back the order with a 409"""
+        app = self.make_app(CART_STORE='sql')
+        client = app.test_client()
+        headers = self.get_auth_headers(client)
+        self.add_to_cart(client, headers, quantity=2)
+
+        store = app.extensions['cart_store']
+        remove = store._remove
+
+        def remove_after_concurrent_write(user_id, token):
+            # Another request updated the cart after checkout read it
+            db.session.execute(db.text('UPDATE carts SET version = version + 1'))
+            return remove(user_id, token)
+
+        store._remove = remove_after_concurrent_write
+        response = client.post('/api/cart/checkout', data=json.dumps({}),
+                               content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.query.count(), 0)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Product, self.product.id).stock_quantity, 10)
+
+        # The retry places exactly one order
+        store._remove = remove
+        response = client.post('/api/cart/checkout', data=json.dumps({}),
+                               content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.query.count(), 1)
+        self.assertEqual(store.load(self.user.id), empty_cart())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import json
+import tempfile
+import os
+import time
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.models.coupon import Coupon
+from app.utils.coupon_cache import CouponCache, coupon_cache
+
+class CouponCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.admin = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.admin.set_password('Admin123')
+        self.user = User(username='shopper', email='shopper@example.com', email_verified=True)
+        self.user.set_password('Password123')
+        db.session.add_all([self.admin, self.user])
+        db.session.commit()
+
+        self.product = Product(name='Desk Lamp', price=40, category='Home', sku='LAMP001',
+                               stock_quantity=100, created_by=self.admin.id)
+        db.session.add(self.product)
+        now = datetime.datetime.utcnow()
+        self.coupon = Coupon(code='SAVE10', title='Save 10%', discount_type='percentage', discount_value=10,
+                             max_uses=5, current_uses=0, created_by=self.admin.id,
+                             start_date=now - datetime.timedelta(days=1),
+                             end_date=now + datetime.timedelta(days=30))
+        db.session.add(self.coupon)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def login(self, email, password):
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': email, 'password': password}),
+                                    content_type='application/json')
+        return {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def post(self, url, payload, headers):
+        return self.client.post(url, data=json.dumps(payload), content_type='application/json', headers=headers)
+
+    def test_lookup_is_cached_by_normalized_code(self):
+        """Test that lookups are served from the cache regardless of code case"""
+        first = coupon_cache.get('save10')
+        second = coupon_cache.get(' SAVE10 ')
+        self.assertEqual(first, second)
+        self.assertIsNone(first.current_uses)
+        self.assertIsNone(coupon_cache.get('NOPE'))
+
+        stats = coupon_cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['entries'], 1)
+
+    def test_usage_is_read_from_the_database(self):
+        """Test that usage counters are never served from the cache"""
+        self.assertEqual(coupon_cache.get('SAVE10', with_usage=True).current_uses, 0)
+
+        self.coupon.current_uses = 5
+        db.session.commit()
+
+        rules = coupon_cache.get('SAVE10', with_usage=True)
+        self.assertEqual(coupon_cache.stats()['hits'], 1)
+        self.assertEqual(rules.current_uses, 5)
+        self.assertEqual(rules.evaluate(100, rules=('usage',)).errors, ['Coupon usage limit reached'])
+
+    def test_admin_writes_invalidate(self):
+        """Test that admin create, update and delete drop cached coupons"""
+        headers = self.login('admin@example.com', 'Admin123')
+        self.assertEqual(coupon_cache.get('SAVE10').discount_value, 10)
+
+        response = self.client.put(f'/api/admin/coupons/{self.coupon.id}',
+                                   data=json.dumps({'discount_value': 25}),
+                                   content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(coupon_cache.get('SAVE10').discount_value, 25)
+
+        response = self.client.delete(f'/api/admin/coupons/{self.coupon.id}', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(coupon_cache.get('SAVE10'))
+        self.assertEqual(coupon_cache.stats()['invalidations'], 2)
+
+        response = self.client.get('/api/admin/coupon-cache/stats', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_rate', json.loads(response.data)['stats'])
+
+    def test_ttl_and_lru_bound(self):
+        """Test expiry after the TTL and least-recently-used eviction"""
+        cache = CouponCache(ttl=0.05, max_entries=1)
+        cache.get('SAVE10')
+        time.sleep(0.1)
+        cache.get('SAVE10')
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+        other = Coupon(code='OTHER', title='Other', discount_type='fixed', discount_value=5,
+                       created_by=self.admin.id)
+        db.session.add(other)
+        db.session.commit()
+        cache.get('OTHER')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['entries'], 1)
+
+        # A TTL of 0 disables caching
+        cache = CouponCache(ttl=0)
+        cache.get('SAVE10')
+        cache.get('SAVE10')
+        self.assertEqual(cache.stats()['hits'], 0)
+
+    def test_cart_path_uses_the_cache(self):
+        """Test that cart mutations with a coupon applied do not select the coupon again"""
+        headers = self.login('shopper@example.com', 'Password123')
+        self.post('/api/cart/add', {'product_id': self.product.id, 'quantity': 1}, headers)
+        response = self.post('/api/cart/apply-coupon', {'coupon_code': 'save10'}, headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['cart']['discount_amount'], 4.0)
+
+        for quantity in range(2, 6):
+            response = self.client.put('/api/cart/update',
+                                       data=json.dumps({'updates': [{'product_id': self.product.id, 'quantity': quantity}]}),
+                                       content_type='application/json', headers=headers)
+            self.assertEqual(response.status_code, 200)
+
+        stats = coupon_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import json
+import tempfile
+import os
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.coupon import Coupon
+from app.models.coupon_category import CouponCategory
+from app.utils.coupon_categories import coupons_for_categories, sync_coupon_categories
+from app.utils.coupon_codes import BulkCodeJob, CodeGenerator
+
+class CouponCategoriesTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='shopper', email='shopper@example.com', email_verified=True)
+        self.user.set_password('Password123')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def create_coupon(self, code, categories=None):
+        now = datetime.datetime.utcnow()
+        coupon = Coupon(code=code, title=code, discount_type='fixed', discount_value=5, max_uses=10,
+                        created_by=self.user.id, start_date=now - datetime.timedelta(days=1),
+                        end_date=now + datetime.timedelta(days=7),
+                        applicable_categories=json.dumps(categories) if categories is not None else None)
+        db.session.add(coupon)
+        db.session.commit()
+        return coupon
+
+    def links(self):
+        return sorted((link.coupon_id, link.category) for link in CouponCategory.query.all())
+
+    def test_links_follow_json_column(self):
+        """Test that ORM writes to applicable_categories keep the mapping in sync"""
+        coupon = self.create_coupon('BOOKS', ['Books', 'Toys', 'Books'])
+        self.assertEqual(self.links(), [(coupon.id, 'Books'), (coupon.id, 'Toys')])
+        self.assertEqual(coupon.get_applicable_categories(), ['Books', 'Toys'])
+
+        coupon.set_applicable_categories(['Toys', 'Garden'])
+        db.session.commit()
+        self.assertEqual(self.links(), [(coupon.id, 'Garden'), (coupon.id, 'Toys')])
+
+        coupon.set_applicable_categories(None)
+        db.session.commit()
+        self.assertEqual(self.links(), [])
+        self.assertEqual(coupon.to_dict()['applicable_categories'], [])
+
+        coupon.set_applicable_categories(['Books'])
+        db.session.commit()
+        db.session.delete(coupon)
+        db.session.commit()
+        self.assertEqual(self.links(), [])
+
+    def test_backfill_from_json(self):
+        """Test rebuilding the mapping for rows inserted without the ORM"""
+        db.session.execute(db.insert(Coupon), [
+            {'code': 'RAW1', 'title': 'Raw', 'discount_type': 'fixed', 'discount_value': 1,
+             'created_by': self.user.id, 'applicable_categories': json.dumps(['Books'])},
+            {'code': 'RAW2', 'title': 'Raw', 'discount_type': 'fixed', 'discount_value': 1,
+             'created_by': self.user.id, 'applicable_categories': 'not json'},
+            {'code': 'RAW3', 'title': 'Raw', 'discount_type': 'fixed', 'discount_value': 1,
+             'created_by': self.user.id, 'applicable_categories': json.dumps(['Toys', 'Books'])}
+        ])
+        db.session.commit()
+        self.assertEqual(self.links(), [])
+
+        self.assertEqual(sync_coupon_categories(), 3)
+        self.assertEqual(sync_coupon_categories(), 3)
+        ids = {coupon.code: coupon.id for coupon in Coupon.query.all()}
+        self.assertEqual(self.links(), [(ids['RAW1'], 'Books'), (ids['RAW3'], 'Books'), (ids['RAW3'], 'Toys')])
+
+    def test_coupons_for_categories(self):
+        """Test the category query API"""
+        self.create_coupon('ANY')
+        self.create_coupon('BOOKS', ['Books'])
+        self.create_coupon('TOYS', ['Toys', 'Garden'])
+
+        codes = lambda query: sorted(coupon.code for coupon in query.all())
+        self.assertEqual(codes(coupons_for_categories(['Books'])), ['ANY', 'BOOKS'])
+        self.assertEqual(codes(coupons_for_categories(['Garden', 'Books'])), ['ANY', 'BOOKS', 'TOYS'])
+        self.assertEqual(codes(coupons_for_categories([])), ['ANY'])
+        self.assertEqual(codes(coupons_for_categories(['Garden'], include_unrestricted=False)), ['TOYS'])
+
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'shopper@example.com', 'password': 'Password123'}),
+                                    content_type='application/json')
+        headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+        response = self.client.get('/api/coupons/public?categories=Toys', headers=headers)
+        self.assertEqual(sorted(coupon['code'] for coupon in json.loads(response.data)['coupons']), ['ANY', 'TOYS'])
+
+    def test_bulk_codes_copy_categories(self):
+        """Test that generated coupons are indexed under the template's categories"""
+        template = self.create_coupon('TEMPLATE', ['Books'])
+        job = BulkCodeJob(template, 5, CodeGenerator(length=8), created_by=self.user.id)
+        codes = [code for chunk in job.run() for code in chunk]
+        self.assertEqual(coupons_for_categories(['Books'], include_unrestricted=False).count(), 6)
+        self.assertEqual(Coupon.query.filter_by(code=codes[0]).first().get_applicable_categories(), ['Books'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+import json
+import tempfile
+import os
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.coupon import Coupon
+from app.routes.admin import is_valid_coupon_code
+from app.utils.coupon_codes import BloomFilter, BulkCodeJob, CodeGenerator, CodeGenerationError
+
+class CouponCodesTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.admin = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.admin.set_password('Admin123')
+        db.session.add(self.admin)
+        db.session.commit()
+
+        now = datetime.datetime.utcnow()
+        self.template = Coupon(code='SPRING', title='Spring campaign', description='Single-use code',
+                               discount_type='percentage', discount_value=15, max_uses=1000,
+                               start_date=now, end_date=now + datetime.timedelta(days=30),
+                               maximum_discount_amount=25, created_by=self.admin.id)
+        db.session.add(self.template)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def get_auth_headers(self):
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'admin@example.com', 'password': 'Admin123'}),
+                                    content_type='application/json')
+        return {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def test_bloom_filter(self):
+        """Test that added values are always found and false positives are rare"""
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'CODE{i}')
+        self.assertTrue(all(f'CODE{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'OTHER{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_generator_validation(self):
+        """Test that parameters producing invalid codes are rejected"""
+        generator = CodeGenerator(alphabet='abc123', length=6, prefix='sp-', validator=is_valid_coupon_code)
+        self.assertEqual(generator.alphabet, '123ABC')
+        code = generator.generate()
+        self.assertTrue(code.startswith('SP-'))
+        self.assertTrue(is_valid_coupon_code(code))
+
+        with self.assertRaises(CodeGenerationError):
+            CodeGenerator(length=30, validator=is_valid_coupon_code)
+        with self.assertRaises(CodeGenerationError):
+            CodeGenerator(alphabet='AB_', length=6, validator=is_valid_coupon_code)
+        with self.assertRaises(CodeGenerationError):
+            BulkCodeJob(self.template, 100, CodeGenerator(alphabet='AB', length=4), created_by=self.admin.id)
+
+    def test_job_skips_existing_codes(self):
+        """Test uniqueness against existing codes without per-code queries"""
+        # Exhaust most of a tiny code space so collisions are certain
+        generator = CodeGenerator(alphabet='AB', length=10, prefix='X')
+        for code in ['XAAAAAAAAAA', 'XBBBBBBBBBB']:
+            db.session.add(Coupon(code=code, title='Taken', discount_type='fixed', discount_value=1,
+                                  created_by=self.admin.id))
+        db.session.commit()
+
+        job = BulkCodeJob(self.template, 50, generator, created_by=self.admin.id, chunk_size=20)
+        codes = [code for chunk in job.run() for code in chunk]
+
+        self.assertEqual(len(codes), 50)
+        self.assertEqual(len(set(codes)), 50)
+        self.assertNotIn('XAAAAAAAAAA', codes)
+        self.assertEqual(job.stats['chunks'], 3)
+        self.assertGreater(job.stats['codes_per_second'], 0)
+        self.assertEqual(Coupon.query.filter(Coupon.code.startswith('X')).count(), 52)
+
+        coupon = Coupon.query.filter_by(code=codes[0]).first()
+        self.assertEqual(coupon.title, 'Spring campaign')
+        self.assertEqual(coupon.max_uses, 1)
+        self.assertFalse(coupon.is_public)
+        self.assertEqual(float(coupon.maximum_discount_amount), 25)
+
+    def test_conflicting_chunk_is_refilled(self):
+        """Test that a code created behind the Bloom filter's back is replaced"""
+        generator = CodeGenerator(alphabet='AB', length=10)
+        job = BulkCodeJob(self.template, 5, generator, created_by=self.admin.id)
+        job.load_existing()
+        db.session.add(Coupon(code='ABABABABAB', title='Late', discount_type='fixed', discount_value=1,
+                              created_by=self.admin.id))
+        db.session.commit()
+
+        codes = job.insert_chunk(['ABABABABAB', 'AAAAABBBBB'])
+        self.assertEqual(len(codes), 2)
+        self.assertNotIn('ABABABABAB', codes)
+        self.assertEqual(job.stats['conflicts'], 1)
+
+    def test_endpoint_streams_csv(self):
+        """Test the generation endpoint"""
+        headers = self.get_auth_headers()
+        response = self.client.post(f'/api/admin/coupons/{self.template.id}/generate-codes',
+                                    data=json.dumps({'count': 120, 'prefix': 'SPR-', 'length': 8,
+                                                     'chunk_size': 50}),
+                                    content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], 'code')
+        self.assertEqual(len(set(lines[1:])), 120)
+        self.assertTrue(all(is_valid_coupon_code(code) and code.startswith('SPR-') for code in lines[1:]))
+        self.assertEqual(Coupon.query.count(), 121)
+
+        response = self.client.post(f'/api/admin/coupons/{self.template.id}/generate-codes',
+                                    data=json.dumps({'count': 10, 'length': 25}),
+                                    content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_endpoint_reports_throughput_as_json(self):
+        """Test that the JSON format returns the codes with the job's throughput"""
+        headers = self.get_auth_headers()
+        response = self.client.post(f'/api/admin/coupons/{self.template.id}/generate-codes?format=json',
+                                    data=json.dumps({'count': 30, 'prefix': 'SPR-', 'chunk_size': 20}),
+                                    content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(len(set(data['codes'])), 30)
+        self.assertEqual(data['generated'], 30)
+        self.assertGreater(data['elapsed_seconds'], 0)
+        self.assertGreater(data['codes_per_second'], 0)
+
+        response = self.client.post(f'/api/admin/coupons/{self.template.id}/generate-codes?format=xml',
+                                    data=json.dumps({'count': 1}),
+                                    content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
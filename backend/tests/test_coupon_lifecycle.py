@@ -0,0 +1,167 @@
+import unittest
+import json
+import tempfile
+import os
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.coupon import Coupon
+from app.utils.coupon_lifecycle import (
+    coupon_lifecycle, refresh_lifecycle_states, lifecycle_state_filter, END_OF_WINDOW
+)
+from app.utils.coupon_usage import claim_coupon_use
+
+class CouponLifecycleTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret',
+            'COUPON_LIFECYCLE_HORIZON_SECONDS': 3600
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.user.set_password('Admin123')
+        db.session.add(self.user)
+        db.session.commit()
+        self.now = datetime.datetime.utcnow()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def create_coupon(self, code, start=-60, end=60, **fields):
+        coupon = Coupon(code=code, title=code, discount_type='fixed', discount_value=5, max_uses=2,
+                        created_by=self.user.id, start_date=self.now + datetime.timedelta(minutes=start),
+                        end_date=self.now + datetime.timedelta(minutes=end), **fields)
+        db.session.add(coupon)
+        db.session.commit()
+        return coupon
+
+    def states(self):
+        db.session.expire_all()
+        return {coupon.code: coupon.lifecycle_state for coupon in Coupon.query.all()}
+
+    def test_initial_states(self):
+        """Test the state computed on insert, through the ORM and bulk inserts"""
+        self.create_coupon('LIVE')
+        self.create_coupon('LATER', start=10)
+        self.create_coupon('OVER', start=-120, end=-60)
+        self.create_coupon('USEDUP', current_uses=2)
+        db.session.execute(db.insert(Coupon), [{
+            'code': 'BULK', 'title': 'Bulk', 'discount_type': 'fixed', 'discount_value': 1,
+            'created_by': self.user.id, 'start_date': self.now + datetime.timedelta(days=1)
+        }])
+        db.session.commit()
+        self.assertEqual(self.states(), {'LIVE': 'active', 'LATER': 'scheduled', 'OVER': 'expired',
+                                         'USEDUP': 'exhausted', 'BULK': 'scheduled'})
+
+    def test_boundaries_flip_states(self):
+        """Test that the scheduler flips states exactly at start_date and after end_date"""
+        transitions = []
+        coupon_lifecycle.add_hook(transitions.extend)
+        coupon = self.create_coupon('WINDOW', start=10, end=20)
+        self.assertEqual(coupon_lifecycle.advance_due(self.now), [])
+        self.assertEqual(coupon_lifecycle.stats()['queued'], 2)
+
+        start, end = coupon.start_date, coupon.end_date
+        self.assertEqual(coupon_lifecycle.advance_due(start - END_OF_WINDOW), [])
+        self.assertEqual(coupon_lifecycle.advance_due(start), [(coupon.id, 'WINDOW', 'active')])
+        self.assertEqual(coupon_lifecycle.advance_due(end), [])
+        self.assertEqual(self.states(), {'WINDOW': 'active'})
+        self.assertEqual(coupon_lifecycle.advance_due(end + END_OF_WINDOW), [(coupon.id, 'WINDOW', 'expired')])
+        self.assertEqual([state for _, _, state in transitions], ['active', 'expired'])
+        self.assertEqual(coupon_lifecycle.stats()['queued'], 0)
+
+    def test_coupons_written_later_are_scheduled(self):
+        """Test that coupons created or edited after the heap was loaded get their boundaries queued"""
+        coupon_lifecycle.advance_due(self.now)
+        coupon = self.create_coupon('NEW', start=5)
+        self.assertEqual(coupon_lifecycle.stats()['queued'], 1)
+
+        coupon.end_date = self.now + datetime.timedelta(minutes=30)
+        db.session.commit()
+        self.assertEqual(coupon_lifecycle.stats()['queued'], 2)
+        coupon_lifecycle.advance_due(self.now + datetime.timedelta(minutes=5))
+        self.assertEqual(self.states(), {'NEW': 'active'})
+
+        coupon.end_date = self.now - datetime.timedelta(minutes=1)
+        db.session.commit()
+        self.assertEqual(self.states(), {'NEW': 'expired'})
+
+    def test_reads_filter_on_stored_states_without_writing(self):
+        """Test that listings filter on the stored state and never offer ended coupons"""
+        self.create_coupon('ENDED', is_public=True)
+        self.create_coupon('STARTED', start=10, is_public=True)
+        self.create_coupon('LATER', start=30, is_public=True)
+        # Both boundaries passed, but no transition was written
+        db.session.execute(db.update(Coupon).where(Coupon.code == 'ENDED')
+                           .values(end_date=self.now - datetime.timedelta(minutes=1)))
+        db.session.execute(db.update(Coupon).where(Coupon.code == 'STARTED')
+                           .values(start_date=self.now - datetime.timedelta(minutes=1)))
+        db.session.commit()
+        stored = self.states()
+
+        def codes(*states):
+            query = Coupon.query.filter(lifecycle_state_filter(states, self.now))
+            return sorted(coupon.code for coupon in query)
+
+        # Until the scheduler runs: ENDED is no longer offered, STARTED not yet
+        self.assertEqual(codes('active'), [])
+        self.assertEqual(codes('scheduled'), ['LATER', 'STARTED'])
+        self.assertEqual(codes('expired'), [])
+
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'admin@example.com', 'password': 'Admin123'}),
+                                    content_type='application/json')
+        headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+        def listed(path):
+            response = self.client.get(path, headers=headers)
+            return [coupon['code'] for coupon in json.loads(response.data)['coupons']]
+
+        self.assertEqual(listed('/api/coupons/public'), [])
+        self.assertEqual(self.states(), stored)
+        self.assertEqual(coupon_lifecycle.stats()['advances'], 0)
+
+        coupon_lifecycle.lifecycle.advance(self.now)
+        self.assertEqual(codes('active'), ['STARTED'])
+        self.assertEqual(codes('scheduled'), ['LATER'])
+        self.assertEqual(codes('expired'), ['ENDED'])
+        self.assertEqual(listed('/api/coupons/public'), ['STARTED'])
+        self.assertEqual(listed('/api/admin/coupons?status=expired'), ['ENDED'])
+
+    def test_usage_flips_states(self):
+        """Test that claiming the last use exhausts the coupon"""
+        coupon = self.create_coupon('TWICE')
+        self.assertTrue(claim_coupon_use(coupon.id))
+        self.assertEqual(self.states(), {'TWICE': 'active'})
+        self.assertTrue(claim_coupon_use(coupon.id))
+        self.assertEqual(self.states(), {'TWICE': 'exhausted'})
+
+    def test_refresh_repairs_states(self):
+        """Test recomputing every state in one statement"""
+        self.create_coupon('LIVE')
+        self.create_coupon('OVER', start=-120, end=-60)
+        db.session.execute(db.update(Coupon).values(lifecycle_state='scheduled'))
+        db.session.commit()
+        self.assertEqual(refresh_lifecycle_states(), 2)
+        self.assertEqual(self.states(), {'LIVE': 'active', 'OVER': 'expired'})
+        self.assertEqual(refresh_lifecycle_states(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import unittest
+import json
+import tempfile
+import os
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.models.coupon import Coupon
+from app.models.coupon_reservation import CouponReservation
+from app.utils.coupon_cache import coupon_cache
+from app.utils.coupon_reservations import (
+    reserve_coupon_use, release_reservation, redeem_reservation, sweep_expired_reservations
+)
+
+class CouponReservationsTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.first = User(username='first', email='first@example.com', email_verified=True)
+        self.first.set_password('Password123')
+        self.second = User(username='second', email='second@example.com', email_verified=True)
+        self.second.set_password('Password123')
+        db.session.add_all([self.first, self.second])
+        db.session.commit()
+
+        self.product = Product(name='Laptop', price=100, category='Electronics', sku='LAPTOP001',
+                               stock_quantity=10, created_by=self.first.id)
+        now = datetime.datetime.utcnow()
+        self.coupon = Coupon(code='DROP', title='Limited drop', discount_type='percentage', discount_value=10,
+                             max_uses=1, current_uses=0, created_by=self.first.id,
+                             start_date=now - datetime.timedelta(days=1), end_date=now + datetime.timedelta(days=7))
+        db.session.add_all([self.product, self.coupon])
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def get_auth_headers(self, email):
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': email, 'password': 'Password123'}),
+                                    content_type='application/json')
+        return {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def fill_cart_and_apply(self, headers, code='DROP'):
+        self.client.post('/api/cart/add', data=json.dumps({'product_id': self.product.id, 'quantity': 1}),
+                         content_type='application/json', headers=headers)
+        return self.client.post('/api/cart/apply-coupon', data=json.dumps({'coupon_code': code}),
+                                content_type='application/json', headers=headers)
+
+    def usage(self):
+        db.session.expire_all()
+        coupon = Coupon.query.get(self.coupon.id)
+        return coupon.current_uses, coupon.reserved_uses
+
+    def test_hold_survives_until_checkout(self):
+        """Test that an applied coupon cannot be taken by another user before checkout"""
+        first_headers = self.get_auth_headers('first@example.com')
+        second_headers = self.get_auth_headers('second@example.com')
+
+        response = self.fill_cart_and_apply(first_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('reserved_until', json.loads(response.data)['cart']['applied_coupon'])
+        self.assertEqual(self.usage(), (0, 1))
+
+        response = self.fill_cart_and_apply(second_headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['error'], 'Coupon usage limit reached')
+
+        response = self.client.get('/api/coupons/public', headers=second_headers)
+        self.assertEqual(json.loads(response.data)['coupons'], [])
+
+        response = self.client.post('/api/cart/checkout', data=json.dumps({'payment_method': 'credit_card'}),
+                                    content_type='application/json', headers=first_headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.usage(), (1, 0))
+        self.assertEqual(CouponReservation.query.count(), 0)
+
+    def test_remove_coupon_releases_hold(self):
+        """Test that removing the coupon gives the held use back"""
+        headers = self.get_auth_headers('first@example.com')
+        self.fill_cart_and_apply(headers)
+        response = self.client.post('/api/cart/remove-coupon', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.usage(), (0, 0))
+        self.assertFalse(release_reservation(self.coupon.id, self.first.id))
+
+    def test_dropped_coupon_releases_hold(self):
+        """Test that a coupon dropped by a cart update gives the held use back"""
+        headers = self.get_auth_headers('first@example.com')
+        self.fill_cart_and_apply(headers)
+        self.assertEqual(self.usage(), (0, 1))
+
+        self.coupon.is_active = False
+        db.session.commit()
+        coupon_cache.invalidate('DROP')
+        response = self.client.post('/api/cart/add', data=json.dumps({'product_id': self.product.id, 'quantity': 1}),
+                                    content_type='application/json', headers=headers)
+        self.assertIsNone(json.loads(response.data)['cart']['applied_coupon'])
+        self.assertEqual(self.usage(), (0, 0))
+        self.assertEqual(CouponReservation.query.count(), 0)
+
+    def test_redeem_converts_own_hold_on_last_use(self):
+        """Test that a user holding the last use can redeem it, and nobody else can"""
+        first_headers = self.get_auth_headers('first@example.com')
+        self.fill_cart_and_apply(first_headers)
+        self.assertEqual(self.usage(), (0, 1))
+
+        def redeem(headers):
+            return self.client.post('/api/coupons/redeem', data=json.dumps({'code': 'DROP', 'order_amount': 100}),
+                                    content_type='application/json', headers=headers)
+
+        response = redeem(self.get_auth_headers('second@example.com'))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['details'], ['Coupon usage limit reached'])
+
+        response = redeem(first_headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.usage(), (1, 0))
+        self.assertEqual(CouponReservation.query.count(), 0)
+
+    def test_reserve_again_extends_hold(self):
+        """Test that a user never holds more than one use of a coupon"""
+        now = datetime.datetime.utcnow()
+        first_expiry = reserve_coupon_use(self.coupon.id, self.first.id, ttl=60, now=now)
+        second_expiry = reserve_coupon_use(self.coupon.id, self.first.id, ttl=600, now=now)
+        self.assertGreater(second_expiry, first_expiry)
+        self.assertEqual(self.usage(), (0, 1))
+        self.assertIsNone(reserve_coupon_use(self.coupon.id, self.second.id, now=now))
+
+    def test_expired_holds_are_reclaimed(self):
+        """Test the sweeper and the on-demand sweep of an exhausted coupon"""
+        past = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        self.assertIsNotNone(reserve_coupon_use(self.coupon.id, self.first.id, ttl=60, now=past))
+
+        # The expired hold is swept when the next user needs the use
+        self.assertIsNotNone(reserve_coupon_use(self.coupon.id, self.second.id))
+        self.assertEqual(self.usage(), (0, 1))
+        self.assertEqual(CouponReservation.query.one().user_id, self.second.id)
+
+        # A user whose hold was lost falls back to claiming a free use
+        self.assertFalse(redeem_reservation(self.coupon.id, self.first.id))
+        self.assertTrue(redeem_reservation(self.coupon.id, self.second.id))
+        db.session.commit()
+        self.assertEqual(self.usage(), (1, 0))
+
+        other = Coupon(code='OTHER', title='Other', discount_type='fixed', discount_value=5, max_uses=5,
+                       created_by=self.first.id)
+        db.session.add(other)
+        db.session.commit()
+        reserve_coupon_use(other.id, self.first.id, ttl=60, now=past)
+        reserve_coupon_use(other.id, self.second.id, ttl=60, now=past)
+        self.assertEqual(sweep_expired_reservations(batch_size=1), 2)
+        db.session.expire_all()
+        self.assertEqual(Coupon.query.get(other.id).reserved_uses, 0)
+
+    def test_remaining_uses_account_for_holds(self):
+        """Test that public listings subtract held uses"""
+        self.coupon.max_uses = 5
+        db.session.commit()
+        reserve_coupon_use(self.coupon.id, self.first.id)
+
+        response = self.client.get('/api/coupons/public', headers=self.get_auth_headers('second@example.com'))
+        coupon = json.loads(response.data)['coupons'][0]
+        self.assertEqual(coupon['current_uses'], 0)
+        self.assertEqual(coupon['remaining_uses'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
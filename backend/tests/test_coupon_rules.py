@@ -0,0 +1,107 @@
+import unittest
+import json
+import datetime
+from app.models.coupon import Coupon
+from app.utils.coupon_rules import (
+    compile_coupon, UserFacts, ALL_RULES, AVAILABILITY_RULES, CART_RULES
+)
+
+NOW = datetime.datetime(2030, 6, 1, 12, 0, 0)
+
+def make_coupon(**overrides):
+    """Build an unsaved Coupon; compiling never touches the database"""
+    fields = dict(
+        id=1,
+        code='SAVE10',
+        title='Save 10%',
+        discount_type='percentage',
+        discount_value=10,
+        is_active=True,
+        is_public=True,
+        start_date=NOW - datetime.timedelta(days=1),
+        end_date=NOW + datetime.timedelta(days=1),
+        max_uses=10,
+        current_uses=0,
+        minimum_order_value=50,
+        applicable_categories=None,
+        maximum_discount_amount=None,
+        first_time_user_only=False
+    )
+    fields.update(overrides)
+    return Coupon(**fields)
+
+class CouponRulesTestCase(unittest.TestCase):
+    def test_valid_coupon_passes_every_rule(self):
+        """Test that a valid coupon produces no failures"""
+        evaluation = compile_coupon(make_coupon()).evaluate(100, now=NOW)
+        self.assertTrue(evaluation.ok)
+        self.assertEqual(evaluation.errors, [])
+        self.assertEqual(evaluation.discount_amount, 10.0)
+
+    def test_failures_are_reported_in_rule_order(self):
+        """Test that all failures are collected in ALL_RULES order"""
+        rules = compile_coupon(make_coupon(
+            is_active=False,
+            is_public=False,
+            end_date=NOW - datetime.timedelta(hours=1),
+            current_uses=10
+        ))
+        evaluation = rules.evaluate(10, now=NOW)
+        self.assertEqual([failure.rule for failure in evaluation.failures],
+                         ['active', 'public', 'not_expired', 'usage', 'minimum_order'])
+        self.assertEqual(evaluation.errors[0], 'Coupon is inactive')
+        self.assertEqual(evaluation.errors[-1], 'Minimum order value of $50.00 required')
+
+    def test_only_selected_rules_are_checked(self):
+        """Test that rules outside the selection are skipped"""
+        rules = compile_coupon(make_coupon(is_public=False))
+        self.assertTrue(rules.evaluate(100, now=NOW, rules=AVAILABILITY_RULES).ok)
+        self.assertEqual(rules.evaluate(100, now=NOW, rules=ALL_RULES).first_failure.rule, 'public')
+
+    def test_not_started(self):
+        rules = compile_coupon(make_coupon(start_date=NOW + datetime.timedelta(hours=1)))
+        self.assertEqual(rules.evaluate(100, now=NOW).errors, ['Coupon has not started yet'])
+
+    def test_user_facts(self):
+        """Test the per-user rules against UserFacts"""
+        rules = compile_coupon(make_coupon(first_time_user_only=True))
+        self.assertTrue(rules.evaluate(100, now=NOW, rules=CART_RULES).ok)
+
+        facts = UserFacts(redeemed_coupon_ids=frozenset([1]), redemption_count=1)
+        self.assertEqual(rules.evaluate(100, facts=facts, now=NOW, rules=CART_RULES).errors, [
+            'You have already redeemed this coupon',
+            'This coupon is only for first-time users'
+        ])
+
+        facts = UserFacts(redeemed_coupon_ids=frozenset([2]), redemption_count=1)
+        self.assertEqual(rules.evaluate(100, facts=facts, now=NOW, rules=CART_RULES).errors,
+                         ['This coupon is only for first-time users'])
+
+    def test_categories(self):
+        """Test that a coupon limited to categories needs one matching cart category"""
+        rules = compile_coupon(make_coupon(applicable_categories=json.dumps(['Electronics', 'Books'])))
+        self.assertEqual(rules.category_set, frozenset(['Electronics', 'Books']))
+        self.assertTrue(rules.evaluate(100, categories={'Books', 'Toys'}, now=NOW).ok)
+        self.assertEqual(rules.evaluate(100, categories={'Toys'}, now=NOW).errors,
+                         ['Coupon only applies to categories: Electronics, Books'])
+
+        # Malformed category JSON means no restriction, as before
+        rules = compile_coupon(make_coupon(applicable_categories='not json'))
+        self.assertEqual(rules.category_set, frozenset())
+        self.assertTrue(rules.evaluate(100, categories={'Toys'}, now=NOW).ok)
+
+    def test_discount_for(self):
+        """Test percentage cap and fixed discounts"""
+        rules = compile_coupon(make_coupon(discount_value=25, maximum_discount_amount=20))
+        self.assertEqual(rules.discount_for(40), 10.0)
+        self.assertEqual(rules.discount_for(200), 20.0)
+
+        rules = compile_coupon(make_coupon(discount_type='fixed', discount_value=15))
+        self.assertEqual(rules.discount_for(100), 15.0)
+        self.assertEqual(rules.discount_for(9.99), 9.99)
+
+        rules = compile_coupon(make_coupon(discount_value=12.5))
+        self.assertEqual(rules.discount_for(33.33), 4.17)
+
+if __name__ == '__main__':
+    unittest.main()
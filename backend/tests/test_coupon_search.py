@@ -0,0 +1,96 @@
+import unittest
+import json
+import tempfile
+import os
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.coupon import Coupon
+from app.utils.search_index import search_terms
+
+class CouponSearchTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='shopper', email='shopper@example.com', email_verified=True)
+        self.user.set_password('Password123')
+        db.session.add(self.user)
+        db.session.commit()
+
+        now = datetime.datetime.utcnow()
+        for code, title, description, discount_type, days in [
+            ('SPRING10', 'Ten off', 'Seasonal offer', 'fixed', 5),
+            ('GARDEN', 'Spring garden sale', 'Plants and tools', 'percentage', 10),
+            ('WELCOME', 'Welcome bonus', 'Valid in spring and summer', 'fixed', 3),
+            ('WINTER', 'Winter sale', 'Warm clothes', 'percentage', 20)
+        ]:
+            db.session.add(Coupon(code=code, title=title, description=description, discount_type=discount_type,
+                                  discount_value=10, max_uses=10, created_by=self.user.id,
+                                  start_date=now - datetime.timedelta(days=1),
+                                  end_date=now + datetime.timedelta(days=days)))
+        db.session.commit()
+
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'shopper@example.com', 'password': 'Password123'}),
+                                    content_type='application/json')
+        self.headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def search(self, query_string):
+        response = self.client.get(f'/api/coupons/search?{query_string}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return [coupon['code'] for coupon in json.loads(response.data)['coupons']]
+
+    def test_search_terms(self):
+        """Test splitting search box input into index terms"""
+        self.assertEqual(search_terms('  Spring-Sale "10%" '), ['spring', 'sale', '10'])
+        self.assertEqual(search_terms('*'), [])
+
+    def test_prefix_match_ranked_by_relevance(self):
+        """Test prefix matching with code matches ranked above title and description matches"""
+        self.assertEqual(self.search('q=spr'), ['SPRING10', 'GARDEN', 'WELCOME'])
+        self.assertEqual(self.search('q=spring%20sa'), ['GARDEN'])
+        self.assertEqual(self.search('q=autumn'), [])
+        self.assertEqual(self.search('q=%2A%2A'), [])
+
+    def test_existing_filters_and_sorting(self):
+        """Test that discount_type and sort_by still apply to search results"""
+        self.assertEqual(self.search('q=spr&sort_by=expiry'), ['WELCOME', 'SPRING10', 'GARDEN'])
+        self.assertEqual(self.search('q=spr&discount_type=fixed'), ['SPRING10', 'WELCOME'])
+        self.assertEqual(self.search('sort_by=expiry'), ['WELCOME', 'SPRING10', 'GARDEN', 'WINTER'])
+
+    def test_index_follows_writes(self):
+        """Test that updates and deletes are reflected in the index"""
+        coupon = Coupon.query.filter_by(code='WINTER').first()
+        coupon.title = 'Spring clearance'
+        db.session.commit()
+        self.assertIn('WINTER', self.search('q=clearance'))
+        self.assertEqual(self.search('q=warm'), ['WINTER'])
+
+        db.session.delete(coupon)
+        db.session.commit()
+        self.assertEqual(self.search('q=clearance'), [])
+
+if __name__ == '__main__':
+    unittest.main()
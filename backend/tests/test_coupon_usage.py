@@ -0,0 +1,131 @@
+import unittest
+import json
+import tempfile
+import os
+import threading
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.coupon import Coupon
+from app.models.redemption import Redemption
+from app.utils.coupon_usage import claim_coupon_use
+
+class CouponUsageTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.admin = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.admin.set_password('Admin123')
+        db.session.add(self.admin)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def create_coupon(self, code='FLASH50', max_uses=1):
+        now = datetime.datetime.utcnow()
+        coupon = Coupon(
+            code=code,
+            title='Flash sale',
+            description='Limited quantity',
+            discount_type='percentage',
+            discount_value=50,
+            max_uses=max_uses,
+            current_uses=0,
+            start_date=now - datetime.timedelta(days=1),
+            end_date=now + datetime.timedelta(days=1),
+            created_by=self.admin.id
+        )
+        db.session.add(coupon)
+        db.session.commit()
+        return coupon.id
+
+    def get_uses(self, coupon_id):
+        db.session.expire_all()
+        return db.session.get(Coupon, coupon_id).current_uses
+
+    def test_claim_up_to_max_uses(self):
+        """Test claiming up to max_uses"""
+        coupon_id = self.create_coupon(max_uses=2)
+        self.assertTrue(claim_coupon_use(coupon_id))
+        self.assertTrue(claim_coupon_use(coupon_id))
+        self.assertFalse(claim_coupon_use(coupon_id))
+        db.session.commit()
+        self.assertEqual(self.get_uses(coupon_id), 2)
+
+    def test_concurrent_claims_never_exceed_max_uses(self):
+        """Many threads racing for the last uses of one coupon"""
+        max_uses = 25
+        coupon_id = self.create_coupon(max_uses=max_uses)
+        claimed = []
+        errors = []
+
+        def claimant():
+            with self.app.app_context():
+                for _ in range(5):
+                    try:
+                        if claim_coupon_use(coupon_id):
+                            claimed.append(1)
+                        db.session.commit()
+                    except Exception as e:
+                        db.session.rollback()
+                        errors.append(e)
+                db.session.remove()
+
+        threads = [threading.Thread(target=claimant) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(claimed), max_uses)
+        self.assertEqual(self.get_uses(coupon_id), max_uses)
+
+    def test_redeem_counts_each_use_once(self):
+        """Test that the redeem endpoint claims through the conditional increment"""
+        coupon_id = self.create_coupon(max_uses=1)
+        headers = []
+        for name in ('first', 'second'):
+            user = User(username=name, email=f'{name}@example.com', email_verified=True)
+            user.set_password('Password123')
+            db.session.add(user)
+            db.session.commit()
+            response = self.client.post('/api/auth/login',
+                                        data=json.dumps({'email': user.email, 'password': 'Password123'}),
+                                        content_type='application/json')
+            headers.append({'Authorization': f"Bearer {json.loads(response.data)['access_token']}"})
+
+        payload = json.dumps({'code': 'FLASH50', 'order_amount': 100})
+        response = self.client.post('/api/coupons/redeem', data=payload,
+                                    content_type='application/json', headers=headers[0])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_uses(coupon_id), 1)
+
+        response = self.client.post('/api/coupons/redeem', data=payload,
+                                    content_type='application/json', headers=headers[1])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_uses(coupon_id), 1)
+        self.assertEqual(Redemption.query.count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import unittest
+import json
+import tempfile
+import shutil
+import hashlib
+import struct
+import zlib
+import os
+from io import BytesIO
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.utils import image_pipeline as pipeline_module
+from app.utils.image_pipeline import image_pipeline, image_dir, Image
+
+
+def make_png(width, height, text=None):
+    """A valid RGB PNG, optionally carrying a tEXt metadata chunk"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    rows = b''.join(b'\x00' + b''.join(bytes([x % 256, y % 256, 128]) for x in range(width))
+                    for y in range(height))
+    png = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+    if text:
+        png += chunk(b'tEXt', b'Comment\x00' + text)
+    return png + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+
+class ImagePipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.upload_dir = tempfile.mkdtemp()
+        self.staging_dir = tempfile.mkdtemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret',
+            'UPLOAD_DIR': self.upload_dir,
+            'IMAGE_STAGING_DIR': self.staging_dir
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        admin = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        admin.set_password('Admin123')
+        db.session.add(admin)
+        db.session.commit()
+        self.product = Product(name='Lamp', category='Home', price=30, sku='LAMP-1', created_by=admin.id)
+        db.session.add(self.product)
+        db.session.commit()
+
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'admin@example.com', 'password': 'Admin123'}),
+                                    content_type='application/json')
+        self.headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def tearDown(self):
+        """Clean up after tests"""
+        image_pipeline.pipeline.shutdown()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_dir, ignore_errors=True)
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def upload(self, content, filename='photo.png', **form):
+        response = self.client.post('/api/admin/upload-image', headers=self.headers,
+                                    data=dict(form, image=(BytesIO(content), filename)),
+                                    content_type='multipart/form-data')
+        data = json.loads(response.data)
+        if response.status_code == 200:
+            image_pipeline.wait(data['image']['digest'])
+        return response, data
+
+    def test_content_addressed_dedupe(self):
+        """Test that identical uploads are stored once under their hash"""
+        png = make_png(8, 8)
+        response, first = self.upload(png, filename='a.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(first['image']['duplicate'])
+        digest = first['image']['digest']
+        self.assertEqual(first['filename'], f'{digest}.png')
+        self.assertTrue(first['imageUrl'].startswith(f'/uploads/images/{digest[:2]}/{digest}/'))
+
+        response, second = self.upload(png, filename='renamed.jpg')
+        self.assertTrue(second['image']['duplicate'])
+        self.assertEqual(second['imageUrl'], first['imageUrl'])
+
+        self.assertEqual(os.listdir(os.path.join(self.upload_dir, 'images', digest[:2])), [digest])
+        self.assertEqual(os.listdir(self.staging_dir), [])
+        stats = image_pipeline.stats()
+        self.assertEqual((stats['uploads'], stats['duplicates'], stats['processed'], stats['pending']), (2, 1, 1, 0))
+
+        # Different content gets its own directory
+        response, other = self.upload(make_png(8, 9))
+        self.assertNotEqual(other['image']['digest'], digest)
+
+    def test_rejects_non_images(self):
+        """Test that the type comes from the content, not the file name"""
+        response, data = self.upload(b'<?php echo 1; ?>', filename='shell.png')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(os.listdir(self.staging_dir), [])
+        self.assertFalse(os.path.exists(os.path.join(self.upload_dir, 'images')))
+
+        self.app.extensions['image_pipeline'].max_bytes = 100
+        response, data = self.upload(make_png(64, 64))
+        self.assertEqual(response.status_code, 400)
+
+    def test_records_image_on_product(self):
+        """Test product_id sets image_url and products expose the variant URLs"""
+        response, data = self.upload(make_png(8, 8), product_id=str(self.product.id))
+        self.assertEqual(response.status_code, 200)
+        db.session.expire_all()
+        product = db.session.get(Product, self.product.id)
+        self.assertEqual(product.image_url, data['imageUrl'])
+        self.assertEqual(product.to_dict()['image_variants'], data['variants'])
+        self.assertEqual(set(data['variants']), {'thumbnail', 'medium'})
+
+        self.assertEqual(self.upload(make_png(8, 8), product_id='999')[0].status_code, 404)
+        product.image_url = 'https://cdn.example.com/lamp.jpg'
+        self.assertIsNone(product.to_dict()['image_variants'])
+
+    def test_failed_processing_does_not_leave_broken_urls(self):
+        """Test that a product only points at an image once it was processed"""
+        def fail(staged_path, target_dir, ext):
+            raise OSError('disk full')
+
+        other = Product(name='Desk', category='Home', price=90, sku='DESK-1', created_by=self.product.created_by)
+        db.session.add(other)
+        db.session.commit()
+        process_image, pipeline_module.process_image = pipeline_module.process_image, fail
+        try:
+            png = make_png(8, 8)
+            digest = hashlib.sha256(png).hexdigest()
+            # A form saved the URL returned by the upload before it was processed
+            other.image_url = pipeline_module.image_url_for(digest, 'png', variants=Image is not None)
+            db.session.commit()
+            response, data = self.upload(png, product_id=str(self.product.id))
+        finally:
+            pipeline_module.process_image = process_image
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(image_pipeline.stats()['failed'], 1)
+
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(Product, self.product.id).image_url)
+        self.assertIsNone(db.session.get(Product, other.id).image_url)
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_rejects_corrupt_images(self):
+        """Test that files with valid magic bytes but broken data are rejected"""
+        response, data = self.upload(make_png(64, 64)[:-40], product_id=str(self.product.id))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('corrupt', data['error'])
+        self.assertEqual(os.listdir(self.staging_dir), [])
+        self.assertIsNone(db.session.get(Product, self.product.id).image_url)
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_variants_are_resized_without_metadata(self):
+        """Test the generated variants and that metadata is stripped"""
+        response, data = self.upload(make_png(1200, 800, text=b'taken at 51.5N 0.1W'))
+        directory = image_dir(self.upload_dir, data['image']['digest'])
+        self.assertEqual(sorted(os.listdir(directory)), ['medium.webp', 'original.png', 'thumbnail.webp'])
+        with Image.open(os.path.join(directory, 'thumbnail.webp')) as thumbnail:
+            self.assertEqual(thumbnail.size, (160, 107))
+        with Image.open(os.path.join(directory, 'medium.webp')) as medium:
+            self.assertEqual(medium.size, (600, 400))
+        with open(os.path.join(directory, 'original.png'), 'rb') as f:
+            self.assertNotIn(b'51.5N', f.read())
+
+if __name__ == '__main__':
+    unittest.main()
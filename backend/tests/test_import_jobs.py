@@ -0,0 +1,178 @@
+import unittest
+import json
+import tempfile
+import shutil
+import os
+import datetime
+from io import BytesIO
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.models.import_job import ImportJob
+from app.utils.import_jobs import run_next_import_job, claim_next_job, ImportJobRun, run_import_job
+
+class ImportJobsTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.import_dir = tempfile.mkdtemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret',
+            'PRODUCT_IMPORT_DIR': self.import_dir,
+            'PRODUCT_IMPORT_CHUNK_SIZE': 2,
+            'PRODUCT_IMPORT_MAX_ERRORS': 2
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.admin = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.admin.set_password('Admin123')
+        db.session.add(self.admin)
+        db.session.commit()
+
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'admin@example.com', 'password': 'Admin123'}),
+                                    content_type='application/json')
+        self.headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.import_dir, ignore_errors=True)
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def enqueue(self, content):
+        response = self.client.post('/api/admin/products/bulk-upload?async=true', headers=self.headers,
+                                    data={'file': (BytesIO(content.encode('utf-8')), 'products.csv')},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 202)
+        return json.loads(response.data)['job']
+
+    def progress(self, job_id):
+        response = self.client.get(f'/api/admin/import-jobs/{job_id}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)['job']
+
+    def csv(self, count, bad_every=0):
+        lines = ['name,price,sku']
+        for i in range(count):
+            price = 'abc' if bad_every and i % bad_every == 0 else '5'
+            lines.append(f'Item {i},{price},SKU-{i}')
+        return '\n'.join(lines) + '\n'
+
+    def crash_after(self, worker_id, count):
+        """Run the next job until its worker dies after `count` rows"""
+        job = claim_next_job(worker_id)
+        run = ImportJobRun(job, worker_id, chunk_size=2, max_errors=5)
+        rows = run.rows(job.file_path)
+
+        def dying_rows():
+            for _ in range(count):
+                yield next(rows)
+            raise RuntimeError('worker killed')
+
+        with self.assertRaises(RuntimeError):
+            run.run(dying_rows())
+        db.session.rollback()
+        return job.id
+
+    def test_queued_job_runs_with_progress(self):
+        """Test that an async upload returns 202 and the worker imports it"""
+        job = self.enqueue(self.csv(5, bad_every=2))
+        self.assertEqual(job['status'], 'queued')
+        self.assertEqual(len(os.listdir(self.import_dir)), 1)
+        self.assertEqual(Product.query.count(), 0)
+
+        self.assertEqual(run_next_import_job('worker-1'), job['id'])
+        self.assertIsNone(run_next_import_job('worker-1'))
+
+        job = self.progress(job['id'])
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual((job['processed_rows'], job['imported_count'], job['error_count']), (5, 2, 3))
+        # Only the first PRODUCT_IMPORT_MAX_ERRORS errors are kept
+        self.assertEqual([error['row'] for error in job['errors']], [2, 4])
+        self.assertIsNotNone(job['finished_at'])
+        self.assertEqual(os.listdir(self.import_dir), [])
+
+        listing = json.loads(self.client.get('/api/admin/import-jobs?status=completed', headers=self.headers).data)
+        self.assertEqual([entry['id'] for entry in listing['jobs']], [job['id']])
+        self.assertEqual(self.client.get('/api/admin/import-jobs/999', headers=self.headers).status_code, 404)
+
+    def test_cancel(self):
+        """Test cancelling queued, running and finished jobs"""
+        queued = self.enqueue(self.csv(3))
+        response = self.client.post(f'/api/admin/import-jobs/{queued["id"]}/cancel', headers=self.headers)
+        self.assertEqual(json.loads(response.data)['job']['status'], 'cancelled')
+        self.assertIsNone(run_next_import_job('worker-1'))
+
+        running = self.enqueue(self.csv(6))
+        self.crash_after('worker-1', 2)
+
+        response = self.client.post(f'/api/admin/import-jobs/{running["id"]}/cancel', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(run_import_job(db.session.get(ImportJob, running['id']), 'worker-1'), 'cancelled')
+        job = self.progress(running['id'])
+        self.assertEqual((job['status'], job['imported_count']), ('cancelled', 2))
+        self.assertEqual(Product.query.count(), 2)
+
+        response = self.client.post(f'/api/admin/import-jobs/{running["id"]}/cancel', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        finished = self.enqueue(self.csv(1))
+        run_next_import_job('worker-1')
+        response = self.client.post(f'/api/admin/import-jobs/{finished["id"]}/cancel', headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+
+    def test_stale_job_resumes_after_committed_rows(self):
+        """Test that a job whose worker died is taken over and not imported twice"""
+        queued = self.enqueue(self.csv(7, bad_every=3))
+        self.crash_after('worker-1', 4)
+        self.assertEqual(Product.query.count(), 2)
+
+        self.assertIsNone(claim_next_job('worker-2'))
+        db.session.execute(db.update(ImportJob).values(
+            heartbeat_at=datetime.datetime.utcnow() - datetime.timedelta(hours=1)))
+        db.session.commit()
+
+        self.assertEqual(run_next_import_job('worker-2'), queued['id'])
+        job = self.progress(queued['id'])
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual((job['processed_rows'], job['imported_count'], job['error_count']), (7, 4, 3))
+        self.assertEqual(Product.query.count(), 4)
+
+        # The old worker can no longer write to the job
+        self.assertEqual(run_import_job(db.session.get(ImportJob, queued['id']), 'worker-1'), None)
+
+    def test_job_fails_after_max_attempts(self):
+        """Test that a job killing every worker is not reclaimed forever"""
+        self.app.config['PRODUCT_IMPORT_MAX_ATTEMPTS'] = 2
+        queued = self.enqueue(self.csv(1))
+        self.assertEqual(len(os.listdir(self.import_dir)), 1)
+
+        def expire_heartbeat():
+            db.session.execute(db.update(ImportJob).values(
+                heartbeat_at=datetime.datetime.utcnow() - datetime.timedelta(hours=1)))
+            db.session.commit()
+
+        for worker_id in ('worker-1', 'worker-2'):
+            self.assertEqual(claim_next_job(worker_id).id, queued['id'])
+            expire_heartbeat()
+        self.assertEqual(self.progress(queued['id'])['attempts'], 2)
+
+        self.assertIsNone(claim_next_job('worker-3'))
+        job = self.progress(queued['id'])
+        self.assertEqual((job['status'], job['message']), ('failed', 'Import stopped after 2 attempts'))
+        self.assertEqual(os.listdir(self.import_dir), [])
+
+if __name__ == '__main__':
+    unittest.main()
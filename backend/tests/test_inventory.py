@@ -0,0 +1,134 @@
+import unittest
+import tempfile
+import os
+import threading
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.utils.inventory import decrement_stock, find_shortages, InsufficientStockError
+
+class InventoryTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test app and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        user = User(username='admin', email='admin@example.com', is_admin=True)
+        user.set_password('Admin123')
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def create_product(self, sku, stock_quantity, is_active=True):
+        product = Product(name=f'Product {sku}', price=10, category='Electronics', sku=sku,
+                          stock_quantity=stock_quantity, is_active=is_active, created_by=self.user_id)
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+    def get_stock(self, product_id):
+        db.session.expire_all()
+        return db.session.get(Product, product_id).stock_quantity
+
+    def test_decrement_stock(self):
+        """Test that all lines are decremented together"""
+        first = self.create_product('SKU-1', 5)
+        second = self.create_product('SKU-2', 3)
+
+        decrement_stock({first: 2, second: 3})
+        db.session.commit()
+
+        self.assertEqual(self.get_stock(first), 3)
+        self.assertEqual(self.get_stock(second), 0)
+
+    def test_partial_failure_reports_short_skus(self):
+        """Test that a short line fails the whole decrement and names the SKU"""
+        first = self.create_product('SKU-1', 5)
+        second = self.create_product('SKU-2', 1)
+        inactive = self.create_product('SKU-3', 10, is_active=False)
+
+        with self.assertRaises(InsufficientStockError) as ctx:
+            decrement_stock([(first, 2), (second, 2), (inactive, 1)])
+        db.session.rollback()
+
+        shortages = {shortage['sku']: shortage for shortage in ctx.exception.shortages}
+        self.assertEqual(set(shortages), {'SKU-2', 'SKU-3'})
+        self.assertEqual(shortages['SKU-2']['requested'], 2)
+        self.assertEqual(shortages['SKU-2']['available'], 1)
+        self.assertEqual(shortages['SKU-3']['available'], 0)
+
+        # Rolling back leaves the line that had enough stock untouched
+        self.assertEqual(self.get_stock(first), 5)
+        self.assertEqual(find_shortages({first: 5}), [])
+
+    def test_duplicate_lines_are_merged(self):
+        """Test that two lines for one product are checked against the combined quantity"""
+        product_id = self.create_product('SKU-1', 3)
+        with self.assertRaises(InsufficientStockError):
+            decrement_stock([(product_id, 2), (product_id, 2)])
+        db.session.rollback()
+        self.assertEqual(self.get_stock(product_id), 3)
+
+    def test_concurrent_checkouts_never_oversell(self):
+        """Hammer one hot product from many threads"""
+        stock = 100
+        threads = 16
+        attempts_per_thread = 10
+        product_id = self.create_product('HOT-1', stock)
+
+        results = {'sold': 0, 'rejected': 0, 'errors': []}
+        results_lock = threading.Lock()
+
+        def buyer():
+            with self.app.app_context():
+                for _ in range(attempts_per_thread):
+                    try:
+                        decrement_stock({product_id: 1})
+                        db.session.commit()
+                        outcome = 'sold'
+                    except InsufficientStockError:
+                        db.session.rollback()
+                        outcome = 'rejected'
+                    except Exception as e:
+                        db.session.rollback()
+                        with results_lock:
+                            results['errors'].append(e)
+                        continue
+                    with results_lock:
+                        results[outcome] += 1
+                db.session.remove()
+
+        workers = [threading.Thread(target=buyer) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(results['errors'], [])
+        # Never oversold ...
+        self.assertEqual(self.get_stock(product_id), 0)
+        self.assertEqual(results['sold'], stock)
+        # ... and no buyer was turned away while stock was still available
+        self.assertEqual(results['rejected'], threads * attempts_per_thread - stock)
+
+if __name__ == '__main__':
+    unittest.main()
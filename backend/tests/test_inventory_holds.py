@@ -0,0 +1,188 @@
+import unittest
+import json
+import tempfile
+import os
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.models.inventory_hold import InventoryHold
+from app.models.order import Order
+from app.utils.inventory_holds import hold_stock, sweep_expired_holds, available_quantities
+from app.utils.cart_store import CartConflictError
+
+class InventoryHoldsTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.first = User(username='first', email='first@example.com', email_verified=True)
+        self.first.set_password('Password123')
+        self.second = User(username='second', email='second@example.com', email_verified=True)
+        self.second.set_password('Password123')
+        db.session.add_all([self.first, self.second])
+        db.session.commit()
+
+        self.product = Product(name='Console', price=300, category='Electronics', sku='CONSOLE-1',
+                               stock_quantity=3, created_by=self.first.id)
+        db.session.add(self.product)
+        db.session.commit()
+        self.product_id = self.product.id
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def get_auth_headers(self, email):
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': email, 'password': 'Password123'}),
+                                    content_type='application/json')
+        return {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def add(self, headers, quantity):
+        return self.client.post('/api/cart/add',
+                                data=json.dumps({'product_id': self.product_id, 'quantity': quantity}),
+                                content_type='application/json', headers=headers)
+
+    def checkout(self, headers):
+        return self.client.post('/api/cart/checkout', data=json.dumps({}),
+                                content_type='application/json', headers=headers)
+
+    def stock(self):
+        db.session.expire_all()
+        product = db.session.get(Product, self.product_id)
+        return product.stock_quantity, product.reserved_quantity
+
+    def test_cart_holds_stock_until_checkout(self):
+        """Test that units in one cart cannot be taken by another"""
+        first_headers = self.get_auth_headers('first@example.com')
+        second_headers = self.get_auth_headers('second@example.com')
+
+        response = self.add(first_headers, 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('reserved_until', json.loads(response.data)['cart']['items'][0])
+        self.assertEqual(self.stock(), (3, 2))
+
+        response = self.add(second_headers, 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Available: 1', json.loads(response.data)['error'])
+        self.assertEqual(self.add(second_headers, 1).status_code, 200)
+        self.assertEqual(self.stock(), (3, 3))
+
+        # Adding more to the same line moves the existing hold
+        self.assertEqual(self.add(first_headers, 1).status_code, 400)
+        self.assertEqual(InventoryHold.query.filter_by(user_id=self.first.id).one().quantity, 2)
+
+        self.assertEqual(self.checkout(first_headers).status_code, 201)
+        self.assertEqual(self.stock(), (1, 1))
+        self.assertEqual(self.checkout(second_headers).status_code, 201)
+        self.assertEqual(self.stock(), (0, 0))
+        self.assertEqual(InventoryHold.query.count(), 0)
+
+    def test_update_and_remove_move_the_hold(self):
+        """Test that changing cart lines adjusts the held units"""
+        headers = self.get_auth_headers('first@example.com')
+        self.add(headers, 1)
+
+        def update(quantity):
+            updates = [{'product_id': self.product_id, 'quantity': quantity}]
+            return self.client.put('/api/cart/update', data=json.dumps({'updates': updates}),
+                                   content_type='application/json', headers=headers)
+
+        self.assertEqual(update(3).status_code, 200)
+        self.assertEqual(self.stock(), (3, 3))
+        self.assertEqual(update(4).status_code, 400)
+        self.assertEqual(update(2).status_code, 200)
+        self.assertEqual(self.stock(), (3, 2))
+
+        self.client.delete(f'/api/cart/remove/{self.product_id}', headers=headers)
+        self.assertEqual(self.stock(), (3, 0))
+        self.assertEqual(InventoryHold.query.count(), 0)
+
+    def test_cart_conflict_restores_the_hold(self):
+        """Test that a cart write lost to another request leaves the hold at the stored quantity"""
+        headers = self.get_auth_headers('first@example.com')
+        self.add(headers, 1)
+        self.assertEqual(self.stock(), (3, 1))
+
+        store = self.app.extensions['cart_store']
+        write, remove = store._write, store._remove
+
+        def conflict(user_id, *args):
+            raise CartConflictError(f'Cart for user {user_id} was modified concurrently')
+
+        store._write = store._remove = conflict
+        self.assertEqual(self.add(headers, 1).status_code, 409)
+        self.assertEqual(self.stock(), (3, 1))
+        self.assertEqual(self.client.delete(f'/api/cart/remove/{self.product_id}', headers=headers).status_code, 409)
+        self.assertEqual(self.stock(), (3, 1))
+        self.assertEqual(InventoryHold.query.one().quantity, 1)
+
+        store._write, store._remove = write, remove
+        self.assertEqual(self.add(headers, 1).status_code, 200)
+        self.assertEqual(self.stock(), (3, 2))
+
+    def test_checkout_without_hold_respects_other_carts(self):
+        """Test that a cart whose hold expired cannot take units held by others"""
+        first_headers = self.get_auth_headers('first@example.com')
+        self.add(first_headers, 2)
+        hold_stock(self.product_id, self.first.id, 2, ttl=-1)
+        self.assertEqual(sweep_expired_holds(), 1)
+        self.assertIsNotNone(hold_stock(self.product_id, self.second.id, 2))
+
+        response = self.checkout(first_headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['shortages'][0]['available'], 1)
+        self.assertEqual(Order.query.count(), 0)
+        self.assertEqual(self.stock(), (3, 2))
+
+    def test_expired_holds_are_swept(self):
+        """Test batch sweeping and that expired holds never block new carts"""
+        users = []
+        for i in range(3):
+            user = User(username=f'user{i}', email=f'user{i}@example.com', email_verified=True)
+            user.set_password('Password123')
+            users.append(user)
+        db.session.add_all(users)
+        db.session.commit()
+
+        past = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        for user in users:
+            self.assertIsNotNone(hold_stock(self.product_id, user.id, 1, ttl=60, now=past))
+        self.assertIsNone(hold_stock(self.product_id, self.first.id, 1, ttl=60, now=past))
+        self.assertEqual(available_quantities([self.product_id]), {self.product_id: 0})
+
+        # A new hold sweeps the expired ones blocking it
+        self.assertIsNotNone(hold_stock(self.product_id, self.first.id, 2))
+        self.assertEqual(self.stock(), (3, 2))
+        self.assertEqual(InventoryHold.query.count(), 1)
+
+        db.session.get(Product, self.product_id).stock_quantity = 10
+        db.session.commit()
+        for user in users:
+            hold_stock(self.product_id, user.id, 1, ttl=-1)
+        self.assertEqual(self.stock(), (10, 5))
+        self.assertEqual(sweep_expired_holds(batch_size=2), 3)
+        self.assertEqual(self.stock(), (10, 2))
+        self.assertEqual(available_quantities([self.product_id]), {self.product_id: 8})
+        self.assertEqual(available_quantities([self.product_id], user_id=self.first.id), {self.product_id: 10})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import json
+import tempfile
+import os
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.models.coupon import Coupon
+from app.models.redemption import Redemption
+
+class PaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.admin = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.admin.set_password('Admin123')
+        db.session.add(self.admin)
+        db.session.commit()
+
+        # Repeated names and prices, so ties are broken by id
+        for i in range(23):
+            db.session.add(Product(name=f'Product {i % 5}', price=10 + i % 4, category='Bench',
+                                   stock_quantity=1, created_by=self.admin.id))
+        now = datetime.datetime.utcnow()
+        self.coupon = Coupon(code='PAGE', title='Page', discount_type='fixed', discount_value=1, max_uses=100,
+                             created_by=self.admin.id, start_date=now - datetime.timedelta(days=1),
+                             end_date=now + datetime.timedelta(days=1))
+        db.session.add(self.coupon)
+        db.session.commit()
+        for i in range(7):
+            db.session.add(Redemption(user_id=self.admin.id, coupon_id=self.coupon.id, discount_applied=1,
+                                      redeemed_at=now - datetime.timedelta(hours=i % 3)))
+        db.session.commit()
+
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'admin@example.com', 'password': 'Admin123'}),
+                                    content_type='application/json')
+        self.headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def get(self, path):
+        response = self.client.get(path, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def walk(self, path, key):
+        """Follow next_cursor from the first page, returns ids and pages"""
+        separator = '&' if '?' in path else '?'
+        ids, pages, cursor = [], [], ''
+        while True:
+            data = self.get(f'{path}{separator}cursor={cursor}')
+            ids.extend(item['id'] for item in data[key])
+            pages.append(data['pagination'])
+            if not data['pagination']['has_more']:
+                return ids, pages
+            cursor = data['pagination']['next_cursor']
+
+    def paged(self, path, key):
+        separator = '&' if '?' in path else '?'
+        ids, page = [], 1
+        while True:
+            data = self.get(f'{path}{separator}page={page}')
+            ids.extend(item['id'] for item in data[key])
+            if not data['pagination']['has_next']:
+                return ids
+            page += 1
+
+    def test_cursor_walk_matches_page_numbers(self):
+        """Test that following cursors visits every product once, in page order"""
+        for query in ('per_page=5', 'per_page=5&sort_by=price&sort_order=desc', 'per_page=10&sort_by=created_at'):
+            ids, pages = self.walk(f'/api/products?{query}', 'products')
+            self.assertEqual(ids, self.paged(f'/api/products?{query}', 'products'))
+            self.assertEqual(len(set(ids)), 23)
+            self.assertNotIn('total', pages[0])
+            self.assertIsNone(pages[-1]['next_cursor'])
+
+    def test_include_total(self):
+        """Test that the exact total is only counted on request"""
+        data = self.get('/api/products?cursor=&per_page=5&include_total=true')
+        self.assertEqual(data['pagination']['total'], 23)
+        self.assertTrue(data['pagination']['has_more'])
+
+        data = self.get('/api/products?page=2&per_page=5')
+        self.assertEqual(data['pagination']['total'], 23)
+        self.assertEqual(data['pagination']['pages'], 5)
+
+    def test_invalid_cursor(self):
+        """Test that malformed cursors and cursors of another ordering are rejected"""
+        self.assertEqual(self.client.get('/api/products?cursor=garbage').status_code, 400)
+        cursor = self.get('/api/products?cursor=&per_page=5')['pagination']['next_cursor']
+        response = self.client.get(f'/api/products?cursor={cursor}&sort_by=price')
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_listings(self):
+        """Test cursor pagination of the admin and redemption listings"""
+        ids, _ = self.walk('/api/coupons/user/redemptions?per_page=3', 'redemptions')
+        self.assertEqual(ids, self.paged('/api/coupons/user/redemptions?per_page=3', 'redemptions'))
+        self.assertEqual(len(ids), 7)
+
+        path = f'/api/admin/coupons/{self.coupon.id}/redemptions?per_page=2'
+        ids, pages = self.walk(path, 'redemptions')
+        self.assertEqual(ids, self.paged(path, 'redemptions'))
+        self.assertEqual(len(pages), 4)
+
+        self.assertEqual(len(self.walk('/api/admin/users?per_page=1', 'users')[0]), 1)
+        self.assertEqual(self.walk('/api/admin/coupons?per_page=1', 'coupons')[0], [self.coupon.id])
+
+if __name__ == '__main__':
+    unittest.main()
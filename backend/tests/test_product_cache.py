@@ -0,0 +1,167 @@
+import unittest
+import json
+import tempfile
+import os
+import threading
+import time
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.utils.inventory import decrement_stock
+from app.utils.product_cache import ProductCache, product_cache, bump_catalog_version
+
+class ProductCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret',
+            'PRODUCT_CACHE_VERSION_CHECK_SECONDS': 60
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.admin = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.admin.set_password('Admin123')
+        db.session.add(self.admin)
+        db.session.commit()
+
+        self.product = Product(name='Lamp', category='Home', price=30, stock_quantity=5, created_by=self.admin.id)
+        db.session.add(self.product)
+        db.session.commit()
+        self.product_id = self.product.id
+
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'admin@example.com', 'password': 'Admin123'}),
+                                    content_type='application/json')
+        self.headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def test_reads_are_cached(self):
+        """Test that repeated catalog reads are served from the cache"""
+        for _ in range(3):
+            self.assertEqual(self.get('/api/products?sort_by=price')['products'][0]['name'], 'Lamp')
+            self.assertEqual(self.get(f'/api/products/{self.product_id}')['product']['name'], 'Lamp')
+            self.assertEqual(self.get('/api/products/categories')['categories'], ['Home'])
+        self.assertEqual(self.client.get('/api/products/999').status_code, 404)
+
+        response = self.client.get('/api/admin/product-cache/stats', headers=self.headers)
+        stats = json.loads(response.data)['stats']
+        self.assertEqual(stats['misses'], 4)
+        self.assertEqual(stats['hits'], 6)
+        self.assertEqual(stats['hit_rate'], 0.6)
+
+    def test_admin_writes_bump_version(self):
+        """Test that admin product writes invalidate cached reads"""
+        self.assertEqual(self.get(f'/api/products/{self.product_id}')['product']['price'], 30.0)
+        version = product_cache.version()
+
+        response = self.client.put(f'/api/admin/products/{self.product_id}', data=json.dumps({'price': 35}),
+                                   content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(product_cache.version(), version + 1)
+        self.assertEqual(self.get(f'/api/products/{self.product_id}')['product']['price'], 35.0)
+
+        response = self.client.delete(f'/api/admin/products/{self.product_id}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(f'/api/products/{self.product_id}').status_code, 404)
+        self.assertEqual(self.get('/api/products/categories')['categories'], [])
+
+    def test_stock_decrements_bump_only_when_selling_out(self):
+        """Test that Core stock decrements bump the version once, at commit, when a product sells out"""
+        self.assertEqual(self.get('/api/products')['products'][0]['stock_quantity'], 5)
+        version = product_cache.version()
+
+        decrement_stock({self.product_id: 1})
+        decrement_stock({self.product_id: 1})
+        db.session.commit()
+        self.assertEqual(product_cache.version(), version)
+
+        decrement_stock({self.product_id: 2})
+        decrement_stock({self.product_id: 1})
+        self.assertEqual(product_cache.version(), version)
+        db.session.commit()
+        self.assertEqual(product_cache.version(), version + 1)
+        self.assertEqual(self.get('/api/products')['products'][0]['stock_quantity'], 0)
+
+    def test_stock_edits_bump_only_when_crossing_zero(self):
+        """Test that admin stock edits leave the cache alone unless availability changes"""
+        version = product_cache.version()
+
+        def set_stock(stock):
+            response = self.client.put(f'/api/admin/products/{self.product_id}',
+                                       data=json.dumps({'stock_quantity': stock}),
+                                       content_type='application/json', headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            return product_cache.version()
+
+        self.assertEqual(set_stock(8), version)
+        self.assertEqual(set_stock(0), version + 1)
+        self.assertEqual(set_stock(4), version + 2)
+
+    def test_concurrent_misses_load_once(self):
+        """Test that concurrent misses for one key share a single load, and
+        that the previous version is served while it is refreshed"""
+        cache = ProductCache(ttl=60, version_check=60)
+        calls = []
+        release = threading.Event()
+
+        def loader():
+            calls.append(1)
+            release.wait(5)
+            return len(calls)
+
+        results = []
+
+        def read():
+            with self.app.app_context():
+                results.append(cache.get_or_load('key', loader))
+
+        threads = [threading.Thread(target=read) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(cache.stats()['coalesced'], 4)
+
+        # After a bump one reader refreshes, the others get the old value
+        bump_catalog_version()
+        db.session.commit()
+        cache.version_changed()
+        release.clear()
+        refresher = threading.Thread(target=read)
+        refresher.start()
+        time.sleep(0.2)
+        self.assertEqual(cache.get_or_load('key', loader), 1)
+        release.set()
+        refresher.join()
+        self.assertEqual(results[-1], 2)
+        self.assertEqual(cache.get_or_load('key', loader), 2)
+        self.assertEqual(cache.stats()['stale_hits'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
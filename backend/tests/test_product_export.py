@@ -0,0 +1,131 @@
+import unittest
+import json
+import tempfile
+import os
+import gzip
+from io import BytesIO
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.utils.product_export import export_chunks
+
+class ProductExportTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret',
+            'PRODUCT_EXPORT_BATCH_SIZE': 2
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.admin = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.admin.set_password('Admin123')
+        db.session.add(self.admin)
+        db.session.commit()
+
+        db.session.add_all([
+            Product(name='Desk', description='Oak, "solid"\nwith drawers', category='Office', brand='Oakline',
+                    price=120.5, stock_quantity=4, sku='DESK-1', image_url='/uploads/desk.png',
+                    minimum_order_value=50, created_by=self.admin.id),
+            Product(name='Chair', category='Office', price=80, stock_quantity=0, sku='CHAIR-1',
+                    is_active=False, created_by=self.admin.id),
+            Product(name='Hose', category='Garden', price=25, stock_quantity=3, sku='HOSE-1',
+                    created_by=self.admin.id)
+        ])
+        db.session.commit()
+
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'admin@example.com', 'password': 'Admin123'}),
+                                    content_type='application/json')
+        self.headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def export(self, query=''):
+        response = self.client.get(f'/api/admin/products/export{query}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def snapshot(self):
+        db.session.expire_all()
+        # The importer stores blank text columns as ''
+        return sorted((p.sku, p.name, p.description or '', float(p.price), p.category, p.brand or '',
+                       p.stock_quantity, p.is_active, p.image_url or '', float(p.minimum_order_value or 0))
+                      for p in Product.query.all())
+
+    def test_csv_export_round_trips(self):
+        """Test that a CSV export imports back to the same catalog"""
+        response = self.export()
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertIn('attachment; filename="products-', response.headers['Content-Disposition'])
+        lines = response.data.decode().splitlines()
+        self.assertEqual(lines[0], 'name,description,price,category,brand,sku,stock_quantity,is_active,'
+                                   'image_url,minimum_order_value')
+
+        # Re-applying the export changes nothing
+        upsert = self.client.post('/api/admin/products/bulk-upsert', headers=self.headers,
+                                  data={'file': (BytesIO(response.data), 'products.csv')},
+                                  content_type='multipart/form-data')
+        self.assertEqual(json.loads(upsert.data)['unchanged_count'], 3)
+
+        before = self.snapshot()
+        Product.query.delete()
+        db.session.commit()
+        upload = self.client.post('/api/admin/products/bulk-upload', headers=self.headers,
+                                  data={'file': (BytesIO(response.data), 'products.csv')},
+                                  content_type='multipart/form-data')
+        self.assertEqual(json.loads(upload.data)['imported_count'], 3)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_gzip_and_ndjson(self):
+        """Test gzip-compressed and NDJSON exports, and filters"""
+        response = self.export('?format=ndjson&gzip=true&status=active')
+        self.assertEqual(response.mimetype, 'application/gzip')
+        self.assertTrue(response.headers['Content-Disposition'].endswith('.ndjson.gz"'))
+        records = [json.loads(line) for line in gzip.decompress(response.data).decode().splitlines()]
+        self.assertEqual([record['sku'] for record in records], ['DESK-1', 'HOSE-1'])
+        self.assertEqual(records[0]['price'], 120.5)
+        self.assertIs(records[0]['is_active'], True)
+
+        upsert = self.client.post('/api/admin/products/bulk-upsert', headers=self.headers,
+                                  data={'file': (BytesIO(response.data), 'products.ndjson.gz')},
+                                  content_type='multipart/form-data')
+        self.assertEqual(json.loads(upsert.data)['unchanged_count'], 2)
+
+        # Read before deleting: the body is streamed lazily
+        data = self.export('?gzip=true&category=Garden').data
+        Product.query.filter_by(sku='HOSE-1').delete()
+        db.session.commit()
+        upload = self.client.post('/api/admin/products/bulk-upload', headers=self.headers,
+                                  data={'file': (BytesIO(data), 'garden.csv.gz')},
+                                  content_type='multipart/form-data')
+        self.assertEqual(json.loads(upload.data)['imported_count'], 1)
+
+        self.assertEqual(self.client.get('/api/admin/products/export?format=xml',
+                                         headers=self.headers).status_code, 400)
+
+    def test_export_streams_in_batches(self):
+        """Test that the body is produced one batch of rows at a time"""
+        chunks = list(export_chunks('csv', batch_size=2))
+        # Header, then two batches
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual([chunk.decode().count('\r\n') for chunk in chunks], [1, 2, 1])
+
+if __name__ == '__main__':
+    unittest.main()
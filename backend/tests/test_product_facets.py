@@ -0,0 +1,142 @@
+import unittest
+import json
+import tempfile
+import os
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.models.product_facet_count import ProductFacetCount
+from app.utils.inventory import decrement_stock
+from app.utils.product_facets import rebuild_facet_counts, init_sql_block, INIT_SQL_PATH
+
+class ProductFacetsTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.user.set_password('Admin123')
+        db.session.add(self.user)
+        db.session.commit()
+
+        for name, category, brand, price, stock in [
+            ('Headphones', 'Electronics', 'Sonic', 80, 5),
+            ('Speaker', 'Electronics', 'Sonic', 240, 1),
+            ('Cable', 'Electronics', None, 9.99, 0),
+            ('Hose', 'Garden', 'Greenline', 25, 3)
+        ]:
+            db.session.add(Product(name=name, category=category, brand=brand, price=price,
+                                   stock_quantity=stock, created_by=self.user.id))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def facets(self, facets='all'):
+        response = self.client.get(f'/api/products?facets={facets}')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)['facets']
+
+    def counts(self):
+        db.session.expire_all()
+        return {(row.facet, row.value): row.product_count
+                for row in ProductFacetCount.query.all() if row.product_count}
+
+    def test_facets_returned_with_page(self):
+        """Test counts per category, brand, price band and availability"""
+        facets = self.facets()
+        self.assertEqual(facets['category'], [{'value': 'Electronics', 'count': 3}, {'value': 'Garden', 'count': 1}])
+        self.assertEqual(facets['brand'], [{'value': 'Sonic', 'count': 2}, {'value': 'Greenline', 'count': 1}])
+        self.assertEqual([(band['value'], band['count']) for band in facets['price']],
+                         [('0-25', 1), ('25-50', 1), ('50-100', 1), ('100-250', 1)])
+        self.assertEqual(facets['price'][1]['min_price'], 25)
+        self.assertEqual(facets['price'][1]['max_price'], 50)
+        self.assertEqual(facets['availability'], [{'value': 'in_stock', 'count': 3},
+                                                  {'value': 'out_of_stock', 'count': 1}])
+
+        self.assertEqual(list(self.facets('brand')), ['brand'])
+        self.assertEqual(self.client.get('/api/products?facets=color').status_code, 400)
+        self.assertNotIn('facets', json.loads(self.client.get('/api/products').data))
+
+    def test_counts_follow_listing_filters(self):
+        """Test that each facet is counted under the filters of the other facets"""
+        facets = self.facets('all&brand=Sonic')
+        self.assertEqual(facets['category'], [{'value': 'Electronics', 'count': 2}])
+        # The brand facet ignores the brand filter, so the other brands stay reachable
+        self.assertEqual(facets['brand'], [{'value': 'Sonic', 'count': 2}, {'value': 'Greenline', 'count': 1}])
+        self.assertEqual(facets['availability'], [{'value': 'in_stock', 'count': 2}])
+
+        facets = self.facets('category,price&category=Electronics&min_price=50')
+        self.assertEqual(facets['category'], [{'value': 'Electronics', 'count': 2}])
+        self.assertEqual([(band['value'], band['count']) for band in facets['price']],
+                         [('0-25', 1), ('50-100', 1), ('100-250', 1)])
+
+    def test_init_sql_carries_generated_triggers(self):
+        """Test that init_db.sql has the PostgreSQL triggers ddl() generates"""
+        with open(INIT_SQL_PATH) as f:
+            self.assertIn(init_sql_block(), f.read())
+
+    def test_counts_follow_product_writes(self):
+        """Test that updates, deactivation and deletes move the counts"""
+        speaker = Product.query.filter_by(name='Speaker').first()
+        speaker.category = 'Audio'
+        speaker.price = 600
+        db.session.commit()
+        counts = self.counts()
+        self.assertEqual(counts[('category', 'Electronics')], 2)
+        self.assertEqual(counts[('category', 'Audio')], 1)
+        self.assertEqual(counts[('price', '500+')], 1)
+        self.assertNotIn(('price', '100-250'), counts)
+
+        hose = Product.query.filter_by(name='Hose').first()
+        hose.is_active = False
+        db.session.commit()
+        self.assertNotIn(('category', 'Garden'), self.counts())
+        self.assertEqual(json.loads(self.client.get('/api/products/categories').data)['categories'],
+                         ['Audio', 'Electronics'])
+
+        db.session.delete(speaker)
+        db.session.commit()
+        self.assertEqual(self.counts()[('brand', 'Sonic')], 1)
+
+    def test_stock_changes_move_availability(self):
+        """Test that selling out and restocking update availability"""
+        speaker = Product.query.filter_by(name='Speaker').first()
+        decrement_stock({speaker.id: 1})
+        db.session.commit()
+        counts = self.counts()
+        self.assertEqual(counts[('availability', 'in_stock')], 2)
+        self.assertEqual(counts[('availability', 'out_of_stock')], 2)
+
+        db.session.execute(db.update(Product).where(Product.stock_quantity == 0).values(stock_quantity=10))
+        db.session.commit()
+        self.assertEqual(self.counts()[('availability', 'in_stock')], 4)
+
+    def test_rebuild_matches_maintained_counts(self):
+        """Test that recomputing from scratch gives the trigger-maintained counts"""
+        Product.query.filter_by(name='Cable').first().stock_quantity = 4
+        db.session.commit()
+        maintained = self.counts()
+        rebuild_facet_counts()
+        self.assertEqual(self.counts(), maintained)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import json
+import tempfile
+import os
+from io import BytesIO
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.models.product_facet_count import ProductFacetCount
+from app.utils.product_import import ProductImport, read_csv_rows
+
+class ProductImportTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret',
+            'PRODUCT_IMPORT_CHUNK_SIZE': 2
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.admin = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.admin.set_password('Admin123')
+        db.session.add(self.admin)
+        db.session.commit()
+        self.admin_id = self.admin.id
+
+        db.session.add(Product(name='Lamp', category='Home', price=30, sku='LAMP-1', created_by=self.admin_id))
+        db.session.commit()
+
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'admin@example.com', 'password': 'Admin123'}),
+                                    content_type='application/json')
+        self.headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def upload(self, content, filename='products.csv'):
+        return self.client.post('/api/admin/products/bulk-upload', headers=self.headers,
+                                data={'file': (BytesIO(content.encode('utf-8')), filename)},
+                                content_type='multipart/form-data')
+
+    def test_import_in_chunks(self):
+        """Test that valid rows are imported across chunks and are searchable"""
+        response = self.upload(
+            'name,price,category,brand,sku,stock_quantity,is_active\n'
+            'Desk,120,Office,Oakline,DESK-1,4,true\n'
+            'Chair,80.5,Office,Oakline,CHAIR-1,10,true\n'
+            '"Shelf, tall",45,Home,,,0,false\n'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['processed_count'], 3)
+        self.assertEqual(data['imported_count'], 3)
+        self.assertEqual(data['error_count'], 0)
+
+        shelf = Product.query.filter_by(name='Shelf, tall').first()
+        self.assertEqual(len(shelf.sku), 8)
+        self.assertFalse(shelf.is_active)
+        self.assertEqual(float(Product.query.filter_by(sku='CHAIR-1').first().price), 80.5)
+
+        # Core inserts still reach the search index and the facet counts
+        search = json.loads(self.client.get('/api/products/search?q=desk').data)
+        self.assertEqual([product['sku'] for product in search['products']], ['DESK-1'])
+        self.assertEqual(ProductFacetCount.query.filter_by(facet='category', value='Office').first().product_count, 2)
+
+    def test_row_errors_are_structured(self):
+        """Test per-row errors for missing fields, bad numbers and duplicate SKUs"""
+        response = self.upload(
+            'name,price,sku,stock_quantity\n'
+            'Desk,120,DESK-1,4\n'
+            ',10,NONAME,1\n'
+            'Chair,cheap,CHAIR-1,1\n'
+            'Lamp copy,30,LAMP-1,1\n'
+            'Desk again,99,DESK-1,1\n'
+            'Stool,15,STOOL-1,lots\n'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['imported_count'], 1)
+        self.assertEqual(data['error_count'], 5)
+        self.assertEqual([(error['row'], error['field']) for error in data['errors']],
+                         [(3, 'name'), (4, 'price'), (5, 'sku'), (6, 'sku'), (7, 'stock_quantity')])
+        self.assertEqual(data['errors'][2], {'row': 5, 'sku': 'LAMP-1', 'field': 'sku', 'error': 'SKU already exists'})
+
+    def test_invalid_files(self):
+        """Test rejection of files that are not importable"""
+        self.assertEqual(self.upload('name,price\n', filename='products.txt').status_code, 400)
+
+        response = self.upload('title,cost\nDesk,120\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('price', json.loads(response.data)['error'])
+
+        response = self.client.post('/api/admin/products/bulk-upload', headers=self.headers,
+                                    data={'file': (BytesIO(b'name,price\nDesk,120\n\xff\xfe,1\n'), 'products.csv')},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.query.count(), 1)
+
+    def test_errors_are_capped_and_skus_preloaded(self):
+        """Test the error cap and that SKU checks do not query per row"""
+        lines = ['name,price,sku'] + [f'Item {i},abc,SKU-{i}' for i in range(20)]
+        job = ProductImport(self.admin_id, chunk_size=5, max_errors=3)
+        job.run(read_csv_rows(BytesIO('\n'.join(lines).encode('utf-8'))))
+        self.assertEqual(job.stats['error_count'], 20)
+        self.assertEqual(len(job.errors), 3)
+
+        job = ProductImport(self.admin_id, chunk_size=5)
+        job.load_existing_skus()
+        self.assertIn('LAMP-1', job.skus)
+        stats = job.run(read_csv_rows(BytesIO(
+            '\n'.join(['name,price,sku'] + [f'Item {i},5,SKU-{i}' for i in range(12)]).encode('utf-8'))))
+        self.assertEqual((stats['imported'], stats['chunks']), (12, 3))
+        self.assertEqual(Product.query.count(), 13)
+
+    def test_sku_created_during_import(self):
+        """Test that a SKU inserted after the preload is skipped, not a failed chunk"""
+        job = ProductImport(self.admin_id, chunk_size=10)
+        job.load_existing_skus()
+        db.session.add(Product(name='Racer', category='Home', price=5, sku='SKU-1', created_by=self.admin_id))
+        db.session.commit()
+
+        stats = job.run(read_csv_rows(BytesIO(b'name,price,sku\nA,5,SKU-0\nB,5,SKU-1\nC,5,SKU-2\n')))
+        self.assertEqual((stats['imported'], stats['error_count']), (2, 1))
+        self.assertEqual(job.errors, [{'row': 3, 'sku': 'SKU-1', 'field': 'sku', 'error': 'SKU already exists'}])
+        self.assertEqual(Product.query.filter_by(sku='SKU-1').first().name, 'Racer')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import json
+import tempfile
+import os
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.utils.search_index import product_search
+
+class ProductSearchTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.user.set_password('Admin123')
+        db.session.add(self.user)
+        db.session.commit()
+
+        for name, sku, brand, description, category in [
+            ('Wireless Headphones', 'AUD-100', 'Sonic', 'Noise cancelling over-ear headphones', 'Electronics'),
+            ('Phone Stand', 'ACC-200', 'Headway', 'Aluminium stand', 'Electronics'),
+            ('Garden Hose', 'GRD-300', 'Greenline', 'Fits wireless sprinkler heads', 'Home & Garden'),
+            ('Running Shoes', 'SPT-400', 'Stride', 'Lightweight trainers', 'Sports')
+        ]:
+            db.session.add(Product(name=name, sku=sku, brand=brand, description=description,
+                                   category=category, price=10, created_by=self.user.id))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def search(self, query_string):
+        response = self.client.get(f'/api/products/search?{query_string}')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def names(self, query_string):
+        return [product['name'] for product in self.search(query_string)['products']]
+
+    def test_prefix_match_ranked_by_relevance(self):
+        """Test prefix matching with name matches ranked above brand and description matches"""
+        self.assertEqual(self.names('q=head'), ['Wireless Headphones', 'Phone Stand', 'Garden Hose'])
+        self.assertEqual(self.names('q=wireless'), ['Wireless Headphones', 'Garden Hose'])
+        self.assertEqual(self.names('q=spt'), ['Running Shoes'])
+        self.assertEqual(self.names('q=electronics'), [])
+
+    def test_candidate_cap_keeps_best_matches(self):
+        """Test that the candidate cap keeps the best ranked matches, not the newest"""
+        self.app.config['PRODUCT_SEARCH_MAX_CANDIDATES'] = 1
+        data = self.search('q=head')
+        self.assertEqual([product['name'] for product in data['products']], ['Wireless Headphones'])
+        self.assertEqual(data['pagination']['total'], 1)
+        self.assertEqual(data['pagination']['total_limit'], 1)
+
+        self.app.config['PRODUCT_SEARCH_MAX_CANDIDATES'] = 0
+        self.assertEqual(self.search('q=head')['pagination']['total'], 3)
+
+    def test_category_filter(self):
+        """Test that the category filter is applied inside the index query"""
+        self.assertEqual(self.names('q=wireless&category=electronics'), ['Wireless Headphones'])
+        self.assertEqual(self.names('q=wireless&category=home%20gar'), ['Garden Hose'])
+        self.assertEqual(self.names('q=wireless&category=sports'), [])
+
+    def test_typo_correction(self):
+        """Test that a query without results is retried with misspelt words corrected"""
+        data = self.search('q=wireles%20hedphones')
+        self.assertEqual([product['name'] for product in data['products']], ['Wireless Headphones'])
+        self.assertEqual(data['corrected_query'], 'wireles headphones')
+        self.assertIsNone(self.search('q=head')['corrected_query'])
+        self.assertIsNone(product_search.correct('qqqq'))
+
+    def test_index_follows_writes(self):
+        """Test that inactive, updated and deleted products are reflected in search"""
+        product = Product.query.filter_by(sku='SPT-400').first()
+        product.name = 'Trail Runner'
+        db.session.commit()
+        self.assertEqual(self.names('q=trail'), ['Trail Runner'])
+        self.assertEqual(self.names('q=running'), [])
+
+        product.is_active = False
+        db.session.commit()
+        self.assertEqual(self.names('q=trail'), [])
+
+        db.session.delete(product)
+        db.session.commit()
+        self.assertEqual(self.names('q=stride'), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+import json
+import tempfile
+import os
+from io import BytesIO
+from app import create_app, db
+from app.models.user import User
+from app.models.product import Product
+from app.models.cache_version import CacheVersion
+from app.models.product_facet_count import ProductFacetCount
+from app.utils.product_upsert import ProductUpsert, read_ndjson_rows
+from app.utils.inventory_holds import hold_stock
+
+class ProductUpsertTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.admin = User(username='admin', email='admin@example.com', is_admin=True, email_verified=True)
+        self.admin.set_password('Admin123')
+        db.session.add(self.admin)
+        db.session.commit()
+        self.admin_id = self.admin.id
+
+        for sku, name, price, stock in [('DESK-1', 'Desk', 120, 4), ('CHAIR-1', 'Chair', 80, 10),
+                                        ('LAMP-1', 'Lamp', 30, 0)]:
+            db.session.add(Product(name=name, category='Office', price=price, stock_quantity=stock, sku=sku,
+                                   description=f'{name} description', created_by=self.admin_id))
+        db.session.commit()
+
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'admin@example.com', 'password': 'Admin123'}),
+                                    content_type='application/json')
+        self.headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def catalog_version(self):
+        return db.session.execute(db.select(CacheVersion.version)).scalar() or 0
+
+    def product(self, sku):
+        db.session.expire_all()
+        return Product.query.filter_by(sku=sku).first()
+
+    def test_csv_upsert_counts(self):
+        """Test inserted, updated and unchanged counts of a partial CSV feed"""
+        version = self.catalog_version()
+        response = self.client.post('/api/admin/products/bulk-upsert', headers=self.headers, data={
+            'file': (BytesIO(b'sku,price,stock_quantity,name\n'
+                             b'DESK-1,99.5,4,\n'
+                             b'CHAIR-1,80.00,10,\n'
+                             b'LAMP-1,30,7,\n'
+                             b'STOOL-1,15,3,Stool\n'), 'feed.csv')
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual((data['inserted_count'], data['updated_count'], data['unchanged_count'],
+                          data['error_count']), (1, 2, 1, 0))
+
+        desk = self.product('DESK-1')
+        self.assertEqual((float(desk.price), desk.stock_quantity, desk.name, desk.description),
+                         (99.5, 4, 'Desk', 'Desk description'))
+        self.assertEqual(self.product('LAMP-1').stock_quantity, 7)
+        self.assertEqual(self.product('STOOL-1').category, 'All')
+        # One chunk: one version bump; the facet triggers saw the restock
+        self.assertEqual(self.catalog_version(), version + 1)
+        self.assertEqual(ProductFacetCount.query.filter_by(facet='availability', value='in_stock').first()
+                         .product_count, 4)
+
+    def test_ndjson_body_and_errors(self):
+        """Test a raw NDJSON feed with per-line errors"""
+        feed = '\n'.join([
+            json.dumps({'sku': 'DESK-1', 'price': 110, 'is_active': False}),
+            '{not json',
+            json.dumps({'price': 5}),
+            json.dumps({'sku': 'NEW-1', 'price': 5}),
+            json.dumps({'sku': 'CHAIR-1', 'stock_quantity': 'many'}),
+            '',
+            json.dumps({'sku': 'DESK-1', 'price': 1})
+        ]) + '\n'
+        response = self.client.post('/api/admin/products/bulk-upsert', headers=self.headers,
+                                    data=feed, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual((data['updated_count'], data['inserted_count'], data['error_count']), (1, 0, 5))
+        self.assertEqual([(error['row'], error['field']) for error in data['errors']],
+                         [(2, None), (3, 'sku'), (5, 'stock_quantity'), (7, 'sku'), (4, 'name')])
+        desk = self.product('DESK-1')
+        self.assertEqual((float(desk.price), desk.is_active), (110, False))
+
+        response = self.client.post('/api/admin/products/bulk-upsert', headers=self.headers,
+                                    data='sku\n', content_type='text/plain')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/admin/products/bulk-upsert?format=csv', headers=self.headers,
+                                    data='name,price\nDesk,1\n', content_type='text/plain')
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunks_are_set_based(self):
+        """Test that each chunk runs a fixed number of statements"""
+        lines = [json.dumps({'sku': f'SKU-{i}', 'name': f'Item {i}', 'price': 5 + i}) for i in range(25)]
+        ProductUpsert(self.admin_id, chunk_size=10).run(read_ndjson_rows(BytesIO('\n'.join(lines).encode())))
+        self.assertEqual(Product.query.count(), 28)
+
+        statements = []
+        from sqlalchemy import event
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            lines = [json.dumps({'sku': f'SKU-{i}', 'price': 5 if i == 0 else 6 + i}) for i in range(25)]
+            job = ProductUpsert(self.admin_id, chunk_size=10)
+            stats = job.run(read_ndjson_rows(BytesIO('\n'.join(lines).encode())))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        self.assertEqual((stats['updated'], stats['unchanged'], stats['chunks']), (24, 1, 3))
+        self.assertEqual(len([s for s in statements if s.startswith('UPDATE products')]), 3)
+        self.assertEqual(len([s for s in statements if s.startswith('SELECT')]), 3)
+
+    def test_stock_below_held_units_is_rejected(self):
+        """Test that a feed cannot take away units held in carts, and whole floats are accepted"""
+        chair = self.product('CHAIR-1')
+        self.assertIsNotNone(hold_stock(chair.id, self.admin_id, 6))
+        feed = '\n'.join([
+            json.dumps({'sku': 'CHAIR-1', 'stock_quantity': 5.0, 'price': 70}),
+            json.dumps({'sku': 'DESK-1', 'stock_quantity': 3.0}),
+            json.dumps({'sku': 'LAMP-1', 'stock_quantity': 2.5})
+        ]) + '\n'
+        response = self.client.post('/api/admin/products/bulk-upsert', headers=self.headers,
+                                    data=feed, content_type='application/x-ndjson')
+        data = json.loads(response.data)
+        self.assertEqual((data['updated_count'], data['error_count']), (1, 2))
+        self.assertEqual([(error['row'], error['sku'], error['field']) for error in data['errors']],
+                         [(3, 'LAMP-1', 'stock_quantity'), (1, 'CHAIR-1', 'stock_quantity')])
+        self.assertIn('6 units held in carts', data['errors'][1]['error'])
+
+        chair = self.product('CHAIR-1')
+        self.assertEqual((chair.stock_quantity, chair.reserved_quantity, float(chair.price)), (10, 6, 80))
+        self.assertEqual(self.product('DESK-1').stock_quantity, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+import json
+import tempfile
+import os
+import threading
+import datetime
+from app import create_app, db
+from app.models.user import User
+from app.models.coupon import Coupon
+from app.models.redemption import Redemption
+from app.models.redeemed_coupon import RedeemedCoupon
+from app.utils.redeemed_coupons import (
+    get_redeemed_coupon_ids, record_redemption, rebuild_redeemed_coupons, exclude_redeemed
+)
+
+class RedeemedCouponsTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client and create test database"""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret'
+        })
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='shopper', email='shopper@example.com', email_verified=True)
+        self.user.set_password('Password123')
+        db.session.add(self.user)
+        db.session.commit()
+
+        now = datetime.datetime.utcnow()
+        self.coupon_ids = []
+        for i in range(10):
+            coupon = Coupon(code=f'PUBLIC{i}', title=f'Coupon {i}', discount_type='fixed', discount_value=5,
+                            max_uses=100, current_uses=0, created_by=self.user.id,
+                            start_date=now - datetime.timedelta(days=1),
+                            end_date=now + datetime.timedelta(days=i + 1))
+            db.session.add(coupon)
+            db.session.flush()
+            self.coupon_ids.append(coupon.id)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        try:
+            os.close(self.db_fd)
+            os.unlink(self.db_path)
+        except (OSError, PermissionError):
+            pass  # File might already be closed or deleted
+
+    def get_auth_headers(self):
+        response = self.client.post('/api/auth/login',
+                                    data=json.dumps({'email': 'shopper@example.com', 'password': 'Password123'}),
+                                    content_type='application/json')
+        return {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def test_record_redemption(self):
+        """Test that coupons are recorded once per user"""
+        self.assertEqual(get_redeemed_coupon_ids(self.user.id), frozenset())
+        self.assertTrue(record_redemption(self.user.id, self.coupon_ids[0]))
+        self.assertTrue(record_redemption(self.user.id, self.coupon_ids[3]))
+        self.assertFalse(record_redemption(self.user.id, self.coupon_ids[0]))
+        db.session.commit()
+
+        self.assertEqual(get_redeemed_coupon_ids(self.user.id),
+                         frozenset([self.coupon_ids[0], self.coupon_ids[3]]))
+        self.assertEqual(RedeemedCoupon.query.filter_by(user_id=self.user.id).count(), 2)
+
+    def test_rollback_discards_the_change(self):
+        """Test that the index follows the redemption's transaction"""
+        record_redemption(self.user.id, self.coupon_ids[0])
+        db.session.rollback()
+        self.assertEqual(get_redeemed_coupon_ids(self.user.id), frozenset())
+
+    def test_rebuild(self):
+        """Test the backfill from redemptions"""
+        for coupon_id in self.coupon_ids[:2]:
+            db.session.add(Redemption(user_id=self.user.id, coupon_id=coupon_id, discount_applied=5))
+        db.session.commit()
+        self.assertEqual(get_redeemed_coupon_ids(self.user.id), frozenset())
+
+        self.assertEqual(rebuild_redeemed_coupons(), 1)
+        self.assertEqual(get_redeemed_coupon_ids(self.user.id), frozenset(self.coupon_ids[:2]))
+        self.assertFalse(record_redemption(self.user.id, self.coupon_ids[1]))
+        self.assertTrue(record_redemption(self.user.id, self.coupon_ids[2]))
+        db.session.commit()
+        self.assertEqual(get_redeemed_coupon_ids(self.user.id), frozenset(self.coupon_ids[:3]))
+
+        self.assertEqual(rebuild_redeemed_coupons(self.user.id), 1)
+        self.assertEqual(get_redeemed_coupon_ids(self.user.id), frozenset(self.coupon_ids[:2]))
+
+    def test_exclude_redeemed(self):
+        """Test the anti-join filter"""
+        for coupon_id in self.coupon_ids[::2]:
+            record_redemption(self.user.id, coupon_id)
+        db.session.commit()
+        query = exclude_redeemed(Coupon.query, self.user.id)
+        ids = [coupon.id for coupon in query.all()]
+        self.assertEqual(sorted(ids), self.coupon_ids[1::2])
+
+        # The statement does not grow with the user's redemptions
+        sql = str(query.statement.compile(compile_kwargs={'literal_binds': True}))
+        self.assertIn('NOT (EXISTS', sql)
+        self.assertNotIn(' IN ', sql)
+
+    def test_concurrent_redemptions_keep_every_coupon(self):
+        """Test that concurrent redemptions by one user are all recorded"""
+        errors = []
+
+        def redeem(coupon_id):
+            with self.app.app_context():
+                try:
+                    record_redemption(self.user.id, coupon_id)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+                db.session.remove()
+
+        threads = [threading.Thread(target=redeem, args=(coupon_id,)) for coupon_id in self.coupon_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        db.session.expire_all()
+        self.assertEqual(get_redeemed_coupon_ids(self.user.id), frozenset(self.coupon_ids))
+
+    def test_endpoints_use_the_index(self):
+        """Test that redeeming updates the index and listings exclude the coupon"""
+        headers = self.get_auth_headers()
+        response = self.client.post('/api/coupons/redeem',
+                                    data=json.dumps({'code': 'PUBLIC0', 'order_amount': 50}),
+                                    content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(get_redeemed_coupon_ids(self.user.id), frozenset([self.coupon_ids[0]]))
+
+        response = self.client.post('/api/coupons/redeem',
+                                    data=json.dumps({'code': 'PUBLIC0', 'order_amount': 50}),
+                                    content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Redemption.query.count(), 1)
+
+        response = self.client.get('/api/coupons/public?per_page=50', headers=headers)
+        codes = [coupon['code'] for coupon in json.loads(response.data)['coupons']]
+        self.assertEqual(len(codes), 9)
+        self.assertNotIn('PUBLIC0', codes)
+
+        response = self.client.get('/api/user/stats', headers=headers)
+        self.assertEqual(json.loads(response.data)['stats']['available_coupons'], 9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import tempfile
+import shutil
+import os
+from app import create_app
+
+DIGEST = 'ab' + '0' * 62
+
+
+class UploadsTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up test client with an upload directory"""
+        self.upload_dir = tempfile.mkdtemp()
+        self.image_path = os.path.join('images', 'ab', DIGEST, 'medium.webp')
+        os.makedirs(os.path.join(self.upload_dir, os.path.dirname(self.image_path)))
+        with open(os.path.join(self.upload_dir, self.image_path), 'wb') as f:
+            f.write(bytes(range(256)) * 4)
+        with open(os.path.join(self.upload_dir, 'product_1.jpg'), 'wb') as f:
+            f.write(b'legacy image')
+
+        self.config = {
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'SECRET_KEY': 'test-secret-key',
+            'JWT_SECRET_KEY': 'test-jwt-secret',
+            'UPLOAD_DIR': self.upload_dir
+        }
+        self.client = create_app(self.config).test_client()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        shutil.rmtree(self.upload_dir, ignore_errors=True)
+
+    def test_cache_headers(self):
+        """Test immutable caching for content-hashed files only"""
+        response = self.client.get(f'/uploads/{self.image_path}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1024)
+        self.assertEqual(response.mimetype, 'image/webp')
+        cache_control = response.cache_control
+        self.assertTrue(cache_control.public and cache_control.immutable)
+        self.assertEqual(cache_control.max_age, 365 * 24 * 3600)
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+        self.assertEqual(response.headers.get('Accept-Ranges'), 'bytes')
+
+        response = self.client.get('/uploads/product_1.jpg')
+        self.assertEqual(response.data, b'legacy image')
+        self.assertFalse(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, 300)
+
+        self.assertEqual(self.client.get('/uploads/missing.png').status_code, 404)
+        self.assertEqual(self.client.get('/uploads/../secret.py').status_code, 404)
+
+    def test_conditional_and_range_requests(self):
+        """Test 304 revalidation and partial content"""
+        response = self.client.get(f'/uploads/{self.image_path}')
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+
+        response = self.client.get(f'/uploads/{self.image_path}', headers={'If-None-Match': etag})
+        self.assertEqual((response.status_code, response.data), (304, b''))
+        response = self.client.get(f'/uploads/{self.image_path}', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(f'/uploads/{self.image_path}', headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, bytes(range(10, 20)))
+        self.assertEqual(response.headers['Content-Range'], 'bytes 10-19/1024')
+
+        response = self.client.get(f'/uploads/{self.image_path}', headers={'Range': 'bytes=5000-'})
+        self.assertEqual(response.status_code, 416)
+
+    def test_proxy_offload(self):
+        """Test that offloading leaves the body to the proxy"""
+        client = create_app(dict(self.config, UPLOADS_OFFLOAD='x-sendfile')).test_client()
+        response = client.get(f'/uploads/{self.image_path}')
+        self.assertEqual(response.headers['X-Sendfile'], os.path.join(self.upload_dir, self.image_path))
+        self.assertEqual(response.data, b'')
+        self.assertTrue(response.cache_control.immutable)
+
+        client = create_app(dict(self.config, UPLOADS_OFFLOAD='x-accel-redirect')).test_client()
+        response = client.get(f'/uploads/{self.image_path}')
+        self.assertEqual(response.headers['X-Accel-Redirect'], f'/_uploads/{self.image_path}')
+        self.assertNotIn('X-Sendfile', response.headers)
+        self.assertEqual(response.data, b'')
+
+        # Conditional and Range requests are answered by the proxy
+        response = client.get(f'/uploads/{self.image_path}', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Accel-Redirect', response.headers)
+
+    def test_proxy_offload_range_request(self):
+        """Test that an offloaded Range request is a plain 200 for the proxy to slice"""
+        for mode, header in (('x-sendfile', 'X-Sendfile'), ('x-accel-redirect', 'X-Accel-Redirect')):
+            client = create_app(dict(self.config, UPLOADS_OFFLOAD=mode)).test_client()
+            response = client.get(f'/uploads/{self.image_path}', headers={'Range': 'bytes=10-19'})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(header, response.headers)
+            self.assertNotIn('Content-Range', response.headers)
+            self.assertNotIn('Content-Length', response.headers)
+            self.assertEqual(response.data, b'')
+
+if __name__ == '__main__':
+    unittest.main()
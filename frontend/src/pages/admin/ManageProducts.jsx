@@ -303,7 +303,7 @@ const ManageProducts = () => {
                           {product.image_url ? (
                             <img
                               className="h-12 w-12 rounded-lg object-cover"
-                              src={product.image_url}
+                              src={product.image_variants?.thumbnail || product.image_url}
                               alt={product.name}
                             />
                           ) : (
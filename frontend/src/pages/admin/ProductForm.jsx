@@ -117,15 +117,9 @@ const ProductForm = () => {
 
   const uploadImageToPublic = async (file) => {
     try {
-      // Create a unique filename
-      const timestamp = Date.now();
-      const fileExtension = file.name.split('.').pop();
-      const fileName = `product_${timestamp}.${fileExtension}`;
-
-      // Create FormData for file upload
+      // Create FormData for file upload; the server names the file by its content hash
       const formData = new FormData();
       formData.append('image', file);
-      formData.append('filename', fileName);
 
       // Get the API base URL from the environment or use default
       const apiBaseUrl = process.env.REACT_APP_API_URL || 'http://localhost:5000';